@@ -19,6 +19,9 @@ if not API_KEY:
 class AlphaVantageClient:
     BASE_URL = "https://www.alphavantage.co/query"
 
+    # === BULK QUOTES (REALTIME_BULK_QUOTES) ===
+    BULK_BATCH_SIZE = 100
+
     # === OPTYMALIZACJA (TRAFFIC SHAPING) - WORKER ===
     # Worker otrzymuje 120 zapytań/minutę (80% pasma Premium).
     # Pozostałe 30 zapytań/minutę jest zarezerwowane dla Frontendu.
@@ -141,68 +144,67 @@ class AlphaVantageClient:
         params = {"function": "MARKET_STATUS"}
         return self._make_request(params)
 
-    def get_bulk_quotes(self, symbols: list[str]):
+    def _iter_bulk_chunks(self, symbols: list[str]):
         """
-        Pobiera surowy tekst CSV dla endpointu REALTIME_BULK_QUOTES.
-        OBSŁUGA BATCHINGU: Dzieli zapytanie na paczki po 100 symboli.
+        Generator surowych odpowiedzi CSV endpointu REALTIME_BULK_QUOTES.
+        OBSŁUGA BATCHINGU: Dzieli zapytanie na paczki po BULK_BATCH_SIZE symboli
+        (tempo pilnuje limiter - bez dodatkowych uśpień między paczkami).
         """
-        # 1. Oczyszczenie i deduplikacja symboli
-        clean_symbols = list(set([s.strip().upper() for s in symbols if s.strip()]))
-        if not clean_symbols:
-            return None
+        # 1. Oczyszczenie i deduplikacja symboli (kolejność zachowana)
+        clean_symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
 
         # 2. Podział na batche (Max 100 symboli na request wg dokumentacji AV)
-        batch_size = 100
-        batches = [clean_symbols[i:i + batch_size] for i in range(0, len(clean_symbols), batch_size)]
-        
-        combined_csv_output = ""
-        header_saved = False
-        
-        # 3. Wykonanie zapytań dla każdej paczki
-        for batch in batches:
+        for i in range(0, len(clean_symbols), self.BULK_BATCH_SIZE):
+            batch = clean_symbols[i:i + self.BULK_BATCH_SIZE]
             params = {
                 "function": "REALTIME_BULK_QUOTES",
                 "symbol": ",".join(batch),
                 "datatype": "csv",
             }
-            
             try:
-                # _make_request zarządza API Key i Rate Limitami (Worker ma własne limity 120/min)
+                # _make_request zarządza API Key i Rate Limitami (API ma własne limity)
                 text_response = self._make_request(params)
-                
                 if isinstance(text_response, str) and "symbol" in text_response:
-                    lines = text_response.strip().split('\n')
-                    if not lines: continue
-                    
-                    # Logika łączenia CSV
-                    if not header_saved:
-                        # Pierwsza paczka: bierzemy wszystko (nagłówek + dane)
-                        combined_csv_output += text_response.strip()
-                        header_saved = True
-                    else:
-                        # Kolejne paczki: pomijamy nagłówek (pierwszą linię), doklejamy tylko dane
-                        if len(lines) > 1:
-                            # Dodaj nową linię separatora, jeśli buffer nie jest pusty
-                            if combined_csv_output:
-                                combined_csv_output += "\n"
-                            combined_csv_output += "\n".join(lines[1:])
-                
-                # Krótki oddech, aby nie zalać API przy bardzo dużej liczbie batchy
-                if len(batches) > 1:
-                    time.sleep(0.1)
-                    
+                    yield text_response
             except Exception as e:
                 logger.error(f"Worker: Błąd podczas pobierania batcha Bulk Quotes: {e}")
-                continue
 
-        if not combined_csv_output or "symbol" not in combined_csv_output:
+    def get_bulk_quotes(self, symbols: list[str]):
+        """
+        Pobiera surowy tekst CSV dla endpointu REALTIME_BULK_QUOTES (jeden nagłówek, wszystkie paczki).
+        """
+        lines = []
+        for chunk in self._iter_bulk_chunks(symbols):
+            chunk_lines = chunk.strip().split('\n')
+            # Kolejne paczki: pomijamy nagłówek (pierwszą linię), doklejamy tylko dane
+            lines.extend(chunk_lines if not lines else chunk_lines[1:])
+        if not lines:
             return None
-            
-        return combined_csv_output
+        return "\n".join(lines)
+
+    def get_bulk_quote_columns(self, symbols: list[str]) -> dict[str, list[str]]:
+        """
+        Dane Bulk kolumnami (nazwa kolumny CSV -> lista wartości tekstowych, kolejność paczek zachowana).
+        Każda paczka czytana osobno przez csv.reader i transponowana - bez sklejania paczek w jeden
+        tekst i bez słownika na wiersz (csv.DictReader).
+        """
+        columns: dict[str, list[str]] = {}
+        for chunk in self._iter_bulk_chunks(symbols):
+            rows = list(csv.reader(StringIO(chunk)))
+            if len(rows) < 2:
+                continue
+            header = rows[0]
+            body = [r for r in rows[1:] if len(r) == len(header) and r[0]]
+            if columns and list(columns) != header:
+                logger.warning("Bulk Quotes: Inny nagłówek CSV w kolejnej paczce - paczka pominięta.")
+                continue
+            for name, values in zip(header, zip(*body)):
+                columns.setdefault(name, []).extend(values)
+        return columns
 
     def get_bulk_quotes_parsed(self, symbols: list[str]) -> list[dict]:
         """
-        Pobiera i parsuje dane Bulk do listy słowników (Dla Workera/Faza 5).
+        Pobiera i parsuje dane Bulk do listy słowników.
         """
         csv_text = self.get_bulk_quotes(symbols)
         if not csv_text: 
@@ -225,7 +227,7 @@ class AlphaVantageClient:
                 if data['symbol']:
                     results.append(data)
         except Exception as e:
-            logger.error(f"Błąd parsowania Bulk CSV w Workerze: {e}")
+            logger.error(f"Błąd parsowania Bulk CSV w API: {e}")
             
         return results
 
@@ -12,6 +12,7 @@ import csv
 from typing import Generator
 import uuid 
 import math 
+import json
 import os 
 
 logger = logging.getLogger(__name__)
@@ -609,6 +610,85 @@ def get_ai_optimizer_report(db: Session) -> schemas.AIOptimizerReport:
             report_text=f"Błąd serwera podczas odczytu raportu: {e}"
         )
 
+# === KSIĘGA ZAPYTAŃ AV ===
+
+_LEDGER_JOB_COLUMNS = """
+    job_id, MIN(phase),
+    COUNT(*) FILTER (WHERE NOT cached),
+    COUNT(*) FILTER (WHERE cached),
+    COUNT(*) FILTER (WHERE status = 'THROTTLED'),
+    COUNT(*) FILTER (WHERE status = 'ERROR'),
+    MIN(called_at), MAX(called_at)
+"""
+
+def _ledger_job_from_row(row) -> schemas.ApiUsageJob:
+    duration = (row[7] - row[6]).total_seconds() if row[6] and row[7] else 0.0
+    return schemas.ApiUsageJob(
+        job_id=row[0], phase=row[1], api_calls=row[2], cache_hits=row[3],
+        throttled=row[4], errors=row[5], started_at=row[6], finished_at=row[7],
+        duration_seconds=round(duration, 1)
+    )
+
+def get_api_usage_jobs(db: Session, limit: int = 50) -> List[schemas.ApiUsageJob]:
+    """Ostatnie zadania Workera z księgi: zapytania AV vs trafienia w cache."""
+    rows = db.execute(text(f"""
+        SELECT {_LEDGER_JOB_COLUMNS} FROM api_call_ledger
+        WHERE job_id IS NOT NULL
+        GROUP BY job_id
+        ORDER BY MAX(called_at) DESC
+        LIMIT :limit
+    """), {'limit': limit}).fetchall()
+    return [_ledger_job_from_row(r) for r in rows]
+
+def get_api_usage_job(db: Session, job_id: str) -> Optional[schemas.ApiUsageJobDetail]:
+    row = db.execute(text(f"""
+        SELECT {_LEDGER_JOB_COLUMNS} FROM api_call_ledger WHERE job_id = :job_id GROUP BY job_id
+    """), {'job_id': job_id}).fetchone()
+    if not row:
+        return None
+    functions = db.execute(text("""
+        SELECT function,
+               COUNT(*) FILTER (WHERE NOT cached),
+               COUNT(*) FILTER (WHERE cached),
+               COUNT(*) FILTER (WHERE status = 'THROTTLED'),
+               AVG(latency_ms)
+        FROM api_call_ledger WHERE job_id = :job_id
+        GROUP BY function
+        ORDER BY COUNT(*) FILTER (WHERE NOT cached) DESC
+    """), {'job_id': job_id}).fetchall()
+    detail = schemas.ApiUsageJobDetail(**_ledger_job_from_row(row).model_dump())
+    detail.functions = [
+        schemas.ApiUsageFunction(
+            function=f[0], api_calls=f[1], cache_hits=f[2], throttled=f[3],
+            avg_latency_ms=round(float(f[4]), 1) if f[4] is not None else None
+        ) for f in functions
+    ]
+    return detail
+
+def get_api_estimate_report(db: Session) -> schemas.ApiEstimateReport:
+    try:
+        report_row = db.query(models.SystemControl).filter(
+            models.SystemControl.key == 'api_estimate_report'
+        ).first()
+
+        if not report_row or not report_row.value or report_row.value == 'NONE':
+            return schemas.ApiEstimateReport(status="NONE")
+
+        if report_row.value == 'PROCESSING':
+            return schemas.ApiEstimateReport(status="PROCESSING", last_updated=report_row.updated_at)
+
+        payload = json.loads(report_row.value)
+        return schemas.ApiEstimateReport(
+            status=payload.get('status', 'DONE'),
+            report=payload.get('report'),
+            error=payload.get('error'),
+            last_updated=report_row.updated_at
+        )
+
+    except Exception as e:
+        logger.error(f"Nie można pobrać estymacji kosztu API: {e}", exc_info=True)
+        return schemas.ApiEstimateReport(status="ERROR", error=str(e))
+
 def get_h3_deep_dive_report(db: Session) -> schemas.H3DeepDiveReport:
     try:
         report_row = db.query(models.SystemControl).filter(
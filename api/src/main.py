@@ -2,8 +2,6 @@
 import logging
 import sys
 import json
-import csv
-from io import StringIO
 from fastapi import FastAPI, Depends, HTTPException, Response, Query, Body
 from fastapi.responses import StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
@@ -65,7 +63,9 @@ async def startup_event():
             'h3_deep_dive_report': 'NONE',
             'h3_live_parameters': '{}',
             'macro_sentiment': 'UNKNOWN',
-            'optimization_request': 'NONE'
+            'optimization_request': 'NONE',
+            'api_estimate_request': 'NONE',
+            'api_estimate_report': 'NONE'
         }
         for key, value in initial_values.items():
             if crud.get_system_control_value(db, key) is None:
@@ -336,6 +336,44 @@ def request_ai_optimizer(request: schemas.AIOptimizerRequest, db: Session = Depe
 def get_ai_optimizer_report_endpoint(db: Session = Depends(get_db)):
     return crud.get_ai_optimizer_report(db)
 
+# --- KSIĘGA ZAPYTAŃ AV / ESTYMATOR KOSZTU ---
+
+ESTIMATE_JOBS = ['PHASE1', 'PHASE3', 'PHASE4', 'SDAR', 'BACKTEST', 'OPTIMIZER']
+
+@app.get("/api/v1/api-usage/jobs", response_model=List[schemas.ApiUsageJob])
+def get_api_usage_jobs_endpoint(limit: int = 50, db: Session = Depends(get_db)):
+    try:
+        return crud.get_api_usage_jobs(db, limit=max(1, min(limit, 500)))
+    except Exception as e:
+        logger.error(f"Błąd odczytu księgi zapytań: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail="Błąd serwera.")
+
+@app.get("/api/v1/api-usage/jobs/{job_id}", response_model=schemas.ApiUsageJobDetail)
+def get_api_usage_job_endpoint(job_id: str, db: Session = Depends(get_db)):
+    job = crud.get_api_usage_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Nie znaleziono zadania w księdze.")
+    return job
+
+@app.post("/api/v1/api-usage/estimate", status_code=202)
+def request_api_estimate(request: schemas.ApiEstimateRequest, db: Session = Depends(get_db)):
+    # Estymacja czyta tylko świeżość danych (bez zapytań AV) - Worker liczy ją między operacjami
+    job = request.job.strip().upper()
+    if job not in ESTIMATE_JOBS:
+        raise HTTPException(status_code=400, detail=f"Nieznane zadanie. Dozwolone: {', '.join(ESTIMATE_JOBS)}")
+    payload = request.model_dump()
+    payload['job'] = job
+    try:
+        crud.set_system_control_value(db, "api_estimate_request", json.dumps(payload))
+        crud.set_system_control_value(db, "api_estimate_report", 'PROCESSING')
+        return {"message": f"Estymacja kosztu {job} zlecona."}
+    except Exception:
+        raise HTTPException(status_code=500, detail="Błąd serwera.")
+
+@app.get("/api/v1/api-usage/estimate", response_model=schemas.ApiEstimateReport)
+def get_api_estimate_endpoint(db: Session = Depends(get_db)):
+    return crud.get_api_estimate_report(db)
+
 @app.post("/api/v1/analysis/h3-deep-dive", status_code=202)
 def request_h3_deep_dive(request: schemas.H3DeepDiveRequest, db: Session = Depends(get_db)):
     worker_status = crud.get_system_control_value(db, "worker_status")
@@ -396,26 +434,32 @@ def get_bulk_quotes_endpoint(tickers: str = Query(..., description="Tickery oddz
     if not ticker_list:
         return []
     try:
-        csv_data = api_av_client.get_bulk_quotes(ticker_list)
-        if not csv_data: return []
+        # Kolumny z paczek CSV (bez sklejania tekstu i csv.DictReader); pola zostają tekstem jak w AV
+        columns = api_av_client.get_bulk_quote_columns(ticker_list)
+        symbols = columns.get("symbol")
+        if not symbols: return []
+        missing = [None] * len(symbols)
+        fields = ("open", "high", "low", "close", "volume", "previous_close", "change", "change_percent",
+                  "extended_hours_quote", "extended_hours_change", "extended_hours_change_percent")
         results = []
-        reader = csv.DictReader(StringIO(csv_data))
-        for row in reader:
+        for symbol, open_, high, low, close, volume, prev_close, change, change_pct, ext_quote, ext_change, ext_change_pct in zip(
+            symbols, *(columns.get(f, missing) for f in fields)
+        ):
             formatted = {
-                "01. symbol": row.get("symbol"),
-                "02. open": row.get("open"),
-                "03. high": row.get("high"),
-                "04. low": row.get("low"),
-                "05. price": row.get("close"),
-                "06. volume": row.get("volume"),
-                "08. previous close": row.get("previous_close"),
-                "09. change": row.get("change"),
-                "10. change percent": f'{row.get("change_percent")}%'
+                "01. symbol": symbol,
+                "02. open": open_,
+                "03. high": high,
+                "04. low": low,
+                "05. price": close,
+                "06. volume": volume,
+                "08. previous close": prev_close,
+                "09. change": change,
+                "10. change percent": f'{change_pct}%'
             }
-            if row.get("extended_hours_quote"):
-                 formatted["05. price"] = row.get("extended_hours_quote")
-                 formatted["09. change"] = row.get("extended_hours_change")
-                 formatted["10. change percent"] = f'{row.get("extended_hours_change_percent")}%'
+            if ext_quote:
+                 formatted["05. price"] = ext_quote
+                 formatted["09. change"] = ext_change
+                 formatted["10. change percent"] = f'{ext_change_pct}%'
                  formatted["_price_source"] = "extended_hours"
             results.append(formatted)
         return results
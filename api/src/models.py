@@ -234,6 +234,24 @@ class AlphaVantageCache(Base):
     last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     __table_args__ = (UniqueConstraint('ticker', 'data_type', name='uq_av_cache_entry'),)
 
+# === KSIĘGA ZAPYTAŃ ALPHA VANTAGE (zapisuje Worker) ===
+class ApiCallLedger(Base):
+    __tablename__ = 'api_call_ledger'
+    id = Column(BIGINT, primary_key=True, autoincrement=True)
+    called_at = Column(PG_TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    job_id = Column(VARCHAR(64), nullable=True)
+    phase = Column(VARCHAR(50), nullable=True)
+    function = Column(VARCHAR(64), nullable=True)
+    symbol = Column(VARCHAR(50), nullable=True)
+    lane = Column(INTEGER, nullable=True)
+    cached = Column(Boolean, nullable=False, default=False)
+    status = Column(VARCHAR(20), nullable=False)
+    latency_ms = Column(INTEGER, nullable=True)
+    __table_args__ = (
+        Index('ix_api_call_ledger_job', 'job_id', 'called_at'),
+        Index('ix_api_call_ledger_called_at', 'called_at'),
+    )
+
 # === OPTYMALIZATOR (QUANTUM JOB) ===
 class OptimizationJob(Base):
     __tablename__ = 'optimization_jobs'
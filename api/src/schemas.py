@@ -263,6 +263,41 @@ class H3DeepDiveReport(BaseModel):
     report_text: Optional[str] = None
     last_updated: Optional[datetime] = None
 
+# === KSIĘGA ZAPYTAŃ AV I ESTYMATOR KOSZTU ===
+
+class ApiUsageJob(BaseModel):
+    job_id: str
+    phase: Optional[str] = None
+    api_calls: int
+    cache_hits: int
+    throttled: int
+    errors: int
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    duration_seconds: float = 0.0
+
+class ApiUsageFunction(BaseModel):
+    function: Optional[str] = None
+    api_calls: int
+    cache_hits: int
+    throttled: int
+    avg_latency_ms: Optional[float] = None
+
+class ApiUsageJobDetail(ApiUsageJob):
+    functions: List[ApiUsageFunction] = []
+
+class ApiEstimateRequest(BaseModel):
+    job: str = Field(..., description="PHASE1, PHASE3, PHASE4, SDAR, BACKTEST, OPTIMIZER")
+    year: Optional[int] = Field(default=None, description="Rok backtestu (miesiące intraday SDAR)", ge=2000, le=2100)
+    strategy_mode: Optional[str] = Field(default='H3', description="H3 / SDAR / AQM")
+    tickers: Optional[List[str]] = Field(default=None, description="Brak = uniwersum zadania jak w Workerze")
+
+class ApiEstimateReport(BaseModel):
+    status: str
+    report: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    last_updated: Optional[datetime] = None
+
 class OptimizationRequest(BaseModel):
     target_year: int = Field(..., description="Rok optymalizacji", ge=2000, le=2100)
     n_trials: int = Field(default=50, description="Liczba prób", ge=10, le=5000)
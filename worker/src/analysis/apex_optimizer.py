@@ -17,16 +17,20 @@ from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
 from .utils import (
     update_system_control, 
     append_scan_log, 
-    calculate_atr,
-    get_raw_data_with_cache,
-    standardize_df_columns
+    calculate_atr
 )
 # === IMPORTY SILNIKÓW FIZYCZNYCH (H3/AQM) ===
 from . import aqm_v3_metrics 
 from . import aqm_v3_h2_loader
 from . import aqm_v4_logic
+from . import indicators
+from . import daily_data
+from . import daily_sentiment
+from . import insider_transactions
+from . import macro_context
 # ============================================
 from .apex_audit import SensitivityAnalyzer
+from .prefetch_planner import prefetch_for_job
 from ..database import get_db_session 
 
 logger = logging.getLogger(__name__)
@@ -153,36 +157,20 @@ class QuantumOptimizer:
 
     def _load_macro_context(self):
         append_scan_log(self.session, "📊 Ładowanie tła makroekonomicznego (Historycznego)...")
-        macro = {
-            'qqq_df': pd.DataFrame(), 
-            'inflation_series': pd.Series(dtype=float),
-            'yield_series': pd.Series(dtype=float),
-            'fed_rate_series': pd.Series(dtype=float)
-        }
-        
         local_session = get_db_session()
         try:
-            client = AlphaVantageClient()
-            qqq_raw = get_raw_data_with_cache(local_session, client, 'QQQ', 'DAILY_ADJUSTED', 'get_daily_adjusted', outputsize='full')
-            if qqq_raw:
-                macro['qqq_df'] = standardize_df_columns(pd.DataFrame.from_dict(qqq_raw.get('Time Series (Daily)', {}), orient='index'))
-                macro['qqq_df'].index = pd.to_datetime(macro['qqq_df'].index)
-                macro['qqq_df'].sort_index(inplace=True)
-            
-            from .backtest_engine import _parse_macro_to_series
-            yield_raw = get_raw_data_with_cache(local_session, client, 'TREASURY_YIELD', 'TREASURY_YIELD', 'get_treasury_yield', interval='monthly')
-            macro['yield_series'] = _parse_macro_to_series(yield_raw)
-            inf_raw = get_raw_data_with_cache(local_session, client, 'INFLATION', 'INFLATION', 'get_inflation_rate')
-            macro['inflation_series'] = _parse_macro_to_series(inf_raw)
-            fed_raw = get_raw_data_with_cache(local_session, client, 'FEDERAL_FUNDS_RATE', 'FEDERAL_FUNDS_RATE', 'get_fed_funds_rate', interval='monthly')
-            macro['fed_rate_series'] = _parse_macro_to_series(fed_raw)
-
+            # Wspólny kontekst makro (pamięć procesu, odświeżany wg rytmu publikacji serii)
+            return macro_context.get_macro_context(local_session, AlphaVantageClient()).macro_data()
         except Exception as e:
             append_scan_log(self.session, f"⚠️ Warning Makro: {e}")
+            return {
+                'qqq_df': pd.DataFrame(),
+                'inflation_series': pd.Series(dtype=float),
+                'yield_series': pd.Series(dtype=float),
+                'fed_rate_series': pd.Series(dtype=float)
+            }
         finally:
             local_session.close()
-            
-        return macro
 
     def _preload_data_to_cache_sequential(self):
         update_system_control(self.session, 'worker_status', 'OPTIMIZING_DATA_LOAD')
@@ -203,6 +191,13 @@ class QuantumOptimizer:
         
         load_session = get_db_session()
         client = AlphaVantageClient()
+
+        # Planer: brakujące dane pobrane równolegle, pętla niżej liczy już tylko z cache
+        try:
+            prefetch_for_job(self.session, client, 'OPTIMIZER', tickers, strategy_mode=self.strategy_mode)
+        except Exception as e:
+            logger.error(f"Optimizer: Błąd prefetchu: {e}")
+            self.session.rollback()
         
         try:
             for i, ticker in enumerate(tickers):
@@ -231,57 +226,31 @@ class QuantumOptimizer:
         append_scan_log(self.session, summary)
 
     def _load_single_ticker_data(self, session, client, ticker):
-        daily_data = get_raw_data_with_cache(session, client, ticker, 'DAILY_ADJUSTED', 'get_daily_adjusted', outputsize='full')
-        if not daily_data:
-            daily_data = get_raw_data_with_cache(session, client, ticker, 'DAILY_OHLCV', 'get_time_series_daily', outputsize='full')
-        if not daily_data: return False
+        frames = daily_data.load_daily_frames(session, client, ticker)
+        if frames.empty: return False
         
         h2_data = aqm_v3_h2_loader.load_h2_data_into_cache(ticker, client, session)
-        weekly_df = pd.DataFrame()
-        obv_df = pd.DataFrame()
         
-        if self.strategy_mode == 'AQM':
-            w_raw = get_raw_data_with_cache(session, client, ticker, 'WEEKLY_ADJUSTED', 'get_weekly_adjusted')
-            if w_raw: weekly_df = standardize_df_columns(pd.DataFrame.from_dict(w_raw.get('Weekly Adjusted Time Series', {}), orient='index'))
-            obv_raw = get_raw_data_with_cache(session, client, ticker, 'OBV', 'get_obv')
-            if obv_raw:
-                obv_df = pd.DataFrame.from_dict(obv_raw.get('Technical Analysis: OBV', {}), orient='index')
-                if not obv_df.empty:
-                    obv_df.index = pd.to_datetime(obv_df.index)
-                    obv_df.rename(columns={'OBV': 'OBV'}, inplace=True)
-        
-        processed_df = self._preprocess_ticker_unified(daily_data, h2_data, weekly_df, obv_df)
+        processed_df = self._preprocess_ticker_unified(frames.raw.copy(), h2_data, frames.adjusted)
         if not processed_df.empty:
             self.data_cache[ticker] = processed_df
             return True
         return False
 
-    def _preprocess_ticker_unified(self, daily_data, h2_data, weekly_df, obv_df) -> pd.DataFrame:
+    def _preprocess_ticker_unified(self, daily_df, h2_data, adjusted_df=None) -> pd.DataFrame:
         try:
-            daily_df = standardize_df_columns(pd.DataFrame.from_dict(daily_data.get('Time Series (Daily)', {}), orient='index'))
             if len(daily_df) < 200: return pd.DataFrame()
-            
-            if not isinstance(daily_df.index, pd.DatetimeIndex):
-                daily_df.index = pd.to_datetime(daily_df.index)
-            daily_df.index = daily_df.index.tz_localize(None) 
-            daily_df.sort_index(inplace=True)
             daily_df['atr_14'] = calculate_atr(daily_df).ffill().fillna(0)
 
             if self.strategy_mode == 'H3':
                 daily_df['price_gravity'] = (daily_df['high'] + daily_df['low'] + daily_df['close']) / 3 / daily_df['close'] - 1
                 insider_df = h2_data.get('insider_df')
-                news_df = h2_data.get('news_df')
-                daily_df['institutional_sync'] = daily_df.apply(lambda row: aqm_v3_metrics.calculate_institutional_sync_from_data(insider_df, row.name) or 0.0, axis=1)
-                daily_df['retail_herding'] = daily_df.apply(lambda row: aqm_v3_metrics.calculate_retail_herding_from_data(news_df, row.name) or 0.0, axis=1)
+                sentiment_df = h2_data.get('sentiment_df')
+                daily_df['institutional_sync'] = insider_transactions.institutional_sync_series(insider_df, daily_df.index)
+                daily_df['retail_herding'] = daily_sentiment.retail_herding_series(sentiment_df, daily_df.index)
                 daily_df['daily_returns'] = daily_df['close'].pct_change().fillna(0)
                 daily_df['market_temperature'] = daily_df['daily_returns'].rolling(window=30).std().fillna(0) 
-                
-                if not news_df.empty:
-                    nc = news_df.groupby(news_df.index.date).size() 
-                    nc.index = pd.to_datetime(nc.index)
-                    nc = nc.reindex(daily_df.index, fill_value=0)
-                    daily_df['information_entropy'] = nc.rolling(window=10).sum().fillna(0)
-                else: daily_df['information_entropy'] = 0.0
+                daily_df['information_entropy'] = daily_sentiment.information_entropy_series(sentiment_df, daily_df.index)
                 
                 df_calc = aqm_v3_metrics.calculate_aqm_h3_vectorized(daily_df)
                 df_calc['aqm_rank'] = df_calc['aqm_score_h3'].rolling(window=100, min_periods=20).rank(pct=True).fillna(0)
@@ -290,11 +259,10 @@ class QuantumOptimizer:
                 return result
 
             elif self.strategy_mode == 'AQM':
-                # (Logika AQM bez zmian)
-                if not weekly_df.empty and isinstance(weekly_df.index, pd.DatetimeIndex): weekly_df.index = weekly_df.index.tz_localize(None)
-                if not obv_df.empty and isinstance(obv_df.index, pd.DatetimeIndex): obv_df.index = obv_df.index.tz_localize(None)
-                if weekly_df.empty:
-                    weekly_df = daily_df.resample('W').agg({'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}).dropna()
+                # Tygodniowe i OBV liczone lokalnie ze świec skorygowanych o splity (bez zapytań API)
+                trend_df = adjusted_df if adjusted_df is not None and not adjusted_df.empty else daily_df
+                weekly_df = indicators.weekly_resample(trend_df)
+                obv_df = indicators.obv(trend_df)
                 aqm_df = aqm_v4_logic.calculate_aqm_full_vector(daily_df=daily_df, weekly_df=weekly_df, intraday_60m_df=pd.DataFrame(), obv_df=obv_df, macro_data=self.macro_data, earnings_days_to=None)
                 if aqm_df.empty: return pd.DataFrame()
                 if 'atr' in aqm_df.columns: aqm_df['atr_14'] = aqm_df['atr']
@@ -475,7 +443,7 @@ class QuantumOptimizer:
             res_p1 = self.session.execute(text("SELECT ticker FROM phase1_candidates")).fetchall()
             tickers_p1 = [r[0] for r in res_p1]
             if len(tickers_p1) > 0: return tickers_p1
-            res_all = self.session.execute(text("SELECT ticker FROM companies LIMIT 100")).fetchall()
+            res_all = self.session.execute(text("SELECT ticker FROM companies WHERE is_active LIMIT 100")).fetchall()
             return [r[0] for r in res_all]
         except Exception as e:
             logger.error(f"Błąd pobierania tickerów: {e}")
@@ -0,0 +1,247 @@
+import atexit
+import json
+import logging
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional
+
+from psycopg2.extras import execute_values
+
+from ..database import engine
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from . import fundamentals
+from . import prefetch_planner
+from . import ticker_tiers
+from .utils import get_system_control_value, update_system_control
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# KSIĘGA ZAPYTAŃ AV I ESTYMATOR KOSZTU ZADAŃ (api_call_ledger)
+# ==================================================================
+# Klient AV zgłasza każde zapytanie (także throttle / błąd), a get_raw_data_with_cache każde
+# trafienie w cache - z job_id i fazą bieżącego zadania. Wpisy zbieramy w buforze i zapisujemy
+# paczkami (execute_values), żeby księga nie dokładała commitu do każdego zapytania.
+# Estymator przed startem zadania liczy plan prefetchu (świeżość cache/hurtowni) i przelicza
+# liczbę zapytań na czas przy wyuczonym tempie klucza (pas BULK, bez rezerwy LIVE).
+# API zleca estymację przez system_control ('api_estimate_request' -> 'api_estimate_report').
+
+FLUSH_SIZE = 500
+LEDGER_RETENTION_DAYS = 30
+DEFAULT_RPM = 120                     # Tempo startowe klienta (gdy brak wyuczonego)
+AV_LEARNED_RPM_KEY = 'av_learned_rpm'
+
+ESTIMATE_REQUEST_KEY = 'api_estimate_request'
+ESTIMATE_REPORT_KEY = 'api_estimate_report'
+
+BENCHMARK_TICKERS = ['QQQ', 'SPY', 'IWM', 'TQQQ', 'SQQQ']   # Jak filtr backtestu
+
+INSERT_SQL = """
+    INSERT INTO api_call_ledger (called_at, job_id, phase, function, symbol, lane, cached, status, latency_ms)
+    VALUES %s
+"""
+COLUMNS = ('called_at', 'job_id', 'phase', 'function', 'symbol', 'lane', 'cached', 'status', 'latency_ms')
+
+class ApiCallLedger:
+    """Bufor wpisów księgi. record() woła klient AV z dowolnego wątku."""
+
+    def __init__(self, flush_size: int = FLUSH_SIZE):
+        self.flush_size = flush_size
+        self._pending: List[tuple] = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    def record(self, entry: Dict):
+        with self._lock:
+            self._pending.append(tuple(entry.get(c) for c in COLUMNS))
+            full = len(self._pending) >= self.flush_size
+        # Zapis w wątku zgłaszającym, ale bez czekania, gdy inny wątek już zapisuje
+        if full and self._flush_lock.acquire(blocking=False):
+            try:
+                self._flush_locked()
+            finally:
+                self._flush_lock.release()
+
+    def flush(self) -> int:
+        with self._flush_lock:
+            return self._flush_locked()
+
+    def _flush_locked(self) -> int:
+        with self._lock:
+            if not self._pending:
+                return 0
+            batch, self._pending = self._pending, []
+
+        raw_conn = engine.raw_connection()
+        try:
+            cursor = raw_conn.cursor()
+            execute_values(cursor, INSERT_SQL, batch, page_size=self.flush_size)
+            raw_conn.commit()
+        except Exception as e:
+            raw_conn.rollback()
+            # Księga jest diagnostyką - nie blokujemy pracy ponawianiem, tracimy paczkę
+            logger.error(f"AV Ledger: Błąd zapisu {len(batch)} wpisów: {e}")
+            return 0
+        finally:
+            raw_conn.close()
+        return len(batch)
+
+LEDGER = ApiCallLedger()
+
+def flush_ledger() -> int:
+    """Wymuszony zapis bufora księgi (koniec zadania / zamknięcie procesu)."""
+    try:
+        return LEDGER.flush()
+    except Exception as e:
+        logger.error(f"AV Ledger: Błąd wymuszonego zapisu: {e}")
+        return 0
+
+atexit.register(flush_ledger)
+
+def new_job_id(phase: str) -> str:
+    return f"{phase}-{datetime.now(timezone.utc).strftime('%Y%m%dT%H%M%S')}"
+
+def purge_ledger(session: Session, days: int = LEDGER_RETENTION_DAYS) -> int:
+    """Retencja księgi (wywoływana z dziennego GC cache)."""
+    deleted = session.execute(text("""
+        DELETE FROM api_call_ledger WHERE called_at < NOW() - make_interval(days => :days)
+    """), {'days': days}).rowcount
+    session.commit()
+    return deleted
+
+# --- Odczyt księgi ---
+
+def job_summary(session: Session, job_id: str) -> Optional[dict]:
+    """Zapytania AV, trafienia w cache, throttle i czas trwania zadania."""
+    row = session.execute(text("""
+        SELECT phase,
+               COUNT(*) FILTER (WHERE NOT cached),
+               COUNT(*) FILTER (WHERE cached),
+               COUNT(*) FILTER (WHERE status = 'THROTTLED'),
+               MIN(called_at), MAX(called_at)
+        FROM api_call_ledger WHERE job_id = :job_id
+        GROUP BY phase
+    """), {'job_id': job_id}).fetchone()
+    if not row:
+        return None
+    duration = (row[5] - row[4]).total_seconds() if row[4] and row[5] else 0.0
+    return {
+        'job_id': job_id, 'phase': row[0], 'api_calls': row[1], 'cache_hits': row[2],
+        'throttled': row[3], 'started_at': row[4], 'finished_at': row[5], 'duration_seconds': duration
+    }
+
+def last_job_of_phase(session: Session, phase: str) -> Optional[dict]:
+    row = session.execute(text("""
+        SELECT job_id FROM api_call_ledger
+        WHERE phase = :phase AND job_id IS NOT NULL
+        ORDER BY called_at DESC LIMIT 1
+    """), {'phase': phase}).fetchone()
+    return job_summary(session, row[0]) if row else None
+
+# --- Estymator kosztu ---
+
+def _learned_rpm(session: Session) -> float:
+    try:
+        return float(get_system_control_value(session, AV_LEARNED_RPM_KEY) or DEFAULT_RPM)
+    except (TypeError, ValueError):
+        return float(DEFAULT_RPM)
+
+def _column(session: Session, sql: str) -> List[str]:
+    return [r[0] for r in session.execute(text(sql)).fetchall()]
+
+def default_tickers(session: Session, job: str) -> List[str]:
+    """Uniwersum zadania - te same źródła (i fallbacki) co handlery Workera."""
+    if job == 'PHASE1':
+        rows = session.execute(text(fundamentals.COMPANIES_WITH_FUNDAMENTALS_SQL)).fetchall()
+        return [r[0] for r in rows if fundamentals.passes_fundamentals_filter(r[3], r[4])]
+    if job == 'BACKTEST':
+        tickers = set()
+        for table in ('phase1_candidates', 'phasex_candidates', 'portfolio_holdings'):
+            tickers.update(_column(session, f"SELECT ticker FROM {table}"))
+        if not tickers:
+            tickers = set(_column(session, "SELECT ticker FROM companies WHERE is_active AND industry != 'N/A' LIMIT 880"))
+        return sorted(t for t in tickers if t not in BENCHMARK_TICKERS)
+    if job == 'PHASE4':
+        tickers = set(_column(session, "SELECT ticker FROM phase1_candidates"))
+        tickers.update(_column(session, "SELECT ticker FROM phasex_candidates"))
+    elif job == 'SDAR':
+        tickers = set(_column(session, "SELECT ticker FROM phase1_candidates WHERE volume > 100000"))
+    else:
+        tickers = set(_column(session, "SELECT ticker FROM phase1_candidates"))
+    return sorted(tickers) or _column(session, "SELECT ticker FROM companies WHERE is_active LIMIT 100")
+
+def estimate_job(
+    session: Session,
+    job: str,
+    tickers: Optional[List[str]] = None,
+    strategy_mode: str = 'H3',
+    year: Optional[int] = None
+) -> dict:
+    """
+    Ile zapytań AV zużyje zadanie przy obecnym stanie cache i ile to potrwa przy wyuczonym tempie.
+    Dane świeże (cache, hurtownia intraday, insiderzy, newsy) nie kosztują nic.
+    """
+    job = job.upper()
+    tickers = tickers or default_tickers(session, job)
+    kwargs = {'strategy_mode': strategy_mode}
+    if job == 'PHASE1':
+        # Faza 1 odświeża dzienne wg warstw (WARM/COLD rzadziej) - estymacja tak samo
+        kwargs['expiry_by_ticker'] = ticker_tiers.expiry_map(session, tickers, 12)
+    if job == 'BACKTEST' and year:
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        kwargs['start'] = datetime(int(year), 1, 1)
+        kwargs['end'] = min(datetime(int(year), 12, 31), now)
+    plan = prefetch_planner.plan_prefetch(session, job, tickers, **kwargs)
+
+    learned_rpm = _learned_rpm(session)
+    bulk_rpm = max(1.0, learned_rpm * (1 - AlphaVantageClient.LIVE_RESERVED_FRACTION))
+    by_type: Dict[str, int] = {}
+    for need in plan.missing:
+        by_type[need.data_type] = by_type.get(need.data_type, 0) + need.api_calls
+
+    report = {
+        'job': job,
+        'tickers': len(tickers),
+        'needs': len(plan.needs),
+        'fresh': len(plan.needs) - len(plan.missing),
+        'api_calls': plan.api_cost,
+        'calls_by_type': by_type,
+        'learned_rpm': round(learned_rpm, 1),
+        'bulk_rpm': round(bulk_rpm, 1),
+        'estimated_minutes': math.ceil(plan.api_cost / bulk_rpm * 10) / 10,
+    }
+    last_run = last_job_of_phase(session, job)
+    if last_run:
+        report['last_run'] = {
+            'job_id': last_run['job_id'], 'api_calls': last_run['api_calls'],
+            'cache_hits': last_run['cache_hits'], 'duration_seconds': round(last_run['duration_seconds'], 1)
+        }
+    return report
+
+def run_estimate_request(session: Session) -> Optional[dict]:
+    """Obsługa zlecenia z API: JSON w 'api_estimate_request' -> raport w 'api_estimate_report'."""
+    raw = get_system_control_value(session, ESTIMATE_REQUEST_KEY)
+    if not raw or raw in ('NONE', 'PROCESSING'):
+        return None
+    update_system_control(session, ESTIMATE_REQUEST_KEY, 'PROCESSING')
+    start_time = time.time()
+    try:
+        req = json.loads(raw)
+        report = estimate_job(
+            session, req['job'], tickers=req.get('tickers'),
+            strategy_mode=req.get('strategy_mode') or 'H3', year=req.get('year')
+        )
+        report['computed_in_seconds'] = round(time.time() - start_time, 2)
+        payload = {'status': 'DONE', 'report': report}
+    except Exception as e:
+        logger.error(f"AV Ledger: Błąd estymacji zadania: {e}", exc_info=True)
+        session.rollback()
+        report = None
+        payload = {'status': 'ERROR', 'error': str(e)}
+    update_system_control(session, ESTIMATE_REPORT_KEY, json.dumps(payload, default=str))
+    update_system_control(session, ESTIMATE_REQUEST_KEY, 'NONE')
+    return report
@@ -1,34 +1,23 @@
 import logging
 import pandas as pd
 from typing import Dict, Any, Optional
+from sqlalchemy.orm import Session
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
 from .utils import standardize_df_columns # Potrzebne do parsowania
+from . import indicators
+from . import daily_data
+from .intraday_warehouse import get_recent_bars
 
 logger = logging.getLogger(__name__)
 
-def _parse_bbands(raw_data: Dict[str, Any]) -> Optional[pd.DataFrame]:
+def _load_daily(ticker: str, api_client: AlphaVantageClient, session: Optional[Session]) -> pd.DataFrame:
     """
-    Przetwarza surową odpowiedź JSON z BBANDS na DataFrame
-    gotowy do backtestu.
+    Dzienne świece (te same co w backteście - z cache, jeśli jest sesja).
+    Z nich liczymy BBANDS lokalnie zamiast osobnego zapytania BBANDS.
     """
-    try:
-        data = raw_data.get('Technical Analysis: BBANDS', {})
-        if not data:
-            return pd.DataFrame(columns=['Real Middle Band', 'Real Upper Band', 'Real Lower Band']).set_index(pd.to_datetime([]))
-
-        df = pd.DataFrame.from_dict(data, orient='index')
-        df.index = pd.to_datetime(df.index)
-        
-        # Konwertuj na liczby
-        for col in ['Real Middle Band', 'Real Upper Band', 'Real Lower Band']:
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-            
-        df.sort_index(inplace=True)
-        return df
-        
-    except Exception as e:
-        logger.error(f"Błąd podczas parsowania danych BBANDS: {e}", exc_info=True)
-        return None
+    if session is not None:
+        return daily_data.load_daily_frames(session, api_client, ticker).raw
+    return daily_data.parse_daily_adjusted(api_client.get_daily_adjusted(ticker, outputsize='full')).raw
 
 def _parse_intraday_5min(raw_data: Dict[str, Any]) -> Optional[pd.DataFrame]:
     """
@@ -52,36 +41,40 @@ def _parse_intraday_5min(raw_data: Dict[str, Any]) -> Optional[pd.DataFrame]:
         logger.error(f"Błąd podczas parsowania danych Intraday 5min: {e}", exc_info=True)
         return None
 
-def load_h3_data_into_cache(ticker: str, api_client: AlphaVantageClient) -> Dict[str, pd.DataFrame]:
+def load_h3_data_into_cache(
+    ticker: str,
+    api_client: AlphaVantageClient,
+    session: Optional[Session] = None,
+    daily_df: Optional[pd.DataFrame] = None
+) -> Dict[str, pd.DataFrame]:
     """
     Główna funkcja tego modułu. Pobiera i przetwarza dane Wymiaru 3 i 4
     dla pojedynczego tickera.
+    Z sesją DB świece 5min czytane są z hurtowni intraday (sync przyrostowy).
+    BBANDS liczone lokalnie z 'daily_df' (lub z dziennych z cache, jeśli nie podano).
     """
     logger.info(f"[Backtest V3][H3 Loader] Ładowanie danych Wymiaru 3 i 4 dla {ticker}...")
     
-    # 1. Pobierz dane BBANDS (Wymiar 3.1)
-    # Używamy parametrów ze specyfikacji (period=20, nbdev=2)
-    bbands_raw = api_client.get_bollinger_bands(
-        ticker, 
-        interval='daily', 
-        time_period=20, 
-        nbdevup=2, 
-        nbdevdn=2
-    )
-    bbands_df = _parse_bbands(bbands_raw)
-    
-    if bbands_df is None:
-        logger.warning(f"[Backtest V3][H3 Loader] Nie udało się przetworzyć danych BBANDS dla {ticker}. Tworzenie pustego DataFrame.")
-        bbands_df = pd.DataFrame(columns=['Real Middle Band', 'Real Upper Band', 'Real Lower Band']).set_index(pd.to_datetime([]))
+    # 1. BBANDS (Wymiar 3.1) - parametry ze specyfikacji (period=20, nbdev=2), liczone lokalnie z dziennych
+    if daily_df is None:
+        daily_df = _load_daily(ticker, api_client, session)
+    try:
+        bbands_df = indicators.bbands(daily_df, time_period=20, nbdevup=2, nbdevdn=2)
+    except Exception as e:
+        logger.warning(f"[Backtest V3][H3 Loader] Nie udało się policzyć BBANDS dla {ticker}: {e}. Tworzenie pustego DataFrame.")
+        bbands_df = pd.DataFrame(columns=indicators.BBANDS_COLUMNS).set_index(pd.to_datetime([]))
     
     # 2. Pobierz dane Intraday 5min (Wymiar 4.1)
-    # Specyfikacja wymaga 'outputsize=full' (dla 30 dni danych)
-    intraday_raw = api_client.get_intraday(
-        ticker, 
-        interval='5min', 
-        outputsize='full'
-    )
-    intraday_5min_df = _parse_intraday_5min(intraday_raw)
+    # Specyfikacja wymaga 30 dni danych - z hurtowni, a bez sesji bezpośrednio 'outputsize=full'
+    if session is not None:
+        intraday_5min_df = get_recent_bars(session, api_client, ticker, expiry_hours=6)
+    else:
+        intraday_raw = api_client.get_intraday(
+            ticker, 
+            interval='5min', 
+            outputsize='full'
+        )
+        intraday_5min_df = _parse_intraday_5min(intraday_raw)
     
     if intraday_5min_df is None:
         logger.warning(f"[Backtest V3][H3 Loader] Nie udało się przetworzyć danych Intraday 5min dla {ticker}. Tworzenie pustego DataFrame.")
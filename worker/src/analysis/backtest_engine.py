@@ -5,11 +5,11 @@ import numpy as np
 from sqlalchemy import text
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
+from typing import Optional
 
 # Importy narzędziowe
 from .utils import (
     get_raw_data_with_cache, 
-    standardize_df_columns, 
     calculate_atr, 
     append_scan_log, 
     update_scan_progress,
@@ -24,9 +24,16 @@ from . import aqm_v3_metrics
 
 # Importy analityczne (AQM V4)
 from . import aqm_v4_logic
+from . import indicators
+from . import daily_data
+from . import daily_sentiment
+from . import insider_transactions
+from . import macro_context
 
 # === IMPORT SDAR ===
 from .phase_sdar import SDARAnalyzer
+from .prefetch_planner import prefetch_for_job
+from . import intraday_warehouse
 
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
 from .. import models
@@ -40,16 +47,126 @@ BIOTECH_KEYWORDS = [
     'Drug', 'Bio'
 ]
 
-# === KLASA POMOCNICZA: WEHIKUŁ CZASU DLA SDAR (NAPRAWIONA - PREMIUM SUPPORT) ===
+# === LOKALNE DANE HISTORYCZNE DLA SDAR (Cache miesięczny) ===
+SDAR_BT_LOOKBACK_DAYS = 30          # Tyle historii 5min widzi analizator (jak SDAR live)
+SDAR_BT_NEWS_WINDOW_HOURS = 48      # Okno SPD
+SDAR_BT_CLOSED_MONTH_TTL_HOURS = 24 * 365 * 10   # Zamknięty miesiąc newsów nigdy nie wygasa
+SDAR_BT_OPEN_MONTH_TTL_HOURS = 6                 # Bieżący miesiąc odświeżamy
+SDAR_BT_NEWS_LIMIT = 1000                        # Maksimum AV na jedno zapytanie (sort=LATEST)
+SDAR_BT_NEWS_MIN_WINDOW = timedelta(days=1)      # Najkrótsze okno przy dzieleniu ruchliwego miesiąca
+
+class TimeTravelDataStore:
+    """
+    Dane historyczne SDAR dla jednego przebiegu backtestu.
+    Świece 5min: hurtownia intraday (miesiące zamknięte pobierane raz na zawsze),
+    newsy: alpha_vantage_cache z kluczem miesiąca ('NEWS_MONTH_YYYY-MM').
+    Każdy ticker ładowany jest z bazy raz, a daty badania dostają wycinki z pamięci.
+    """
+    def __init__(self, session, api_client):
+        self.session = session
+        self.client = api_client
+        self._bars = {}   # ticker -> DataFrame 5min (cały zakres backtestu + lookback)
+        self._news = {}   # (ticker, 'YYYY-MM') -> lista artykułów
+
+    def preload(self, ticker: str, start: datetime, end: datetime):
+        """Backfill brakujących miesięcy i jednorazowy odczyt świec tickera do pamięci."""
+        load_start = start - timedelta(days=SDAR_BT_LOOKBACK_DAYS)
+        load_end = end + timedelta(days=1)
+        for month in intraday_warehouse.month_range(load_start, end):
+            intraday_warehouse.backfill_month(self.session, self.client, ticker, month)
+        df = intraday_warehouse.load_bars(self.session, ticker, start=load_start, end=load_end)
+        self._bars[ticker] = df if df is not None else pd.DataFrame()
+
+    def release(self, ticker: str):
+        self._bars.pop(ticker, None)
+        for key in [k for k in self._news if k[0] == ticker]:
+            self._news.pop(key, None)
+
+    def bars_until(self, ticker: str, cutoff: datetime) -> Optional[pd.DataFrame]:
+        df = self._bars.get(ticker)
+        if df is None or df.empty:
+            return None
+        window = df.loc[cutoff - timedelta(days=SDAR_BT_LOOKBACK_DAYS):cutoff]
+        return window.copy() if not window.empty else None
+
+    def _news_window(self, ticker: str, start: datetime, end: datetime) -> Optional[list]:
+        """
+        Newsy tickera z okna [start, end]. AV zwraca najwyżej SDAR_BT_NEWS_LIMIT najnowszych artykułów,
+        więc pełna odpowiedź = okno ucięte od początku: dzielimy je na połowy (aż do SDAR_BT_NEWS_MIN_WINDOW).
+        None = błąd / throttle (niepełnego miesiąca nie zapisujemy do cache).
+        """
+        raw = self.client.get_news_sentiment(
+            ticker, limit=SDAR_BT_NEWS_LIMIT,
+            time_from=start.strftime('%Y%m%dT%H%M'),
+            time_to=end.strftime('%Y%m%dT%H%M')
+        )
+        if not isinstance(raw, dict) or 'feed' not in raw:
+            return None
+        feed = raw.get('feed') or []
+        if len(feed) < SDAR_BT_NEWS_LIMIT:
+            return feed
+        if end - start <= SDAR_BT_NEWS_MIN_WINDOW:
+            logger.warning(f"Backtest SDAR: {ticker} - ponad {SDAR_BT_NEWS_LIMIT} newsów w oknie {start:%Y-%m-%d %H:%M}, wynik ucięty.")
+            return feed
+
+        middle = start + (end - start) / 2
+        first = self._news_window(ticker, start, middle)
+        second = self._news_window(ticker, middle, end)
+        if first is None or second is None:
+            return None
+        # Artykuł dokładnie na granicy okien wraca w obu połówkach
+        merged = {a.get('url') or id(a): a for a in first + second}
+        return sorted(merged.values(), key=lambda a: a.get('time_published', ''), reverse=True)
+
+    def _month_news(self, ticker: str, month: str) -> list:
+        key = (ticker, month)
+        if key not in self._news:
+            month_start = datetime.strptime(month, '%Y-%m')
+            month_end = (month_start + timedelta(days=32)).replace(day=1)
+            is_closed = month_end <= datetime.now()
+
+            def fetch_month(t):
+                feed = self._news_window(t, month_start, month_end)
+                # 'windowed' odróżnia pełny miesiąc od dawnych wpisów uciętych do jednej strony
+                return {'feed': feed, 'items': str(len(feed)), 'windowed': True} if feed is not None else {}
+
+            cache_key = f'NEWS_MONTH_{month}'
+            expiry_hours = SDAR_BT_CLOSED_MONTH_TTL_HOURS if is_closed else SDAR_BT_OPEN_MONTH_TTL_HOURS
+            raw = get_raw_data_with_cache(self.session, self.client, ticker, cache_key, fetch_month, expiry_hours=expiry_hours)
+            if raw and not raw.get('windowed') and len(raw.get('feed', [])) >= SDAR_BT_NEWS_LIMIT:
+                # Wpis sprzed dzielenia okien (jedna strona LATEST - brak początku miesiąca): pobieramy ponownie
+                raw = get_raw_data_with_cache(self.session, self.client, ticker, cache_key, fetch_month, expiry_hours=0)
+            self._news[key] = (raw or {}).get('feed', [])
+        return self._news[key]
+
+    def news_window(self, ticker: str, cutoff: datetime) -> list:
+        # cutoff to naiwny czas nowojorski (jak świece), a time_published z AV jest w UTC
+        cutoff = _ny_to_utc(cutoff).replace(tzinfo=None)
+        start = cutoff - timedelta(hours=SDAR_BT_NEWS_WINDOW_HOURS)
+        start_str, end_str = start.strftime('%Y%m%dT%H%M%S'), cutoff.strftime('%Y%m%dT%H%M%S')
+        articles = []
+        for month in intraday_warehouse.month_range(start, cutoff):
+            articles.extend(
+                a for a in self._month_news(ticker, month)
+                if start_str <= a.get('time_published', '') <= end_str
+            )
+        return articles
+
+def _ny_to_utc(ts: datetime) -> datetime:
+    """Naiwny czas nowojorski (indeks świec, data badania) -> świadomy UTC."""
+    return intraday_warehouse.NY_TZ.localize(ts).astimezone(timezone.utc)
+
+# === KLASA POMOCNICZA: WEHIKUŁ CZASU DLA SDAR ===
 class TimeTravelSDARAnalyzer(SDARAnalyzer):
     """
     Specjalna wersja analyzera SDAR dla Backtestu.
-    Nadpisuje pobieranie danych, aby 'cofnąć się w czasie'.
-    Wykorzystuje pełną historię Intraday dostępną w planie Premium (parametr 'month').
+    Nadpisuje pobieranie danych, aby 'cofnąć się w czasie':
+    świece i newsy są wycinane do daty badania z lokalnych danych (TimeTravelDataStore).
     """
-    def __init__(self, session, api_client, target_date: datetime):
+    def __init__(self, session, api_client, target_date: datetime, data_store: TimeTravelDataStore):
         super().__init__(session, api_client)
         self.target_date = target_date
+        self.data_store = data_store
         # Ustawiamy koniec dnia badanej daty
         self.cutoff_time = target_date.replace(hour=23, minute=59, second=59)
         self.debug_log = [] # Bufor na logi diagnostyczne
@@ -57,109 +174,23 @@ class TimeTravelSDARAnalyzer(SDARAnalyzer):
     def log_debug(self, msg: str):
         self.debug_log.append(msg)
 
-    def _get_news_data(self, ticker: str) -> list:
-        try:
-            # Okno: 48h wstecz od momentu badania
-            time_from_str = (self.cutoff_time - timedelta(days=2)).strftime('%Y%m%dT%H%M')
-            time_to_str = self.cutoff_time.strftime('%Y%m%dT%H%M')
-
-            # Wywołanie klienta z parametrami historycznymi (sort='LATEST' w oknie)
-            resp = self.client.get_news_sentiment(
-                ticker, limit=50, time_from=time_from_str, time_to=time_to_str, sort='LATEST'
-            )
-            if resp and 'feed' in resp:
-                return resp['feed']
-        except Exception:
-            pass
-        return []
+    def _reference_time(self) -> datetime:
+        return _ny_to_utc(self.cutoff_time)
 
-    def _get_virtual_candles(self, ticker: str):
-        """
-        Pobiera ceny i ucina je na dacie badania I AGREGUJE DO 4H.
-        Naprawia problem braku danych w silniku SDAR w backteście poprzez
-        jawne żądanie danych historycznych (parametr month), zgodnie z zaleceniem Supportu AV.
-        """
+    def _get_news_data(self, ticker: str) -> list:
         try:
-            # === KLUCZOWE: Obliczenie miesiąca dla zapytania API (np. '2024-01') ===
-            # Dzięki temu API Alpha Vantage zwróci dane historyczne dla tego okresu.
-            month_str = self.target_date.strftime('%Y-%m')
-            
-            # Unikalny klucz cache dla danego miesiąca i tickera
-            cache_key = f'INTRADAY_60_{month_str}'
-
-            # Pobieramy full history godzinową dla konkretnego miesiąca
-            # Interwał 60min jest wystarczający do aproksymacji mikro-struktury w backteście długoterminowym
-            # i znacznie lżejszy dla API/bazy niż 5min, przy zachowaniu precyzji VWAP.
-            raw_data = get_raw_data_with_cache(
-                self.session, self.client, ticker, 
-                cache_key, 
-                lambda t: self.client.get_intraday(t, interval='60min', outputsize='full', month=month_str),
-                expiry_hours=24 * 30 # Cache ważny bardzo długo (historia się nie zmienia)
-            )
-            
-            ts_key = 'Time Series (60min)'
-            if not raw_data or ts_key not in raw_data: 
-                # self.log_debug(f"Brak danych API (Intraday) dla {ticker} w {month_str}")
-                return None
-            
-            df = pd.DataFrame.from_dict(raw_data[ts_key], orient='index')
-            df = standardize_df_columns(df)
-            df.index = pd.to_datetime(df.index)
-            df.sort_index(inplace=True)
-            
-            cols = ['open', 'high', 'low', 'close', 'volume']
-            for col in cols: df[col] = pd.to_numeric(df[col], errors='coerce')
-
-            # Odcięcie przyszłości (względem daty badania wewnątrz tego miesiąca)
-            if df.index.tz is None:
-                cutoff_naive = self.cutoff_time.replace(tzinfo=None)
-                df = df[df.index <= cutoff_naive]
-            else:
-                cutoff_aware = self.cutoff_time.replace(tzinfo=df.index.tz)
-                df = df[df.index <= cutoff_aware]
-
-            if len(df) < 10: 
-                # self.log_debug(f"Zbyt mało świec po odcięciu: {len(df)}")
-                return None 
-
-            # === AGREGACJA DO 4H (Wymagane przez SDAR PDF) ===
-            # Używamy '4h' (małe h) aby uniknąć błędów pandas
-            df_virtual = df.resample('4h').agg({
-                'open': 'first',
-                'high': 'max',
-                'low': 'min',
-                'close': 'last',
-                'volume': 'sum'
-            }).dropna()
-
-            return df_virtual
+            return self.data_store.news_window(ticker, self.cutoff_time)
         except Exception as e:
-            self.log_debug(f"Błąd przetwarzania świec: {e}")
-            return None
+            self.log_debug(f"Błąd newsów: {e}")
+            return []
 
-
-# === NARZĘDZIA POMOCNICZE DLA MAKRO ===
-def _parse_macro_to_series(raw_json: dict) -> pd.Series:
-    """Konwertuje surowy JSON z Alpha Vantage (data list) na Pandas Series z indeksem czasowym."""
-    try:
-        if not raw_json or 'data' not in raw_json:
-            return pd.Series(dtype=float)
-        
-        data_list = raw_json['data']
-        df = pd.DataFrame(data_list)
-        
-        # Konwersja kolumn
-        df['date'] = pd.to_datetime(df['date'])
-        df['value'] = pd.to_numeric(df['value'], errors='coerce')
-        
-        # Ustawienie indeksu i sortowanie (najstarsze pierwsze, żeby .asof() działało poprawnie)
-        df.set_index('date', inplace=True)
-        df.sort_index(inplace=True)
-        
-        return df['value']
-    except Exception as e:
-        logger.error(f"Błąd parsowania danych makro do serii: {e}")
-        return pd.Series(dtype=float)
+    def _get_market_data(self, ticker: str):
+        """Świece 5min do daty badania (odcięcie przyszłości) + agregacja do 4H."""
+        df_5min = self.data_store.bars_until(ticker, self.cutoff_time)
+        if df_5min is None or len(df_5min) < 10:
+            self.log_debug(f"DANE PUSTE: brak świec 5min dla {ticker} do {self.cutoff_time:%Y-%m-%d}")
+            return None, None
+        return df_5min, self._build_virtual_frame(df_5min)
 
 def _calculate_time_dilation_series(ticker_df: pd.DataFrame, benchmark_df: pd.DataFrame, window: int = 20) -> pd.Series:
     try:
@@ -215,7 +246,7 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
         # Fallback
         if not tickers:
             append_scan_log(session, "⚠️ Brak kandydatów w F1/FX. Pobieram próbkę z tabeli companies.")
-            tickers = [r[0] for r in session.execute(text("SELECT ticker FROM companies WHERE industry != 'N/A' LIMIT 880")).fetchall()]
+            tickers = [r[0] for r in session.execute(text("SELECT ticker FROM companies WHERE is_active AND industry != 'N/A' LIMIT 880")).fetchall()]
         
         # === FILTRACJA BENCHMARKU (QQQ i SPY) ===
         # Wykluczamy ticker QQQ z handlu, bo to nasz benchmark
@@ -227,7 +258,7 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
         # Mapa sektorów
         company_sectors = {}
         try:
-            rows = session.execute(text("SELECT ticker, sector, industry FROM companies")).fetchall()
+            rows = session.execute(text("SELECT ticker, sector, industry FROM companies WHERE is_active")).fetchall()
             for r in rows:
                 company_sectors[r[0]] = (r[1] or '', r[2] or '')
         except Exception as e:
@@ -245,43 +276,31 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
         start_date_ts = pd.Timestamp(f"{year}-01-01").tz_localize(None)
         end_date_ts = pd.Timestamp(f"{year}-12-31").tz_localize(None)
 
-        # === A. DANE BENCHMARKOWE (NASDAQ / QQQ) ===
-        append_scan_log(session, "BACKTEST: Pobieranie danych benchmarku (QQQ)...")
-        qqq_raw = get_raw_data_with_cache(session, api_client, 'QQQ', 'DAILY_ADJUSTED', 'get_daily_adjusted', outputsize='full')
-        qqq_df = pd.DataFrame()
-        if qqq_raw:
-            qqq_df = standardize_df_columns(pd.DataFrame.from_dict(qqq_raw.get('Time Series (Daily)', {}), orient='index'))
-            qqq_df.index = pd.to_datetime(qqq_df.index).tz_localize(None)
-            qqq_df.sort_index(inplace=True)
-        else:
+        # === A+B. BENCHMARK (QQQ) I KONTEKST MAKRO (Time-Travel Fix: pełne serie historyczne) ===
+        # Wspólny kontekst z pamięci procesu (macro_series + DAILY_ADJUSTED QQQ) - bez zapytań na zadanie
+        append_scan_log(session, "BACKTEST: Kontekst makro (QQQ, Inflacja, Yields, Stopy)...")
+        macro_ctx = macro_context.get_macro_context(session, api_client)
+        macro_data = macro_ctx.macro_data()
+        qqq_df = macro_data['qqq_df']
+        if qqq_df.empty:
             append_scan_log(session, "⚠️ OSTRZEŻENIE: Nie udało się pobrać danych QQQ. Analiza relatywna może być błędna.")
 
-        # === B. KONTEKST MAKRO (Time-Travel Fix) ===
-        # Pobieramy PEŁNĄ historię, a nie tylko najnowszą wartość
-        append_scan_log(session, "BACKTEST: Pobieranie historycznych danych makro (Inflacja, Yields)...")
-        
-        macro_data = {
-            'qqq_df': qqq_df, # Używamy QQQ zamiast SPY
-            'inflation_series': pd.Series(dtype=float),
-            'yield_series': pd.Series(dtype=float),
-            'fed_rate_series': pd.Series(dtype=float)
-        }
-
-        # Pobieranie Inflacji
-        inf_raw = get_raw_data_with_cache(session, api_client, 'INFLATION', 'INFLATION', 'get_inflation_rate')
-        macro_data['inflation_series'] = _parse_macro_to_series(inf_raw)
-        
-        # Pobieranie Rentowności 10Y
-        yield_raw = get_raw_data_with_cache(session, api_client, 'TREASURY_YIELD', 'TREASURY_YIELD', 'get_treasury_yield', interval='monthly')
-        macro_data['yield_series'] = _parse_macro_to_series(yield_raw)
-        
-        # Pobieranie Stóp Procentowych
-        fed_raw = get_raw_data_with_cache(session, api_client, 'FEDERAL_FUNDS_RATE', 'FEDERAL_FUNDS_RATE', 'get_fed_funds_rate', interval='monthly')
-        macro_data['fed_rate_series'] = _parse_macro_to_series(fed_raw)
-
         if macro_data['inflation_series'].empty:
             append_scan_log(session, "⚠️ Brak danych inflacji. AQM RAS może być niedokładny.")
 
+        # === C. PLANER PREFETCHU (wszystkie dane tickerów przed symulacją) ===
+        try:
+            prefetch_for_job(
+                session, api_client, 'BACKTEST', tickers, strategy_mode=strategy_mode,
+                start=start_date_ts.to_pydatetime(), end=min(end_date_ts, pd.Timestamp.now()).to_pydatetime()
+            )
+        except Exception as e:
+            logger.error(f"[Backtest] Błąd prefetchu: {e}")
+            session.rollback()
+
+        # Magazyn danych historycznych SDAR (świece 5min + newsy miesięczne) na cały przebieg
+        sdar_store = TimeTravelDataStore(session, api_client)
+
         total_tickers = len(tickers)
         processed_count = 0
         trades_generated = 0
@@ -295,34 +314,15 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                 if processed_count % 5 == 0:
                     update_scan_progress(session, processed_count, total_tickers)
                     
-                # Pobieramy dane dzienne (niezależnie od strategii, potrzebne do symulacji transakcji)
-                daily_raw = get_raw_data_with_cache(session, api_client, ticker, 'DAILY_OHLCV', 'get_time_series_daily', outputsize='full')
-                daily_adj_raw = get_raw_data_with_cache(session, api_client, ticker, 'DAILY_ADJUSTED', 'get_daily_adjusted', outputsize='full')
-                
-                if not daily_raw:
+                # Dane dzienne (niezależnie od strategii, potrzebne do symulacji transakcji).
+                # Jeden payload DAILY_ADJUSTED: surowe OHLC (transakcje) + widok skorygowany o splity (wskaźniki).
+                frames = daily_data.load_daily_frames(session, api_client, ticker)
+                if frames.empty:
                     processed_count += 1
                     continue
 
-                ohlcv = standardize_df_columns(pd.DataFrame.from_dict(daily_raw.get('Time Series (Daily)', {}), orient='index'))
-                ohlcv.index = pd.to_datetime(ohlcv.index).tz_localize(None)
-                
-                adj = pd.DataFrame()
-                if daily_adj_raw:
-                    adj = standardize_df_columns(pd.DataFrame.from_dict(daily_adj_raw.get('Time Series (Daily)', {}), orient='index'))
-                    adj.index = pd.to_datetime(adj.index).tz_localize(None)
-                
-                # Scalanie danych (Adj Close + Raw OHLC)
-                if not adj.empty:
-                    df = adj.join(ohlcv[['open', 'high', 'low', 'close']], rsuffix='_raw')
-                    trade_open_col = 'open_raw' if 'open_raw' in df.columns else 'open'
-                    trade_high_col = 'high_raw' if 'high_raw' in df.columns else 'high'
-                    trade_low_col = 'low_raw' if 'low_raw' in df.columns else 'low'
-                    trade_close_col = 'close_raw' if 'close_raw' in df.columns else 'close'
-                else:
-                    df = ohlcv
-                    trade_open_col, trade_high_col, trade_low_col, trade_close_col = 'open', 'high', 'low', 'close'
-
-                df.sort_index(inplace=True)
+                df = frames.raw.copy()
+                trade_open_col, trade_high_col, trade_low_col, trade_close_col = 'open', 'high', 'low', 'close'
                 
                 # Filtr na rok backtestu
                 if df.empty or df.index[-1] < start_date_ts or df.index[0] > end_date_ts:
@@ -340,11 +340,11 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                     
                     h2_data = load_h2_data_into_cache(ticker, api_client, session)
                     insider_df = h2_data.get('insider_df')
-                    news_df = h2_data.get('news_df')
+                    sentiment_df = h2_data.get('sentiment_df')
                     
                     # Obliczenia metryk wstepnych (pre-vectorization)
-                    df['institutional_sync'] = df.apply(lambda row: aqm_v3_metrics.calculate_institutional_sync_from_data(insider_df, row.name), axis=1).fillna(0.0)
-                    df['retail_herding'] = df.apply(lambda row: aqm_v3_metrics.calculate_retail_herding_from_data(news_df, row.name), axis=1).fillna(0.0)
+                    df['institutional_sync'] = insider_transactions.institutional_sync_series(insider_df, df.index)
+                    df['retail_herding'] = daily_sentiment.retail_herding_series(sentiment_df, df.index)
                     
                     df['price_gravity'] = (df['high'] + df['low'] + df['close']) / 3 / df['close'] - 1
                     df['time_dilation'] = _calculate_time_dilation_series(df, qqq_df) # QQQ jako benchmark
@@ -352,14 +352,7 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                     df['daily_returns'] = df['close'].pct_change().fillna(0)
                     df['market_temperature'] = df['daily_returns'].rolling(window=30).std().fillna(0.01)
                     
-                    if not news_df.empty:
-                        if news_df.index.tz is not None: news_df.index = news_df.index.tz_localize(None)
-                        nc = news_df.groupby(news_df.index.date).size()
-                        nc.index = pd.to_datetime(nc.index)
-                        nc = nc.reindex(df.index, fill_value=0)
-                        df['information_entropy'] = nc.rolling(window=10).sum().fillna(0)
-                    else:
-                        df['information_entropy'] = 0.0
+                    df['information_entropy'] = daily_sentiment.information_entropy_series(sentiment_df, df.index)
                     
                     # Wolumen (df['volume'] już jest)
 
@@ -386,18 +379,9 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                     if len(df) < 201: 
                         processed_count += 1; continue
                         
-                    w_raw = get_raw_data_with_cache(session, api_client, ticker, 'WEEKLY_ADJUSTED', 'get_weekly_adjusted')
-                    weekly_df = pd.DataFrame()
-                    if w_raw: 
-                        weekly_df = standardize_df_columns(pd.DataFrame.from_dict(w_raw.get('Weekly Adjusted Time Series', {}), orient='index'))
-                        weekly_df.index = pd.to_datetime(weekly_df.index).tz_localize(None)
-                    
-                    obv_raw = get_raw_data_with_cache(session, api_client, ticker, 'OBV', 'get_obv')
-                    obv_df = pd.DataFrame()
-                    if obv_raw: 
-                        obv_df = pd.DataFrame.from_dict(obv_raw.get('Technical Analysis: OBV', {}), orient='index')
-                        obv_df.index = pd.to_datetime(obv_df.index).tz_localize(None)
-                        obv_df.rename(columns={'OBV': 'OBV'}, inplace=True)
+                    # Tygodniowe i OBV liczone lokalnie ze świec skorygowanych o splity (bez zapytań API)
+                    weekly_df = indicators.weekly_resample(frames.adjusted)
+                    obv_df = indicators.obv(frames.adjusted)
 
                     # Obliczamy AQM z nową obsługą danych makro
                     # >>> URUCHOMIENIE SILNIKA WEKTOROWEGO AQM <<<
@@ -456,6 +440,10 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                 elif strategy_mode == 'SDAR':
                     # Ograniczamy zakres analizy do wybranego roku
                     df_sdar = df[(df.index >= start_date_ts) & (df.index <= end_date_ts)].copy()
+
+                    # Jednorazowe załadowanie świec tickera (miesiące z hurtowni) - daty badania to wycinki w pamięci
+                    if not df_sdar.empty:
+                        sdar_store.preload(ticker, df_sdar.index[0].to_pydatetime(), df_sdar.index[-1].to_pydatetime())
                     df_sdar['is_signal'] = False
                     df_sdar['aqm_score_h3'] = 0.0 
                     
@@ -472,9 +460,8 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                         if verbose_logging and check_dates.get_loc(date_idx) == 0:
                            append_scan_log(session, f"SDAR DEBUG: Start analizy {ticker} (Month: {date_idx.strftime('%Y-%m')})...")
 
-                        # Tworzymy analyzer dla konkretnego dnia
-                        # UWAGA: Teraz TimeTravelSDARAnalyzer używa parametru month dla Premium API
-                        analyzer = TimeTravelSDARAnalyzer(session, api_client, target_date=date_idx)
+                        # Tworzymy analyzer dla konkretnego dnia (dane z lokalnego magazynu backtestu)
+                        analyzer = TimeTravelSDARAnalyzer(session, api_client, target_date=date_idx, data_store=sdar_store)
                         
                         # Uruchamiamy analizę
                         result = analyzer.analyze_ticker(ticker)
@@ -496,6 +483,7 @@ def _run_historical_backtest_unified(session: Session, api_client, year: str, pa
                                     verbose_logging = False
                     
                     signal_df = df_sdar
+                    sdar_store.release(ticker)
 
                 # === SYMULACJA TRANSAKCJI (WSPÓLNA LOGIKA) ===
                 if not signal_df.empty and 'is_signal' in signal_df.columns:
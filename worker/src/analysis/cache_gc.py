@@ -0,0 +1,191 @@
+import logging
+import time
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, Optional
+
+from ..database import engine
+from . import market_calendar
+from .utils import append_scan_log, get_system_control_value, update_system_control
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# SPRZĄTANIE CACHE (alpha_vantage_cache: retencja, sieroty, VACUUM)
+# ==================================================================
+# Cache trzyma pełne payloady JSON (TOAST) dla każdego (ticker, data_type) bez końca,
+# także dla spółek, które dawno wypadły z list kandydatów. Job raz dziennie (poza sesją):
+#   1. usuwa wpisy starsze niż retencja danego typu (nikt ich nie odświeżał = nikt nie czyta),
+#   2. usuwa typy, których kod już nie czyta (zastąpione obliczeniami lokalnymi / DAILY_ADJUSTED),
+#   3. usuwa sieroty - tickery spoza aktywnego uniwersum, portfela i otwartych transakcji,
+#   4. robi VACUUM (ANALYZE) tabeli i raportuje rozmiar tabeli + TOAST przed i po.
+# Usuwamy paczkami (krótkie blokady - monitory live i skany piszą do tej samej tabeli).
+
+GC_RAN_KEY = 'cache_gc_ran_on'
+DELETE_BATCH = 500
+
+DEFAULT_RETENTION_DAYS = 180
+RETENTION_DAYS = {
+    'DAILY_ADJUSTED': 120,
+    'DAILY_ADJUSTED_COMPACT': 120,
+}
+PREFIX_RETENTION_DAYS = {
+    'NEWS_MONTH_': 365,    # Miesiące newsów (backtest SDAR) - retencja tylko dla bieżącego miesiąca
+}
+# Klucze miesięczne ('<prefiks>YYYY-MM...'): zamknięty miesiąc pobierany jest raz (TTL 10 lat)
+# i nigdy nie odświeżany, więc last_fetched nie mówi nic o tym, czy backtesty go czytają -
+# takie wpisy są wyłączone z retencji (drogie do odtworzenia, usuwa je tylko reguła sierot).
+CLOSED_MONTH_PREFIXES = ['NEWS_MONTH_']
+# Typy niczytane już przez kod (OBV/BBANDS/tygodniowe liczone lokalnie, dzienne tylko z DAILY_ADJUSTED,
+# insiderzy w tabeli insider_transactions, historia newsów w news_articles + daily_sentiment,
+# serie makro w macro_series)
+RETIRED_DATA_TYPES = ['DAILY_OHLCV', 'WEEKLY_ADJUSTED', 'OBV', 'BBANDS', 'INSIDER', 'NEWS_SENTIMENT_FULL_HISTORY',
+                      'INFLATION', 'TREASURY_YIELD', 'FEDERAL_FUNDS_RATE']
+RETIRED_PREFIXES = ['INTRADAY']   # Świece intraday żyją w hurtowni intraday_bars_5m
+
+# Klucze niebędące spółkami z uniwersum (benchmarki, makro) - nigdy nie są sierotami
+PROTECTED_TICKERS = ['QQQ', 'SPY', 'INFLATION', 'TREASURY_YIELD', 'FEDERAL_FUNDS_RATE', 'CPI', 'UNEMPLOYMENT', 'REAL_GDP']
+ORPHAN_GRACE_DAYS = 30   # Backtesty czytają też wycofane spółki - dajemy im miesiąc
+
+def get_cache_size_report(session: Session) -> Dict[str, int]:
+    """Rozmiar alpha_vantage_cache: wiersze, sterta, TOAST, indeksy, razem (bajty)."""
+    row = session.execute(text("""
+        SELECT
+            (SELECT COUNT(*) FROM alpha_vantage_cache),
+            pg_relation_size(c.oid),
+            COALESCE(pg_total_relation_size(NULLIF(c.reltoastrelid, 0)), 0),
+            pg_indexes_size(c.oid),
+            pg_total_relation_size(c.oid)
+        FROM pg_class c
+        WHERE c.oid = 'alpha_vantage_cache'::regclass
+    """)).fetchone()
+    return {'rows': row[0], 'heap': row[1], 'toast': row[2], 'indexes': row[3], 'total': row[4]}
+
+def _fmt_mb(n: int) -> str:
+    return f"{(n or 0) / (1024 * 1024):.1f} MB"
+
+def _format_report(report: Dict[str, int]) -> str:
+    return (f"{report['rows']} wierszy, razem {_fmt_mb(report['total'])} "
+            f"(sterta {_fmt_mb(report['heap'])}, TOAST {_fmt_mb(report['toast'])}, indeksy {_fmt_mb(report['indexes'])})")
+
+def _delete_in_batches(session: Session, where_sql: str, params: dict) -> int:
+    """DELETE paczkami po DELETE_BATCH wierszy (commit po każdej paczce)."""
+    total = 0
+    stmt = text(f"""
+        DELETE FROM alpha_vantage_cache
+        WHERE (ticker, data_type) IN (
+            SELECT a.ticker, a.data_type FROM alpha_vantage_cache a
+            WHERE {where_sql}
+            LIMIT :batch
+        )
+    """)
+    while True:
+        deleted = session.execute(stmt, {**params, 'batch': DELETE_BATCH}).rowcount
+        session.commit()
+        total += deleted
+        if deleted < DELETE_BATCH:
+            return total
+
+def purge_retired(session: Session) -> int:
+    """Usuwa typy danych, których kod już nie czyta."""
+    return _delete_in_batches(
+        session,
+        "a.data_type = ANY(:types) OR a.data_type LIKE ANY(:prefixes)",
+        {'types': RETIRED_DATA_TYPES, 'prefixes': [p + '%' for p in RETIRED_PREFIXES]}
+    )
+
+def purge_expired(session: Session) -> int:
+    """Retencja per typ: wpisy nieodświeżane dłużej niż limit typu."""
+    deleted = 0
+    for data_type, days in RETENTION_DAYS.items():
+        deleted += _delete_in_batches(
+            session,
+            "a.data_type = :dt AND a.last_fetched < NOW() - make_interval(days => :days)",
+            {'dt': data_type, 'days': days}
+        )
+    current_month = datetime.now(timezone.utc).strftime('%Y-%m')
+    for prefix, days in PREFIX_RETENTION_DAYS.items():
+        where_sql = "a.data_type LIKE :prefix AND a.last_fetched < NOW() - make_interval(days => :days)"
+        if prefix in CLOSED_MONTH_PREFIXES:
+            where_sql += " AND a.data_type >= :open_from"
+        deleted += _delete_in_batches(
+            session, where_sql,
+            {'prefix': prefix + '%', 'days': days, 'open_from': prefix + current_month}
+        )
+    # Pozostałe typy (bez własnej reguły) - retencja domyślna; makro/benchmarki chronione
+    deleted += _delete_in_batches(
+        session,
+        """a.data_type <> ALL(:known) AND NOT a.data_type LIKE ANY(:known_prefixes)
+           AND a.ticker <> ALL(:protected)
+           AND a.last_fetched < NOW() - make_interval(days => :days)""",
+        {
+            'known': list(RETENTION_DAYS), 'known_prefixes': [p + '%' for p in PREFIX_RETENTION_DAYS],
+            'protected': PROTECTED_TICKERS, 'days': DEFAULT_RETENTION_DAYS
+        }
+    )
+    return deleted
+
+def purge_orphans(session: Session) -> int:
+    """Tickery spoza aktywnego uniwersum, portfela i otwartych transakcji (po okresie karencji)."""
+    return _delete_in_batches(
+        session,
+        """a.ticker <> ALL(:protected)
+           AND a.last_fetched < NOW() - make_interval(days => :grace)
+           AND NOT EXISTS (SELECT 1 FROM companies c WHERE c.ticker = a.ticker AND c.is_active)
+           AND NOT EXISTS (SELECT 1 FROM portfolio_holdings p WHERE p.ticker = a.ticker)
+           AND NOT EXISTS (SELECT 1 FROM virtual_trades v WHERE v.ticker = a.ticker AND v.status = 'OPEN')""",
+        {'protected': PROTECTED_TICKERS, 'grace': ORPHAN_GRACE_DAYS}
+    )
+
+def vacuum_cache_table(full: bool = False):
+    """
+    VACUUM nie działa w transakcji - osobne połączenie w trybie AUTOCOMMIT.
+    Zwykły VACUUM oddaje miejsce do ponownego użycia bez blokady zapisu; FULL przepisuje tabelę (blokada!).
+    """
+    stmt = "VACUUM (FULL, ANALYZE) alpha_vantage_cache" if full else "VACUUM (ANALYZE) alpha_vantage_cache"
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text(stmt))
+
+def run_cache_gc(session: Session, vacuum_full: bool = False) -> Dict[str, int]:
+    """Pełny przebieg GC. Zwraca liczniki usuniętych wierszy i rozmiary przed/po."""
+    start_time = time.time()
+    before = get_cache_size_report(session)
+    session.commit()
+
+    stats = {
+        'retired': purge_retired(session),
+        'expired': purge_expired(session),
+        'orphans': purge_orphans(session),
+    }
+    vacuum_cache_table(full=vacuum_full)
+    after = get_cache_size_report(session)
+    session.commit()
+
+    msg = (f"Cache GC: usunięto {sum(stats.values())} wpisów "
+           f"(wycofane typy {stats['retired']}, retencja {stats['expired']}, sieroty {stats['orphans']}) "
+           f"w {time.time() - start_time:.1f}s. Przed: {_format_report(before)}. Po: {_format_report(after)}.")
+    logger.info(msg)
+    append_scan_log(session, msg)
+    stats.update({'bytes_before': before['total'], 'bytes_after': after['total']})
+    return stats
+
+def run_cache_gc_job(session: Session, now: Optional[datetime] = None) -> bool:
+    """
+    Job harmonogramu: raz dziennie (blokada w system_control), tylko poza sesją regularną NYSE,
+    żeby DELETE/VACUUM nie konkurowały ze skanami i monitorami.
+    """
+    now = now or datetime.now(timezone.utc)
+    today = market_calendar.ny_date(now)
+    if get_system_control_value(session, GC_RAN_KEY) == today.isoformat():
+        return False
+    if market_calendar.is_session_open(now):
+        return False
+    try:
+        run_cache_gc(session)
+    except Exception as e:
+        logger.error(f"Cache GC: Błąd: {e}")
+        session.rollback()
+        return False
+    update_system_control(session, GC_RAN_KEY, today.isoformat())
+    return True
@@ -0,0 +1,238 @@
+import atexit
+import logging
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from psycopg2.extras import execute_values
+
+from ..config import CACHE_WRITE_BEHIND_FLUSH_SIZE, CACHE_WRITE_BEHIND_FLUSH_SECONDS, CACHE_WRITE_BEHIND_MAX_BYTES
+from ..database import engine
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# ZAPIS ODROCZONY (WRITE-BEHIND) DLA alpha_vantage_cache
+# ==================================================================
+# Każde chybienie cache w pętli skanu robiło osobny upsert + commit (fsync, blokady wierszy).
+# Teraz odpowiedź API trafia do bufora w pamięci, a wątek tła zapisuje go paczkami:
+# jeden wielowierszowy INSERT ... ON CONFLICT (execute_values) i jeden commit na paczkę,
+# co FLUSH_SIZE wpisów, co FLUSH_SECONDS sekund albo po przekroczeniu limitu bajtów.
+#   - odczyt własnych zapisów: get_raw_data_with_cache najpierw zagląda do bufora,
+#   - last_fetched = chwila pobrania z API (nie chwila zapisu), starszy wpis nie nadpisze nowszego,
+#   - flush na końcu każdej operacji (main) oraz przy zamknięciu procesu (atexit).
+
+STATEMENT_MAX_BYTES = 16 * 1024 * 1024   # Limit jednej instrukcji INSERT (duże payloady 'full')
+MAX_RETRIES = 3                          # Paczka, która 3x nie weszła do bazy, jest porzucana (wróci z API)
+                                         # - przy ostatniej próbie wpisy idą pojedynczo, porzucane są tylko złe wiersze
+
+UPSERT_SQL = """
+    INSERT INTO alpha_vantage_cache (ticker, data_type, raw_data_json, last_fetched) VALUES %s
+    ON CONFLICT (ticker, data_type) DO UPDATE SET
+        raw_data_json = EXCLUDED.raw_data_json,
+        last_fetched = EXCLUDED.last_fetched
+    WHERE alpha_vantage_cache.last_fetched IS NULL OR alpha_vantage_cache.last_fetched <= EXCLUDED.last_fetched
+"""
+UPSERT_TEMPLATE = "(%s, %s, %s::jsonb, %s)"
+
+@dataclass
+class PendingEntry:
+    raw_data: Any
+    json_data: str
+    fetched_at: datetime
+    attempts: int = 0
+
+    @property
+    def size(self) -> int:
+        return len(self.json_data)
+
+class CacheWriteBehind:
+    """Bufor zapisów cache z wątkiem tła. Bezpieczny wątkowo (prefetch pisze z wielu wątków)."""
+
+    def __init__(
+        self,
+        flush_size: int = CACHE_WRITE_BEHIND_FLUSH_SIZE,
+        flush_seconds: float = CACHE_WRITE_BEHIND_FLUSH_SECONDS,
+        max_bytes: int = CACHE_WRITE_BEHIND_MAX_BYTES
+    ):
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.max_bytes = max_bytes
+        self._pending: Dict[Tuple[str, str], PendingEntry] = {}
+        self._inflight: Dict[Tuple[str, str], PendingEntry] = {}
+        self._pending_bytes = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {'queued': 0, 'flushed': 0, 'flushes': 0, 'dropped': 0}
+
+    # --- Bufor ---
+
+    def put(self, ticker: str, data_type: str, raw_data: Any, json_data: str, fetched_at: Optional[datetime] = None):
+        entry = PendingEntry(raw_data, json_data, fetched_at or datetime.now(timezone.utc))
+        with self._lock:
+            old = self._pending.get((ticker, data_type))
+            if old is not None:
+                self._pending_bytes -= old.size
+            self._pending[(ticker, data_type)] = entry
+            self._pending_bytes += entry.size
+            self.stats['queued'] += 1
+            full = len(self._pending) >= self.flush_size or self._pending_bytes >= self.max_bytes
+        self._ensure_thread()
+        if full:
+            self._wake.set()
+
+    def get(self, ticker: str, data_type: str) -> Optional[PendingEntry]:
+        """Wpis czekający na zapis (lub zapisywany właśnie teraz) - odczyt własnych zapisów."""
+        key = (ticker, data_type)
+        with self._lock:
+            return self._pending.get(key) or self._inflight.get(key)
+
+    def fetched_at(self, keys: Iterable[Tuple[str, str]]) -> Dict[Tuple[str, str], datetime]:
+        """(ticker, data_type) -> chwila pobrania dla wpisów jeszcze niezapisanych (planer prefetchu)."""
+        with self._lock:
+            result = {}
+            for key in keys:
+                entry = self._pending.get(key) or self._inflight.get(key)
+                if entry is not None:
+                    result[key] = entry.fetched_at
+            return result
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return len(self._pending) + len(self._inflight)
+
+    # --- Zapis ---
+
+    def _chunks(self, items: List[Tuple[Tuple[str, str], PendingEntry]]):
+        chunk, size = [], 0
+        for key, entry in items:
+            if chunk and (len(chunk) >= self.flush_size or size + entry.size > STATEMENT_MAX_BYTES):
+                yield chunk
+                chunk, size = [], 0
+            chunk.append((key[0], key[1], entry.json_data, entry.fetched_at))
+            size += entry.size
+        if chunk:
+            yield chunk
+
+    def flush(self) -> int:
+        """Zapisuje cały bufor (paczki execute_values, jeden commit). Zwraca liczbę zapisanych wpisów."""
+        with self._flush_lock:
+            with self._lock:
+                if not self._pending:
+                    return 0
+                self._inflight = self._pending
+                self._pending = {}
+                self._pending_bytes = 0
+                batch = list(self._inflight.items())
+
+            start_time = time.time()
+            raw_conn = engine.raw_connection()
+            try:
+                cursor = raw_conn.cursor()
+                for chunk in self._chunks(batch):
+                    execute_values(cursor, UPSERT_SQL, chunk, template=UPSERT_TEMPLATE, page_size=len(chunk))
+                raw_conn.commit()
+            except Exception as e:
+                raw_conn.rollback()
+                logger.error(f"Cache write-behind: Błąd zapisu paczki {len(batch)} wpisów: {e}")
+                # Ostatnia próba: jeden zły wiersz nie może zabrać ze sobą całej paczki
+                last_chance = [item for item in batch if item[1].attempts + 1 >= MAX_RETRIES]
+                retry = [item for item in batch if item[1].attempts + 1 < MAX_RETRIES]
+                written = {key for key, _ in self._write_rows(raw_conn, last_chance)} if last_chance else set()
+                self._requeue(retry + [item for item in last_chance if item[0] not in written])
+                self.stats['flushed'] += len(written)
+                return len(written)
+            finally:
+                raw_conn.close()
+                with self._lock:
+                    self._inflight = {}
+
+            self.stats['flushed'] += len(batch)
+            self.stats['flushes'] += 1
+            logger.debug(f"Cache write-behind: zapisano {len(batch)} wpisów w {time.time() - start_time:.2f}s.")
+            return len(batch)
+
+    def _write_rows(self, raw_conn, batch: List[Tuple[Tuple[str, str], PendingEntry]]) -> List[Tuple[Tuple[str, str], PendingEntry]]:
+        """Zapis wiersz po wierszu (SAVEPOINT na wiersz, jeden commit). Zwraca wpisy, które weszły do bazy."""
+        written = []
+        try:
+            cursor = raw_conn.cursor()
+            for key, entry in batch:
+                cursor.execute("SAVEPOINT cache_row")
+                try:
+                    execute_values(cursor, UPSERT_SQL, [(key[0], key[1], entry.json_data, entry.fetched_at)], template=UPSERT_TEMPLATE)
+                    cursor.execute("RELEASE SAVEPOINT cache_row")
+                    written.append((key, entry))
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT cache_row")
+                    logger.error(f"Cache write-behind: Porzucono wpis {key[0]}/{key[1]}: {e}")
+            raw_conn.commit()
+        except Exception as e:
+            raw_conn.rollback()
+            logger.error(f"Cache write-behind: Błąd zapisu pojedynczych wpisów ({len(batch)}): {e}")
+            return []
+        if written:
+            logger.info(f"Cache write-behind: zapisano pojedynczo {len(written)}/{len(batch)} wpisów z nieudanej paczki.")
+        return written
+
+    def _requeue(self, batch: List[Tuple[Tuple[str, str], PendingEntry]]):
+        """Nieudana paczka wraca do bufora (chyba że w międzyczasie przyszła nowsza wersja wpisu)."""
+        with self._lock:
+            for key, entry in batch:
+                entry.attempts += 1
+                if entry.attempts >= MAX_RETRIES:
+                    self.stats['dropped'] += 1
+                    continue
+                if key not in self._pending:
+                    self._pending[key] = entry
+                    self._pending_bytes += entry.size
+
+    # --- Wątek tła ---
+
+    def _ensure_thread(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="cache-write-behind", daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error(f"Cache write-behind: Błąd wątku zapisu: {e}")
+
+    def shutdown(self):
+        """Zatrzymuje wątek i zapisuje resztę bufora (atexit)."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_seconds + 5)
+        try:
+            flushed = self.flush()
+            if flushed:
+                logger.info(f"Cache write-behind: zapisano {flushed} wpisów przy zamknięciu.")
+        except Exception as e:
+            logger.error(f"Cache write-behind: Błąd zapisu przy zamknięciu: {e}")
+
+CACHE_WRITER = CacheWriteBehind()
+atexit.register(CACHE_WRITER.shutdown)
+
+def flush_cache_writes() -> int:
+    """Wymuszony zapis bufora (koniec zadania)."""
+    try:
+        return CACHE_WRITER.flush()
+    except Exception as e:
+        logger.error(f"Cache write-behind: Błąd wymuszonego zapisu: {e}")
+        return 0
@@ -0,0 +1,85 @@
+import logging
+import pandas as pd
+from dataclasses import dataclass
+from sqlalchemy.orm import Session
+from typing import Optional
+
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from .utils import get_raw_data_with_cache, standardize_df_columns
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# WSPÓLNA ŚCIEŻKA DANYCH DZIENNYCH (jedno źródło: DAILY_ADJUSTED)
+# ==================================================================
+# TIME_SERIES_DAILY_ADJUSTED zawiera surowe (as-traded) OHLCV, skorygowane zamknięcie,
+# dywidendę i współczynnik splitu. Z jednego payloadu odtwarzamy więc oba widoki:
+#   raw      - świece jak na giełdzie (symulacja transakcji, poziomy SL/TP)
+#   adjusted - świece skorygowane o splity (ciągłe serie dla wskaźników długoterminowych)
+# Osobne TIME_SERIES_DAILY (DAILY_OHLCV) nie jest już potrzebne - połowa zapytań,
+# wierszy cache i parsowania JSON na każdy ticker backtestu / optymalizatora.
+
+DAILY_DATA_TYPE = 'DAILY_ADJUSTED'
+PRICE_COLUMNS = ['open', 'high', 'low', 'close']
+
+@dataclass
+class DailyFrames:
+    raw: pd.DataFrame        # OHLCV as-traded + 'adjusted close', 'dividend amount', 'split coefficient'
+    adjusted: pd.DataFrame   # OHLCV skorygowane o splity + 'adjusted close' (tygodniowe, OBV w F3/backteście/optymalizatorze)
+
+    @property
+    def empty(self) -> bool:
+        return self.raw.empty
+
+def _empty_frames() -> DailyFrames:
+    return DailyFrames(raw=pd.DataFrame(), adjusted=pd.DataFrame())
+
+def split_factors(raw_df: pd.DataFrame) -> pd.Series:
+    """
+    Skumulowany współczynnik splitów 'po' danej świecy: cena skorygowana = cena / czynnik.
+    AV podaje współczynnik w dniu splitu (ceny tego dnia są już po splicie), więc dzień splitu
+    i późniejsze mają czynnik 1, a wcześniejsze - iloczyn wszystkich późniejszych splitów.
+    """
+    if 'split coefficient' not in raw_df.columns:
+        return pd.Series(1.0, index=raw_df.index)
+    coef = pd.to_numeric(raw_df['split coefficient'], errors='coerce').fillna(1.0)
+    coef = coef.where(coef > 0, 1.0)
+    return coef[::-1].cumprod()[::-1].shift(-1).fillna(1.0)
+
+def parse_daily_adjusted(raw_data: Optional[dict]) -> DailyFrames:
+    """JSON TIME_SERIES_DAILY_ADJUSTED -> DailyFrames (raw + split-adjusted), indeks bez strefy, rosnąco."""
+    data = (raw_data or {}).get('Time Series (Daily)', {})
+    if not data:
+        return _empty_frames()
+
+    raw_df = standardize_df_columns(pd.DataFrame.from_dict(data, orient='index'))
+    raw_df.index = pd.to_datetime(raw_df.index).tz_localize(None)
+    raw_df = raw_df.sort_index()
+    for col in ('dividend amount', 'split coefficient'):
+        if col in raw_df.columns:
+            raw_df[col] = pd.to_numeric(raw_df[col], errors='coerce')
+
+    factor = split_factors(raw_df)
+    adjusted = raw_df[[c for c in PRICE_COLUMNS if c in raw_df.columns]].div(factor, axis=0)
+    if 'volume' in raw_df.columns:
+        adjusted['volume'] = raw_df['volume'] * factor
+    if 'adjusted close' in raw_df.columns:
+        adjusted['adjusted close'] = raw_df['adjusted close']
+    return DailyFrames(raw=raw_df, adjusted=adjusted)
+
+def load_daily_frames(
+    session: Session,
+    api_client: AlphaVantageClient,
+    ticker: str,
+    expiry_hours: Optional[float] = None
+) -> DailyFrames:
+    """Jedno zapytanie (lub trafienie w cache) DAILY_ADJUSTED -> oba widoki świec dziennych."""
+    try:
+        raw_data = get_raw_data_with_cache(
+            session, api_client, ticker, DAILY_DATA_TYPE, 'get_daily_adjusted',
+            expiry_hours=expiry_hours, outputsize='full'
+        )
+        return parse_daily_adjusted(raw_data)
+    except Exception as e:
+        logger.error(f"Dane dzienne: Błąd ładowania {ticker}: {e}")
+        return _empty_frames()
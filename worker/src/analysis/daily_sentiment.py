@@ -0,0 +1,126 @@
+import logging
+import numpy as np
+import pandas as pd
+from datetime import date
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# DZIENNE AGREGATY SENTYMENTU (news_ticker_sentiment -> daily_sentiment)
+# ==================================================================
+# Cechy H2/H3 (retail_herding, information_entropy) przeliczały sentyment z listy artykułów
+# JSON przy każdym uruchomieniu - filtr dat i średnia w Pythonie dla każdego wiersza ramki.
+# Teraz każdy zapis artykułów (firehose, sync historii tickera) odświeża agregat tylko dla
+# dotkniętych par (ticker, dzień), a cechy czytają zwartą serię liczbową.
+# Dzień = data UTC publikacji (tak jak dotychczasowe metryki na indeksie UTC).
+
+REFRESH_CHUNK = 1000
+BULLISH_LABELS = ('Bullish', 'Somewhat-Bullish')
+BEARISH_LABELS = ('Bearish', 'Somewhat-Bearish')
+
+FRAME_COLUMNS = ['article_count', 'mean_sentiment', 'weighted_sentiment', 'bullish_count', 'bearish_count']
+
+HERDING_WINDOW_DAYS = 7      # Jak calculate_retail_herding_from_data
+ENTROPY_WINDOW = 10          # Suma newsów z 10 świec (information_entropy)
+
+# Agregat liczony od zera z tabel newsów dla zadanych par - idempotentny (korekty sentymentu AV
+# i duplikaty z kilku strumieni nie psują liczników).
+_REFRESH_SQL = f"""
+    WITH keys AS (
+        SELECT * FROM unnest(CAST(:tickers AS VARCHAR[]), CAST(:days AS DATE[])) AS k(ticker, day)
+    )
+    INSERT INTO daily_sentiment (ticker, day, article_count, mean_sentiment, weighted_sentiment,
+                                 bullish_count, bearish_count, updated_at)
+    SELECT k.ticker, k.day,
+           COUNT(*),
+           AVG(a.overall_sentiment_score),
+           SUM(s.relevance_score * s.ticker_sentiment_score) / NULLIF(SUM(s.relevance_score), 0),
+           COUNT(*) FILTER (WHERE s.ticker_sentiment_label IN {BULLISH_LABELS}),
+           COUNT(*) FILTER (WHERE s.ticker_sentiment_label IN {BEARISH_LABELS}),
+           NOW()
+    FROM keys k
+    JOIN news_ticker_sentiment s
+      ON s.ticker = k.ticker
+     AND s.time_published >= (k.day::timestamp AT TIME ZONE 'UTC')
+     AND s.time_published < ((k.day + 1)::timestamp AT TIME ZONE 'UTC')
+    JOIN news_articles a ON a.article_hash = s.article_hash
+    GROUP BY k.ticker, k.day
+    ON CONFLICT (ticker, day) DO UPDATE SET
+        article_count = EXCLUDED.article_count,
+        mean_sentiment = EXCLUDED.mean_sentiment,
+        weighted_sentiment = EXCLUDED.weighted_sentiment,
+        bullish_count = EXCLUDED.bullish_count,
+        bearish_count = EXCLUDED.bearish_count,
+        updated_at = NOW()
+"""
+
+def refresh_daily_sentiment(session: Session, keys: Iterable[Tuple[str, date]]) -> int:
+    """
+    Przelicza agregaty dla par (ticker, dzień UTC). Bez commitu - wywołujący zapisuje
+    razem z artykułami (jedna transakcja). Zwraca liczbę odświeżonych par.
+    """
+    keys = sorted(set(keys))
+    refreshed = 0
+    for start in range(0, len(keys), REFRESH_CHUNK):
+        chunk = keys[start:start + REFRESH_CHUNK]
+        result = session.execute(text(_REFRESH_SQL), {
+            'tickers': [k[0] for k in chunk],
+            'days': [k[1] for k in chunk]
+        })
+        refreshed += max(result.rowcount, 0)
+    return refreshed
+
+def rebuild_daily_sentiment(session: Session) -> int:
+    """Pełne odtworzenie agregatów z news_ticker_sentiment (jednorazowy backfill istniejących newsów)."""
+    keys = session.execute(text("""
+        SELECT DISTINCT ticker, (time_published AT TIME ZONE 'UTC')::date FROM news_ticker_sentiment
+    """)).fetchall()
+    refreshed = refresh_daily_sentiment(session, [(k[0], k[1]) for k in keys])
+    session.commit()
+    return refreshed
+
+# --- Odczyt dla cech H2/H3 ---
+
+def load_daily_sentiment(session: Session, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+    """Seria dzienna tickera (indeks: dzień UTC bez strefy, rosnąco), kolumny FRAME_COLUMNS."""
+    query = f"SELECT day, {', '.join(FRAME_COLUMNS)} FROM daily_sentiment WHERE ticker = :ticker"
+    params = {'ticker': ticker}
+    if start is not None:
+        query += " AND day >= :start"
+        params['start'] = start
+    if end is not None:
+        query += " AND day <= :end"
+        params['end'] = end
+    rows = session.execute(text(query + " ORDER BY day"), params).fetchall()
+    if not rows:
+        return pd.DataFrame(columns=FRAME_COLUMNS).set_index(pd.to_datetime([]))
+    df = pd.DataFrame(rows, columns=['day'] + FRAME_COLUMNS).astype({c: float for c in FRAME_COLUMNS})
+    df.set_index(pd.to_datetime(df.pop('day')), inplace=True)
+    return df
+
+def retail_herding_series(sentiment_df: pd.DataFrame, index: pd.DatetimeIndex, window_days: int = HERDING_WINDOW_DAYS) -> pd.Series:
+    """
+    retail_herding dla każdej daty indeksu naraz: średni sentyment artykułów od (data - window_days).
+    Okno jak w calculate_retail_herding_from_data (bez górnej granicy) - sumy sufiksowe zamiast filtra na wiersz.
+    """
+    if sentiment_df is None or sentiment_df.empty:
+        return pd.Series(0.0, index=index)
+    counts = sentiment_df['article_count'].to_numpy()
+    sums = (sentiment_df['mean_sentiment'].fillna(0.0) * sentiment_df['article_count']).to_numpy()
+    suffix_counts = np.append(counts[::-1].cumsum()[::-1], 0.0)
+    suffix_sums = np.append(sums[::-1].cumsum()[::-1], 0.0)
+
+    pos = sentiment_df.index.searchsorted(index - pd.Timedelta(days=window_days), side='left')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        herding = np.where(suffix_counts[pos] > 0, suffix_sums[pos] / suffix_counts[pos], 0.0)
+    return pd.Series(herding, index=index)
+
+def information_entropy_series(sentiment_df: pd.DataFrame, index: pd.DatetimeIndex, window: int = ENTROPY_WINDOW) -> pd.Series:
+    """information_entropy: suma artykułów z ostatnich 'window' świec indeksu (dni bez świecy pomijane)."""
+    if sentiment_df is None or sentiment_df.empty:
+        return pd.Series(0.0, index=index)
+    counts = sentiment_df['article_count'].reindex(index, fill_value=0)
+    return counts.rolling(window=window).sum().fillna(0)
@@ -0,0 +1,138 @@
+import logging
+from io import StringIO
+from datetime import datetime, date, timezone, timedelta
+import pandas as pd
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional, Set
+
+from . import utils
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# KALENDARZ WYNIKÓW (EARNINGS_CALENDAR -> earnings_calendar)
+# ==================================================================
+# AV zwraca cały kalendarz (horyzont 3/12 miesięcy) jako jeden CSV. Ładujemy go
+# raz dziennie do tabeli indeksowanej po (ticker, report_date), a fazy odpowiadają
+# na pytanie "ile dni do wyników" jednym JOIN-em - bez zapytań per ticker.
+# Przeszłe daty zostają w tabeli (historia dla backtestów i audytu).
+
+LOADED_KEY = 'earnings_calendar_loaded_on'
+DEFAULT_HORIZON = '3month'
+WRITE_CHUNK = 2000
+
+# Okno ryzyka wyników (dni względem daty raportu): -2 = dwa dni po, +1 = dzień przed
+NEAR_EARNINGS_AFTER_DAYS = 2
+NEAR_EARNINGS_BEFORE_DAYS = 1
+
+def parse_calendar_csv(csv_text: str) -> pd.DataFrame:
+    """CSV AV -> tabela (ticker, report_date, name, fiscal_date_ending, estimate, currency, time_of_the_day)."""
+    if not csv_text or 'symbol' not in csv_text:
+        return pd.DataFrame()
+    df = pd.read_csv(StringIO(csv_text), dtype={'symbol': str})
+    df = df.rename(columns={
+        'symbol': 'ticker', 'reportDate': 'report_date', 'fiscalDateEnding': 'fiscal_date_ending',
+        'timeOfTheDay': 'time_of_the_day'
+    })
+    for col in ('name', 'fiscal_date_ending', 'estimate', 'currency', 'time_of_the_day'):
+        if col not in df.columns:
+            df[col] = None
+    df['report_date'] = pd.to_datetime(df['report_date'], errors='coerce').dt.date
+    df['fiscal_date_ending'] = pd.to_datetime(df['fiscal_date_ending'], errors='coerce').dt.date
+    df['estimate'] = pd.to_numeric(df['estimate'], errors='coerce')
+    df = df.dropna(subset=['ticker', 'report_date']).drop_duplicates(subset=['ticker', 'report_date'], keep='last')
+    cols = ['ticker', 'report_date', 'name', 'fiscal_date_ending', 'estimate', 'currency', 'time_of_the_day']
+    return df[cols].astype(object).where(df[cols].notna(), None)
+
+def _store_calendar(session: Session, df: pd.DataFrame, today: date) -> int:
+    """
+    Kalendarz jest źródłem prawdy dla przyszłości: przyszłe wpisy zastępujemy (daty raportów się przesuwają),
+    przeszłe zostawiamy. Jedna transakcja.
+    """
+    rows = df.to_dict('records')
+    session.execute(text("DELETE FROM earnings_calendar WHERE report_date >= :today"), {'today': today})
+    for start in range(0, len(rows), WRITE_CHUNK):
+        session.execute(text("""
+            INSERT INTO earnings_calendar (ticker, report_date, name, fiscal_date_ending, estimate, currency, time_of_the_day, loaded_at)
+            VALUES (:ticker, :report_date, :name, :fiscal_date_ending, :estimate, :currency, :time_of_the_day, NOW())
+            ON CONFLICT (ticker, report_date) DO UPDATE SET
+                name = EXCLUDED.name,
+                fiscal_date_ending = EXCLUDED.fiscal_date_ending,
+                estimate = EXCLUDED.estimate,
+                currency = EXCLUDED.currency,
+                time_of_the_day = EXCLUDED.time_of_the_day,
+                loaded_at = NOW()
+        """), rows[start:start + WRITE_CHUNK])
+    return len(rows)
+
+def refresh_days_to_earnings(session: Session):
+    """phase1_candidates.days_to_earnings = dni do najbliższego raportu (od 'okna po raporcie' wzwyż)."""
+    session.execute(text("""
+        UPDATE phase1_candidates p
+        SET days_to_earnings = (
+            SELECT MIN(e.report_date) - CURRENT_DATE FROM earnings_calendar e
+            WHERE e.ticker = p.ticker AND e.report_date >= CURRENT_DATE - :after
+        )
+    """), {'after': NEAR_EARNINGS_AFTER_DAYS})
+    session.commit()
+
+def ingest_earnings_calendar(session: Session, api_client, horizon: str = DEFAULT_HORIZON, force: bool = False) -> int:
+    """
+    Dzienny ładunek kalendarza wyników (jedno zapytanie API). Pomija, jeśli dziś już załadowano.
+    Zwraca liczbę zapisanych wierszy (0 = pominięto / brak danych).
+    """
+    today = datetime.now(timezone.utc).date()
+    if not force and utils.get_system_control_value(session, LOADED_KEY) == today.isoformat():
+        return 0
+
+    try:
+        df = parse_calendar_csv(api_client.get_earnings_calendar(horizon=horizon))
+    except Exception as e:
+        logger.error(f"Kalendarz wyników: Błąd pobierania/parsowania: {e}")
+        return 0
+    if df.empty:
+        logger.warning("Kalendarz wyników: Pusta odpowiedź API.")
+        return 0
+
+    try:
+        saved = _store_calendar(session, df, today)
+        session.commit()
+        refresh_days_to_earnings(session)
+    except Exception as e:
+        logger.error(f"Kalendarz wyników: Błąd zapisu: {e}")
+        session.rollback()
+        return 0
+
+    utils.update_system_control(session, LOADED_KEY, today.isoformat())
+    msg = f"Kalendarz wyników: załadowano {saved} raportów (horyzont {horizon})."
+    logger.info(msg)
+    utils.append_scan_log(session, msg)
+    return saved
+
+# --- Odczyt dla faz ---
+
+def get_days_to_earnings(session: Session, tickers: List[str], as_of: Optional[date] = None) -> Dict[str, int]:
+    """ticker -> dni do najbliższego raportu (ujemne = w oknie po raporcie). Brak wpisu = brak klucza."""
+    if not tickers:
+        return {}
+    as_of = as_of or datetime.now(timezone.utc).date()
+    rows = session.execute(text("""
+        SELECT ticker, MIN(report_date) FROM earnings_calendar
+        WHERE ticker = ANY(:tickers) AND report_date >= :since
+        GROUP BY ticker
+    """), {'tickers': list(tickers), 'since': as_of - timedelta(days=NEAR_EARNINGS_AFTER_DAYS)}).fetchall()
+    return {r[0]: (r[1] - as_of).days for r in rows}
+
+def get_near_earnings(session: Session, tickers: Optional[List[str]] = None, as_of: Optional[date] = None) -> Set[str]:
+    """Tickery z raportem w oknie ryzyka [-NEAR_EARNINGS_AFTER_DAYS, +NEAR_EARNINGS_BEFORE_DAYS]."""
+    as_of = as_of or datetime.now(timezone.utc).date()
+    params = {
+        'start': as_of - timedelta(days=NEAR_EARNINGS_AFTER_DAYS),
+        'end': as_of + timedelta(days=NEAR_EARNINGS_BEFORE_DAYS)
+    }
+    query = "SELECT DISTINCT ticker FROM earnings_calendar WHERE report_date BETWEEN :start AND :end"
+    if tickers is not None:
+        query += " AND ticker = ANY(:tickers)"
+        params['tickers'] = list(tickers)
+    return {r[0] for r in session.execute(text(query), params).fetchall()}
@@ -0,0 +1,212 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional
+
+from ..config import (
+    FUNDAMENTALS_MIN_MARKET_CAP, FUNDAMENTALS_MAX_MARKET_CAP,
+    FUNDAMENTALS_MIN_FLOAT, FUNDAMENTALS_MAX_FLOAT
+)
+from .utils import append_scan_log
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# FUNDAMENTY SPÓŁEK (OVERVIEW -> company_fundamentals)
+# ==================================================================
+# Dane z OVERVIEW zmieniają się rzadko (sektor, branża, kapitalizacja, free float),
+# więc trzymamy je w tabeli z TTL liczonym w tygodniach. Odświeża je job tła
+# (małe porcje, pas BULK), a skanery czytają tabelę przez JOIN - bez zapytań API.
+# Przy okazji uzupełniamy sektor/branżę w 'companies' (wiersze 'N/A' z inicjalizatora).
+
+FUNDAMENTALS_TTL_DAYS = 28          # Wiersz OK jest świeży przez 4 tygodnie
+EMPTY_RETRY_DAYS = 14               # AV nie zwróciło nic (np. ETF/warrant) - ponowna próba po 2 tygodniach
+REFRESH_BATCH = 120                 # Maksimum spółek na jeden przebieg joba tła
+REFRESH_RPM_SHARE = 0.5             # Przebieg joba zużywa najwyżej ~pół minuty bieżącego tempa API
+REFRESH_MAX_WORKERS = 4
+WRITE_BATCH = 50
+
+STATUS_OK = 'OK'
+STATUS_EMPTY = 'EMPTY'
+UNKNOWN_SECTOR = 'UNKNOWN'          # Ten sam znacznik co Faza X (nie pytamy ponownie o sektor)
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+def _to_num(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _clean_str(value) -> Optional[str]:
+    if value is None or str(value).strip() in ('', 'None', '-'):
+        return None
+    return str(value).strip()
+
+def parse_overview(ticker: str, overview: Optional[dict]) -> dict:
+    """Odpowiedź OVERVIEW -> wiersz company_fundamentals (pusta odpowiedź = status EMPTY)."""
+    overview = overview or {}
+    row = {
+        'ticker': ticker,
+        'name': _clean_str(overview.get('Name')),
+        'exchange': _clean_str(overview.get('Exchange')),
+        'asset_type': _clean_str(overview.get('AssetType')),
+        'sector': _clean_str(overview.get('Sector')),
+        'industry': _clean_str(overview.get('Industry')),
+        'market_cap': _to_int(overview.get('MarketCapitalization')),
+        'shares_outstanding': _to_int(overview.get('SharesOutstanding')),
+        'shares_float': _to_int(overview.get('SharesFloat')),
+        'pe_ratio': _to_num(overview.get('PERatio')),
+        'beta': _to_num(overview.get('Beta')),
+        'dividend_yield': _to_num(overview.get('DividendYield')),
+        'week52_high': _to_num(overview.get('52WeekHigh')),
+        'week52_low': _to_num(overview.get('52WeekLow')),
+    }
+    row['status'] = STATUS_OK if overview.get('Symbol') and row['sector'] else STATUS_EMPTY
+    return row
+
+def _fetch_row(api_client, ticker: str) -> Optional[dict]:
+    """Samo zapytanie OVERVIEW (bez bazy) - bezpieczne do wywołania z wątku. None = błąd sieci."""
+    try:
+        return parse_overview(ticker, api_client.get_company_overview(ticker))
+    except Exception as e:
+        logger.warning(f"Fundamenty: Błąd OVERVIEW dla {ticker}: {e}")
+        return None
+
+def save_fundamentals(session: Session, rows: List[dict]):
+    """Upsert paczki fundamentów + uzupełnienie sektora/branży w companies (jeden commit)."""
+    if not rows: return
+    try:
+        session.execute(text("""
+            INSERT INTO company_fundamentals (
+                ticker, name, exchange, asset_type, sector, industry, market_cap, shares_outstanding,
+                shares_float, pe_ratio, beta, dividend_yield, week52_high, week52_low, status, fetched_at
+            ) VALUES (
+                :ticker, :name, :exchange, :asset_type, :sector, :industry, :market_cap, :shares_outstanding,
+                :shares_float, :pe_ratio, :beta, :dividend_yield, :week52_high, :week52_low, :status, NOW()
+            )
+            ON CONFLICT (ticker) DO UPDATE SET
+                name = EXCLUDED.name, exchange = EXCLUDED.exchange, asset_type = EXCLUDED.asset_type,
+                sector = EXCLUDED.sector, industry = EXCLUDED.industry, market_cap = EXCLUDED.market_cap,
+                shares_outstanding = EXCLUDED.shares_outstanding, shares_float = EXCLUDED.shares_float,
+                pe_ratio = EXCLUDED.pe_ratio, beta = EXCLUDED.beta, dividend_yield = EXCLUDED.dividend_yield,
+                week52_high = EXCLUDED.week52_high, week52_low = EXCLUDED.week52_low,
+                status = EXCLUDED.status, fetched_at = NOW()
+        """), rows)
+
+        # Wzbogacenie companies: tylko wiersze bez sektora / ze znacznikiem UNKNOWN (nie nadpisujemy ręcznych korekt)
+        session.execute(text("""
+            UPDATE companies c SET
+                sector = COALESCE(f.sector, :unknown),
+                industry = COALESCE(f.industry, :unknown),
+                last_updated = NOW()
+            FROM company_fundamentals f
+            WHERE f.ticker = c.ticker AND f.ticker = ANY(:tickers)
+              AND (c.sector IS NULL OR c.sector IN ('N/A', :unknown) OR c.industry IS NULL OR c.industry = 'N/A')
+        """), {'tickers': [r['ticker'] for r in rows], 'unknown': UNKNOWN_SECTOR})
+        session.commit()
+    except Exception as e:
+        logger.error(f"Fundamenty: Błąd zapisu paczki: {e}")
+        session.rollback()
+
+def get_refresh_queue(session: Session, limit: int) -> List[str]:
+    """
+    Spółki bez fundamentów lub z przeterminowanym wpisem: najpierw brakujące, potem wg warstwy
+    (HOT -> WARM -> COLD, ticker_tiers), w warstwie najstarsze.
+    """
+    rows = session.execute(text("""
+        SELECT c.ticker FROM companies c
+        LEFT JOIN company_fundamentals f ON f.ticker = c.ticker
+        LEFT JOIN ticker_tiers t ON t.ticker = c.ticker
+        WHERE c.is_active AND (
+              f.ticker IS NULL
+           OR (f.status = :ok AND f.fetched_at < NOW() - make_interval(days => :ttl))
+           OR (f.status <> :ok AND f.fetched_at < NOW() - make_interval(days => :empty_retry)))
+        ORDER BY (f.ticker IS NOT NULL),
+                 CASE t.tier WHEN 'HOT' THEN 0 WHEN 'COLD' THEN 2 ELSE 1 END,
+                 f.fetched_at ASC, c.ticker
+        LIMIT :limit
+    """), {'ok': STATUS_OK, 'ttl': FUNDAMENTALS_TTL_DAYS, 'empty_retry': EMPTY_RETRY_DAYS, 'limit': limit}).fetchall()
+    return [r[0] for r in rows]
+
+def refresh_fundamentals(
+    session: Session,
+    api_client,
+    tickers: Optional[List[str]] = None,
+    limit: int = REFRESH_BATCH,
+    max_workers: int = REFRESH_MAX_WORKERS
+) -> Dict[str, dict]:
+    """
+    Pobiera OVERVIEW dla podanych tickerów (lub kolejki przeterminowanych) i zapisuje paczkami.
+    Zapytania idą równolegle, limit API pilnuje wspólny Rate Limiter klienta.
+    Zwraca mapę ticker -> wiersz dla pobranych spółek (błędy sieci pomijane - wrócą w kolejce).
+    """
+    if tickers is None:
+        tickers = get_refresh_queue(session, limit)
+    if not tickers:
+        return {}
+
+    fetched: Dict[str, dict] = {}
+    pending = []
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_fetch_row, api_client, t): t for t in tickers}
+        for future in as_completed(futures):
+            row = future.result()
+            if row is None:
+                continue
+            fetched[row['ticker']] = row
+            pending.append(row)
+            if len(pending) >= WRITE_BATCH:
+                save_fundamentals(session, pending)
+                pending = []
+    save_fundamentals(session, pending)
+    return fetched
+
+def run_fundamentals_refresh_job(session: Session, api_client) -> int:
+    """
+    Job tła: jedna mała porcja przeterminowanych fundamentów.
+    Wielkość porcji zależy od bieżącego (wyuczonego) tempa klienta, żeby nie zjadać pasma monitorów.
+    """
+    rpm = getattr(api_client, 'current_rpm', None) or REFRESH_BATCH
+    limit = max(1, min(REFRESH_BATCH, int(rpm * REFRESH_RPM_SHARE)))
+    fetched = refresh_fundamentals(session, api_client, limit=limit)
+    if fetched:
+        ok = sum(1 for r in fetched.values() if r['status'] == STATUS_OK)
+        msg = f"Fundamenty: odświeżono {len(fetched)} spółek (z danymi: {ok})."
+        logger.info(msg)
+        append_scan_log(session, msg)
+    return len(fetched)
+
+# --- Odczyt dla skanerów ---
+
+def fundamentals_filter_active() -> bool:
+    return any(v is not None for v in (
+        FUNDAMENTALS_MIN_MARKET_CAP, FUNDAMENTALS_MAX_MARKET_CAP, FUNDAMENTALS_MIN_FLOAT, FUNDAMENTALS_MAX_FLOAT
+    ))
+
+def passes_fundamentals_filter(market_cap: Optional[int], shares_float: Optional[int]) -> bool:
+    """Filtr kapitalizacji / free float z config. Brak danych = przepuszczamy."""
+    if market_cap is not None:
+        if FUNDAMENTALS_MIN_MARKET_CAP is not None and market_cap < FUNDAMENTALS_MIN_MARKET_CAP: return False
+        if FUNDAMENTALS_MAX_MARKET_CAP is not None and market_cap > FUNDAMENTALS_MAX_MARKET_CAP: return False
+    if shares_float is not None:
+        if FUNDAMENTALS_MIN_FLOAT is not None and shares_float < FUNDAMENTALS_MIN_FLOAT: return False
+        if FUNDAMENTALS_MAX_FLOAT is not None and shares_float > FUNDAMENTALS_MAX_FLOAT: return False
+    return True
+
+# Wspólne zapytanie skanerów: companies + fundamenty (sektor z fundamentów ma pierwszeństwo)
+COMPANIES_WITH_FUNDAMENTALS_SQL = """
+    SELECT c.ticker,
+           COALESCE(f.sector, NULLIF(c.sector, 'N/A')) AS sector,
+           COALESCE(f.industry, NULLIF(c.industry, 'N/A')) AS industry,
+           f.market_cap, f.shares_float
+    FROM companies c
+    LEFT JOIN company_fundamentals f ON f.ticker = c.ticker AND f.status = 'OK'
+    WHERE c.is_active
+    ORDER BY c.ticker
+"""
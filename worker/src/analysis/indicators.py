@@ -0,0 +1,110 @@
+import logging
+import numpy as np
+import pandas as pd
+from pandas import Series as pd_Series
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# WSKAŹNIKI LOKALNE (zamiast OBV / BBANDS / WEEKLY_ADJUSTED z API)
+# ==================================================================
+# Alpha Vantage liczy wskaźniki techniczne (TA-Lib) z tych samych świec dziennych,
+# które i tak trzymamy w cache. Liczymy je lokalnie z identyczną konwencją
+# (pierwsza wartość, okno rozgrzewki, odchylenie populacyjne, wygładzanie Wildera),
+# więc dla tych samych świec wejściowych wynik jest zgodny z API - bez dodatkowego zapytania na ticker.
+# Zgodność dotyczy konwencji, nie danych: Faza 3, backtest i optymalizator podają świece
+# skorygowane o splity (DailyFrames.adjusted), więc tygodniowe i OBV przed splitem różnią się
+# od surowych serii AV - celowo (split nie udaje załamania trendu ani odpływu wolumenu).
+# Kolumny wynikowe mają nazwy z odpowiedzi AV, żeby konsumenci się nie zmienili.
+
+BBANDS_COLUMNS = ['Real Upper Band', 'Real Middle Band', 'Real Lower Band']
+WEEKLY_AGG = {'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'}
+
+def _prepare(df: pd.DataFrame) -> pd.DataFrame:
+    """Indeks DatetimeIndex bez strefy, rosnąco (tak jak standardize_df_columns + tz_localize(None))."""
+    if not isinstance(df.index, pd.DatetimeIndex):
+        df = df.copy()
+        df.index = pd.to_datetime(df.index)
+    if df.index.tz is not None:
+        df = df.tz_localize(None)
+    return df.sort_index()
+
+def sma(series: pd_Series, period: int) -> pd_Series:
+    """SMA (AV 'SMA'): NaN dla pierwszych period-1 świec."""
+    return series.rolling(window=period, min_periods=period).mean()
+
+def obv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    On-Balance Volume (AV 'OBV', TA-Lib): pierwsza wartość = wolumen pierwszej świecy,
+    potem +/- wolumen wg kierunku zamknięcia (bez zmiany = bez zmiany OBV).
+    Zwraca DataFrame z kolumną 'OBV' (jak 'Technical Analysis: OBV').
+    """
+    if df.empty:
+        return pd.DataFrame(columns=['OBV'], index=pd.DatetimeIndex([]))
+    df = _prepare(df)
+    volume = df['volume'].astype(float)
+    direction = np.sign(df['close'].diff()).fillna(0)
+    signed = direction * volume
+    signed.iloc[0] = volume.iloc[0]
+    return signed.cumsum().to_frame('OBV')
+
+def bbands(df: pd.DataFrame, time_period: int = 20, nbdevup: float = 2, nbdevdn: float = 2, series_type: str = 'close') -> pd.DataFrame:
+    """
+    Wstęgi Bollingera (AV 'BBANDS', matype=0): SMA(period) +/- nbdev * odchylenie populacyjne (ddof=0).
+    Jak w API - tylko świece z pełnym oknem (bez NaN z rozgrzewki).
+    """
+    if df.empty:
+        return pd.DataFrame(columns=BBANDS_COLUMNS, index=pd.DatetimeIndex([]))
+    df = _prepare(df)
+    series = df[series_type].astype(float)
+    middle = sma(series, time_period)
+    std = series.rolling(window=time_period, min_periods=time_period).std(ddof=0)
+    bands = pd.DataFrame({
+        'Real Upper Band': middle + nbdevup * std,
+        'Real Middle Band': middle,
+        'Real Lower Band': middle - nbdevdn * std,
+    }, index=df.index)
+    return bands.dropna()
+
+def weekly_resample(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Świece tygodniowe z dowolnych świec dziennych: tydzień pon-pt (W-FRI), etykieta = ostatni
+    dzień handlowy tygodnia (np. czwartek przed Wielkim Piątkiem), nie sztuczna niedziela z resample('W').
+    Agregacja jak AV 'TIME_SERIES_WEEKLY'; ze świec skorygowanych o splity wynik jest ciągły,
+    a więc inny niż surowe tygodniowe z API sprzed splitu.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=list(WEEKLY_AGG), index=pd.DatetimeIndex([]))
+    df = _prepare(df)
+    agg = {c: how for c, how in WEEKLY_AGG.items() if c in df.columns}
+    if 'adjusted close' in df.columns:
+        agg['adjusted close'] = 'last'
+    weeks = df.index.to_period('W-FRI')
+    weekly = df.groupby(weeks).agg(agg)
+    weekly.index = pd.DatetimeIndex(df.index.to_series().groupby(weeks).max().values)
+    return weekly.dropna(subset=['close'])
+
+def true_range(df: pd.DataFrame) -> pd_Series:
+    """True Range; pierwsza świeca bez poprzedniego zamknięcia = NaN (jak TA-Lib)."""
+    prev_close = df['close'].shift()
+    tr = pd.concat([
+        df['high'] - df['low'],
+        (df['high'] - prev_close).abs(),
+        (df['low'] - prev_close).abs()
+    ], axis=1).max(axis=1)
+    tr.iloc[0] = np.nan
+    return tr
+
+def atr_wilder(df: pd.DataFrame, time_period: int = 14) -> pd_Series:
+    """
+    ATR (AV 'ATR', TA-Lib): pierwsza wartość na świecy 'time_period' = średnia TR z 1..time_period,
+    dalej wygładzanie Wildera ATR_t = (ATR_{t-1} * (n-1) + TR_t) / n. Wcześniej NaN.
+    """
+    if df.empty or len(df) <= time_period:
+        return pd_Series(dtype=float, index=df.index)
+    df = _prepare(df)
+    tr = true_range(df)
+    seeded = tr.iloc[time_period:].copy()
+    seeded.iloc[0] = tr.iloc[1:time_period + 1].mean()
+    atr = seeded.ewm(alpha=1.0 / time_period, adjust=False).mean()
+    return atr.reindex(df.index)
@@ -0,0 +1,182 @@
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from datetime import date, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional
+
+from .utils import is_cache_entry_fresh
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# TRANSAKCJE INSIDERÓW (INSIDER_TRANSACTIONS -> insider_transactions)
+# ==================================================================
+# Zamiast jednego bloba JSONB na ticker (parsowanego od zera przy każdym użyciu i pobieranego
+# w całości po wygaśnięciu) trzymamy znormalizowane wiersze z kluczem naturalnym (hash pól).
+# AV zawsze zwraca pełną historię, więc przyrost robimy po naszej stronie: zapisujemy tylko
+# transakcje od znaku wodnego (minus zakładka na spóźnione zgłoszenia), duplikaty odrzuca PK.
+# Cechy H2 (institutional_sync) liczone są wektorowo z ramki numerycznej (load_insider_frame).
+
+INSIDER_TTL_HOURS = 24              # AV aktualizuje insiderów raz dziennie
+WATERMARK_OVERLAP_DAYS = 30         # Zakładka: Form 4 bywa zgłaszany / publikowany z opóźnieniem
+SYNC_WINDOW_DAYS = 90               # Okno institutional_sync (jak aqm_v3_metrics)
+WRITE_CHUNK = 1000
+
+FRAME_COLUMNS = ['transaction_type', 'transaction_shares']
+
+def _to_num(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _clean(value) -> Optional[str]:
+    if value is None or str(value).strip() in ('', 'None'):
+        return None
+    return str(value).strip()
+
+def parse_insider_payload(ticker: str, raw_data: Optional[dict]) -> List[dict]:
+    """
+    Odpowiedź INSIDER_TRANSACTIONS -> wiersze tabeli z kluczem naturalnym.
+    Identyczne wiersze w jednym payloadzie (dwie takie same transakcje tego dnia) dostają
+    kolejne numery powtórzenia, więc hash jest stabilny między pobraniami.
+    """
+    rows, seen = [], {}
+    for tx in (raw_data or {}).get('data', []) or []:
+        try:
+            tx_date = date.fromisoformat(str(tx.get('transaction_date'))[:10])
+        except (TypeError, ValueError):
+            continue
+        row = {
+            'ticker': ticker,
+            'transaction_date': tx_date,
+            'executive': _clean(tx.get('executive')),
+            'executive_title': _clean(tx.get('executive_title')),
+            'security_type': _clean(tx.get('security_type')),
+            'acquisition_or_disposal': _clean(tx.get('acquisition_or_disposal')),
+            'shares': _to_num(tx.get('shares')),
+            'share_price': _to_num(tx.get('share_price')),
+        }
+        natural_key = '|'.join(str(row[k]) for k in (
+            'ticker', 'transaction_date', 'executive', 'executive_title', 'security_type',
+            'acquisition_or_disposal', 'shares', 'share_price'
+        ))
+        occurrence = seen.get(natural_key, 0)
+        seen[natural_key] = occurrence + 1
+        row['tx_hash'] = hashlib.md5(f"{natural_key}#{occurrence}".encode()).hexdigest()
+        rows.append(row)
+    return rows
+
+def get_sync_state(session: Session, tickers: List[str]) -> Dict[str, tuple]:
+    """ticker -> (watermark, last_fetched) dla tickerów już synchronizowanych."""
+    if not tickers:
+        return {}
+    rows = session.execute(text("""
+        SELECT ticker, watermark, last_fetched FROM insider_sync WHERE ticker = ANY(:tickers)
+    """), {'tickers': list(tickers)}).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+def get_stale_tickers(session: Session, tickers: List[str], expiry_hours: float = INSIDER_TTL_HOURS) -> List[str]:
+    """Tickery bez synchronizacji lub z synchronizacją starszą niż TTL (planer prefetchu)."""
+    state = get_sync_state(session, tickers)
+    return [t for t in tickers if t not in state or not is_cache_entry_fresh(state[t][1], expiry_hours)]
+
+def sync_insider_transactions(
+    session: Session,
+    api_client,
+    ticker: str,
+    expiry_hours: float = INSIDER_TTL_HOURS,
+    force: bool = False
+) -> int:
+    """
+    Przyrostowa synchronizacja insiderów tickera. Pomija, jeśli ostatnie pobranie jest świeże.
+    Zwraca liczbę nowych transakcji (0 = nic nowego / pominięto).
+    """
+    watermark, last_fetched = get_sync_state(session, [ticker]).get(ticker, (None, None))
+    if not force and is_cache_entry_fresh(last_fetched, expiry_hours):
+        return 0
+
+    raw_data = api_client.get_insider_transactions(ticker)
+    if not raw_data or (isinstance(raw_data, dict) and (raw_data.get('Error Message') or raw_data.get('Information'))):
+        return 0
+
+    rows = parse_insider_payload(ticker, raw_data)
+    if watermark is not None:
+        since = watermark - timedelta(days=WATERMARK_OVERLAP_DAYS)
+        rows = [r for r in rows if r['transaction_date'] >= since]
+
+    inserted = 0
+    try:
+        for start in range(0, len(rows), WRITE_CHUNK):
+            result = session.execute(text("""
+                INSERT INTO insider_transactions (
+                    tx_hash, ticker, transaction_date, executive, executive_title,
+                    security_type, acquisition_or_disposal, shares, share_price, loaded_at
+                ) VALUES (
+                    :tx_hash, :ticker, :transaction_date, :executive, :executive_title,
+                    :security_type, :acquisition_or_disposal, :shares, :share_price, NOW()
+                )
+                ON CONFLICT (tx_hash) DO NOTHING
+            """), rows[start:start + WRITE_CHUNK])
+            inserted += max(result.rowcount, 0)
+
+        session.execute(text("""
+            INSERT INTO insider_sync (ticker, watermark, row_count, last_fetched)
+            SELECT :ticker, MAX(transaction_date), COUNT(*), NOW()
+            FROM insider_transactions WHERE ticker = :ticker
+            ON CONFLICT (ticker) DO UPDATE SET
+                watermark = EXCLUDED.watermark, row_count = EXCLUDED.row_count, last_fetched = NOW()
+        """), {'ticker': ticker})
+        session.commit()
+    except Exception as e:
+        logger.error(f"Insiderzy: Błąd zapisu {ticker}: {e}")
+        session.rollback()
+        return 0
+    return inserted
+
+# --- Odczyt dla cech H2 ---
+
+def load_insider_frame(session: Session, ticker: str, start: Optional[date] = None, end: Optional[date] = None) -> pd.DataFrame:
+    """
+    Transakcje A/D z dodatnią liczbą akcji jako ramka numeryczna (indeks: data transakcji),
+    w formacie dotychczasowego parsera H2: kolumny 'transaction_type', 'transaction_shares'.
+    """
+    query = """
+        SELECT transaction_date, acquisition_or_disposal, shares FROM insider_transactions
+        WHERE ticker = :ticker AND acquisition_or_disposal IN ('A', 'D') AND shares > 0
+    """
+    params = {'ticker': ticker}
+    if start is not None:
+        query += " AND transaction_date >= :start"
+        params['start'] = start
+    if end is not None:
+        query += " AND transaction_date <= :end"
+        params['end'] = end
+    rows = session.execute(text(query + " ORDER BY transaction_date"), params).fetchall()
+    if not rows:
+        return pd.DataFrame(columns=FRAME_COLUMNS).set_index(pd.to_datetime([]))
+    df = pd.DataFrame(rows, columns=['transaction_date'] + FRAME_COLUMNS)
+    df['transaction_shares'] = df['transaction_shares'].astype(float)
+    df.set_index(pd.to_datetime(df.pop('transaction_date')), inplace=True)
+    return df
+
+def institutional_sync_series(insider_df: pd.DataFrame, index: pd.DatetimeIndex, window_days: int = SYNC_WINDOW_DAYS) -> pd.Series:
+    """
+    institutional_sync dla każdej daty indeksu naraz: (kupno - sprzedaż) / (kupno + sprzedaż) od (data - window_days).
+    Okno jak w calculate_institutional_sync_from_data (bez górnej granicy) - sumy sufiksowe zamiast filtra na wiersz.
+    """
+    if insider_df is None or insider_df.empty:
+        return pd.Series(0.0, index=index)
+    insider_df = insider_df.sort_index()
+    shares = insider_df['transaction_shares'].to_numpy(dtype=float)
+    signed = np.where(insider_df['transaction_type'].to_numpy() == 'A', shares, -shares)
+    suffix_total = np.append(shares[::-1].cumsum()[::-1], 0.0)
+    suffix_net = np.append(signed[::-1].cumsum()[::-1], 0.0)
+
+    pos = insider_df.index.searchsorted(index - pd.Timedelta(days=window_days), side='left')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sync = np.where(suffix_total[pos] > 0, suffix_net[pos] / suffix_total[pos], 0.0)
+    return pd.Series(sync, index=index)
@@ -0,0 +1,109 @@
+import logging
+import threading
+import pandas as pd
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy.orm import Session
+from typing import Callable, List, Optional
+
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from ..database import get_db_session
+from .intraday_warehouse import ensure_synced, load_recent_bars
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# WSPÓLNA ŚCIEŻKA DANYCH INTRADAY 5MIN (Faza 4 + SDAR)
+# ==================================================================
+# Obie fazy czytają świece z hurtowni 'intraday_bars_5m' (przyrostowy sync z API),
+# a gotowe ramki trzymamy dodatkowo w pamięci procesu, żeby ten sam
+# ticker nie był czytany z bazy dwa razy w ramach jednego cyklu.
+# Ramka w pamięci jest ważna tylko dla tego syncu hurtowni, z którego powstała:
+# świeżość (TTL wywołującego) liczymy od czasu syncu w intraday_months, nie od odczytu,
+# więc ramka załadowana przez Fazę 4 (TTL 6h) nie trafi do SDAR (TTL 1h) po czasie.
+
+INTRADAY_5_TTL_HOURS = 1         # SDAR (live): dane sprzed godziny są już "stare"
+PHASE4_INTRADAY_TTL_HOURS = 6    # Faza 4 liczy statystyki z 30 dni - godziny nic nie zmieniają
+PREFETCH_MAX_WORKERS = 6         # Wątki I/O; limit zapytań trzyma Rate Limiter klienta
+MEMORY_CACHE_MAX_TICKERS = 256   # Limit ramek w pamięci (LRU) - ~30 dni świec 5min na ticker
+
+_FRAME_MEMORY_CACHE: "OrderedDict[str, tuple]" = OrderedDict()   # ticker -> (czas syncu hurtowni, DataFrame)
+_FRAME_LOCK = threading.Lock()
+
+def _cached_frame(ticker: str, synced_at) -> Optional[pd.DataFrame]:
+    with _FRAME_LOCK:
+        cached = _FRAME_MEMORY_CACHE.get(ticker)
+        if cached is None or cached[0] != synced_at:
+            return None
+        _FRAME_MEMORY_CACHE.move_to_end(ticker)
+        return cached[1]
+
+def _remember_frame(ticker: str, synced_at, df: pd.DataFrame):
+    with _FRAME_LOCK:
+        _FRAME_MEMORY_CACHE[ticker] = (synced_at, df)
+        _FRAME_MEMORY_CACHE.move_to_end(ticker)
+        while len(_FRAME_MEMORY_CACHE) > MEMORY_CACHE_MAX_TICKERS:
+            _FRAME_MEMORY_CACHE.popitem(last=False)
+
+def get_intraday_5min_frame(
+    session: Session,
+    api_client: AlphaVantageClient,
+    ticker: str,
+    expiry_hours: float = INTRADAY_5_TTL_HOURS
+) -> Optional[pd.DataFrame]:
+    """
+    Zwraca ramkę 5min (30 dni) dla tickera: sync hurtowni po TTL -> pamięć (ten sam sync) -> hurtownia.
+    Zwracana jest kopia, bo konsumenci (SDAR) dopisują własne kolumny.
+    """
+    synced_at = ensure_synced(session, api_client, ticker, expiry_hours)
+    if synced_at is not None:
+        cached = _cached_frame(ticker, synced_at)
+        if cached is not None:
+            return cached.copy()
+
+    df = load_recent_bars(session, ticker)
+    if df is None or df.empty:
+        return None
+
+    if synced_at is not None:
+        _remember_frame(ticker, synced_at, df)
+    return df.copy()
+
+def _load_in_own_session(api_client: AlphaVantageClient, ticker: str, expiry_hours: float) -> Optional[pd.DataFrame]:
+    # Sesja SQLAlchemy nie jest bezpieczna wątkowo - każdy wątek pracuje na własnej
+    local_session = get_db_session()
+    try:
+        return get_intraday_5min_frame(local_session, api_client, ticker, expiry_hours=expiry_hours)
+    except Exception as e:
+        logger.error(f"Intraday 5min: Błąd pobierania {ticker}: {e}")
+        local_session.rollback()
+        return None
+    finally:
+        local_session.close()
+
+def map_intraday_5min(
+    api_client: AlphaVantageClient,
+    tickers: List[str],
+    func: Callable[[str, pd.DataFrame], Optional[dict]],
+    expiry_hours: float = INTRADAY_5_TTL_HOURS,
+    max_workers: int = PREFETCH_MAX_WORKERS
+):
+    """
+    Równoległa pula: dla każdego tickera pobiera ramkę 5min i od razu wylicza func(ticker, df).
+    Generator zwraca pary (ticker, wynik) w kolejności ukończenia; brak danych -> wynik None.
+    """
+    def _task(ticker):
+        df = _load_in_own_session(api_client, ticker, expiry_hours)
+        if df is None or df.empty:
+            return None
+        return func(ticker, df)
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_task, t): t for t in tickers}
+        for future in as_completed(futures):
+            ticker = futures[future]
+            try:
+                yield ticker, future.result()
+            except Exception as e:
+                logger.error(f"Intraday 5min: Błąd przetwarzania {ticker}: {e}")
+                yield ticker, None
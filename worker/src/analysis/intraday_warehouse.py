@@ -0,0 +1,350 @@
+import logging
+import threading
+import pytz
+import pandas as pd
+from datetime import datetime, timedelta
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional, Set
+
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from .utils import standardize_df_columns, is_cache_entry_fresh
+from . import market_calendar
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# HURTOWNIA ŚWIEC INTRADAY 5MIN
+# ==================================================================
+# Zamiast co godzinę pobierać pełne 30 dni (outputsize=full, kilka MB JSON-a)
+# trzymamy świece w tabeli 'intraday_bars_5m' (partycja = miesiąc):
+#   - live: krótki poll 'compact' (ostatnie ~100 świec) dopisywany przyrostowo,
+#     pełne okno tylko gdy wykryjemy dziurę (najstarsza świeca compact > ostatnia w bazie),
+#   - historia: backfill pojedynczych miesięcy parametrem 'month=YYYY-MM';
+#     miesiąc zamknięty oznaczamy w 'intraday_months' jako is_final i nie pobieramy ponownie.
+
+INTERVAL_5MIN = '5min'
+SERIES_KEY_5MIN = 'Time Series (5min)'
+DATA_TYPE_5MIN = 'INTRADAY_5'       # Klucz reguły świeżości (market_calendar)
+DEFAULT_WINDOW_DAYS = 30
+MONTH_REFRESH_HOURS = 6      # Otwarty miesiąc (bieżący) w backfillu odświeżamy najwyżej co 6h
+WRITE_CHUNK = 2000
+COMPACT_BARS = 100           # Tyle świec zwraca poll 'compact'
+GAP_SCAN_MAX_DAYS = 14       # Dłuższa przerwa = luka bez liczenia minut sesji
+
+NY_TZ = pytz.timezone('America/New_York')
+
+_KNOWN_PARTITIONS: Set[str] = set()
+_PARTITION_LOCK = threading.Lock()
+
+def _now_ny() -> datetime:
+    """Aktualny czas NY bez strefy (tak jak znaczniki świec AV)."""
+    return datetime.now(NY_TZ).replace(tzinfo=None)
+
+def _month_key(ts: datetime) -> str:
+    return ts.strftime('%Y-%m')
+
+def _month_bounds(month: str):
+    start = datetime.strptime(month, '%Y-%m')
+    end = (start + timedelta(days=32)).replace(day=1)
+    return start, end
+
+def parse_intraday_json(raw_data: Optional[dict], series_key: str = SERIES_KEY_5MIN) -> Optional[pd.DataFrame]:
+    """JSON TIME_SERIES_INTRADAY -> DataFrame OHLCV posortowany rosnąco (indeks: czas NY)."""
+    if not raw_data or series_key not in raw_data:
+        return None
+    df = pd.DataFrame.from_dict(raw_data[series_key], orient='index')
+    if df.empty:
+        return None
+    df = standardize_df_columns(df)
+    df.index = pd.to_datetime(df.index)
+    df.sort_index(inplace=True)
+    for c in ['open', 'high', 'low', 'close', 'volume']:
+        df[c] = pd.to_numeric(df[c], errors='coerce')
+    df.dropna(subset=['open', 'high', 'low', 'close', 'volume'], inplace=True)
+    return df
+
+def _ensure_partition(session: Session, month: str):
+    """Tworzy partycję miesięczną (jeśli brak). Pamiętamy utworzone, by nie wysyłać DDL przy każdym zapisie."""
+    if month in _KNOWN_PARTITIONS:
+        return
+    with _PARTITION_LOCK:
+        if month in _KNOWN_PARTITIONS:
+            return
+        start, end = _month_bounds(month)
+        partition = f"intraday_bars_5m_{month.replace('-', '_')}"
+        session.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {partition}
+            PARTITION OF intraday_bars_5m
+            FOR VALUES FROM ('{start:%Y-%m-%d}') TO ('{end:%Y-%m-%d}')
+        """))
+        session.commit()
+        _KNOWN_PARTITIONS.add(month)
+
+def store_bars(session: Session, ticker: str, df: pd.DataFrame) -> int:
+    """Upsert świec (ON CONFLICT po (ticker, bar_time)) - ostatnia świeca dnia bywa korygowana."""
+    if df is None or df.empty:
+        return 0
+
+    for month in sorted({_month_key(ts) for ts in df.index}):
+        _ensure_partition(session, month)
+
+    rows = [
+        {
+            'ticker': ticker,
+            'bar_time': ts.to_pydatetime(),
+            'open': float(r.open), 'high': float(r.high),
+            'low': float(r.low), 'close': float(r.close),
+            'volume': int(r.volume)
+        }
+        for ts, r in df[['open', 'high', 'low', 'close', 'volume']].iterrows()
+    ]
+    stmt = text("""
+        INSERT INTO intraday_bars_5m (ticker, bar_time, open, high, low, close, volume)
+        VALUES (:ticker, :bar_time, :open, :high, :low, :close, :volume)
+        ON CONFLICT (ticker, bar_time) DO UPDATE SET
+            open = EXCLUDED.open, high = EXCLUDED.high,
+            low = EXCLUDED.low, close = EXCLUDED.close,
+            volume = EXCLUDED.volume
+    """)
+    try:
+        for i in range(0, len(rows), WRITE_CHUNK):
+            session.execute(stmt, rows[i:i + WRITE_CHUNK])
+        session.commit()
+    except Exception as e:
+        logger.error(f"Hurtownia 5min: Błąd zapisu świec {ticker}: {e}")
+        session.rollback()
+        return 0
+    return len(rows)
+
+def _record_months(session: Session, ticker: str, months: List[str], final_months: Set[str] = frozenset()):
+    """Aktualizuje księgę pokrycia (liczba świec, czas pobrania, is_final)."""
+    stmt = text("""
+        INSERT INTO intraday_months (ticker, interval, month, is_final, bar_count, last_fetched)
+        VALUES (:ticker, :interval, :month, :is_final,
+                (SELECT COUNT(*) FROM intraday_bars_5m
+                 WHERE ticker = :ticker AND bar_time >= :start AND bar_time < :end),
+                NOW())
+        ON CONFLICT (ticker, interval, month) DO UPDATE SET
+            is_final = intraday_months.is_final OR EXCLUDED.is_final,
+            bar_count = EXCLUDED.bar_count,
+            last_fetched = NOW()
+    """)
+    params = []
+    for month in months:
+        start, end = _month_bounds(month)
+        params.append({
+            'ticker': ticker, 'interval': INTERVAL_5MIN, 'month': month,
+            'is_final': month in final_months, 'start': start, 'end': end
+        })
+    if not params:
+        return
+    try:
+        session.execute(stmt, params)
+        session.commit()
+    except Exception as e:
+        logger.error(f"Hurtownia 5min: Błąd aktualizacji księgi miesięcy {ticker}: {e}")
+        session.rollback()
+
+def get_last_bar_time(session: Session, ticker: str) -> Optional[datetime]:
+    return session.execute(
+        text("SELECT MAX(bar_time) FROM intraday_bars_5m WHERE ticker = :t"), {'t': ticker}
+    ).scalar()
+
+def get_last_bar_times(session: Session, tickers: List[str]) -> Dict[str, datetime]:
+    """ticker -> ostatnia świeca w hurtowni (tickery bez świec pomijane) - jedno zapytanie."""
+    if not tickers:
+        return {}
+    rows = session.execute(text("""
+        SELECT ticker, MAX(bar_time) FROM intraday_bars_5m
+        WHERE ticker = ANY(:tickers) GROUP BY ticker
+    """), {'tickers': list(tickers)}).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+def _extended_minutes_between(start: datetime, end: datetime) -> float:
+    """Minuty sesji rozszerzonej (04:00-20:00 NY, dni sesyjne) między dwiema chwilami NY bez strefy."""
+    if end <= start:
+        return 0.0
+    if (end.date() - start.date()).days > GAP_SCAN_MAX_DAYS:
+        return float('inf')
+    minutes = 0.0
+    day = start.date()
+    while day <= end.date():
+        if market_calendar.is_trading_day(day):
+            open_ts = datetime.combine(day, market_calendar.EXTENDED_OPEN)
+            close_ts = datetime.combine(day, market_calendar.EXTENDED_CLOSE)
+            overlap = (min(end, close_ts) - max(start, open_ts)).total_seconds() / 60
+            minutes += max(0.0, overlap)
+        day += timedelta(days=1)
+    return minutes
+
+def sync_call_cost(last_bar: Optional[datetime], now: Optional[datetime] = None) -> int:
+    """
+    Liczba zapytań sync_ticker: pusta baza = od razu pełne okno (1), świece nowsze niż okno
+    'compact' = sam poll (1), starsze (luka) = poll 'compact' + pełne okno (2).
+    """
+    if last_bar is None:
+        return 1
+    return 2 if _extended_minutes_between(last_bar, now or _now_ny()) > COMPACT_BARS * 5 else 1
+
+def sync_ticker(session: Session, api_client: AlphaVantageClient, ticker: str) -> int:
+    """
+    Dopisuje najnowsze świece tickera. Najpierw tani poll 'compact';
+    pełne okno (30 dni) tylko przy pustej bazie lub wykrytej luce.
+    Zwraca liczbę zapisanych świec.
+    """
+    last_bar = get_last_bar_time(session, ticker)
+    df = None
+
+    if last_bar is not None:
+        df = parse_intraday_json(api_client.get_intraday(ticker, interval=INTERVAL_5MIN, outputsize='compact'))
+        if df is not None and not df.empty and df.index.min() > last_bar:
+            logger.info(f"Hurtownia 5min: Luka w danych {ticker} (ostatnia {last_bar}) - pobieram pełne okno.")
+            df = None
+
+    if df is None:
+        df = parse_intraday_json(api_client.get_intraday(ticker, interval=INTERVAL_5MIN, outputsize='full'))
+
+    if df is None or df.empty:
+        # Throttle / błąd / pusta odpowiedź - bez wpisu w księdze, żeby TTL nie blokował ponowienia
+        logger.warning(f"Hurtownia 5min: Brak danych dla {ticker} - synchronizacja nie zapisana.")
+        return 0
+
+    saved = store_bars(session, ticker, df)
+    months = {_month_key(_now_ny())}
+    months.update(_month_key(ts) for ts in df.index)
+    _record_months(session, ticker, sorted(months))
+    return saved
+
+def month_range(start: datetime, end: datetime) -> List[str]:
+    """Lista miesięcy 'YYYY-MM' pokrywających [start, end]."""
+    months = []
+    cursor = datetime(start.year, start.month, 1)
+    while cursor <= end:
+        months.append(_month_key(cursor))
+        cursor = (cursor + timedelta(days=32)).replace(day=1)
+    return months
+
+def backfill_month(
+    session: Session,
+    api_client: AlphaVantageClient,
+    ticker: str,
+    month: str,
+    refresh_hours: float = MONTH_REFRESH_HOURS
+) -> int:
+    """
+    Uzupełnia jeden miesiąc historii ('YYYY-MM'). Miesiące zamknięte (is_final)
+    są pomijane bez zapytania do API, a otwarte (bieżący / bez danych) odświeżane
+    najwyżej raz na `refresh_hours`. Zwraca liczbę świec miesiąca w hurtowni.
+    """
+    row = session.execute(text("""
+        SELECT is_final, bar_count, last_fetched >= NOW() - make_interval(secs => :ttl)
+        FROM intraday_months
+        WHERE ticker = :t AND interval = :i AND month = :m
+    """), {'t': ticker, 'i': INTERVAL_5MIN, 'm': month, 'ttl': refresh_hours * 3600}).fetchone()
+    if row and (row[0] or row[2]):
+        return int(row[1] or 0)
+
+    raw = api_client.get_intraday(ticker, interval=INTERVAL_5MIN, outputsize='full', month=month)
+    df = parse_intraday_json(raw)
+    if df is None:
+        # Nieudane pobranie nie trafia do księgi - następny preload spróbuje ponownie
+        logger.warning(f"Hurtownia 5min: Brak danych miesiąca {month} dla {ticker} - backfill nie zapisany.")
+        return 0
+    start, end = _month_bounds(month)
+    df = df[(df.index >= start) & (df.index < end)]
+    store_bars(session, ticker, df)
+
+    # Miesiąc wcześniejszy niż bieżący (NY) już się nie zmieni
+    final = {month} if (not df.empty and month < _month_key(_now_ny())) else set()
+    _record_months(session, ticker, [month], final_months=final)
+    return len(df)
+
+def load_bars(
+    session: Session,
+    ticker: str,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Optional[pd.DataFrame]:
+    """Odczyt świec z zakresu [start, end) - DataFrame OHLCV z indeksem czasu NY, rosnąco."""
+    rows = session.execute(text("""
+        SELECT bar_time, open, high, low, close, volume
+        FROM intraday_bars_5m
+        WHERE ticker = :t
+          AND (CAST(:start AS TIMESTAMP) IS NULL OR bar_time >= :start)
+          AND (CAST(:end AS TIMESTAMP) IS NULL OR bar_time < :end)
+        ORDER BY bar_time
+    """), {'t': ticker, 'start': start, 'end': end}).fetchall()
+    if not rows:
+        return None
+    df = pd.DataFrame(rows, columns=['bar_time', 'open', 'high', 'low', 'close', 'volume'])
+    df.set_index(pd.to_datetime(df.pop('bar_time')), inplace=True)
+    df = df.astype({'open': float, 'high': float, 'low': float, 'close': float, 'volume': float})
+    return df
+
+def get_last_sync(session: Session, ticker: str) -> Optional[datetime]:
+    """Czas ostatniej synchronizacji tickera (bieżący miesiąc NY w księdze intraday_months)."""
+    return session.execute(text("""
+        SELECT last_fetched FROM intraday_months
+        WHERE ticker = :t AND interval = :i AND month = :m
+    """), {'t': ticker, 'i': INTERVAL_5MIN, 'm': _month_key(_now_ny())}).scalar()
+
+def ensure_synced(
+    session: Session,
+    api_client: AlphaVantageClient,
+    ticker: str,
+    expiry_hours: float = 1
+) -> Optional[datetime]:
+    """
+    Synchronizuje ticker, jeśli ostatni sync jest starszy niż `expiry_hours`
+    (TTL albo brak sesji od syncu - wspólna reguła z cache). Zwraca czas ostatniego syncu.
+    """
+    last_sync = get_last_sync(session, ticker)
+    if is_cache_entry_fresh(last_sync, expiry_hours, data_type=DATA_TYPE_5MIN):
+        return last_sync
+    try:
+        sync_ticker(session, api_client, ticker)
+    except Exception as e:
+        logger.error(f"Hurtownia 5min: Błąd synchronizacji {ticker}: {e}")
+        session.rollback()
+        return last_sync
+    return get_last_sync(session, ticker)
+
+def get_stale_tickers(session: Session, tickers: List[str], expiry_hours: float) -> List[str]:
+    """Tickery, których ostatnia synchronizacja (bieżący miesiąc NY) nie jest już świeża - jedno zapytanie."""
+    if not tickers:
+        return []
+    rows = session.execute(text("""
+        SELECT ticker, last_fetched FROM intraday_months
+        WHERE ticker = ANY(:tickers) AND interval = :i AND month = :m
+    """), {'tickers': list(tickers), 'i': INTERVAL_5MIN, 'm': _month_key(_now_ny())}).fetchall()
+    fresh = {r[0] for r in rows if is_cache_entry_fresh(r[1], expiry_hours, data_type=DATA_TYPE_5MIN)}
+    return [t for t in tickers if t not in fresh]
+
+def get_final_months(session: Session, tickers: List[str]) -> Set[tuple]:
+    """Zbiór (ticker, 'YYYY-MM') miesięcy zamkniętych w hurtowni."""
+    if not tickers:
+        return set()
+    rows = session.execute(text("""
+        SELECT ticker, month FROM intraday_months
+        WHERE ticker = ANY(:tickers) AND interval = :i AND is_final
+    """), {'tickers': list(tickers), 'i': INTERVAL_5MIN}).fetchall()
+    return {(r[0], r[1]) for r in rows}
+
+def get_recent_bars(
+    session: Session,
+    api_client: AlphaVantageClient,
+    ticker: str,
+    expiry_hours: float = 1,
+    days: int = DEFAULT_WINDOW_DAYS
+) -> Optional[pd.DataFrame]:
+    """
+    Ostatnie `days` dni świec 5min. Jeśli ostatnia synchronizacja tickera
+    jest starsza niż `expiry_hours` - najpierw przyrostowy sync z API.
+    """
+    ensure_synced(session, api_client, ticker, expiry_hours)
+    return load_recent_bars(session, ticker, days)
+
+def load_recent_bars(session: Session, ticker: str, days: int = DEFAULT_WINDOW_DAYS) -> Optional[pd.DataFrame]:
+    """Ostatnie `days` dni świec 5min z hurtowni (bez synchronizacji)."""
+    return load_bars(session, ticker, start=_now_ny() - timedelta(days=days))
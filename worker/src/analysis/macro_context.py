@@ -0,0 +1,223 @@
+import logging
+import threading
+import pandas as pd
+from dataclasses import dataclass, field
+from datetime import date, datetime, timezone
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, Optional
+
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from . import daily_data
+from . import market_calendar
+from .utils import is_cache_entry_fresh
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# KONTEKST MAKRO (macro_series + QQQ, wspólny dla Fazy 0 i silników AQM)
+# ==================================================================
+# Faza 0 pobierała pełną historię QQQ i rentowność 10Y bez cache przy każdym uruchomieniu,
+# a optymalizator i backtest ładowały inflację / stopy / rentowność osobno dla każdego zadania.
+# Teraz serie makro żyją w tabeli macro_series i są odświeżane wg własnego rytmu publikacji
+# (miesięczne / roczne - dopiero gdy może istnieć nowa obserwacja), QQQ idzie przez DAILY_ADJUSTED
+# (świeżość wg kalendarza NYSE). Gotowy kontekst (serie dzienne z ffill) trzymamy w pamięci
+# procesu do następnej publikacji świecy dziennej - skoring live dostaje prawdziwe makro za darmo.
+
+BENCHMARK_TICKER = 'QQQ'
+
+FREQ_MONTHLY = 'monthly'
+FREQ_ANNUAL = 'annual'
+
+RETRY_HOURS = 24              # Po terminie publikacji pytamy AV najwyżej raz dziennie
+MAX_AGE_DAYS = 35             # Rewizje danych - pełne odświeżenie co najmniej raz na ~miesiąc
+
+@dataclass(frozen=True)
+class MacroSpec:
+    api_func: str
+    params: Dict = field(default_factory=dict)
+    frequency: str = FREQ_MONTHLY
+
+# Klucze = series_id w macro_series (te same nazwy co dawne klucze alpha_vantage_cache)
+MACRO_SERIES = {
+    'INFLATION': MacroSpec('get_inflation_rate', frequency=FREQ_ANNUAL),
+    'TREASURY_YIELD': MacroSpec('get_treasury_yield', {'interval': 'monthly', 'maturity': '10year'}),
+    'FEDERAL_FUNDS_RATE': MacroSpec('get_fed_funds_rate', {'interval': 'monthly'}),
+    'UNEMPLOYMENT': MacroSpec('get_unemployment'),
+}
+
+# series_id -> klucz w słowniku macro_data silnika AQM (aqm_v4_logic.calculate_aqm_full_vector)
+MACRO_DATA_KEYS = {
+    'INFLATION': 'inflation_series',
+    'TREASURY_YIELD': 'yield_series',
+    'FEDERAL_FUNDS_RATE': 'fed_rate_series',
+    'UNEMPLOYMENT': 'unemployment_series',
+}
+
+# --- Rytm publikacji ---
+
+def _add_months(d: date, months: int) -> date:
+    m = d.month - 1 + months
+    return date(d.year + m // 12, m % 12 + 1, 1)
+
+def next_release_due(latest: Optional[date], frequency: str) -> Optional[date]:
+    """
+    Najwcześniejszy dzień, w którym AV może mieć obserwację nowszą niż 'latest'.
+    Obserwacja miesiąca M (data M-01) ukazuje się w miesiącu M+1, kolejna - od M+2;
+    roczna za rok R ukazuje się w R+1, kolejna - od R+2.
+    """
+    if latest is None:
+        return None
+    if frequency == FREQ_ANNUAL:
+        return date(latest.year + 2, 1, 1)
+    return _add_months(latest, 2)
+
+def is_series_fresh(latest: Optional[date], last_fetched: Optional[datetime], frequency: str, now: Optional[datetime] = None) -> bool:
+    """Seria jest świeża, jeśli nie minął termin kolejnej publikacji (lub pytaliśmy AV w ostatniej dobie)."""
+    if last_fetched is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    if not is_cache_entry_fresh(last_fetched, MAX_AGE_DAYS * 24, now=now):
+        return False
+    if is_cache_entry_fresh(last_fetched, RETRY_HOURS, now=now):
+        return True
+    due = next_release_due(latest, frequency)
+    return due is not None and now.date() < due
+
+# --- Synchronizacja macro_series ---
+
+def _parse_observations(raw_data: Optional[dict]) -> Dict[date, float]:
+    observations = {}
+    for item in (raw_data or {}).get('data', []) or []:
+        try:
+            observations[date.fromisoformat(str(item.get('date'))[:10])] = float(item.get('value'))
+        except (TypeError, ValueError):
+            continue   # AV oznacza brak wartości jako '.'
+    return observations
+
+def get_sync_state(session: Session) -> Dict[str, tuple]:
+    """series_id -> (latest_date, last_fetched)."""
+    rows = session.execute(text("SELECT series_id, latest_date, last_fetched FROM macro_sync")).fetchall()
+    return {r[0]: (r[1], r[2]) for r in rows}
+
+def sync_series(session: Session, api_client: AlphaVantageClient, series_id: str) -> int:
+    """Pobiera całą serię (AV nie ma zapytań przyrostowych dla makro) i upsertuje obserwacje."""
+    spec = MACRO_SERIES[series_id]
+    raw_data = getattr(api_client, spec.api_func)(**spec.params)
+    if not raw_data or (isinstance(raw_data, dict) and (raw_data.get('Error Message') or raw_data.get('Information'))):
+        return 0
+    observations = _parse_observations(raw_data)
+    if not observations:
+        return 0
+    try:
+        session.execute(text("""
+            INSERT INTO macro_series (series_id, obs_date, value, loaded_at)
+            VALUES (:series_id, :obs_date, :value, NOW())
+            ON CONFLICT (series_id, obs_date) DO UPDATE SET value = EXCLUDED.value, loaded_at = NOW()
+            WHERE macro_series.value IS DISTINCT FROM EXCLUDED.value
+        """), [{'series_id': series_id, 'obs_date': d, 'value': v} for d, v in observations.items()])
+        session.execute(text("""
+            INSERT INTO macro_sync (series_id, latest_date, last_fetched) VALUES (:series_id, :latest, NOW())
+            ON CONFLICT (series_id) DO UPDATE SET latest_date = EXCLUDED.latest_date, last_fetched = NOW()
+        """), {'series_id': series_id, 'latest': max(observations)})
+        session.commit()
+    except Exception as e:
+        logger.error(f"Makro: Błąd zapisu serii {series_id}: {e}")
+        session.rollback()
+        return 0
+    return len(observations)
+
+def refresh_macro_series(session: Session, api_client: AlphaVantageClient, force: bool = False) -> int:
+    """Odświeża serie, dla których minął termin publikacji. Zwraca liczbę zapytań do AV."""
+    state = get_sync_state(session)
+    calls = 0
+    for series_id, spec in MACRO_SERIES.items():
+        latest, last_fetched = state.get(series_id, (None, None))
+        if not force and is_series_fresh(latest, last_fetched, spec.frequency):
+            continue
+        try:
+            sync_series(session, api_client, series_id)
+        except Exception as e:
+            logger.error(f"Makro: Błąd odświeżania {series_id}: {e}")
+            session.rollback()
+        calls += 1
+    return calls
+
+def load_macro_series(session: Session) -> Dict[str, pd.Series]:
+    """series_id -> seria obserwacji (indeks: data, rosnąco)."""
+    rows = session.execute(text("""
+        SELECT series_id, obs_date, value FROM macro_series
+        WHERE series_id = ANY(:ids) ORDER BY series_id, obs_date
+    """), {'ids': list(MACRO_SERIES)}).fetchall()
+    result = {sid: pd.Series(dtype=float) for sid in MACRO_SERIES}
+    if not rows:
+        return result
+    df = pd.DataFrame(rows, columns=['series_id', 'obs_date', 'value'])
+    df['obs_date'] = pd.to_datetime(df['obs_date'])
+    df['value'] = df['value'].astype(float)
+    for sid, group in df.groupby('series_id'):
+        result[sid] = group.set_index('obs_date')['value']
+    return result
+
+def _daily_ffill(series: pd.Series, end: pd.Timestamp) -> pd.Series:
+    """Obserwacje -> seria dzienna (każdy dzień kalendarzowy) z ostatnią znaną wartością."""
+    if series.empty:
+        return series
+    days = pd.date_range(series.index[0], max(end, series.index[-1]), freq='D')
+    return series.reindex(days).ffill()
+
+# --- Kontekst w pamięci ---
+
+@dataclass
+class MacroContext:
+    qqq_df: pd.DataFrame                 # QQQ as-traded (+ 'adjusted close'), indeks bez strefy
+    series: Dict[str, pd.Series]         # series_id -> seria dzienna (ffill)
+    loaded_at: datetime
+
+    def latest(self, series_id: str) -> Optional[float]:
+        s = self.series.get(series_id)
+        return float(s.iloc[-1]) if s is not None and not s.empty else None
+
+    def aligned(self, index: pd.DatetimeIndex) -> pd.DataFrame:
+        """Wszystkie serie wyrównane do indeksu (wartość obowiązująca w danym dniu)."""
+        return pd.DataFrame({
+            sid: (s.reindex(index, method='ffill') if not s.empty else pd.Series(float('nan'), index=index))
+            for sid, s in self.series.items()
+        }, index=index)
+
+    def macro_data(self) -> dict:
+        """Słownik macro_data dla aqm_v4_logic.calculate_aqm_full_vector (serie -> asof per dzień)."""
+        data = {'qqq_df': self.qqq_df}
+        for sid, key in MACRO_DATA_KEYS.items():
+            data[key] = self.series.get(sid, pd.Series(dtype=float))
+        return data
+
+_CONTEXT: Optional[MacroContext] = None
+_CONTEXT_LOCK = threading.Lock()
+
+def _is_context_current(ctx: Optional[MacroContext], now: datetime) -> bool:
+    # Nowa świeca QQQ (a z nią ewentualnie nowe makro) pojawia się dopiero po publikacji dziennej
+    return ctx is not None and market_calendar.unchanged_since(daily_data.DAILY_DATA_TYPE, ctx.loaded_at, now)
+
+def build_macro_context(session: Session, api_client: AlphaVantageClient) -> MacroContext:
+    refresh_macro_series(session, api_client)
+    qqq_df = daily_data.load_daily_frames(session, api_client, BENCHMARK_TICKER).raw
+    end = pd.Timestamp(datetime.now(timezone.utc).date())
+    series = {sid: _daily_ffill(s, end) for sid, s in load_macro_series(session).items()}
+    return MacroContext(qqq_df=qqq_df, series=series, loaded_at=datetime.now(timezone.utc))
+
+def get_macro_context(session: Session, api_client: AlphaVantageClient, force: bool = False) -> MacroContext:
+    """Kontekst makro z pamięci procesu; przebudowa po publikacji nowej świecy dziennej (lub force)."""
+    global _CONTEXT
+    now = datetime.now(timezone.utc)
+    with _CONTEXT_LOCK:
+        if not force and _is_context_current(_CONTEXT, now):
+            return _CONTEXT
+        try:
+            _CONTEXT = build_macro_context(session, api_client)
+        except Exception as e:
+            logger.error(f"Makro: Błąd budowy kontekstu: {e}", exc_info=True)
+            session.rollback()
+            if _CONTEXT is None:
+                return MacroContext(qqq_df=pd.DataFrame(), series={sid: pd.Series(dtype=float) for sid in MACRO_SERIES}, loaded_at=now)
+        return _CONTEXT
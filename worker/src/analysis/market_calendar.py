@@ -0,0 +1,185 @@
+import logging
+import pytz
+from datetime import datetime, date, time, timedelta, timezone
+from functools import lru_cache
+from typing import Dict, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# KALENDARZ SESJI NYSE (świeżość cache wg rynku, nie wg zegara)
+# ==================================================================
+# Dane rynkowe zmieniają się tylko wtedy, gdy giełda pracuje. Zamiast stałego TTL
+# w godzinach pytamy: "czy od chwili pobrania mogły pojawić się nowe dane?".
+#   - dane dzienne: nowa świeca pojawia się po zamknięciu sesji + opóźnienie publikacji AV,
+#   - intraday: nowe świece powstają tylko w oknie handlu rozszerzonego (04:00-20:00 NY) dni sesyjnych.
+# Dane pobrane w piątek wieczorem są więc świeże do poniedziałkowego zamknięcia, a w święta
+# (i w nocy dla intraday) nie odświeżamy niczego. Święta liczone regułami NYSE (bez zależności).
+
+NY_TZ = pytz.timezone('America/New_York')
+
+REGULAR_OPEN = time(9, 30)
+REGULAR_CLOSE = time(16, 0)
+EARLY_CLOSE = time(13, 0)
+EXTENDED_OPEN = time(4, 0)       # Pre-market (AV intraday z extended_hours)
+EXTENDED_CLOSE = time(20, 0)     # After-market
+
+DAILY_PUBLISH_LAG = timedelta(minutes=30)   # Ile po zamknięciu AV publikuje świecę dzienną
+
+# Typy danych w alpha_vantage_cache z regułą kalendarzową (pozostałe - zwykły TTL)
+POLICY_DAILY = 'DAILY'
+POLICY_INTRADAY = 'INTRADAY'
+DAILY_DATA_TYPES = {'DAILY_ADJUSTED', 'DAILY_OHLCV', 'WEEKLY_ADJUSTED', 'OBV', 'BBANDS'}
+INTRADAY_DATA_PREFIX = 'INTRADAY'
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    """n-ty (1..) dzień tygodnia w miesiącu; n=-1 = ostatni."""
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month, 28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+def _easter(year: int) -> date:
+    """Niedziela Wielkanocna (algorytm Meeusa/Jonesa/Butchera, kalendarz gregoriański)."""
+    a = year % 19
+    b, c = divmod(year, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month, day = divmod(h + l - 7 * m + 114, 31)
+    return date(year, month, day + 1)
+
+def _observed(d: date) -> date:
+    """Święto w sobotę -> piątek, w niedzielę -> poniedziałek (reguła NYSE)."""
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+@lru_cache(maxsize=64)
+def nyse_holidays(year: int) -> Dict[date, str]:
+    """Dni bez sesji NYSE w danym roku (data -> nazwa)."""
+    holidays = {
+        _nth_weekday(year, 1, 0, 3): "Martin Luther King Jr. Day",
+        _nth_weekday(year, 2, 0, 3): "Presidents' Day",
+        _easter(year) - timedelta(days=2): "Good Friday",
+        _nth_weekday(year, 5, 0, -1): "Memorial Day",
+        _observed(date(year, 7, 4)): "Independence Day",
+        _nth_weekday(year, 9, 0, 1): "Labor Day",
+        _nth_weekday(year, 11, 3, 4): "Thanksgiving Day",
+        _observed(date(year, 12, 25)): "Christmas Day",
+    }
+    # Nowy Rok w sobotę nie przesuwa się na piątek 31.12 (NYSE nie zamyka roku bez sesji)
+    new_year = date(year, 1, 1)
+    if new_year.weekday() != 5:
+        holidays[_observed(new_year)] = "New Year's Day"
+    if year >= 2022:
+        holidays[_observed(date(year, 6, 19))] = "Juneteenth"
+    return holidays
+
+@lru_cache(maxsize=64)
+def early_closes(year: int) -> Set[date]:
+    """Sesje skrócone (zamknięcie 13:00): 3 lipca, piątek po Święcie Dziękczynienia, Wigilia."""
+    candidates = {
+        date(year, 7, 3),
+        _nth_weekday(year, 11, 3, 4) + timedelta(days=1),
+        date(year, 12, 24),
+    }
+    return {d for d in candidates if d.weekday() < 5 and d not in nyse_holidays(year)}
+
+def is_trading_day(d: date) -> bool:
+    return d.weekday() < 5 and d not in nyse_holidays(d.year)
+
+def next_trading_day(d: date) -> date:
+    """Najbliższy dzień sesyjny PO dniu d."""
+    d += timedelta(days=1)
+    while not is_trading_day(d):
+        d += timedelta(days=1)
+    return d
+
+def previous_trading_day(d: date) -> date:
+    """Ostatni dzień sesyjny PRZED dniem d."""
+    d -= timedelta(days=1)
+    while not is_trading_day(d):
+        d -= timedelta(days=1)
+    return d
+
+def session_close(d: date) -> datetime:
+    """Zamknięcie sesji regularnej dnia d (aware, NY)."""
+    close = EARLY_CLOSE if d in early_closes(d.year) else REGULAR_CLOSE
+    return NY_TZ.localize(datetime.combine(d, close))
+
+def _to_ny(ts: datetime) -> datetime:
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.astimezone(NY_TZ)
+
+def ny_date(ts: Optional[datetime] = None) -> date:
+    """Data w Nowym Jorku dla chwili 'ts' (domyślnie teraz)."""
+    return _to_ny(ts or datetime.now(timezone.utc)).date()
+
+def is_session_open(ts: Optional[datetime] = None) -> bool:
+    """Czy w chwili 'ts' (domyślnie teraz) trwa sesja regularna NYSE."""
+    ny = _to_ny(ts or datetime.now(timezone.utc))
+    if not is_trading_day(ny.date()):
+        return False
+    return NY_TZ.localize(datetime.combine(ny.date(), REGULAR_OPEN)) <= ny < session_close(ny.date())
+
+def next_daily_publication(after: datetime) -> datetime:
+    """Pierwsza publikacja świecy dziennej (zamknięcie + opóźnienie AV) później niż 'after' (UTC)."""
+    ny = _to_ny(after)
+    d = ny.date() if is_trading_day(ny.date()) else next_trading_day(ny.date())
+    while session_close(d) + DAILY_PUBLISH_LAG <= ny:
+        d = next_trading_day(d)
+    return (session_close(d) + DAILY_PUBLISH_LAG).astimezone(timezone.utc)
+
+def next_intraday_activity(after: datetime) -> datetime:
+    """
+    Pierwsza chwila >= 'after', w której mogą powstawać nowe świece intraday (okno 04:00-20:00 NY).
+    W trakcie okna zwraca 'after' (dane mogą się zmieniać w każdej chwili).
+    """
+    ny = _to_ny(after)
+    d = ny.date()
+    if is_trading_day(d):
+        start = NY_TZ.localize(datetime.combine(d, EXTENDED_OPEN))
+        end = NY_TZ.localize(datetime.combine(d, EXTENDED_CLOSE))
+        if ny < start:
+            return start.astimezone(timezone.utc)
+        if ny < end:
+            return after if after.tzinfo else after.replace(tzinfo=timezone.utc)
+    nxt = next_trading_day(d)
+    return NY_TZ.localize(datetime.combine(nxt, EXTENDED_OPEN)).astimezone(timezone.utc)
+
+def freshness_policy(data_type: Optional[str]) -> Optional[str]:
+    if not data_type:
+        return None
+    if data_type in DAILY_DATA_TYPES:
+        return POLICY_DAILY
+    if data_type.startswith(INTRADAY_DATA_PREFIX):
+        return POLICY_INTRADAY
+    return None
+
+def unchanged_since(data_type: Optional[str], fetched_at: datetime, now: Optional[datetime] = None) -> bool:
+    """
+    True, jeśli od 'fetched_at' rynek nie mógł wyprodukować nowych danych tego typu
+    (brak publikacji dziennej / brak okna handlu intraday). Typy bez reguły -> False.
+    """
+    policy = freshness_policy(data_type)
+    if policy is None or fetched_at is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+    if now.tzinfo is None:
+        now = now.replace(tzinfo=timezone.utc)
+    try:
+        if policy == POLICY_DAILY:
+            return now < next_daily_publication(fetched_at)
+        return now < next_intraday_activity(fetched_at)
+    except Exception as e:
+        logger.error(f"Kalendarz rynku: Błąd reguły świeżości {data_type}: {e}")
+        return False
@@ -11,13 +11,11 @@ from sqlalchemy import text
 # === IMPORTY ===
 from .. import models
 from . import utils
+from .news_firehose import ingest_news_firehose, get_news_for_tickers
 
 logger = logging.getLogger(__name__)
 
 # === KONFIGURACJA ===
-TARGET_RPM = 100  
-REQUEST_INTERVAL = 60.0 / TARGET_RPM  
-
 # Szerokie okno czasowe (60 min) eliminuje "ślepe plamki" przy restarcie workera
 LOOKBACK_WINDOW_MINUTES = 60  
 
@@ -59,7 +57,7 @@ class NewsScout:
                 logger.error(f"NEWS AGENT: Błąd pobierania listy Fazy X: {e}")
                 tickers = []
 
-        msg_start = f"NEWS: Start skanowania Fazy X ({len(tickers)} tickerów, {TARGET_RPM} RPM, Window: {LOOKBACK_WINDOW_MINUTES}m)..."
+        msg_start = f"NEWS: Start skanowania Fazy X ({len(tickers)} tickerów, Firehose, Window: {LOOKBACK_WINDOW_MINUTES}m)..."
         logger.info(msg_start)
         utils.append_scan_log(self.session, msg_start)
 
@@ -67,15 +65,22 @@ class NewsScout:
             utils.append_scan_log(self.session, "NEWS: Brak tickerów w Fazie X. Kończę pracę.")
             return
 
-        # 2. Okno czasowe
+        # 2. Firehose: kilka zapytań na cały rynek zamiast jednego na ticker
+        try:
+            ingest_news_firehose(self.session, self.api_client)
+        except Exception as e:
+            logger.error(f"NEWS AGENT: Błąd firehose: {e}")
+            self.session.rollback()
+            self.stats["errors"] += 1
+
+        # 3. Okno czasowe + odczyt artykułów z bazy (jedno zapytanie dla całej listy)
         time_from_dt = datetime.now(timezone.utc) - timedelta(minutes=LOOKBACK_WINDOW_MINUTES)
-        time_from_str = time_from_dt.strftime('%Y%m%dT%H%M')
+        news_by_ticker = get_news_for_tickers(self.session, tickers, time_from_dt)
 
-        # 3. Iteracja
+        # 4. Iteracja
         for i, ticker in enumerate(tickers):
-            step_start = time.time()
             try:
-                self._process_ticker(ticker, time_from_str)
+                self._process_ticker(ticker, news_by_ticker.get(ticker, []))
             except Exception as e:
                 logger.error(f"Błąd przetwarzania newsów dla {ticker}: {e}")
                 self.stats["errors"] += 1
@@ -86,12 +91,6 @@ class NewsScout:
             if (i + 1) % 20 == 0:
                 progress_msg = f"NEWS: Przeanalizowano {i + 1}/{len(tickers)}..."
                 utils.append_scan_log(self.session, progress_msg)
-            
-            # Pacing
-            elapsed = time.time() - step_start
-            sleep_time = max(0, REQUEST_INTERVAL - elapsed)
-            if sleep_time > 0:
-                time.sleep(sleep_time)
 
         duration = time.time() - start_time
         
@@ -110,19 +109,8 @@ class NewsScout:
         logger.info(msg_end)
         utils.append_scan_log(self.session, msg_end)
 
-    def _process_ticker(self, ticker: str, time_from: str):
-        """Pobiera i analizuje newsy."""
-        # FIX 1: Sortowanie LATEST (kluczowe dla wyłapania świeżych newsów)
-        data = self.api_client.get_news_sentiment(
-            ticker=ticker,
-            limit=50,
-            time_from=time_from
-        ) # Parametr sort='LATEST' jest już dodany w metodzie get_news_sentiment w alpha_vantage_client.py
-
-        if not data or "feed" not in data:
-            return
-
-        feed = data.get("feed", [])
+    def _process_ticker(self, ticker: str, feed: list):
+        """Analizuje newsy tickera (artykuły z firehose, od najnowszych)."""
         for article in feed:
             self._analyze_article(ticker, article)
 
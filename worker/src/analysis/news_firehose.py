@@ -0,0 +1,268 @@
+import logging
+import hashlib
+import json
+from datetime import datetime, timezone, timedelta
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional, Tuple
+
+from ..config import NEWS_FIREHOSE_TOPICS
+from . import utils
+from . import daily_sentiment
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# FIREHOSE NEWSÓW (NEWS_SENTIMENT całego rynku -> news_articles)
+# ==================================================================
+# Zamiast jednego zapytania NEWS_SENTIMENT na ticker pobieramy strumień całego
+# rynku od znacznika 'time_from' (watermark w system_control), a artykuły
+# rozprowadzamy na tickery wg ich listy 'ticker_sentiment'.
+# Strony idą w przód (sort=EARLIEST), więc po limicie stron watermark staje na najnowszym
+# pobranym artykule - pokrycie jest ciągłe, a następny cykl podejmuje strumień od tego miejsca.
+# Konsumenci (NewsScout, SDAR) czytają już tylko z bazy.
+# Historia pojedynczego tickera (cechy H2) trafia do tych samych tabel (sync_ticker_news),
+# a każdy zapis odświeża dzienne agregaty daily_sentiment dotkniętych par (ticker, dzień).
+
+WATERMARK_KEY = 'news_firehose_watermark'
+FEED_LIMIT = 1000                    # Maksimum AV na jedno zapytanie
+MAX_PAGES_PER_STREAM = 10            # Strona = przesunięcie 'time_from' na najnowszy pobrany artykuł
+WATERMARK_OVERLAP_MINUTES = 5        # Zakładka na artykuły publikowane z opóźnieniem
+INITIAL_LOOKBACK_HOURS = 48          # Pierwsze uruchomienie: okno SPD (SDAR) = 48h
+TICKER_HISTORY_LIMIT = 1000          # Historia tickera dla H2 (jak dawny NEWS_SENTIMENT_FULL_HISTORY)
+TICKER_SYNC_OVERLAP_HOURS = 24       # Zakładka przyrostowego sync historii tickera
+
+AV_TIME_FORMAT = '%Y%m%dT%H%M%S'
+AV_QUERY_FORMAT = '%Y%m%dT%H%M'
+
+def _article_hash(url: str, title: str, source: str) -> str:
+    """Ten sam klucz co deduplikacja NewsScout (MD5 url|title|source)."""
+    raw_str = f"{url}|{title}|{source}"
+    return hashlib.md5(raw_str.encode('utf-8')).hexdigest()
+
+def _parse_time(value: Optional[str]) -> Optional[datetime]:
+    try:
+        return datetime.strptime(value, AV_TIME_FORMAT).replace(tzinfo=timezone.utc)
+    except (TypeError, ValueError):
+        return None
+
+def _safe_num(value) -> Optional[float]:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+def _fetch_stream(api_client, topics: Optional[str], time_from: datetime) -> Tuple[List[dict], Optional[datetime]]:
+    """
+    Pobiera strumień od 'time_from' stronami w przód (sort=EARLIEST) - gdy AV ucina wynik do FEED_LIMIT,
+    następna strona zaczyna się od najnowszego pobranego artykułu.
+    Zwraca (artykuły, granica pokrycia): granica = None gdy strumień pobrany do końca, inaczej
+    najnowszy pobrany artykuł (limit stron) - dalej watermark przesuwać nie wolno.
+    """
+    articles = []
+    cursor = time_from
+    for _ in range(MAX_PAGES_PER_STREAM):
+        data = api_client.get_news_feed(
+            topics=topics,
+            time_from=cursor.strftime(AV_QUERY_FORMAT),
+            limit=FEED_LIMIT,
+            sort='EARLIEST'
+        )
+        feed = (data or {}).get('feed') or []
+        articles.extend(feed)
+        if len(feed) < FEED_LIMIT:
+            return articles, None
+
+        newest = max((t for t in (_parse_time(a.get('time_published')) for a in feed) if t), default=None)
+        if newest is None or newest <= cursor:
+            # Pełna strona z jednej minuty - dalej nie przesuniemy kursora
+            return articles, cursor
+        cursor = newest
+    return articles, cursor
+
+def _save_articles(session: Session, articles: List[dict]) -> int:
+    """Upsert artykułów i ich rozprowadzenia na tickery. Zwraca liczbę unikalnych artykułów."""
+    article_rows = {}
+    ticker_rows = {}
+    sentiment_days = set()
+    for a in articles:
+        published = _parse_time(a.get('time_published'))
+        if published is None:
+            continue
+        h = _article_hash(a.get('url'), a.get('title', ''), a.get('source', ''))
+        article_rows[h] = {
+            'article_hash': h,
+            'url': a.get('url'),
+            'title': a.get('title'),
+            'source': a.get('source'),
+            'summary': a.get('summary'),
+            'time_published': published,
+            'overall_sentiment_score': _safe_num(a.get('overall_sentiment_score')),
+            'overall_sentiment_label': a.get('overall_sentiment_label'),
+            'topics': json.dumps(a.get('topics', []))
+        }
+        for ts in a.get('ticker_sentiment', []) or []:
+            ticker = ts.get('ticker')
+            if not ticker:
+                continue
+            ticker_rows[(h, ticker)] = {
+                'article_hash': h,
+                'ticker': ticker,
+                'time_published': published,
+                'relevance_score': _safe_num(ts.get('relevance_score')),
+                'ticker_sentiment_score': _safe_num(ts.get('ticker_sentiment_score')),
+                'ticker_sentiment_label': ts.get('ticker_sentiment_label')
+            }
+            sentiment_days.add((ticker, published.date()))
+
+    if not article_rows:
+        return 0
+
+    try:
+        session.execute(text("""
+            INSERT INTO news_articles (article_hash, url, title, source, summary, time_published,
+                                       overall_sentiment_score, overall_sentiment_label, topics)
+            VALUES (:article_hash, :url, :title, :source, :summary, :time_published,
+                    :overall_sentiment_score, :overall_sentiment_label, CAST(:topics AS JSONB))
+            ON CONFLICT (article_hash) DO UPDATE SET
+                overall_sentiment_score = EXCLUDED.overall_sentiment_score,
+                overall_sentiment_label = EXCLUDED.overall_sentiment_label
+        """), list(article_rows.values()))
+        if ticker_rows:
+            # Dostawca potrafi skorygować sentyment - NewsScout wykrywa to jako "UPDATE"
+            session.execute(text("""
+                INSERT INTO news_ticker_sentiment (article_hash, ticker, time_published, relevance_score,
+                                                   ticker_sentiment_score, ticker_sentiment_label)
+                VALUES (:article_hash, :ticker, :time_published, :relevance_score,
+                        :ticker_sentiment_score, :ticker_sentiment_label)
+                ON CONFLICT (article_hash, ticker) DO UPDATE SET
+                    relevance_score = EXCLUDED.relevance_score,
+                    ticker_sentiment_score = EXCLUDED.ticker_sentiment_score,
+                    ticker_sentiment_label = EXCLUDED.ticker_sentiment_label
+            """), list(ticker_rows.values()))
+            daily_sentiment.refresh_daily_sentiment(session, sentiment_days)
+        session.commit()
+    except Exception as e:
+        logger.error(f"NEWS FIREHOSE: Błąd zapisu artykułów: {e}")
+        session.rollback()
+        return 0
+    return len(article_rows)
+
+def ingest_news_firehose(session: Session, api_client) -> int:
+    """
+    Jeden cykl firehose: strumień(e) od watermarku, zapis do news_articles,
+    przesunięcie watermarku na najnowszy artykuł (przy limicie stron - na granicę pokrycia).
+    Zwraca liczbę zapisanych artykułów.
+    """
+    now = datetime.now(timezone.utc)
+    watermark = _parse_time(utils.get_system_control_value(session, WATERMARK_KEY))
+    if watermark is None:
+        watermark = now - timedelta(hours=INITIAL_LOOKBACK_HOURS)
+    time_from = watermark - timedelta(minutes=WATERMARK_OVERLAP_MINUTES)
+
+    streams = NEWS_FIREHOSE_TOPICS or [None]
+    articles = []
+    coverage_limits = []
+    for topics in streams:
+        try:
+            stream_articles, covered_until = _fetch_stream(api_client, topics, time_from)
+        except Exception as e:
+            logger.error(f"NEWS FIREHOSE: Błąd pobierania strumienia ({topics or 'ALL'}): {e}")
+            continue
+        articles.extend(stream_articles)
+        if covered_until is not None:
+            coverage_limits.append(covered_until)
+            logger.warning(f"NEWS FIREHOSE: Limit {MAX_PAGES_PER_STREAM} stron ({topics or 'ALL'}) - "
+                           f"pokrycie do {covered_until.strftime(AV_QUERY_FORMAT)}, reszta w następnym cyklu.")
+
+    saved = _save_articles(session, articles)
+
+    newest = max((t for t in (_parse_time(a.get('time_published')) for a in articles) if t), default=None)
+    if coverage_limits and newest:
+        # Strumień ucięty limitem stron: watermark tylko do miejsca, do którego wszystkie strumienie są ciągłe
+        newest = min([newest] + coverage_limits)
+    if saved and newest and newest > watermark:
+        utils.update_system_control(session, WATERMARK_KEY, min(newest, now).strftime(AV_TIME_FORMAT))
+
+    logger.info(f"NEWS FIREHOSE: {saved} artykułów (od {time_from.strftime(AV_QUERY_FORMAT)}, strumienie: {len(streams)}).")
+    return saved
+
+def get_stale_tickers(session: Session, tickers: List[str], expiry_hours: Optional[float] = None) -> List[str]:
+    """Tickery bez pobranej historii newsów lub z pobraniem starszym niż TTL (planer prefetchu)."""
+    if not tickers:
+        return []
+    rows = session.execute(text("""
+        SELECT ticker, last_fetched FROM news_sync WHERE ticker = ANY(:tickers)
+    """), {'tickers': list(tickers)}).fetchall()
+    fetched = {r[0]: r[1] for r in rows}
+    return [t for t in tickers if not utils.is_cache_entry_fresh(fetched.get(t), expiry_hours)]
+
+def sync_ticker_news(session: Session, api_client, ticker: str, expiry_hours: Optional[float] = None, force: bool = False) -> int:
+    """
+    Historia newsów tickera do news_articles (+ agregaty daily_sentiment). Pierwsze pobranie:
+    ostatnie TICKER_HISTORY_LIMIT artykułów, kolejne - tylko od poprzedniego pobrania (z zakładką).
+    Pomija, jeśli ostatnie pobranie jest świeże. Zwraca liczbę zapisanych artykułów.
+    """
+    row = session.execute(text("SELECT last_fetched FROM news_sync WHERE ticker = :ticker"), {'ticker': ticker}).fetchone()
+    last_fetched = row[0] if row else None
+    if not force and utils.is_cache_entry_fresh(last_fetched, expiry_hours):
+        return 0
+
+    time_from = None
+    if last_fetched is not None:
+        time_from = (last_fetched - timedelta(hours=TICKER_SYNC_OVERLAP_HOURS)).astimezone(timezone.utc).strftime(AV_QUERY_FORMAT)
+    data = api_client.get_news_sentiment(ticker, limit=TICKER_HISTORY_LIMIT, time_from=time_from)
+    if not data or not isinstance(data, dict) or data.get('Error Message') or data.get('Information'):
+        return 0
+
+    saved = _save_articles(session, data.get('feed') or [])
+    try:
+        session.execute(text("""
+            INSERT INTO news_sync (ticker, last_fetched) VALUES (:ticker, NOW())
+            ON CONFLICT (ticker) DO UPDATE SET last_fetched = NOW()
+        """), {'ticker': ticker})
+        session.commit()
+    except Exception as e:
+        logger.error(f"NEWS: Błąd zapisu stanu synchronizacji {ticker}: {e}")
+        session.rollback()
+    return saved
+
+def get_news_for_tickers(session: Session, tickers: List[str], since: datetime) -> Dict[str, List[dict]]:
+    """
+    Artykuły z bazy dla listy tickerów (od 'since'), w formacie pozycji 'feed' z AV,
+    z 'ticker_sentiment' zawężonym do danego tickera. Kolejność: od najnowszych.
+    """
+    if not tickers:
+        return {}
+    rows = session.execute(text("""
+        SELECT s.ticker, a.url, a.title, a.source, a.summary, a.time_published,
+               a.overall_sentiment_score, a.overall_sentiment_label, a.topics,
+               s.relevance_score, s.ticker_sentiment_score, s.ticker_sentiment_label
+        FROM news_ticker_sentiment s
+        JOIN news_articles a ON a.article_hash = s.article_hash
+        WHERE s.ticker = ANY(:tickers) AND s.time_published >= :since
+        ORDER BY s.time_published DESC
+    """), {'tickers': list(tickers), 'since': since}).fetchall()
+
+    result: Dict[str, List[dict]] = {}
+    for r in rows:
+        result.setdefault(r[0], []).append({
+            'url': r[1],
+            'title': r[2] or '',
+            'source': r[3] or '',
+            'summary': r[4],
+            'time_published': r[5].astimezone(timezone.utc).strftime(AV_TIME_FORMAT),
+            'overall_sentiment_score': float(r[6]) if r[6] is not None else 0.0,
+            'overall_sentiment_label': r[7] or 'Neutral',
+            'topics': r[8] or [],
+            'ticker_sentiment': [{
+                'ticker': r[0],
+                'relevance_score': str(r[9] if r[9] is not None else 0),
+                'ticker_sentiment_score': str(r[10] if r[10] is not None else 0),
+                'ticker_sentiment_label': r[11] or 'Neutral'
+            }]
+        })
+    return result
+
+def get_ticker_news(session: Session, ticker: str, since: datetime) -> List[dict]:
+    return get_news_for_tickers(session, [ticker], since).get(ticker, [])
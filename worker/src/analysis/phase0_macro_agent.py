@@ -1,12 +1,11 @@
 import logging
 import pandas as pd
-import numpy as np
-from datetime import datetime
 from sqlalchemy.orm import Session
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
 from ..analysis.utils import (
     append_scan_log, update_system_control
 )
+from . import macro_context
 
 logger = logging.getLogger(__name__)
 
@@ -20,43 +19,37 @@ def run_macro_analysis(session: Session, api_client: AlphaVantageClient) -> str:
     
     try:
         # === KROK 1: Pobieranie danych ===
+        # Wspólny kontekst makro (QQQ z DAILY_ADJUSTED + macro_series) - pobrania tylko, gdy
+        # rynek opublikował nową świecę / minął termin publikacji serii.
+        macro_ctx = macro_context.get_macro_context(session, api_client)
         
         # A. Dane Środowiskowe (Nasdaq-100 ETF: QQQ)
         # To jest nasz benchmark. Jeśli QQQ krwawi, nasze setupy na Nasdaq też będą krwawić.
-        market_ticker = "QQQ"
-        market_raw = api_client.get_daily_adjusted(market_ticker, outputsize='full')
-        
-        # B. Dane Makro (Rentowność Obligacji 10Y)
-        # Rentowność uderza w spółki technologiczne (Growth) mocniej niż w szeroki rynek.
-        yield_data = api_client.get_treasury_yield(interval='monthly', maturity='10year')
+        market_ticker = macro_context.BENCHMARK_TICKER
+        df = macro_ctx.qqq_df
         
         # === KROK 2: Przetwarzanie i Obliczenia ===
         
         # 1. Analiza Techniczna Rynku (QQQ)
-        if not market_raw or 'Time Series (Daily)' not in market_raw:
+        if df.empty or 'adjusted close' not in df.columns:
             logger.warning(f"Faza 0: Brak danych dla {market_ticker}. Zakładam tryb RISK_OFF.")
             return _set_status(session, "RISK_OFF", f"Brak danych {market_ticker}")
 
-        df = pd.DataFrame.from_dict(market_raw['Time Series (Daily)'], orient='index')
-        df = df.astype(float)
-        df.index = pd.to_datetime(df.index)
-        df.sort_index(inplace=True)
-        
-        # Szukamy kolumny z ceną (adjusted close)
-        close_col = [c for c in df.columns if 'adjusted close' in c][0]
+        # Obliczenie SMA 200 (Długoterminowy Trend Technologiczny) na cenie skorygowanej
+        close = df['adjusted close']
+        sma200 = close.rolling(window=200).mean()
         
-        # Obliczenie SMA 200 (Długoterminowy Trend Technologiczny)
-        df['sma200'] = df[close_col].rolling(window=200).mean()
-        
-        current_price = df[close_col].iloc[-1]
-        current_sma200 = df['sma200'].iloc[-1]
+        current_price = close.iloc[-1]
+        current_sma200 = sma200.iloc[-1]
+
+        # Za krótka historia (np. ucięty payload) = brak SMA200. Porównanie z NaN jest zawsze False,
+        # więc bez tej bramki agent uznałby trend za wzrostowy - przy braku danych zakładamy RISK_OFF.
+        if pd.isna(current_sma200) or pd.isna(current_price):
+            logger.warning(f"Faza 0: Za mało świec {market_ticker} do SMA200 ({close.count()}). Zakładam tryb RISK_OFF.")
+            return _set_status(session, "RISK_OFF", f"Brak SMA200 {market_ticker} ({close.count()} świec)")
         
-        # 2. Analiza Rentowności
-        current_yield = 0.0
-        if yield_data and 'data' in yield_data and yield_data['data']:
-            try:
-                current_yield = float(yield_data['data'][0]['value'])
-            except: pass
+        # 2. Analiza Rentowności (Obligacje 10Y - uderzają w Growth mocniej niż w szeroki rynek)
+        current_yield = macro_ctx.latest('TREASURY_YIELD') or 0.0
 
         # === KROK 3: Logika Decyzyjna (Nasdaq Logic) ===
         reasons = []
@@ -7,16 +7,25 @@ from datetime import datetime, timedelta
 # Importy narzędziowe
 from .utils import (
     append_scan_log, update_scan_progress, safe_float, 
-    standardize_df_columns, calculate_atr,
+    standardize_df_columns,
     get_raw_data_with_cache 
 )
 from ..config import SECTOR_TO_ETF_MAP, DEFAULT_MARKET_ETF
+from . import fundamentals, earnings_calendar, ticker_tiers, scan_stats, indicators
 
 logger = logging.getLogger(__name__)
 
 # === CONFIG OPTYMALIZACJI ===
 BATCH_SIZE = 50       
-THROTTLE_DELAY = 0.05 
+THROTTLE_DELAY = 0.05
+DAILY_TTL_HOURS = 12  # Rytm odświeżania dziennych dla warstwy HOT (WARM/COLD rzadziej - ticker_tiers)
+
+# === FILTRY FAZY 1 (progi także dla marginesów scan_stats) ===
+MIN_HISTORY_DAYS = 200
+MIN_PRICE = 0.4
+MAX_PRICE = 25.0
+MIN_AVG_VOLUME = 400000
+MIN_ATR_PERCENT = 0.02 
 
 def _check_sector_health(session: Session, api_client, sector_name: str) -> tuple[bool, float, str]:
     etf_ticker = SECTOR_TO_ETF_MAP.get(sector_name, DEFAULT_MARKET_ETF)
@@ -32,7 +41,7 @@ def _check_sector_health(session: Session, api_client, sector_name: str) -> tupl
         df.sort_index(inplace=True)
         if len(df) < 50: return True, 0.0, etf_ticker
         current_price = df['close'].iloc[-1]
-        sma_50 = df['close'].rolling(window=50).mean().iloc[-1]
+        sma_50 = indicators.sma(df['close'], 50).iloc[-1]
         is_healthy = current_price > sma_50
         trend_score = 1.0 if is_healthy else -1.0
         return is_healthy, trend_score, etf_ticker
@@ -45,15 +54,26 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
     append_scan_log(session, "Faza 1 (V6.2): Start. Tryb bezpiecznego zapisu (Upsert).")
 
     try:
-        all_tickers_rows = session.execute(text("SELECT ticker, sector FROM companies ORDER BY ticker")).fetchall()
+        # Sektor/kapitalizacja/free float z company_fundamentals (JOIN - bez zapytań API)
+        all_tickers_rows = session.execute(text(fundamentals.COMPANIES_WITH_FUNDAMENTALS_SQL)).fetchall()
         total_tickers = len(all_tickers_rows)
         logger.info(f"Found {total_tickers} tickers to process.")
     except Exception as e:
         logger.error(f"Could not fetch companies: {e}", exc_info=True)
         return []
 
+    # Kolejność wg wyuczonego prawdopodobieństwa trafienia - przerwany skan ma już najlepsze tickery
+    ordered = scan_stats.order_tickers(session, scan_stats.SCANNER_PHASE1, [r[0] for r in all_tickers_rows])
+    rank = {t: i for i, t in enumerate(ordered)}
+    all_tickers_rows = sorted(all_tickers_rows, key=lambda r: rank[r[0]])
+    stats_recorder = scan_stats.ScanStatsRecorder(session, scan_stats.SCANNER_PHASE1)
+
+    # TTL danych dziennych wg warstwy tickera (HOT 12h, WARM 72h, COLD tydzień)
+    tier_expiry = ticker_tiers.expiry_map(session, [r[0] for r in all_tickers_rows], DAILY_TTL_HOURS)
+    liquidity = {}
+
     final_candidate_tickers = []
-    reject_stats = {'price': 0, 'volume': 0, 'atr': 0, 'intraday': 0, 'sector': 0, 'data': 0, 'trend': 0}
+    reject_stats = {'price': 0, 'volume': 0, 'atr': 0, 'intraday': 0, 'sector': 0, 'data': 0, 'trend': 0, 'fundamentals': 0}
     candidates_buffer = [] 
     
     start_time = time.time()
@@ -61,6 +81,7 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
     for processed_count, row in enumerate(all_tickers_rows):
         ticker = row[0]
         sector = row[1]
+        market_cap, shares_float = row[3], row[4]
         
         time.sleep(THROTTLE_DELAY)
         
@@ -75,11 +96,16 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
             rate = processed_count / elapsed if elapsed > 0 else 0
             logger.info(f"F1 Heartbeat: {processed_count}/{total_tickers} ({rate:.1f} t/s)")
 
+        # Filtr fundamentalny (cap/float) przed jakimkolwiek zapytaniem o ceny
+        if not fundamentals.passes_fundamentals_filter(market_cap, shares_float):
+            reject_stats['fundamentals'] += 1
+            continue
+
         try:
             price_data_raw = get_raw_data_with_cache(
                 session, api_client, ticker, 
                 'DAILY_ADJUSTED', 'get_daily_adjusted', 
-                expiry_hours=12, outputsize='full'
+                expiry_hours=tier_expiry.get(ticker, DAILY_TTL_HOURS), outputsize='full'
             )
             
             if not price_data_raw or 'Time Series (Daily)' not in price_data_raw:
@@ -91,8 +117,13 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
             daily_df.index = pd.to_datetime(daily_df.index)
             daily_df.sort_index(inplace=True)
 
-            if len(daily_df) < 200: 
+            # Płynność obserwujemy dla każdego tickera z danymi (podstawa warstw odświeżania)
+            avg_volume = daily_df['volume'].iloc[-21:-1].mean()
+            liquidity[ticker] = avg_volume
+
+            if len(daily_df) < MIN_HISTORY_DAYS: 
                 reject_stats['data'] += 1
+                stats_recorder.add(ticker, False, scan_stats.threshold_margin(len(daily_df), MIN_HISTORY_DAYS), avg_volume)
                 continue
 
             latest_candle = daily_df.iloc[-1]
@@ -100,29 +131,42 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
             
             if pd.isna(current_price): continue
                 
-            if not (0.4 <= current_price <= 25.0): 
+            # Marginesy filtrów (scan_stats): względna odległość od progu, decyduje pierwszy odrzucający
+            margins = [scan_stats.range_margin(current_price, MIN_PRICE, MAX_PRICE)]
+            if not (MIN_PRICE <= current_price <= MAX_PRICE): 
                 reject_stats['price'] += 1
+                stats_recorder.add(ticker, False, margins[-1], avg_volume)
                 continue
             
-            avg_volume = daily_df['volume'].iloc[-21:-1].mean()
-            if pd.isna(avg_volume) or avg_volume < 400000: 
+            margins.append(scan_stats.threshold_margin(avg_volume, MIN_AVG_VOLUME))
+            if pd.isna(avg_volume) or avg_volume < MIN_AVG_VOLUME: 
                 reject_stats['volume'] += 1
+                stats_recorder.add(ticker, False, margins[-1], avg_volume)
                 continue
             
-            atr_series = calculate_atr(daily_df, period=14)
+            # ATR jak w AV (TA-Lib, wygładzanie Wildera) - wspólny moduł wskaźników
+            atr_series = indicators.atr_wilder(daily_df, time_period=14)
             if atr_series.empty: continue
             
             current_atr = atr_series.iloc[-1]
+            if pd.isna(current_atr): continue
             atr_percent = (current_atr / current_price)
-            if atr_percent < 0.02: 
+            margins.append(scan_stats.threshold_margin(atr_percent, MIN_ATR_PERCENT))
+            if atr_percent < MIN_ATR_PERCENT: 
                 reject_stats['atr'] += 1
+                stats_recorder.add(ticker, False, margins[-1], avg_volume)
                 continue 
 
-            sma_200 = daily_df['close'].rolling(window=200).mean().iloc[-1]
+            sma_200 = indicators.sma(daily_df['close'], 200).iloc[-1]
+            margins.append(scan_stats.threshold_margin(current_price, sma_200))
             if pd.isna(sma_200) or current_price < sma_200:
                 reject_stats['trend'] += 1
+                stats_recorder.add(ticker, False, margins[-1], avg_volume)
                 continue
 
+            # Trafienie: margines = najsłabszy z przejść (jak blisko odpadnięcia był ticker)
+            stats_recorder.add(ticker, True, min((m for m in margins if m is not None), default=None), avg_volume)
+
             is_sector_healthy, sector_trend, etf_symbol = _check_sector_health(session, api_client, sector)
             
             candidates_buffer.append({
@@ -146,11 +190,26 @@ def run_scan(session: Session, get_current_state, api_client) -> list[str]:
     
     if candidates_buffer:
         _save_batch(session, candidates_buffer)
+    stats_recorder.flush()
+
+    # Dni do wyników z kalendarza (earnings_calendar) - jeden UPDATE dla wszystkich kandydatów
+    try:
+        earnings_calendar.refresh_days_to_earnings(session)
+    except Exception as e:
+        logger.error(f"F1: Błąd uzupełniania days_to_earnings: {e}")
+        session.rollback()
+
+    # Nowa płynność + nowi kandydaci -> warstwy na kolejny skan
+    ticker_tiers.record_liquidity(session, liquidity)
+    tier_counts = ticker_tiers.refresh_tiers(session)
 
     update_scan_progress(session, total_tickers, total_tickers)
     
     summary_msg = (f"🏁 Faza 1 (Trend Guard) zakończona. Kandydatów: {len(final_candidate_tickers)}. "
-                   f"Odrzuty: Trend(SMA200)={reject_stats['trend']}, Cena={reject_stats['price']}, Vol={reject_stats['volume']}")
+                   f"Odrzuty: Trend(SMA200)={reject_stats['trend']}, Cena={reject_stats['price']}, Vol={reject_stats['volume']}, "
+                   f"Fundamenty={reject_stats['fundamentals']}. "
+                   f"Warstwy: HOT={tier_counts.get(ticker_tiers.TIER_HOT, 0)}, WARM={tier_counts.get(ticker_tiers.TIER_WARM, 0)}, "
+                   f"COLD={tier_counts.get(ticker_tiers.TIER_COLD, 0)}")
     
     logger.info(summary_msg)
     append_scan_log(session, summary_msg)
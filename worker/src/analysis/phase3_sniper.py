@@ -13,7 +13,6 @@ from .. import models
 from .utils import (
     log_decision, 
     get_raw_data_with_cache, 
-    standardize_df_columns, 
     calculate_atr, 
     send_telegram_alert,
     append_scan_log,
@@ -23,7 +22,14 @@ from .utils import (
 # Import Silników Matematycznych (Fundamenty z Kroku 1)
 from . import aqm_v3_metrics
 from . import aqm_v4_logic
+from . import indicators
+from . import daily_data
+from . import daily_sentiment
+from . import insider_transactions
+from . import macro_context
 from .aqm_v3_h2_loader import load_h2_data_into_cache
+from .prefetch_planner import prefetch_for_job
+from .earnings_calendar import get_days_to_earnings
 
 logger = logging.getLogger(__name__)
 
@@ -61,6 +67,21 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
     append_scan_log(session, start_msg)
     logger.info(start_msg)
 
+    # Planer: wszystkie potrzebne dane pobrane równolegle przed obliczeniami
+    try:
+        prefetch_for_job(session, api_client, 'PHASE3', candidates, strategy_mode=strategy_mode)
+    except Exception as e:
+        logger.error(f"SNIPER: Błąd prefetchu danych: {e}")
+        session.rollback()
+
+    # Dni do wyników dla wszystkich kandydatów jednym zapytaniem (AQM: kara TCS przy wynikach)
+    try:
+        days_to_earnings = get_days_to_earnings(session, candidates)
+    except Exception as e:
+        logger.error(f"SNIPER: Błąd odczytu kalendarza wyników: {e}")
+        session.rollback()
+        days_to_earnings = {}
+
     processed = 0
     signals_found = 0
     total = len(candidates)
@@ -80,18 +101,14 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
                 log_decision(session, ticker, "DATA_FETCH", "REJECTED", "Brak danych dziennych API")
                 continue
 
-            df = standardize_df_columns(pd.DataFrame.from_dict(daily_raw.get('Time Series (Daily)', {}), orient='index'))
+            # Świece surowe (poziomy SL/TP) + widok skorygowany o splity (serie długoterminowe)
+            frames = daily_data.parse_daily_adjusted(daily_raw)
+            df = frames.raw.copy()
             
             # Wymagane min. 200 świec do obliczeń (EMA 200, normalizacja 100)
             if len(df) < 200:
                 log_decision(session, ticker, "DATA_SIZE", "REJECTED", f"Za krótka historia ({len(df)} < 200)")
                 continue
-
-            # Konwersja indeksu
-            df.index = pd.to_datetime(df.index)
-            if df.index.tz is not None:
-                df.index = df.index.tz_localize(None)
-            df.sort_index(inplace=True)
             
             # Oblicz ATR (potrzebne do SL/TP i logiki)
             # WAŻNE: To oblicza kolumnę 'atr_14' w df, ale silniki mogą zwracać nowe df!
@@ -103,7 +120,7 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
                 # Używamy loadera z cache, aby nie katować API
                 h2_data = load_h2_data_into_cache(ticker, api_client, session)
                 insider_df = h2_data.get('insider_df')
-                news_df = h2_data.get('news_df')
+                sentiment_df = h2_data.get('sentiment_df')
 
                 # Przygotowanie kolumn do silnika wektorowego H3
                 # (Te obliczenia są szybkie, robimy je "w locie" przed wektoryzacją)
@@ -112,29 +129,17 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
                 df['price_gravity'] = (df['high'] + df['low'] + df['close']) / 3 / df['close'] - 1
                 
                 # 2. Institutional Sync (Insiderzy) - mapowanie na dni
-                df['institutional_sync'] = df.apply(
-                    lambda row: aqm_v3_metrics.calculate_institutional_sync_from_data(insider_df, row.name), axis=1
-                ).fillna(0.0)
+                df['institutional_sync'] = insider_transactions.institutional_sync_series(insider_df, df.index)
                 
-                # 3. Retail Herding (Newsy) - mapowanie na dni
-                df['retail_herding'] = df.apply(
-                    lambda row: aqm_v3_metrics.calculate_retail_herding_from_data(news_df, row.name), axis=1
-                ).fillna(0.0)
+                # 3. Retail Herding (Newsy) - dzienne agregaty sentymentu
+                df['retail_herding'] = daily_sentiment.retail_herding_series(sentiment_df, df.index)
                 
                 # 4. Market Temperature (Zmienność)
                 df['daily_returns'] = df['close'].pct_change().fillna(0)
                 df['market_temperature'] = df['daily_returns'].rolling(window=30).std().fillna(0.01) # Unikamy div/0
                 
-                # 5. Information Entropy (Liczba newsów)
-                if not news_df.empty:
-                    # Uproszczona entropia: suma newsów z 10 dni
-                    if news_df.index.tz is not None: news_df.index = news_df.index.tz_localize(None)
-                    nc = news_df.groupby(news_df.index.date).size()
-                    nc.index = pd.to_datetime(nc.index)
-                    nc = nc.reindex(df.index, fill_value=0)
-                    df['information_entropy'] = nc.rolling(window=10).sum().fillna(0)
-                else:
-                    df['information_entropy'] = 0.0
+                # 5. Information Entropy (Liczba newsów): suma artykułów z 10 dni
+                df['information_entropy'] = daily_sentiment.information_entropy_series(sentiment_df, df.index)
                 
                 # 6. Wolumen (Surowy - silnik go znormalizuje)
                 # (df['volume'] już istnieje)
@@ -183,23 +188,13 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
 
             # === ŚCIEŻKA B: STRATEGIA AQM (ADAPTIVE QUANTUM V4) ===
             elif strategy_mode == 'AQM':
-                # Pobieranie danych dodatkowych (Weekly, OBV)
-                # Tu upraszczamy: resamplujemy Weekly z Daily, OBV liczymy sami (żeby było szybko)
-                
-                # Weekly (Resample)
-                weekly_df = df.resample('W').agg({
-                    'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
-                }).dropna()
-                
-                # OBV (Calculate)
-                df['obv'] = (np.sign(df['close'].diff()) * df['volume']).fillna(0).cumsum()
-                obv_df = df[['obv']].rename(columns={'obv': 'OBV'})
+                # Dane dodatkowe (Weekly, OBV) liczone lokalnie ze świec skorygowanych o splity -
+                # split nie udaje załamania trendu ani odpływu wolumenu; bez zapytań API
+                weekly_df = indicators.weekly_resample(frames.adjusted)
+                obv_df = indicators.obv(frames.adjusted)
                 
-                # Makro (Mockup lub pobranie z cache - tutaj weźmiemy "bezpieczne" defaulty dla Live,
-                # bo Faza 0 Makro Agent już powinna zablokować skanowanie, jeśli makro jest złe)
-                macro_data = {
-                    'inflation': 3.0, 'yield_10y': 4.0, 'qqq_df': pd.DataFrame() # Można rozbudować o pobranie QQQ
-                }
+                # Makro: prawdziwe serie (inflacja, 10Y, QQQ) ze wspólnego kontekstu w pamięci procesu
+                macro_data = macro_context.get_macro_context(session, api_client).macro_data()
 
                 # >>> URUCHOMIENIE SILNIKA WEKTOROWEGO AQM <<<
                 df_calc = aqm_v4_logic.calculate_aqm_full_vector(
@@ -207,7 +202,8 @@ def run_h3_live_scan(session: Session, candidates: list, api_client: AlphaVantag
                     weekly_df=weekly_df,
                     intraday_60m_df=pd.DataFrame(),
                     obv_df=obv_df,
-                    macro_data=macro_data
+                    macro_data=macro_data,
+                    earnings_days_to=days_to_earnings.get(ticker)
                 )
                 
                 if df_calc.empty:
@@ -1,5 +1,4 @@
 import logging
-import time
 import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import text
@@ -11,16 +10,44 @@ from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
 from .utils import (
     append_scan_log, 
     update_scan_progress, 
-    standardize_df_columns, 
     update_system_control
 )
 from .aqm_v4_logic import analyze_intraday_kinetics
+from .intraday_data import map_intraday_5min, PHASE4_INTRADAY_TTL_HOURS
+from .prefetch_planner import prefetch_for_job
 
 logger = logging.getLogger(__name__)
 
 # === KONFIGURACJA SKANERA H4 ===
 BATCH_SIZE = 10       # Mniejszy batch, bo zapytania intraday są ciężkie (dużo danych)
-THROTTLE_DELAY = 1.5  # Opóźnienie między tickerami (sekundy) dla bezpieczeństwa API
+MAX_WORKERS = 6       # Pula: pobieranie (cache 'INTRADAY_5') + obliczenia kinetyki; tempo API trzyma klient
+
+def _compute_kinetics_record(ticker: str, df: pd.DataFrame) -> dict | None:
+    """Zadanie puli: kinetyka dla jednego tickera -> rekord do zapisu (lub None)."""
+    # Uruchom "Mózg" (Pulse Hunter) - policzy strzały, elasticity itp.
+    kinetics = analyze_intraday_kinetics(df)
+
+    # Filtr Wstępny (Odrzuć "Leniwych Żołnierzy")
+    # Jeśli spółka nie miała ANI JEDNEGO strzału w 30 dni, szkoda miejsca w bazie
+    if kinetics['total_2pct_shots'] == 0:
+        return None
+
+    # Ramka jest posortowana rosnąco - ostatnia świeca to najnowsza cena
+    last_price = df['close'].iloc[-1]
+
+    return {
+        'ticker': ticker,
+        'price': float(last_price),
+        'kinetic_score': kinetics['kinetic_score'],
+        'elasticity': float(kinetics['elasticity']),
+        'shots_30d': kinetics['total_2pct_shots'], # To pole w bazie nazywa się shots_30d
+        'avg_intraday_volatility': float(kinetics['avg_intraday_volatility']),
+        'max_daily_shots': kinetics['max_daily_shots'],
+        'total_2pct_shots_ytd': kinetics['total_2pct_shots'], # Na razie 30d = YTD (uproszczenie API)
+        'avg_swing_size': float(kinetics['avg_swing_size']),
+        'hard_floor_violations': kinetics['hard_floor_violations'],
+        'last_shot_date': kinetics['last_shot_date']
+    }
 
 def run_phase4_scan(session: Session, api_client: AlphaVantageClient):
     """
@@ -47,7 +74,7 @@ def run_phase4_scan(session: Session, api_client: AlphaVantageClient):
         # Jeśli lista jest pusta, bierzemy top 100 z companies (fallback)
         if not tickers_to_scan:
             append_scan_log(session, "Faza 4: Brak kandydatów z F1/FX. Pobieranie próbki z bazy...")
-            tickers_to_scan = [r[0] for r in session.execute(text("SELECT ticker FROM companies LIMIT 100")).fetchall()]
+            tickers_to_scan = [r[0] for r in session.execute(text("SELECT ticker FROM companies WHERE is_active LIMIT 100")).fetchall()]
 
         total_tickers = len(tickers_to_scan)
         logger.info(f"Faza 4: Załadowano {total_tickers} tickerów do analizy kinetycznej.")
@@ -57,71 +84,36 @@ def run_phase4_scan(session: Session, api_client: AlphaVantageClient):
         session.execute(text("DELETE FROM phase4_candidates"))
         session.commit()
 
+        # Planer: synchronizacja hurtowni intraday dla wszystkich celów przed obliczeniami
+        prefetch_for_job(session, api_client, 'PHASE4', tickers_to_scan, expiry_hours=PHASE4_INTRADAY_TTL_HOURS)
+
         processed_count = 0
         candidates_buffer = []
         
-        # 2. Główna pętla skanowania
-        for ticker in tickers_to_scan:
+        # 2. Główna pętla skanowania (pula wątków)
+        # Świece 5min czytane są z hurtowni intraday_bars_5m (zsynchronizowanej przez planer powyżej),
+        # więc ponowny skan w oknie TTL nie pobiera niczego z API. Kinetyka liczona jest w tej samej puli.
+        for ticker, record in map_intraday_5min(
+            api_client, tickers_to_scan, _compute_kinetics_record,
+            expiry_hours=PHASE4_INTRADAY_TTL_HOURS, max_workers=MAX_WORKERS
+        ):
             processed_count += 1
-            
+
             # Raportowanie postępu
             if processed_count % 5 == 0:
                 update_scan_progress(session, processed_count, total_tickers)
                 logger.info(f"Faza 4: Postęp {processed_count}/{total_tickers}")
 
-            try:
-                # A. Pobierz dane Intraday (5min, full = 30 dni)
-                # To jest kluczowy moment - zapytanie do API
-                # Używamy interval='5min' dla precyzji, outputsize='full' dla historii
-                raw_data = api_client.get_intraday(ticker, interval='5min', outputsize='full')
-                
-                if not raw_data or 'Time Series (5min)' not in raw_data:
-                    # Brak danych lub błąd API - pomiń
-                    continue
-
-                # B. Przetwórz dane do DataFrame
-                df = pd.DataFrame.from_dict(raw_data['Time Series (5min)'], orient='index')
-                df = standardize_df_columns(df) # Zamienia '1. open' na 'open' i typy na float
-                
-                # C. Uruchom "Mózg" (Pulse Hunter)
-                # Ta funkcja (z Kroku 3) policzy strzały, elasticity itp.
-                kinetics = analyze_intraday_kinetics(df)
-                
-                # D. Filtr Wstępny (Odrzuć "Leniwych Żołnierzy")
-                # Jeśli spółka nie miała ANI JEDNEGO strzału w 30 dni, szkoda miejsca w bazie
-                if kinetics['total_2pct_shots'] == 0:
-                    continue
-
-                # E. Przygotuj rekord do zapisu
-                # Pobieramy ostatnią cenę z danych intraday
-                last_price = df['close'].iloc[0] if not df.empty else 0.0
-
-                candidates_buffer.append({
-                    'ticker': ticker,
-                    'price': float(last_price),
-                    'kinetic_score': kinetics['kinetic_score'],
-                    'elasticity': float(kinetics['elasticity']),
-                    'shots_30d': kinetics['total_2pct_shots'], # To pole w bazie nazywa się shots_30d
-                    'avg_intraday_volatility': float(kinetics['avg_intraday_volatility']),
-                    'max_daily_shots': kinetics['max_daily_shots'],
-                    'total_2pct_shots_ytd': kinetics['total_2pct_shots'], # Na razie 30d = YTD (uproszczenie API)
-                    'avg_swing_size': float(kinetics['avg_swing_size']),
-                    'hard_floor_violations': kinetics['hard_floor_violations'],
-                    'last_shot_date': kinetics['last_shot_date']
-                })
-
-                # F. Zapisz batch (jeśli bufor pełny)
-                if len(candidates_buffer) >= BATCH_SIZE:
-                    _save_phase4_batch(session, candidates_buffer)
-                    candidates_buffer = []
-                
-                # G. Pacing (ochrona API)
-                time.sleep(THROTTLE_DELAY)
-
-            except Exception as e:
-                logger.error(f"Faza 4: Błąd analizy dla {ticker}: {e}")
+            if not record:
                 continue
 
+            candidates_buffer.append(record)
+
+            # Zapisz batch (jeśli bufor pełny)
+            if len(candidates_buffer) >= BATCH_SIZE:
+                _save_phase4_batch(session, candidates_buffer)
+                candidates_buffer = []
+
         # 3. Zapisz resztę bufora na koniec
         if candidates_buffer:
             _save_phase4_batch(session, candidates_buffer)
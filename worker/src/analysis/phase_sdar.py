@@ -1,15 +1,20 @@
 import logging
-import time
 import pandas as pd
 import numpy as np
 from datetime import datetime, timedelta, timezone
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Set
+from concurrent.futures import ThreadPoolExecutor
 
 # Importy z systemu Apex
+from ..database import get_db_session
 from ..models import SdarCandidate, TradingSignal
-from .utils import get_raw_data_with_cache, standardize_df_columns
+from .intraday_data import get_intraday_5min_frame, INTRADAY_5_TTL_HOURS
+from .news_firehose import ingest_news_firehose, get_ticker_news
+from .prefetch_planner import prefetch_for_job
+from .earnings_calendar import get_near_earnings
+from . import scan_stats
 # === Moduł Taktyczny ===
 from .phase_tactical import TacticalBridge
 
@@ -19,7 +24,10 @@ logger = logging.getLogger(__name__)
 SDAR_RAW_INTERVAL = '5min'      
 SDAR_VIRTUAL_TIMEFRAME = '4h'   
 SDAR_MIN_CANDLES = 20           
-BATCH_DELAY = 1.0               
+SDAR_BATCH_SIZE = 50            # Tickery na jedną transakcję zapisu
+SDAR_MAX_WORKERS = 6            # Wątki I/O + scoring; limit zapytań trzyma Rate Limiter klienta
+SDAR_NEWS_LOOKBACK_HOURS = 48   # Okno SPD (artykuły z firehose)
+SDAR_HIT_SCORE = 40.0           # Wynik anomalii uznawany za trafienie (scan_stats, logi)
 
 class SDARAnalyzer:
     """
@@ -41,36 +49,73 @@ class SDARAnalyzer:
             logger.warning("SDAR: Brak kandydatów spełniających wymogi płynności.")
             return []
 
+        # Newsy: jeden przyrostowy cykl firehose zamiast zapytania na każdy ticker
+        try:
+            ingest_news_firehose(self.session, self.client)
+        except Exception as e:
+            logger.error(f"SDAR: Błąd firehose newsów: {e}")
+            self.session.rollback()
+
+        # 0. Risk Guard: Earnings Filter (jedno zapytanie zamiast jednego na ticker)
+        near_earnings = self._fetch_near_earnings(candidates)
+        candidates = [t for t in candidates if t not in near_earnings]
+
+        # Kolejność wg wyuczonego prawdopodobieństwa trafienia (remisy - ranking Fazy 1)
+        candidates = scan_stats.order_tickers(self.session, scan_stats.SCANNER_SDAR, candidates)
+        volumes = self._fetch_candidate_volumes(candidates)
+        stats_recorder = scan_stats.ScanStatsRecorder(self.session, scan_stats.SCANNER_SDAR)
+
         logger.info(f"SDAR: Znaleziono {len(candidates)} kandydatów do analizy.")
         processed_tickers = []
 
-        for i, ticker in enumerate(candidates):
-            try:
-                # 0. Risk Guard: Earnings Filter
-                if self._is_near_earnings(ticker):
-                    continue # Cicho pomijamy
+        # Planer: świece 5min wszystkich kandydatów rozgrzane przed scoringiem
+        try:
+            prefetch_for_job(self.session, self.client, 'SDAR', candidates, expiry_hours=INTRADAY_5_TTL_HOURS)
+        except Exception as e:
+            logger.error(f"SDAR: Błąd prefetchu danych: {e}")
+            self.session.rollback()
 
-                time.sleep(BATCH_DELAY)
-                result = self.analyze_ticker(ticker)
-                
-                if result:
-                    self._save_result(result)
-                    
-                    # === MOST EGZEKUCYJNY (Decyzja o Setupie) ===
-                    self._bridge_to_execution(result)
-                    
-                    processed_tickers.append(ticker)
-                    
-                    # Logujemy tylko istotne wyniki (>40), żeby nie śmiecić
-                    if result.total_anomaly_score > 40:
-                        logger.info(f"✅ SDAR [{i+1}/{len(candidates)}]: {ticker} | Score: {result.total_anomaly_score:.1f} | Action: {result.tactical_action}")
-
-            except Exception as e:
-                logger.error(f"❌ SDAR Error dla {ticker}: {str(e)}", exc_info=True)
-                self.session.rollback()
+        for start in range(0, len(candidates), SDAR_BATCH_SIZE):
+            batch = candidates[start:start + SDAR_BATCH_SIZE]
+
+            # Dane rynkowe + newsy + scoring równolegle (każdy wątek na własnej sesji DB)
+            with ThreadPoolExecutor(max_workers=SDAR_MAX_WORKERS) as pool:
+                results = [r for r in pool.map(self._analyze_in_own_session, batch) if r is not None]
 
+            if not results:
+                continue
+
+            # Zapis całego batcha (kandydaci + nowe sygnały) w jednej transakcji
+            if self._save_batch(results):
+                processed_tickers.extend(r.ticker for r in results)
+
+            for result in results:
+                score = result.total_anomaly_score
+                stats_recorder.add(
+                    result.ticker, score > SDAR_HIT_SCORE,
+                    scan_stats.threshold_margin(score, SDAR_HIT_SCORE), volumes.get(result.ticker)
+                )
+                # Logujemy tylko istotne wyniki (>40), żeby nie śmiecić
+                if score > SDAR_HIT_SCORE:
+                    logger.info(f"✅ SDAR: {result.ticker} | Score: {result.total_anomaly_score:.1f} | Action: {result.tactical_action}")
+
+            logger.info(f"SDAR: Batch {start + len(batch)}/{len(candidates)} zakończony ({len(results)} wyników).")
+
+        stats_recorder.flush()
         return processed_tickers
 
+    def _analyze_in_own_session(self, ticker: str) -> Optional[SdarCandidate]:
+        # Sesja SQLAlchemy nie jest bezpieczna wątkowo - każdy wątek pracuje na własnej
+        local_session = get_db_session()
+        try:
+            return SDARAnalyzer(local_session, self.client).analyze_ticker(ticker)
+        except Exception as e:
+            logger.error(f"❌ SDAR Error dla {ticker}: {str(e)}", exc_info=True)
+            local_session.rollback()
+            return None
+        finally:
+            local_session.close()
+
     def analyze_ticker(self, ticker: str) -> Optional[SdarCandidate]:
         # A. Pobranie danych
         df_5min, df_virtual = self._get_market_data(ticker)
@@ -162,37 +207,34 @@ class SDARAnalyzer:
         )
         
         # Hack: Doklejamy obiekt planu do kandydata w pamięci (nie do bazy),
-        # aby przekazać `ttl_days` do funkcji `_bridge_to_execution`.
+        # aby przekazać `ttl_days` do funkcji `_build_signal`.
         candidate._plan_object = plan 
         
         return candidate
 
     # --- EXECUTION BRIDGE (FILTR JAKOŚCI) ---
     
-    def _bridge_to_execution(self, candidate: SdarCandidate):
+    def _build_signal(self, candidate: SdarCandidate, active_tickers: Set[str]) -> Optional[TradingSignal]:
         """
         Zamienia wynik analizy na sygnał, JEŚLI spełnia ostre kryteria.
+        Nie zapisuje - sygnał trafia do transakcji batcha (_save_batch).
         """
         # 1. Czy jest akcja?
         if not candidate.tactical_action or candidate.tactical_action in ['WAIT', 'SKIP', 'OBSERVE']:
-            return
+            return None
 
         # 2. FILTR JAKOŚCI (Threshold)
         # Odrzucamy wszystko z wynikiem < 45. To wytnie słabe setupy (np. ZYME).
         if candidate.total_anomaly_score < 45:
-            return
+            return None
 
         # 3. Filtr R:R (już sprawdzony w module taktycznym, ale dla pewności)
         if not candidate.risk_reward_ratio or candidate.risk_reward_ratio < 2.0:
-            return
-
-        # 4. Sprawdzenie duplikatów
-        existing_signal = self.session.query(TradingSignal).filter(
-            TradingSignal.ticker == candidate.ticker,
-            TradingSignal.status.in_(['PENDING', 'ACTIVE'])
-        ).first()
+            return None
 
-        if existing_signal: return 
+        # 4. Sprawdzenie duplikatów (PENDING/ACTIVE pobrane raz dla całego batcha)
+        if candidate.ticker in active_tickers:
+            return None
 
         # 5. Wyliczenie daty wygaśnięcia (Dynamic TTL)
         expiration_dt = None
@@ -204,28 +246,50 @@ class SDARAnalyzer:
             # Fallback
             expiration_dt = datetime.now(timezone.utc) + timedelta(days=5)
 
+        return TradingSignal(
+            ticker=candidate.ticker,
+            status='PENDING', 
+            entry_price=candidate.entry_price,
+            stop_loss=candidate.stop_loss,
+            take_profit=candidate.take_profit,
+            risk_reward_ratio=candidate.risk_reward_ratio,
+            notes=f"SDAR v2 {candidate.tactical_action}: {candidate.tactical_comment} | Score:{candidate.total_anomaly_score:.0f}",
+            entry_zone_bottom=candidate.entry_price, 
+            entry_zone_top=candidate.entry_price,
+            generation_date=datetime.now(timezone.utc),
+            expiration_date=expiration_dt # <--- ZAPIS DYNAMICZNEGO TTL
+        )
+
+    def _save_batch(self, results: List[SdarCandidate]) -> bool:
+        """Upsert kandydatów SDAR i nowe sygnały (MOST EGZEKUCYJNY) - jedna transakcja na batch."""
         try:
-            new_signal = TradingSignal(
-                ticker=candidate.ticker,
-                status='PENDING', 
-                entry_price=candidate.entry_price,
-                stop_loss=candidate.stop_loss,
-                take_profit=candidate.take_profit,
-                risk_reward_ratio=candidate.risk_reward_ratio,
-                notes=f"SDAR v2 {candidate.tactical_action}: {candidate.tactical_comment} | Score:{candidate.total_anomaly_score:.0f}",
-                entry_zone_bottom=candidate.entry_price, 
-                entry_zone_top=candidate.entry_price,
-                generation_date=datetime.now(timezone.utc),
-                expiration_date=expiration_dt # <--- ZAPIS DYNAMICZNEGO TTL
-            )
-            
-            self.session.add(new_signal)
+            tickers = [r.ticker for r in results]
+            active_tickers = {
+                row[0] for row in self.session.query(TradingSignal.ticker).filter(
+                    TradingSignal.ticker.in_(tickers),
+                    TradingSignal.status.in_(['PENDING', 'ACTIVE'])
+                ).all()
+            }
+
+            new_signals = []
+            for result in results:
+                self.session.merge(result)
+                signal = self._build_signal(result, active_tickers)
+                if signal:
+                    self.session.add(signal)
+                    active_tickers.add(result.ticker)
+                    new_signals.append(signal)
+
             self.session.commit()
-            logger.info(f"⚡ BRIDGE: Utworzono Sygnał {candidate.ticker} (R:R {candidate.risk_reward_ratio:.1f}, Ważny do: {expiration_dt.strftime('%Y-%m-%d')})")
-            
+
+            for signal in new_signals:
+                logger.info(f"⚡ BRIDGE: Utworzono Sygnał {signal.ticker} (R:R {signal.risk_reward_ratio:.1f}, Ważny do: {signal.expiration_date.strftime('%Y-%m-%d')})")
+            return True
+
         except Exception as e:
-            logger.error(f"BRIDGE Error saving signal for {candidate.ticker}: {e}")
+            logger.error(f"SDAR: Błąd zapisu batcha ({len(results)} tickerów): {e}")
             self.session.rollback()
+            return False
 
     # --- FILARY (STANDARDOWE METODY) ---
     
@@ -279,7 +343,7 @@ class SDARAnalyzer:
         if not news_data or df.empty:
             return {'score':0, 'sentiment_shock':0, 'news_count':0, 'resilience_score':0, 'last_sentiment':0}
 
-        now = datetime.now(timezone.utc)
+        now = self._reference_time()
         cutoff = now - timedelta(hours=48)
         
         valid_news = []
@@ -349,35 +413,28 @@ class SDARAnalyzer:
         return {'score': float(me_score), 'is_trap': is_trap, 'rsi': float(current_rsi), 'apo': float(current_apo)}
 
     def _get_market_data(self, ticker: str):
-        raw_data = get_raw_data_with_cache(
-            self.session, self.client, ticker,
-            'INTRADAY_5',
-            lambda t: self.client.get_intraday(t, interval='5min', outputsize='full'),
-            expiry_hours=1
-        )
-        if not raw_data or 'Time Series (5min)' not in raw_data:
+        # Wspólna ścieżka 5min z Fazą 4 (cache 'INTRADAY_5' + sparsowane ramki w pamięci)
+        df_5min = get_intraday_5min_frame(self.session, self.client, ticker, expiry_hours=INTRADAY_5_TTL_HOURS)
+        if df_5min is None or df_5min.empty:
             return None, None
-            
-        df_5min = pd.DataFrame.from_dict(raw_data['Time Series (5min)'], orient='index')
-        df_5min = standardize_df_columns(df_5min)
-        df_5min.index = pd.to_datetime(df_5min.index)
-        df_5min.sort_index(inplace=True)
-        
-        for c in ['open', 'high', 'low', 'close', 'volume']:
-            df_5min[c] = pd.to_numeric(df_5min[c], errors='coerce')
-        df_5min.dropna(inplace=True)
 
-        df_virtual = df_5min.resample(SDAR_VIRTUAL_TIMEFRAME, label='right', closed='right').agg({
+        return df_5min, self._build_virtual_frame(df_5min)
+
+    def _build_virtual_frame(self, df_5min: pd.DataFrame) -> pd.DataFrame:
+        return df_5min.resample(SDAR_VIRTUAL_TIMEFRAME, label='right', closed='right').agg({
             'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
         }).dropna()
 
-        return df_5min, df_virtual
+    def _reference_time(self) -> datetime:
+        """Moment analizy (UTC). Backtest nadpisuje go datą badania."""
+        return datetime.now(timezone.utc)
 
     def _get_news_data(self, ticker: str) -> List[Dict]:
         try:
-            resp = self.client.get_news_sentiment(ticker, limit=50)
-            if resp and 'feed' in resp: return resp['feed']
-        except: pass
+            since = datetime.now(timezone.utc) - timedelta(hours=SDAR_NEWS_LOOKBACK_HOURS)
+            return get_ticker_news(self.session, ticker, since)
+        except Exception:
+            self.session.rollback()
         return []
     
     def _fetch_candidates(self, limit: Optional[int]) -> List[str]:
@@ -387,15 +444,20 @@ class SDARAnalyzer:
         result = self.session.execute(query).fetchall()
         return [r[0] for r in result]
 
-    def _is_near_earnings(self, ticker: str) -> bool:
+    def _fetch_candidate_volumes(self, tickers: List[str]) -> Dict[str, int]:
         try:
-            query = text("SELECT days_to_earnings FROM phase1_candidates WHERE ticker=:t")
-            res = self.session.execute(query, {'t': ticker}).first()
-            if res and res[0] is not None:
-                if -2 <= res[0] <= 1: return True
-            return False
-        except: return False
+            rows = self.session.execute(text(
+                "SELECT ticker, volume FROM phase1_candidates WHERE ticker = ANY(:tickers)"
+            ), {'tickers': tickers}).fetchall()
+            return {r[0]: r[1] for r in rows}
+        except Exception:
+            self.session.rollback()
+            return {}
 
-    def _save_result(self, result: SdarCandidate):
-        self.session.merge(result)
-        self.session.commit()
+    def _fetch_near_earnings(self, tickers: List[str]) -> Set[str]:
+        try:
+            # Kalendarz wyników (earnings_calendar) - jedno zapytanie dla całej listy
+            return get_near_earnings(self.session, tickers)
+        except Exception:
+            self.session.rollback()
+            return set()
@@ -3,8 +3,8 @@ import time
 import pandas as pd
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from datetime import datetime, timedelta
-from typing import List
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional
 
 # Importujemy model Company do aktualizacji sektorów
 from ..models import Company
@@ -13,8 +13,9 @@ from ..models import Company
 from .utils import (
     append_scan_log, update_scan_progress, 
     standardize_df_columns, get_raw_data_with_cache,
-    update_system_control
+    update_system_control, get_system_control_value
 )
+from . import fundamentals, ticker_tiers, scan_stats
 
 logger = logging.getLogger(__name__)
 
@@ -30,6 +31,13 @@ BIOTECH_KEYWORDS = [
     'Drug', 'Bio', 'Immuno', 'Cell', 'Gene', 'Theranostics' # Dodano Theranostics
 ]
 
+# === TRYB BULK (REALTIME_BULK_QUOTES + jednorazowe wzbogacanie sektorów) ===
+BULK_PRICE_CHUNK = 500          # Ile tickerów na jedno wywołanie get_bulk_quote_table (klient tnie po 100)
+ENRICHMENT_MAX_WORKERS = 8      # Równoległe zapytania OVERVIEW (limit i tak trzyma Rate Limiter klienta)
+ENRICHMENT_DONE_KEY = 'phasex_sector_enrichment_done'
+UNKNOWN_SECTOR = fundamentals.UNKNOWN_SECTOR  # Znacznik: OVERVIEW nie zwróciło sektora (nie pytamy ponownie)
+BRUTE_FORCE_PRICE_TTL_HOURS = 24  # Tryb pełny: TTL ceny dla warstwy HOT (ticker_tiers)
+
 def _is_biotech(sector: str, industry: str) -> bool:
     """Sprawdza czy sektor/branża pasuje do Biotech."""
     if not sector or not industry: return False
@@ -41,63 +49,214 @@ def _is_biotech(sector: str, industry: str) -> bool:
 
 def _update_company_sector(session: Session, api_client, ticker: str) -> tuple[str, str]:
     """
-    Pobiera dane fundamentalne (Overview) z API i aktualizuje bazę danych.
+    Pobiera dane fundamentalne (Overview) z API i zapisuje je (company_fundamentals + companies).
     Zwraca (sector, industry).
     """
+    # To zapytanie kosztuje limit API, używane tylko gdy cena pasuje a sektor nieznany
+    row = fundamentals.refresh_fundamentals(session, api_client, tickers=[ticker]).get(ticker)
+    if not row:
+        return 'N/A', 'N/A'
+    return row['sector'] or UNKNOWN_SECTOR, row['industry'] or UNKNOWN_SECTOR
+
+def _needs_sector(sector: Optional[str], industry: Optional[str]) -> bool:
+    """Czy wiersz companies nie ma jeszcze sektora/branży (wartości domyślne z inicjalizatora)."""
+    return not sector or sector == 'N/A' or not industry or industry == 'N/A'
+
+def run_sector_enrichment(session: Session, api_client, tickers: Optional[List[str]] = None) -> Dict[str, tuple[str, str]]:
+    """
+    Jednorazowe wzbogacanie tabeli companies o sektor/branżę (OVERVIEW).
+    Bez listy tickerów obsługuje WSZYSTKIE wiersze 'N/A' i ustawia flagę w system_control,
+    dzięki czemu pełny przebieg nie powtarza się przy kolejnych skanach.
+    Zapytania idą równolegle, a limit API pilnuje wspólny Rate Limiter klienta.
+    Tickery bez sektora w OVERVIEW dostają znacznik UNKNOWN (nie pytamy o nie ponownie).
+    Zwraca mapę ticker -> (sector, industry) dla przetworzonych spółek.
+    """
+    full_run = tickers is None
     try:
-        # To zapytanie kosztuje limit API, używane tylko gdy cena pasuje a sektor nieznany
-        overview = api_client.get_company_overview(ticker)
-        
-        # Obsługa błędów API / pustych odpowiedzi
-        if not overview: 
-            return 'N/A', 'N/A'
-        
-        sector = overview.get('Sector', 'N/A')
-        industry = overview.get('Industry', 'N/A')
-        
-        # Aktualizacja w bazie (aby nie pytać ponownie przy następnym skanie)
-        if sector != 'N/A':
-            session.execute(
-                text("UPDATE companies SET sector=:s, industry=:i, last_updated=NOW() WHERE ticker=:t"),
-                {'s': sector, 'i': industry, 't': ticker}
-            )
-            session.commit()
-            
-        return sector, industry
+        if full_run:
+            rows = session.execute(text(
+                "SELECT ticker FROM companies "
+                "WHERE is_active AND (sector IS NULL OR sector = 'N/A' OR industry IS NULL OR industry = 'N/A') "
+                "ORDER BY ticker"
+            )).fetchall()
+            tickers = [r[0] for r in rows]
     except Exception as e:
-        logger.warning(f"Błąd aktualizacji sektora dla {ticker}: {e}")
-        return 'N/A', 'N/A'
+        logger.error(f"Faza X: Błąd pobierania spółek bez sektora: {e}")
+        return {}
+
+    resolved = {}
+    if tickers:
+        msg = f"Faza X: Wzbogacanie sektorów (OVERVIEW) dla {len(tickers)} spółek..."
+        logger.info(msg)
+        append_scan_log(session, msg)
+
+        # Fundamenty zapisują się w company_fundamentals, a sektor/branża trafiają do companies.
+        # Błędy sieci/limitu nie wracają w wyniku -> zostają 'N/A' do ponownej próby.
+        rows = fundamentals.refresh_fundamentals(session, api_client, tickers=tickers, max_workers=ENRICHMENT_MAX_WORKERS)
+        for ticker, row in rows.items():
+            resolved[ticker] = (row['sector'] or UNKNOWN_SECTOR, row['industry'] or UNKNOWN_SECTOR)
+
+        filled = sum(1 for s, _ in resolved.values() if s not in ('N/A', UNKNOWN_SECTOR))
+        msg = f"Faza X: Wzbogacanie zakończone. Uzupełniono: {filled}/{len(tickers)}."
+        logger.info(msg)
+        append_scan_log(session, msg)
+
+    if full_run:
+        update_system_control(session, ENRICHMENT_DONE_KEY, datetime.now(timezone.utc).isoformat())
+    return resolved
 
-def run_phasex_scan(session: Session, api_client) -> List[str]:
+def _price_margin(price: Optional[float]) -> Optional[float]:
+    return scan_stats.range_margin(price, MIN_PRICE, MAX_PRICE)
+
+def _sector_known(sector: Optional[str], industry: Optional[str]) -> bool:
+    return not _needs_sector(sector, industry) and sector != UNKNOWN_SECTOR
+
+def _record_phasex_result(recorder, ticker: str, info: dict, price: Optional[float], volume: Optional[float], passed: bool):
+    """Margines: cena w przedziale; znany sektor spoza Biotech nigdy nie przejdzie (-1)."""
+    if not passed and info and _sector_known(info['s'], info['i']) and not _is_biotech(info['s'], info['i']):
+        recorder.add(ticker, False, -1.0, volume)
+    else:
+        recorder.add(ticker, passed, _price_margin(price), volume)
+
+def _gate_prices_bulk(session: Session, api_client, tickers: List[str], observed: Optional[Dict[str, Optional[float]]] = None) -> Dict[str, float]:
+    """
+    Bramka cenowa w trybie Bulk: REALTIME_BULK_QUOTES w paczkach zamiast DAILY_ADJUSTED per ticker.
+    Zwraca mapę ticker -> cena tylko dla spółek w przedziale cenowym
+    (wszystkie notowania trafiają do 'observed', jeśli podano - scan_stats).
+    Wolumen z notowania to wolumen bieżącej (niepełnej) sesji - nie używamy go jako dziennego.
+    """
+    passed = {}
+    total = len(tickers)
+    for start in range(0, total, BULK_PRICE_CHUNK):
+        chunk = tickers[start:start + BULK_PRICE_CHUNK]
+        try:
+            quotes = api_client.get_bulk_quote_table(chunk)
+        except Exception as e:
+            logger.error(f"Faza X: Błąd Bulk Quotes ({start}-{start + len(chunk)}): {e}")
+            continue
+        if observed is not None:
+            observed.update((symbol, None if price != price else price) for symbol, price in zip(quotes.symbol.tolist(), quotes.price.tolist()))
+        in_range = (quotes.price >= MIN_PRICE) & (quotes.price <= MAX_PRICE)
+        passed.update(zip(quotes.symbol[in_range].tolist(), quotes.price[in_range].tolist()))
+        update_scan_progress(session, min(start + len(chunk), total), total)
+    return passed
+
+def run_phasex_scan_bulk(session: Session, api_client) -> List[str]:
+    """
+    Skaner Fazy X w trybie BULK.
+    1. Cena: REALTIME_BULK_QUOTES (~100 tickerów na zapytanie).
+    2. Sektor: baza danych; brakujące sektory uzupełnia jednorazowy job wzbogacający.
+    3. Biotech -> zapis kandydatów.
     """
-    Skaner Fazy X: BioX Hunter (Brute Force Mode).
-    Przechodzi przez WSZYSTKIE spółki w bazie (alfabetycznie).
+    logger.info("Running Phase X: BioX Scanner (Bulk Mode)...")
+    append_scan_log(session, f"Faza X (BioX): Start skanowania BULK. Cel: Biotech ${MIN_PRICE}-${MAX_PRICE}.")
+
+    try:
+        # Sektor/kapitalizacja/free float z company_fundamentals (JOIN - bez zapytań API)
+        rows = session.execute(text(fundamentals.COMPANIES_WITH_FUNDAMENTALS_SQL)).fetchall()
+        all_companies = {r[0]: {'s': r[1], 'i': r[2], 'cap': r[3], 'float': r[4]} for r in rows}
+    except Exception as e:
+        logger.error(f"Faza X: Krytyczny błąd bazy danych: {e}")
+        return []
+
+    total_tickers = len(all_companies)
+    if total_tickers == 0:
+        append_scan_log(session, "Faza X BŁĄD: Tabela 'companies' jest pusta! Uruchom Data Initializer.")
+        return []
+
+    # 0. Filtr fundamentalny (kapitalizacja / free float z config) - przed bramką cenową, więc tnie też zapytania Bulk
+    to_price = list(all_companies.keys())
+    if fundamentals.fundamentals_filter_active():
+        to_price = [t for t in to_price if fundamentals.passes_fundamentals_filter(all_companies[t]['cap'], all_companies[t]['float'])]
+        append_scan_log(session, f"Faza X: Filtr fundamentalny (cap/float): {len(to_price)}/{total_tickers} spółek.")
+
+    # Paczki Bulk w kolejności wyuczonego prawdopodobieństwa trafienia (przerwany skan ma najlepsze tickery)
+    to_price = scan_stats.order_tickers(session, scan_stats.SCANNER_PHASEX, to_price)
+
+    try:
+        session.execute(text("DELETE FROM phasex_candidates"))
+        session.commit()
+    except Exception:
+        session.rollback()
+
+    # 1. Bramka cenowa (Bulk)
+    observed = {}
+    price_passed = _gate_prices_bulk(session, api_client, to_price, observed=observed)
+
+    # 2. Sektory: pełny przebieg tylko raz, później wyłącznie nowe spółki, które przeszły bramkę cenową
+    if not get_system_control_value(session, ENRICHMENT_DONE_KEY):
+        resolved = run_sector_enrichment(session, api_client)
+    else:
+        missing = [t for t in price_passed if _needs_sector(all_companies[t]['s'], all_companies[t]['i'])]
+        resolved = run_sector_enrichment(session, api_client, tickers=missing) if missing else {}
+    for ticker, (sector, industry) in resolved.items():
+        if ticker in all_companies:
+            all_companies[ticker].update({'s': sector, 'i': industry})
+
+    # 3. Filtr Biotech + zapis
+    candidates = []
+    # volume_avg zostaje puste: bulk zna tylko wolumen niepełnej sesji, a kolumna to wolumen dzienny (tryb pełny)
+    for ticker, price in price_passed.items():
+        info = all_companies.get(ticker)
+        if not info or not _is_biotech(info['s'], info['i']):
+            continue
+        candidates.append({'ticker': ticker, 'price': price, 'volume_avg': None})
+
+    for start in range(0, len(candidates), 50):
+        _save_phasex_batch_upsert(session, candidates[start:start + 50])
+
+    stats_recorder = scan_stats.ScanStatsRecorder(session, scan_stats.SCANNER_PHASEX)
+    found = {c['ticker'] for c in candidates}
+    for ticker, price in observed.items():
+        _record_phasex_result(stats_recorder, ticker, all_companies.get(ticker), price, None, ticker in found)
+    stats_recorder.flush()
+
+    update_scan_progress(session, total_tickers, total_tickers)
+    summary = (f"🏁 Faza X (BioX, Bulk): Koniec. Przeanalizowano: {total_tickers}. "
+               f"Pasowało cenowo (${MIN_PRICE}-${MAX_PRICE}): {len(price_passed)}. Wynik Biotech: {len(candidates)}.")
+    logger.info(summary)
+    append_scan_log(session, summary)
+
+    final_list_rows = session.execute(text("SELECT ticker FROM phasex_candidates ORDER BY ticker")).fetchall()
+    return [r[0] for r in final_list_rows]
+
+def run_phasex_scan(session: Session, api_client, bulk_mode: bool = True) -> List[str]:
+    """
+    Skaner Fazy X: BioX Hunter.
+    Domyślnie tryb BULK (run_phasex_scan_bulk). Tryb Brute Force (bulk_mode=False)
+    przechodzi przez WSZYSTKIE spółki w bazie (wg scan_stats - najpierw najbardziej prawdopodobne trafienia):
     1. Sprawdza cenę (Cache/API).
     2. Jeśli cena OK -> Weryfikuje sektor (DB -> API Fallback).
     3. Jeśli Biotech -> Zapisuje.
     """
+    if bulk_mode:
+        return run_phasex_scan_bulk(session, api_client)
+
     logger.info("Running Phase X: BioX Scanner (Full Market Scan)...")
     append_scan_log(session, f"Faza X (BioX): Start pełnego skanowania rynku. Cel: Biotech ${MIN_PRICE}-${MAX_PRICE}.")
 
-    # 1. Pobieramy WSZYSTKIE tickery, posortowane alfabetycznie (dla porządku w logach)
+    # 1. Pobieramy WSZYSTKIE tickery
     # Pobieramy też sektor, żeby wiedzieć czy musimy pytać API
     try:
-        query = text("SELECT ticker, sector, industry FROM companies ORDER BY ticker ASC")
-        rows = session.execute(query).fetchall()
-        # Mapa: ticker -> {'sector': ..., 'industry': ...}
-        all_companies = {r[0]: {'s': r[1], 'i': r[2]} for r in rows}
+        rows = session.execute(text(fundamentals.COMPANIES_WITH_FUNDAMENTALS_SQL)).fetchall()
+        # Mapa: ticker -> {'sector': ..., 'industry': ..., kapitalizacja, free float}
+        all_companies = {r[0]: {'s': r[1], 'i': r[2], 'cap': r[3], 'float': r[4]} for r in rows}
     except Exception as e:
         logger.error(f"Faza X: Krytyczny błąd bazy danych: {e}")
         return []
     
     total_tickers = len(all_companies)
-    tickers_list = list(all_companies.keys())
+    # Kolejność wg wyuczonego prawdopodobieństwa trafienia (wcześniej alfabetycznie)
+    tickers_list = scan_stats.order_tickers(session, scan_stats.SCANNER_PHASEX, list(all_companies.keys()))
+    stats_recorder = scan_stats.ScanStatsRecorder(session, scan_stats.SCANNER_PHASEX)
     
     if total_tickers == 0:
         append_scan_log(session, "Faza X BŁĄD: Tabela 'companies' jest pusta! Uruchom Data Initializer.")
         return []
 
     logger.info(f"Faza X: Załadowano {total_tickers} tickerów do sprawdzenia.")
+    # TTL ceny wg warstwy tickera (COLD - raz w tygodniu)
+    tier_expiry = ticker_tiers.expiry_map(session, tickers_list, BRUTE_FORCE_PRICE_TTL_HOURS)
     
     candidates_buffer = []
     # BATCH_SIZE = 20 # Mniejszy batch, częstszy zapis (usunięto nieużywaną zmienną lokalną, używamy 5 w pętli)
@@ -126,14 +285,18 @@ def run_phasex_scan(session: Session, api_client) -> List[str]:
              if processed_count % 50 == 0:
                  logger.info(f"Faza X: Przetworzono {processed_count}/{total_tickers} (Znaleziono: {found_count})")
 
+        # Filtr fundamentalny (cap/float) - dane z bazy, bez zapytań API
+        if not fundamentals.passes_fundamentals_filter(all_companies[ticker]['cap'], all_companies[ticker]['float']):
+            continue
+
         try:
             # === KROK A: CENA (Najpierw, bo to odsiewa 90% rynku) ===
             # Pobieramy dane dzienne (Compact wystarczy do ceny bieżącej)
-            # expiry_hours=24 -> jeśli mamy dane z wczoraj, to ok, nie pytamy API
+            # expiry_hours=24 (HOT) -> jeśli mamy dane z wczoraj, to ok, nie pytamy API
             price_data_raw = get_raw_data_with_cache(
                 session, api_client, ticker, 
                 'DAILY_ADJUSTED', 'get_daily_adjusted', 
-                expiry_hours=24, 
+                expiry_hours=tier_expiry.get(ticker, BRUTE_FORCE_PRICE_TTL_HOURS), 
                 outputsize='compact' 
             )
 
@@ -156,6 +319,7 @@ def run_phasex_scan(session: Session, api_client) -> List[str]:
 
             # FILTR CENOWY (Rozszerzony)
             if not (MIN_PRICE <= raw_close <= MAX_PRICE):
+                _record_phasex_result(stats_recorder, ticker, all_companies[ticker], raw_close, volume, False)
                 continue 
             
             passed_price += 1
@@ -172,8 +336,11 @@ def run_phasex_scan(session: Session, api_client) -> List[str]:
 
             # Czy to Biotech?
             if not _is_biotech(sector, industry):
+                _record_phasex_result(stats_recorder, ticker, {'s': sector, 'i': industry}, raw_close, volume, False)
                 continue
 
+            _record_phasex_result(stats_recorder, ticker, None, raw_close, volume, True)
+
             # === KROK C: MAMY KANDYDATA! ===
             
             candidates_buffer.append({
@@ -198,6 +365,7 @@ def run_phasex_scan(session: Session, api_client) -> List[str]:
     # Zapisz resztę z bufora na koniec
     if candidates_buffer:
         _save_phasex_batch_upsert(session, candidates_buffer)
+    stats_recorder.flush()
 
     update_scan_progress(session, total_tickers, total_tickers)
     
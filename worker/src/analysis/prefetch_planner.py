@@ -0,0 +1,255 @@
+import logging
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+from typing import Dict, List, Optional
+
+from ..database import get_db_session
+from ..data_ingestion.alpha_vantage_client import AlphaVantageClient, LANE_BULK
+from .utils import get_raw_data_with_cache, is_cache_entry_fresh, append_scan_log
+from . import intraday_warehouse
+from . import cache_writer
+from . import insider_transactions
+from . import news_firehose
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# PLANER PREFETCHU (Job-level)
+# ==================================================================
+# Zadanie (faza, lista tickerów, zakres dat) -> pełna lista potrzeb danych
+# (ticker, data_type, funkcja API, parametry). Odejmujemy to, co jest świeże
+# w alpha_vantage_cache / hurtowni intraday, a resztę pobieramy jednym
+# równoległym przebiegiem (priorytet: dane podstawowe przed pomocniczymi).
+# Obliczenia zadania startują dopiero na "ciepłych" danych, a koszt API
+# jest znany (i logowany) przed startem.
+
+PREFETCH_MAX_WORKERS = 8
+PROGRESS_EVERY = 50
+
+SOURCE_CACHE = 'CACHE'             # alpha_vantage_cache (get_raw_data_with_cache)
+SOURCE_INTRADAY = 'INTRADAY_5'     # hurtownia intraday_bars_5m (sync przyrostowy)
+SOURCE_INTRADAY_MONTH = 'INTRADAY_5_MONTH'  # hurtownia - backfill miesiąca
+SOURCE_INSIDER = 'INSIDER'         # tabela insider_transactions (sync przyrostowy)
+SOURCE_NEWS = 'NEWS'               # news_articles + daily_sentiment (sync historii tickera)
+
+PRIORITY_PRIMARY = 0      # Bez tego zadanie nie policzy tickera (np. dzienne OHLCV)
+PRIORITY_SECONDARY = 1    # Wzbogacenie (insiderzy, newsy, miesiące intraday)
+
+@dataclass
+class DataNeed:
+    ticker: str
+    data_type: str
+    api_func: Optional[str] = None
+    params: Dict = field(default_factory=dict)
+    expiry_hours: Optional[float] = None
+    source: str = SOURCE_CACHE
+    priority: int = PRIORITY_PRIMARY
+    month: Optional[str] = None   # Tylko SOURCE_INTRADAY_MONTH
+    api_calls: int = 1            # Zapytania AV potrzebne do uzupełnienia (ustala _subtract_fresh)
+
+@dataclass
+class PrefetchPlan:
+    job: str
+    needs: List[DataNeed]
+    missing: List[DataNeed]
+
+    @property
+    def api_cost(self) -> int:
+        # Zwykle jedno zapytanie na brakującą pozycję; sync intraday z luką w hurtowni
+        # to poll 'compact' + pełne okno (intraday_warehouse.sync_call_cost).
+        return sum(n.api_calls for n in self.missing)
+
+    def summary(self) -> str:
+        return f"PREFETCH {self.job}: potrzeb {len(self.needs)}, świeżych {len(self.needs) - len(self.missing)}, do pobrania {self.api_cost} (koszt API)."
+
+# --- Katalog potrzeb danych dla zadań ---
+
+def _daily_adjusted(ticker, expiry_hours=None):
+    return DataNeed(ticker, 'DAILY_ADJUSTED', 'get_daily_adjusted', {'outputsize': 'full'}, expiry_hours)
+
+def _h2_needs(ticker):
+    # Te same klucze co aqm_v3_h2_loader.load_h2_data_into_cache
+    return [
+        DataNeed(ticker, 'INSIDER', source=SOURCE_INSIDER, priority=PRIORITY_SECONDARY),
+        DataNeed(ticker, 'NEWS', source=SOURCE_NEWS, priority=PRIORITY_SECONDARY),
+    ]
+
+def build_needs(
+    job: str,
+    tickers: List[str],
+    strategy_mode: str = 'H3',
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    expiry_hours: Optional[float] = None,
+    expiry_by_ticker: Optional[Dict[str, float]] = None
+) -> List[DataNeed]:
+    """
+    Lista potrzeb danych dla zadania:
+      PHASE1    - dzienne (12h lub TTL warstwy z expiry_by_ticker) - pełny skan uniwersum (estymator kosztu)
+      PHASE3    - dzienne (12h) + H2 (H3)
+      PHASE4    - intraday 5min z hurtowni
+      SDAR      - intraday 5min z hurtowni (TTL live)
+      BACKTEST  - dzienne (DAILY_ADJUSTED: surowe + skorygowane z jednego payloadu), H2 (H3), miesiące intraday (SDAR)
+      OPTIMIZER - dzienne skorygowane, H2
+    Tygodniowe, OBV i BBANDS liczy lokalnie moduł indicators (z dziennych) - bez osobnych potrzeb.
+    """
+    needs: List[DataNeed] = []
+    for t in tickers:
+        if job == 'PHASE1':
+            base_hours = expiry_hours if expiry_hours is not None else 12
+            needs.append(_daily_adjusted(t, (expiry_by_ticker or {}).get(t, base_hours)))
+
+        elif job == 'PHASE3':
+            needs.append(_daily_adjusted(t, expiry_hours if expiry_hours is not None else 12))
+            if strategy_mode == 'H3':
+                needs.extend(_h2_needs(t))
+
+        elif job in ('PHASE4', 'SDAR'):
+            needs.append(DataNeed(t, 'INTRADAY_5', source=SOURCE_INTRADAY, expiry_hours=expiry_hours or 1))
+
+        elif job == 'BACKTEST':
+            needs.append(_daily_adjusted(t))
+            if strategy_mode == 'H3':
+                needs.extend(_h2_needs(t))
+            elif strategy_mode == 'SDAR' and start and end:
+                for m in intraday_warehouse.month_range(start, end):
+                    needs.append(DataNeed(t, 'INTRADAY_5', source=SOURCE_INTRADAY_MONTH, month=m, priority=PRIORITY_SECONDARY))
+
+        elif job == 'OPTIMIZER':
+            needs.append(_daily_adjusted(t))
+            needs.extend(_h2_needs(t))
+
+        else:
+            raise ValueError(f"Nieznane zadanie prefetchu: {job}")
+    return needs
+
+# --- Odejmowanie świeżych danych ---
+
+def _subtract_fresh(session: Session, needs: List[DataNeed]) -> List[DataNeed]:
+    missing: List[DataNeed] = []
+
+    cache_needs = [n for n in needs if n.source == SOURCE_CACHE]
+    if cache_needs:
+        rows = session.execute(text("""
+            SELECT ticker, data_type, last_fetched FROM alpha_vantage_cache
+            WHERE ticker = ANY(:tickers) AND data_type = ANY(:types)
+        """), {
+            'tickers': list({n.ticker for n in cache_needs}),
+            'types': list({n.data_type for n in cache_needs})
+        }).fetchall()
+        fetched_at = {(r[0], r[1]): r[2] for r in rows}
+        # Pobrane przed chwilą, a jeszcze niezapisane (bufor write-behind)
+        fetched_at.update(cache_writer.CACHE_WRITER.fetched_at((n.ticker, n.data_type) for n in cache_needs))
+        missing.extend(
+            n for n in cache_needs
+            if not is_cache_entry_fresh(fetched_at.get((n.ticker, n.data_type)), n.expiry_hours, data_type=n.data_type)
+        )
+
+    live_needs = [n for n in needs if n.source == SOURCE_INTRADAY]
+    if live_needs:
+        ttl = min(n.expiry_hours for n in live_needs)
+        stale = set(intraday_warehouse.get_stale_tickers(session, [n.ticker for n in live_needs], ttl))
+        last_bars = intraday_warehouse.get_last_bar_times(session, list(stale))
+        for n in live_needs:
+            if n.ticker in stale:
+                n.api_calls = intraday_warehouse.sync_call_cost(last_bars.get(n.ticker))
+                missing.append(n)
+
+    insider_needs = [n for n in needs if n.source == SOURCE_INSIDER]
+    if insider_needs:
+        stale = set(insider_transactions.get_stale_tickers(session, list({n.ticker for n in insider_needs})))
+        missing.extend(n for n in insider_needs if n.ticker in stale)
+
+    news_needs = [n for n in needs if n.source == SOURCE_NEWS]
+    if news_needs:
+        stale = set(news_firehose.get_stale_tickers(session, list({n.ticker for n in news_needs})))
+        missing.extend(n for n in news_needs if n.ticker in stale)
+
+    month_needs = [n for n in needs if n.source == SOURCE_INTRADAY_MONTH]
+    if month_needs:
+        final = intraday_warehouse.get_final_months(session, list({n.ticker for n in month_needs}))
+        missing.extend(n for n in month_needs if (n.ticker, n.month) not in final)
+
+    return missing
+
+def plan_prefetch(session: Session, job: str, tickers: List[str], **kwargs) -> PrefetchPlan:
+    needs = build_needs(job, tickers, **kwargs)
+    missing = _subtract_fresh(session, needs)
+    missing.sort(key=lambda n: n.priority)
+    return PrefetchPlan(job=job, needs=needs, missing=missing)
+
+# --- Wykonanie ---
+
+def _fetch_need(api_client: AlphaVantageClient, need: DataNeed, lane: int) -> bool:
+    # Sesja SQLAlchemy nie jest bezpieczna wątkowo - każdy wątek pracuje na własnej
+    local_session = get_db_session()
+    try:
+        with api_client.priority(lane):
+            if need.source == SOURCE_CACHE:
+                data = get_raw_data_with_cache(
+                    local_session, api_client, need.ticker, need.data_type, need.api_func,
+                    expiry_hours=need.expiry_hours, **need.params
+                )
+                return bool(data)
+            if need.source == SOURCE_INTRADAY:
+                return intraday_warehouse.sync_ticker(local_session, api_client, need.ticker) > 0
+            if need.source == SOURCE_INSIDER:
+                insider_transactions.sync_insider_transactions(local_session, api_client, need.ticker)
+                return True
+            if need.source == SOURCE_NEWS:
+                news_firehose.sync_ticker_news(local_session, api_client, need.ticker)
+                return True
+            if need.source == SOURCE_INTRADAY_MONTH:
+                return intraday_warehouse.backfill_month(local_session, api_client, need.ticker, need.month) > 0
+        return False
+    except Exception as e:
+        logger.error(f"PREFETCH: Błąd {need.ticker}/{need.data_type}: {e}")
+        local_session.rollback()
+        return False
+    finally:
+        local_session.close()
+
+def execute_plan(
+    api_client: AlphaVantageClient,
+    plan: PrefetchPlan,
+    max_workers: int = PREFETCH_MAX_WORKERS,
+    lane: int = LANE_BULK
+) -> int:
+    """Pobiera brakujące dane równolegle (kolejność wg priorytetu). Zwraca liczbę udanych pobrań."""
+    if not plan.missing:
+        return 0
+    ok = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(_fetch_need, api_client, n, lane) for n in plan.missing]
+        for i, future in enumerate(as_completed(futures), 1):
+            if future.result():
+                ok += 1
+            if i % PROGRESS_EVERY == 0:
+                logger.info(f"PREFETCH {plan.job}: {i}/{len(futures)}")
+    return ok
+
+def prefetch_for_job(
+    session: Session,
+    api_client: AlphaVantageClient,
+    job: str,
+    tickers: List[str],
+    max_workers: int = PREFETCH_MAX_WORKERS,
+    **kwargs
+) -> PrefetchPlan:
+    """Planuje, raportuje koszt API i rozgrzewa dane zadania przed obliczeniami."""
+    plan = plan_prefetch(session, job, tickers, **kwargs)
+    logger.info(plan.summary())
+    append_scan_log(session, plan.summary())
+
+    if plan.missing:
+        start_time = time.time()
+        ok = execute_plan(api_client, plan, max_workers=max_workers)
+        cache_writer.flush_cache_writes()
+        msg = f"PREFETCH {job}: pobrano {ok}/{len(plan.missing)} w {time.time() - start_time:.1f}s."
+        logger.info(msg)
+        append_scan_log(session, msg)
+    return plan
@@ -0,0 +1,146 @@
+import logging
+import math
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# STATYSTYKI SKANÓW (scan_stats: kolejność pracy wg prawdopodobieństwa trafienia)
+# ==================================================================
+# Faza 1, Faza X i SDAR szły alfabetycznie / w kolejności bazy - przerwany skan (pauza, operacja
+# o wyższym priorytecie, wyczerpany limit API) mógł nie dojść do najlepszych tickerów.
+# Każdy skaner zapisuje wynik per ticker: trafienie, margines decydującego filtra i wolumen.
+# Przed skanem tickery są sortowane wg wyuczonego wyniku:
+#   - odsetek trafień z wygaszaniem (SCAN_DECAY) i apriori dla nowych tickerów,
+#   - ostatni margines (jak blisko progu był ticker),
+#   - zmiana wolumenu między dwoma ostatnimi obserwacjami.
+# Nowe tickery (bez historii) dostają wynik apriori - wyżej niż stałe odrzuty, niżej niż regularne trafienia.
+
+SCANNER_PHASE1 = 'PHASE1'
+SCANNER_PHASEX = 'PHASEX'
+SCANNER_SDAR = 'SDAR'
+
+SCAN_DECAY = 0.9          # Waga poprzednich skanów (ostatnie ~10 skanów decyduje)
+PRIOR_PASS_RATE = 0.05    # Apriori: ~5% uniwersum przechodzi filtry
+PRIOR_WEIGHT = 4.0        # Siła apriori (w "skanach")
+
+WEIGHT_PASS_RATE = 1.0
+WEIGHT_MARGIN = 0.5
+WEIGHT_VOLUME = 0.2
+
+FLUSH_EVERY = 200
+WRITE_CHUNK = 1000
+
+_UPSERT_SQL = """
+    INSERT INTO scan_stats (
+        scanner, ticker, scans, passes, total_scans, total_passes, last_margin,
+        last_volume, prev_volume, last_passed, last_scanned_at, last_passed_at
+    ) VALUES (
+        :scanner, :ticker, 1, :hit, 1, :hit, :margin,
+        :volume, NULL, :passed, NOW(), CASE WHEN CAST(:passed AS BOOLEAN) THEN NOW() END
+    )
+    ON CONFLICT (scanner, ticker) DO UPDATE SET
+        scans = scan_stats.scans * :decay + 1,
+        passes = scan_stats.passes * :decay + EXCLUDED.passes,
+        total_scans = scan_stats.total_scans + 1,
+        total_passes = scan_stats.total_passes + EXCLUDED.total_passes,
+        last_margin = EXCLUDED.last_margin,
+        prev_volume = CASE WHEN EXCLUDED.last_volume IS NOT NULL THEN scan_stats.last_volume ELSE scan_stats.prev_volume END,
+        last_volume = COALESCE(EXCLUDED.last_volume, scan_stats.last_volume),
+        last_passed = EXCLUDED.last_passed,
+        last_scanned_at = NOW(),
+        last_passed_at = COALESCE(EXCLUDED.last_passed_at, scan_stats.last_passed_at)
+"""
+
+def _clip(value: Optional[float], limit: float = 1.0) -> float:
+    if value is None or value != value:
+        return 0.0
+    return max(-limit, min(limit, float(value)))
+
+def threshold_margin(value: Optional[float], threshold: float) -> Optional[float]:
+    """Względna odległość od progu minimum: >0 powyżej, <0 poniżej (przycięta do [-1, 1])."""
+    if value is None or value != value or not threshold:
+        return None
+    return _clip(value / threshold - 1.0)
+
+def range_margin(value: Optional[float], low: float, high: float) -> Optional[float]:
+    """Margines przedziału [low, high]: odległość od bliższej granicy (>0 w środku, <0 poza)."""
+    if value is None or value != value or value <= 0:
+        return None
+    return _clip(min(value / low - 1.0, high / value - 1.0))
+
+def ticker_score(row) -> float:
+    """Wyuczony wynik z wiersza (scans, passes, last_margin, last_volume, prev_volume)."""
+    scans, passes, margin, volume, prev_volume = row
+    rate = (float(passes or 0) + PRIOR_WEIGHT * PRIOR_PASS_RATE) / (float(scans or 0) + PRIOR_WEIGHT)
+    volume_change = 0.0
+    if volume and prev_volume and volume > 0 and prev_volume > 0:
+        volume_change = _clip(math.log(float(volume) / float(prev_volume)))
+    margin = _clip(float(margin)) if margin is not None else 0.0
+    return WEIGHT_PASS_RATE * rate + WEIGHT_MARGIN * margin + WEIGHT_VOLUME * volume_change
+
+def order_tickers(session: Session, scanner: str, tickers: List[str]) -> List[str]:
+    """
+    Tickery posortowane malejąco wg wyuczonego wyniku. Remisy (i tickery bez historii)
+    zachowują kolejność wejściową - np. ranking Fazy 1 w SDAR.
+    """
+    if not tickers:
+        return []
+    try:
+        rows = session.execute(text("""
+            SELECT ticker, scans, passes, last_margin, last_volume, prev_volume
+            FROM scan_stats WHERE scanner = :scanner AND ticker = ANY(:tickers)
+        """), {'scanner': scanner, 'tickers': list(tickers)}).fetchall()
+    except Exception as e:
+        logger.error(f"Scan Stats: Błąd odczytu ({scanner}): {e}")
+        session.rollback()
+        return list(tickers)
+
+    prior = ticker_score((0, 0, None, None, None))
+    scores = {r[0]: ticker_score(r[1:]) for r in rows}
+    position = {t: i for i, t in enumerate(tickers)}
+    return sorted(tickers, key=lambda t: (-scores.get(t, prior), position[t]))
+
+def record_results(session: Session, scanner: str, results: List[dict]):
+    """Wyniki skanu: lista {'ticker', 'passed', 'margin', 'volume'} (upsert z wygaszaniem)."""
+    if not results:
+        return
+    rows = [{
+        'scanner': scanner,
+        'ticker': r['ticker'],
+        'passed': bool(r['passed']),
+        'hit': 1 if r['passed'] else 0,
+        'margin': None if r.get('margin') is None else round(float(r['margin']), 4),
+        'volume': int(r['volume']) if r.get('volume') is not None and r['volume'] == r['volume'] else None,
+        'decay': SCAN_DECAY
+    } for r in results]
+    try:
+        for start in range(0, len(rows), WRITE_CHUNK):
+            session.execute(text(_UPSERT_SQL), rows[start:start + WRITE_CHUNK])
+        session.commit()
+    except Exception as e:
+        logger.error(f"Scan Stats: Błąd zapisu {len(rows)} wyników ({scanner}): {e}")
+        session.rollback()
+
+class ScanStatsRecorder:
+    """
+    Bufor wyników skanera (wątek skanu, jego sesja) - zapis co FLUSH_EVERY tickerów,
+    żeby przerwany skan też uczył kolejności.
+    """
+
+    def __init__(self, session: Session, scanner: str, flush_every: int = FLUSH_EVERY):
+        self.session = session
+        self.scanner = scanner
+        self.flush_every = flush_every
+        self._pending: List[dict] = []
+
+    def add(self, ticker: str, passed: bool, margin: Optional[float] = None, volume: Optional[float] = None):
+        self._pending.append({'ticker': ticker, 'passed': passed, 'margin': margin, 'volume': volume})
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        batch, self._pending = self._pending, []
+        record_results(self.session, self.scanner, batch)
@@ -6,7 +6,7 @@ from typing import List, Dict
 
 from .. import models
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
-from .utils import send_telegram_alert, append_scan_log, safe_float
+from .utils import send_telegram_alert, append_scan_log
 
 logger = logging.getLogger(__name__)
 
@@ -61,23 +61,12 @@ def run_signal_monitor_cycle(session: Session, api_client: AlphaVantageClient):
 
     tickers = [s.ticker for s in signals]
     
-    # 2. Pobierz ceny LIVE
-    bulk_csv = api_client.get_bulk_quotes(tickers)
-    
-    live_prices = {}
-    if bulk_csv:
-        try:
-            import csv
-            from io import StringIO
-            reader = csv.DictReader(StringIO(bulk_csv))
-            for row in reader:
-                symbol = row.get('symbol')
-                price = safe_float(row.get('close'))
-                if symbol and price:
-                    live_prices[symbol] = price
-        except Exception as e:
-            logger.error(f"Strażnik: Błąd parsowania CSV: {e}")
-            return 
+    # 2. Pobierz ceny LIVE (tabela kolumnowa: symbol/price/high/low/volume/timestamp)
+    try:
+        live_prices = api_client.get_bulk_quote_table(tickers).price_map()
+    except Exception as e:
+        logger.error(f"Strażnik: Błąd pobierania cen Bulk: {e}")
+        return
 
     updates_count = 0
     now_utc = datetime.now(timezone.utc)
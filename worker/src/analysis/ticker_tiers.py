@@ -0,0 +1,133 @@
+import logging
+from sqlalchemy.orm import Session
+from sqlalchemy import text
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# ==================================================================
+# WARSTWY ODŚWIEŻANIA TICKERÓW (ticker_tiers: HOT / WARM / COLD)
+# ==================================================================
+# Każda spółka z 'companies' dostawała ten sam rytm odświeżania danych dziennych - lider
+# z 20M akcji dziennie tak samo jak wydmuszka, która nigdy nie przeszła progu wolumenu Fazy 1.
+# Warstwa wynika z historii kandydatów i ostatnio obserwowanej płynności:
+#   HOT  - obecni kandydaci (F1/FX/F4/SDAR), aktywne sygnały, portfel, otwarte transakcje
+#          -> rytm zadania (np. 12h Fazy 1),
+#   WARM - kandydat w ostatnich CANDIDATE_MEMORY_DAYS dniach, płynność blisko progu F1
+#          albo jeszcze nieznana -> co WARM_REFRESH_HOURS,
+#   COLD - reszta (trwale niepłynne) -> raz w tygodniu.
+# Skanery i planer prefetchu biorą TTL z warstwy - limit API idzie tam, gdzie mogą powstać sygnały.
+
+TIER_HOT = 'HOT'
+TIER_WARM = 'WARM'
+TIER_COLD = 'COLD'
+
+WARM_REFRESH_HOURS = 72
+COLD_REFRESH_HOURS = 7 * 24
+
+CANDIDATE_MEMORY_DAYS = 30           # Tyle dni po ostatniej kandydaturze ticker nie spada do COLD
+WARM_MIN_AVG_VOLUME = 200_000        # Połowa progu wolumenu Fazy 1 (400k) - blisko progu = WARM
+LIQUIDITY_MAX_AGE_DAYS = 21          # Starsza obserwacja płynności nie wystarcza do zepchnięcia do COLD
+WRITE_CHUNK = 1000
+
+# Źródła warstwy HOT (te same tabele, z których zadania biorą tickery)
+_HOT_TICKERS_SQL = """
+    SELECT ticker FROM phase1_candidates
+    UNION SELECT ticker FROM phasex_candidates
+    UNION SELECT ticker FROM phase4_candidates
+    UNION SELECT ticker FROM sdar_candidates
+    UNION SELECT ticker FROM trading_signals WHERE status IN ('PENDING', 'ACTIVE')
+    UNION SELECT ticker FROM portfolio_holdings
+    UNION SELECT ticker FROM virtual_trades WHERE status = 'OPEN'
+"""
+
+def refresh_tiers(session: Session) -> Dict[str, int]:
+    """
+    Przelicza warstwy wszystkich aktywnych spółek (i tickerów HOT spoza uniwersum) jednym przebiegiem SQL.
+    Tanie (bez zapytań API) - wołane przed Fazą 1 i co godzinę z harmonogramu. Zwraca liczność warstw.
+    """
+    try:
+        session.execute(text(f"""
+            WITH hot AS ({_HOT_TICKERS_SQL}),
+            universe AS (
+                SELECT ticker FROM companies WHERE is_active
+                UNION SELECT ticker FROM hot
+            )
+            INSERT INTO ticker_tiers (ticker, tier, last_candidate_at, updated_at)
+            SELECT u.ticker, :warm, CASE WHEN h.ticker IS NOT NULL THEN NOW() END, NOW()
+            FROM universe u LEFT JOIN hot h ON h.ticker = u.ticker
+            ON CONFLICT (ticker) DO UPDATE SET
+                last_candidate_at = COALESCE(EXCLUDED.last_candidate_at, ticker_tiers.last_candidate_at)
+        """), {'warm': TIER_WARM})
+
+        session.execute(text(f"""
+            WITH hot AS ({_HOT_TICKERS_SQL})
+            UPDATE ticker_tiers t SET
+                tier = CASE
+                    WHEN t.ticker IN (SELECT ticker FROM hot) THEN :hot
+                    WHEN t.last_candidate_at >= NOW() - make_interval(days => :memory) THEN :warm
+                    WHEN t.avg_volume IS NULL
+                      OR t.volume_observed_at < NOW() - make_interval(days => :liquidity_age) THEN :warm
+                    WHEN t.avg_volume >= :warm_volume THEN :warm
+                    ELSE :cold
+                END,
+                updated_at = NOW()
+        """), {
+            'hot': TIER_HOT, 'warm': TIER_WARM, 'cold': TIER_COLD,
+            'memory': CANDIDATE_MEMORY_DAYS, 'liquidity_age': LIQUIDITY_MAX_AGE_DAYS,
+            'warm_volume': WARM_MIN_AVG_VOLUME
+        })
+        session.commit()
+    except Exception as e:
+        logger.error(f"Warstwy: Błąd przeliczania: {e}")
+        session.rollback()
+        return {}
+
+    rows = session.execute(text("SELECT tier, COUNT(*) FROM ticker_tiers GROUP BY tier")).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+def record_liquidity(session: Session, avg_volumes: Dict[str, float]):
+    """Obserwacje średniego wolumenu ze skanu (ticker -> średnia 20 sesji). Warstwa - przy refresh_tiers."""
+    rows = [{'ticker': t, 'avg_volume': int(v)} for t, v in avg_volumes.items() if v is not None and v == v]
+    if not rows:
+        return
+    try:
+        for start in range(0, len(rows), WRITE_CHUNK):
+            session.execute(text("""
+                INSERT INTO ticker_tiers (ticker, tier, avg_volume, volume_observed_at, updated_at)
+                VALUES (:ticker, :warm, :avg_volume, NOW(), NOW())
+                ON CONFLICT (ticker) DO UPDATE SET
+                    avg_volume = EXCLUDED.avg_volume, volume_observed_at = NOW()
+            """), [{**r, 'warm': TIER_WARM} for r in rows[start:start + WRITE_CHUNK]])
+        session.commit()
+    except Exception as e:
+        logger.error(f"Warstwy: Błąd zapisu płynności: {e}")
+        session.rollback()
+
+def get_tiers(session: Session, tickers: List[str]) -> Dict[str, str]:
+    """ticker -> warstwa (tickery bez wpisu pomijane - nowe spółki idą w rytmie zadania)."""
+    if not tickers:
+        return {}
+    rows = session.execute(text("""
+        SELECT ticker, tier FROM ticker_tiers WHERE ticker = ANY(:tickers)
+    """), {'tickers': list(tickers)}).fetchall()
+    return {r[0]: r[1] for r in rows}
+
+def refresh_hours(tier: Optional[str], base_hours: float) -> float:
+    """TTL danych dziennych dla warstwy. HOT / brak wpisu = rytm zadania; niższe warstwy nigdy częściej."""
+    if tier is None or tier == TIER_HOT:
+        return base_hours
+    if tier == TIER_COLD:
+        return max(base_hours, COLD_REFRESH_HOURS)
+    return max(base_hours, WARM_REFRESH_HOURS)
+
+def expiry_map(session: Session, tickers: List[str], base_hours: float) -> Dict[str, float]:
+    """ticker -> expiry_hours dla get_raw_data_with_cache / planera prefetchu."""
+    try:
+        tiers = get_tiers(session, tickers)
+    except Exception as e:
+        # Brak warstw (np. pierwsze uruchomienie) - wszystko w rytmie zadania
+        logger.error(f"Warstwy: Błąd odczytu: {e}")
+        session.rollback()
+        return {t: base_hours for t in tickers}
+    return {t: refresh_hours(tiers.get(t), base_hours) for t in tickers}
@@ -16,6 +16,9 @@ import json
 
 from .. import models
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
+from . import market_calendar
+from . import cache_writer
+from ..config import CACHE_WRITE_BEHIND
 
 logger = logging.getLogger(__name__)
 
@@ -155,6 +158,49 @@ def send_telegram_alert(message: str):
 # SEKCJA 3: OBSŁUGA DANYCH (DATA HANDLING)
 # ==================================================================
 
+def is_cache_entry_fresh(
+    last_fetched: datetime,
+    expiry_hours: Optional[float] = None,
+    now: Optional[datetime] = None,
+    data_type: Optional[str] = None
+) -> bool:
+    """
+    Reguła świeżości wpisu alpha_vantage_cache (wspólna dla odczytu i planera prefetchu).
+    Wpis jest świeży, jeśli mieści się w TTL albo - dla typów rynkowych (dzienne, intraday) -
+    jeśli od pobrania rynek nie mógł opublikować nowych danych (weekend, święto, noc).
+    """
+    if last_fetched is None:
+        return False
+    now = now or datetime.now(timezone.utc)
+
+    # Logika wygasania: konkretny limit godzin (np. Faza 1 Live) albo agresywne 7 dni (np. Optymalizator)
+    ttl = timedelta(hours=expiry_hours) if expiry_hours is not None else timedelta(days=CACHE_EXPIRY_DAYS_DEFAULT)
+    if (now - last_fetched) < ttl:
+        return True
+
+    # Kalendarz NYSE: dane z piątku wieczorem są świeże do poniedziałkowego zamknięcia
+    return market_calendar.unchanged_since(data_type, last_fetched, now)
+
+# Payload 'compact' (ostatnie ~100 świec) żyje pod osobnym kluczem - pełna historia pod kluczem
+# bazowym nigdy nie zostaje nadpisana obciętą (SMA200, OBV, backtest dostałyby NaN / ucięte serie)
+COMPACT_SUFFIX = '_COMPACT'
+
+def cache_data_type(data_type: str, outputsize: Optional[str] = None) -> str:
+    """Klucz data_type w alpha_vantage_cache dla danego outputsize."""
+    return f"{data_type}{COMPACT_SUFFIX}" if outputsize == 'compact' else data_type
+
+def is_compact_payload(raw_data: Any) -> bool:
+    """Payload AV pobrany z outputsize='compact' (Meta Data '4. Output Size')."""
+    if not isinstance(raw_data, dict):
+        return False
+    meta = raw_data.get('Meta Data') or {}
+    return str(meta.get('4. Output Size', '')).strip().lower() == 'compact'
+
+def _record_cache_hit(api_client, data_type: str, ticker: str):
+    # Księga zapytań AV: trafienie w cache liczone obok prawdziwych zapytań (per zadanie)
+    if api_client is not None and hasattr(api_client, 'record_cache_hit'):
+        api_client.record_cache_hit(data_type, ticker)
+
 def get_raw_data_with_cache(
     session: Session, 
     api_client: AlphaVantageClient, 
@@ -167,36 +213,41 @@ def get_raw_data_with_cache(
     """
     Inteligentny Wrapper API z agresywnym cache.
     Chroni limit API przed zbędnymi zapytaniami o te same dane.
+    Zapytanie 'compact' może obsłużyć świeży pełny payload; zapytanie pełne nigdy nie dostaje 'compact'.
     """
+    compact = kwargs.get('outputsize') == 'compact'
+    store_type = cache_data_type(data_type, kwargs.get('outputsize'))
+    lookup_types = [data_type, store_type] if compact else [data_type]
+
+    # 0. Wpis pobrany przed chwilą, jeszcze w buforze zapisu odroczonego
+    if CACHE_WRITE_BEHIND:
+        for key_type in lookup_types:
+            pending = cache_writer.CACHE_WRITER.get(ticker, key_type)
+            if pending is None or (not compact and is_compact_payload(pending.raw_data)):
+                continue
+            if is_cache_entry_fresh(pending.fetched_at, expiry_hours, data_type=data_type):
+                _record_cache_hit(api_client, data_type, ticker)
+                return pending.raw_data
+
     try:
         # 1. Sprawdź Cache w DB
-        cache_entry = session.query(models.AlphaVantageCache).filter(
+        cache_entries = session.query(models.AlphaVantageCache).filter(
             models.AlphaVantageCache.ticker == ticker,
-            models.AlphaVantageCache.data_type == data_type
-        ).first()
-        
-        now = datetime.now(timezone.utc)
-        
-        if cache_entry:
-            last_fetched = cache_entry.last_fetched
-            is_fresh = False
-            
-            # Logika wygasania
-            if expiry_hours is not None:
-                # Jeśli podano konkretny limit godzin (np. dla Fazy 1 Live)
-                is_fresh = (now - last_fetched) < timedelta(hours=expiry_hours)
-            else:
-                # Domyślnie (np. dla Optymalizatora) - Agresywne Cache (7 dni)
-                is_fresh = (now - last_fetched) < timedelta(days=CACHE_EXPIRY_DAYS_DEFAULT)
-                
-                # Dodatkowa logika: Jeśli dzisiaj jest weekend, a dane są z piątku, to są świeże
-                if not is_fresh and now.weekday() >= 5: # Sobota/Niedziela
-                    if (now - last_fetched).days < 3:
-                        is_fresh = True
-
-            if is_fresh and cache_entry.raw_data_json:
-                return cache_entry.raw_data_json 
-                
+            models.AlphaVantageCache.data_type.in_(lookup_types)
+        ).all()
+        by_type = {entry.data_type: entry for entry in cache_entries}
+
+        for key_type in lookup_types:
+            cache_entry = by_type.get(key_type)
+            if not cache_entry or not cache_entry.raw_data_json:
+                continue
+            # Stare wpisy sprzed rozdzielenia kluczy: 'compact' pod kluczem pełnym = brak wpisu
+            if not compact and is_compact_payload(cache_entry.raw_data_json):
+                continue
+            if is_cache_entry_fresh(cache_entry.last_fetched, expiry_hours, data_type=data_type):
+                _record_cache_hit(api_client, data_type, ticker)
+                return cache_entry.raw_data_json
+
     except Exception as e:
         logger.error(f"Cache Read Error: {e}")
 
@@ -230,7 +281,11 @@ def get_raw_data_with_cache(
     if isinstance(raw_data, dict):
         if raw_data.get("Error Message") or raw_data.get("Information"): return {}
 
-    # 3. Zapisz do Cache (Upsert)
+    # 3. Zapisz do Cache: bufor write-behind (paczki w tle) albo bezpośredni upsert
+    if CACHE_WRITE_BEHIND and isinstance(raw_data, (dict, list)):
+        cache_writer.CACHE_WRITER.put(ticker, store_type, raw_data, json.dumps(raw_data))
+        return raw_data
+
     try:
         # === FIX: Konwersja dict na JSON string przed zapisem ===
         # psycopg2 przy surowym SQL nie mapuje automatycznie dict na JSONB
@@ -241,7 +296,7 @@ def get_raw_data_with_cache(
             VALUES (:ticker, :data_type, :raw_data, NOW())
             ON CONFLICT (ticker, data_type) DO UPDATE SET raw_data_json = :raw_data, last_fetched = NOW();
         """)
-        session.execute(upsert_stmt, {'ticker': ticker, 'data_type': data_type, 'raw_data': json_data})
+        session.execute(upsert_stmt, {'ticker': ticker, 'data_type': store_type, 'raw_data': json_data})
         session.commit()
     except Exception as e:
         logger.error(f"Cache Write Error: {e}")
@@ -3,10 +3,7 @@ import re
 from sqlalchemy.orm import Session
 from sqlalchemy import Row, text
 from datetime import datetime, timezone, timedelta
-import csv
-from io import StringIO
 from ..data_ingestion.alpha_vantage_client import AlphaVantageClient
-from .utils import safe_float
 from .. import models
 
 logger = logging.getLogger(__name__)
@@ -84,18 +81,6 @@ def open_virtual_trade(session: Session, signal: models.TradingSignal):
         logger.error(f"[Virtual Agent] Błąd krytyczny: {e}", exc_info=True)
         session.rollback()
 
-def _parse_bulk_quotes_for_virtual_agent(csv_text: str) -> dict:
-    if not csv_text or "symbol" not in csv_text: return {}
-    csv_file = StringIO(csv_text)
-    reader = csv.DictReader(csv_file)
-    price_dict = {}
-    for row in reader:
-        ticker = row.get('symbol')
-        price = safe_float(row.get('close'))
-        if ticker and price is not None:
-            price_dict[ticker] = price
-    return price_dict
-
 def run_virtual_trade_monitor(session: Session, api_client: AlphaVantageClient):
     logger.info("🤖 [Virtual Agent] Uruchamianie monitora...")
     
@@ -143,9 +128,8 @@ def run_virtual_trade_monitor(session: Session, api_client: AlphaVantageClient):
 
         if tickers_to_check_expiry:
             unique_tickers = list(set(tickers_to_check_expiry))
-            bulk_csv = api_client.get_bulk_quotes(unique_tickers)
-            if bulk_csv:
-                parsed_prices = _parse_bulk_quotes_for_virtual_agent(bulk_csv)
+            parsed_prices = api_client.get_bulk_quote_table(unique_tickers).price_map()
+            if parsed_prices:
                 expired_trades = session.query(models.VirtualTrade).filter(
                     models.VirtualTrade.status == 'OPEN',
                     models.VirtualTrade.ticker.in_(unique_tickers)
@@ -48,3 +48,27 @@ DEFAULT_MARKET_ETF = "QQQ"
 # === Konfiguracja Workera ===
 ANALYSIS_SCHEDULE_TIME_CET = "02:30"
 COMMAND_CHECK_INTERVAL_SECONDS = 5
+
+# === Firehose Newsów (NEWS_SENTIMENT całego rynku) ===
+# Pusta lista = jeden strumień bez filtra (cały rynek). Lista tematów AV
+# (np. ["life_sciences", "mergers_and_acquisitions"]) = osobny strumień na temat.
+NEWS_FIREHOSE_TOPICS = []
+
+# === Filtry fundamentalne skanerów (tabela company_fundamentals, zero zapytań API) ===
+# None = filtr wyłączony. Spółki bez danych fundamentalnych przechodzą (nie odrzucamy "w ciemno").
+FUNDAMENTALS_MIN_MARKET_CAP = None      # np. 50_000_000
+FUNDAMENTALS_MAX_MARKET_CAP = None      # np. 2_000_000_000
+FUNDAMENTALS_MIN_FLOAT = None           # np. 5_000_000 akcji
+FUNDAMENTALS_MAX_FLOAT = None           # np. 100_000_000 akcji
+
+# === Uniwersum spółek (odświeżanie dzienne: data_initializer.refresh_universe) ===
+# 'NASDAQ' = nasdaqlisted.txt (jak pierwotny seed), 'AV' = LISTING_STATUS z Alpha Vantage (1 zapytanie)
+UNIVERSE_SOURCE = 'NASDAQ'
+UNIVERSE_EXCHANGES = ['NASDAQ']         # Tylko dla źródła 'AV'
+
+# === Zapis odroczony cache (analysis/cache_writer.py) ===
+# False = stary tryb (upsert + commit przy każdym chybieniu cache)
+CACHE_WRITE_BEHIND = True
+CACHE_WRITE_BEHIND_FLUSH_SIZE = 200             # Wpisów na paczkę
+CACHE_WRITE_BEHIND_FLUSH_SECONDS = 5            # Maksymalne opóźnienie zapisu
+CACHE_WRITE_BEHIND_MAX_BYTES = 64 * 1024 * 1024 # Limit pamięci bufora (payloady 'full' bywają duże)
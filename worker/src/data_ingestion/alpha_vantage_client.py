@@ -1,5 +1,6 @@
 
 import time
+import threading
 import requests
 import logging
 import json
@@ -7,6 +8,11 @@ import csv
 from io import StringIO
 from collections import deque
 import os
+import numpy as np
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from typing import Dict, Iterable, Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -17,50 +23,358 @@ API_KEY = os.getenv("ALPHAVANTAGE_API_KEY")
 if not API_KEY:
     logger.error("ALPHAVANTAGE_API_KEY not found in environment for WORKER's client.")
 
+# === PASY PRIORYTETU (Priority Lanes) ===
+# Niższa liczba = wyższy priorytet. Pas wybiera wątek wywołujący (client.priority(...)).
+LANE_LIVE = 0    # Ceny live: monitor sygnałów (SL/TP), wirtualny portfel
+LANE_USER = 1    # Monitory widoczne dla użytkownika (newsy, BioX, alerty)
+LANE_BULK = 2    # Skany, backtesty, optymalizacja, prefetch (domyślny)
+
+# ==================================================================
+# TABELA CEN MASOWYCH (REALTIME_BULK_QUOTES -> kolumny numpy)
+# ==================================================================
+# Każda paczka CSV (do 100 symboli) czytana jest osobno przez csv.reader i transponowana
+# do kolumn - bez sklejania paczek w jeden tekst i bez słownika na wiersz (csv.DictReader).
+# Kolumny liczbowe konwertuje numpy w jednym wywołaniu; wolna ścieżka (wartość po wartości)
+# tylko dla paczek z pustymi / nieliczbowymi polami. Paczki łączy np.concatenate.
+# Pomiar: python -m src.data_ingestion.av_standin bench --symbols 2000
+
+BULK_NUMERIC_COLUMNS = {'price': 'close', 'high': 'high', 'low': 'low', 'volume': 'volume'}
+
+@dataclass
+class BulkQuoteTable:
+    symbol: np.ndarray       # object (str)
+    price: np.ndarray        # float64, NaN = brak
+    high: np.ndarray
+    low: np.ndarray
+    volume: np.ndarray
+    timestamp: np.ndarray    # datetime64[s], NaT = brak
+
+    def __len__(self) -> int:
+        return len(self.symbol)
+
+    def price_map(self) -> Dict[str, float]:
+        """symbol -> cena dla notowań z dodatnią ceną (ostatnie wystąpienie wygrywa)."""
+        valid = self.price > 0
+        return dict(zip(self.symbol[valid].tolist(), self.price[valid].tolist()))
+
+def _empty_bulk_table() -> BulkQuoteTable:
+    empty = np.empty(0, dtype=np.float64)
+    return BulkQuoteTable(
+        symbol=np.empty(0, dtype=object), price=empty, high=empty, low=empty, volume=empty,
+        timestamp=np.empty(0, dtype='datetime64[s]')
+    )
+
+def _float_column(values) -> np.ndarray:
+    try:
+        return np.array(values, dtype=np.float64)
+    except (ValueError, TypeError):
+        parsed = (AlphaVantageClient._safe_float(v) for v in values)
+        return np.fromiter((np.nan if v is None else v for v in parsed), dtype=np.float64, count=len(values))
+
+def _timestamp_column(values) -> np.ndarray:
+    # Paczka ma zwykle jeden znacznik czasu - parsujemy unikalne wartości ('YYYY-MM-DD HH:MM:SS.fff')
+    parsed = {}
+    for v in set(values):
+        try:
+            parsed[v] = np.datetime64(v[:19].replace(' ', 'T'), 's')
+        except ValueError:
+            parsed[v] = np.datetime64('NaT', 's')
+    return np.array([parsed[v] for v in values], dtype='datetime64[s]')
+
+def bulk_chunk_to_table(chunk: str) -> Optional[BulkQuoteTable]:
+    """Jedna odpowiedź CSV REALTIME_BULK_QUOTES -> tabela kolumnowa (None, gdy brak wierszy)."""
+    rows = list(csv.reader(StringIO(chunk)))
+    if len(rows) < 2 or 'symbol' not in rows[0]:
+        return None
+    header = rows[0]
+    body = [r for r in rows[1:] if len(r) == len(header) and r[0]]
+    if not body:
+        return None
+    columns = dict(zip(header, zip(*body)))
+    missing = [''] * len(body)
+    numeric = {name: _float_column(columns.get(src, missing)) for name, src in BULK_NUMERIC_COLUMNS.items()}
+    return BulkQuoteTable(
+        symbol=np.array(columns['symbol'], dtype=object),
+        timestamp=_timestamp_column(columns.get('timestamp', missing)),
+        **numeric
+    )
+
+def bulk_quote_table(chunks: Iterable[str]) -> BulkQuoteTable:
+    """Tabela ze wszystkich paczek (np.concatenate kolumn, kolejność paczek zachowana)."""
+    tables = [t for t in (bulk_chunk_to_table(c) for c in chunks) if t is not None]
+    if not tables:
+        return _empty_bulk_table()
+    if len(tables) == 1:
+        return tables[0]
+    fields = BulkQuoteTable.__dataclass_fields__
+    return BulkQuoteTable(**{f: np.concatenate([getattr(t, f) for t in tables]) for f in fields})
+
 class AlphaVantageClient:
-    BASE_URL = "https://www.alphavantage.co/query"
+    # Nadpisywalne (np. lokalny stand-in: http://127.0.0.1:8765/query)
+    BASE_URL = os.getenv("ALPHAVANTAGE_BASE_URL", "https://www.alphavantage.co/query")
+
+    # Część okna zarezerwowana wyłącznie dla pasa LIVE - pasy USER/BULK
+    # nigdy nie zajmą więcej niż (1 - LIVE_RESERVED_FRACTION) limitu minutowego.
+    LIVE_RESERVED_FRACTION = 0.15
+
+    # === BULK QUOTES (REALTIME_BULK_QUOTES) ===
+    BULK_BATCH_SIZE = 100
+
+    # === ADAPTACYJNA KONTROLA TEMPA (AIMD, jak kontrola przeciążenia TCP) ===
+    # Sukcesy -> tempo rośnie addytywnie (+AIMD_INCREASE_RPM co AIMD_INCREASE_EVERY udanych zapytań),
+    # odpowiedź throttle ("Information"/"Note") -> tempo spada multiplikatywnie (x AIMD_DECREASE_FACTOR).
+    # Wyuczone bezpieczne tempo jest zapisywane przez callback (system_control) i wczytywane po restarcie.
+    # Sufit Workera = pasmo klucza minus rezerwa Frontendu (API używa tego samego klucza).
+    PLAN_RPM = int(os.getenv("ALPHAVANTAGE_PLAN_RPM", "150"))            # Plan Premium (całe pasmo klucza)
+    FRONTEND_RESERVED_RPM = int(os.getenv("ALPHAVANTAGE_FRONTEND_RPM", "30"))
+    AIMD_MIN_RPM = 30
+    AIMD_MAX_RPM = max(AIMD_MIN_RPM, PLAN_RPM - FRONTEND_RESERVED_RPM)
+    AIMD_INCREASE_RPM = 1.0
+    AIMD_INCREASE_EVERY = 20
+    AIMD_DECREASE_FACTOR = 0.7
+    AIMD_DECREASE_COOLDOWN_S = 10.0    # Seria throttle z jednego "wybuchu" = jedno cięcie
+    # Po throttle klucz jest wstrzymany (wszystkie wątki): pierwsza próba czeka do końca cooldownu AIMD,
+    # kolejna - do odnowienia okna minutowego (najstarsze zapytanie w oknie + 60s)
+    THROTTLE_WINDOW_S = 60.0
+    AIMD_PERSIST_INTERVAL_S = 60.0
 
     # === OPTYMALIZACJA (TRAFFIC SHAPING) - WORKER ===
-    # Worker otrzymuje 120 zapytań/minutę (80% pasma Premium).
-    # Pozostałe 30 zapytań/minutę jest zarezerwowane dla Frontendu.
-    def __init__(self, api_key: str = API_KEY, requests_per_minute: int = 120, retries: int = 3, backoff_factor: float = 0.5):
+    # Worker startuje od 120 zapytań/minutę (80% pasma Premium); AIMD zwalnia przy throttle
+    # i wraca najwyżej do AIMD_MAX_RPM. Pozostałe 30 zapytań/minutę jest zarezerwowane dla Frontendu.
+    def __init__(self, api_key: str = API_KEY, requests_per_minute: int = 120, retries: int = 3, backoff_factor: float = 0.5,
+                 max_requests_per_minute: int = None, transport=None):
         if not api_key:
             logger.error("API key is missing for AlphaVantageClient instance in WORKER.")
         self.api_key = api_key
         self.retries = retries
         self.backoff_factor = backoff_factor
         self.requests_per_minute = requests_per_minute
+        self.max_requests_per_minute = max_requests_per_minute or self.AIMD_MAX_RPM
         
-        # Pacing (Rolling Window)
-        self.request_interval = 60.0 / requests_per_minute
+        # Pacing (Rolling Window) - tempo sterowane przez AIMD
+        self.current_rpm = float(min(requests_per_minute, self.max_requests_per_minute))
+        self.request_interval = 60.0 / self.current_rpm
         self.request_timestamps = deque()
+        # Blokada okna: klient bywa współdzielony przez wątki (np. wzbogacanie sektorów Fazy X)
+        self._rate_lock = threading.Lock()
+        self._rate_cond = threading.Condition(self._rate_lock)
+        self._lane_waiting = {LANE_LIVE: 0, LANE_USER: 0, LANE_BULK: 0}
+        self._lane_ctx = threading.local()
+        self._paused_until = 0.0
+
+        # Stan AIMD
+        self._success_streak = 0
+        self._last_decrease = 0.0
+        self._last_persist = 0.0
+        self._persisted_rpm = None
+        self._rate_saver = None
+
+        # Księga zapytań: kontekst zadania (wątek lub cały proces) + callback zapisu
+        self._job_ctx = threading.local()
+        self._process_job = None
+        self._call_recorder = None
         
-        # Session Keep-Alive
-        self.session = requests.Session()
+        # Session Keep-Alive. Transport (obiekt z metodą get(url, params, timeout)) pozwala
+        # podpiąć lokalny stand-in AV (av_standin) - jawnie albo przez APEX_AV_STANDIN.
+        if transport is None:
+            from .av_standin import transport_from_env
+            transport = transport_from_env()
+        self.session = transport or requests.Session()
+
+    # === AIMD ===
+
+    def set_rate_persistence(self, loader=None, saver=None):
+        """
+        Podpina trwałość wyuczonego tempa: loader() -> float | None, saver(rpm: float).
+        Klient nie zna bazy danych - callbacki dostarcza Worker.
+        """
+        self._rate_saver = saver
+        if loader:
+            try:
+                learned = loader()
+                if learned:
+                    with self._rate_lock:
+                        self._set_rpm(float(learned))
+                        self._persisted_rpm = self.current_rpm
+                    logger.info(f"AV Rate Control: Wczytano wyuczone tempo {self.current_rpm:.1f} req/min.")
+            except Exception as e:
+                logger.error(f"AV Rate Control: Błąd wczytywania tempa: {e}")
+
+    def _set_rpm(self, rpm: float):
+        self.current_rpm = max(self.AIMD_MIN_RPM, min(self.max_requests_per_minute, rpm))
+        self.request_interval = 60.0 / self.current_rpm
+
+    def _on_success(self):
+        with self._rate_lock:
+            self._success_streak += 1
+            if self._success_streak >= self.AIMD_INCREASE_EVERY:
+                self._success_streak = 0
+                self._set_rpm(self.current_rpm + self.AIMD_INCREASE_RPM)
+        self._persist_rate()
+
+    def _on_throttle(self):
+        with self._rate_lock:
+            self._success_streak = 0
+            now = time.monotonic()
+            if now - self._last_decrease < self.AIMD_DECREASE_COOLDOWN_S:
+                return
+            self._last_decrease = now
+            previous = self.current_rpm
+            self._set_rpm(self.current_rpm * self.AIMD_DECREASE_FACTOR)
+        logger.warning(f"AV Rate Control: Throttle -> tempo {previous:.1f} -> {self.current_rpm:.1f} req/min.")
+        self._persist_rate(force=True)
+
+    def _pause_after_throttle(self, attempt: int) -> float:
+        """
+        Wstrzymuje limiter po odpowiedzi throttle: pierwsza próba - do końca cooldownu AIMD,
+        kolejne - do odnowienia okna minutowego. Zwraca długość pauzy (s).
+        """
+        with self._rate_cond:
+            now = time.monotonic()
+            resume = now + self.AIMD_DECREASE_COOLDOWN_S
+            if attempt > 0:
+                oldest = self.request_timestamps[0] if self.request_timestamps else now
+                resume = max(resume, oldest + self.THROTTLE_WINDOW_S)
+            self._paused_until = max(self._paused_until, resume)
+            self._rate_cond.notify_all()
+            return self._paused_until - now
+
+    def _persist_rate(self, force: bool = False):
+        if not self._rate_saver:
+            return
+        now = time.monotonic()
+        if not force and (now - self._last_persist) < self.AIMD_PERSIST_INTERVAL_S:
+            return
+        rpm = round(self.current_rpm, 1)
+        if rpm == self._persisted_rpm:
+            return
+        self._last_persist = now
+        try:
+            self._rate_saver(rpm)
+            self._persisted_rpm = rpm
+        except Exception as e:
+            logger.error(f"AV Rate Control: Błąd zapisu tempa: {e}")
+
+    # === KSIĘGA ZAPYTAŃ (Quota Ledger) ===
+
+    def set_call_recorder(self, recorder=None):
+        """
+        Podpina zapis każdego zapytania: recorder(entry: dict).
+        Klient nie zna bazy danych - callback (bufor księgi) dostarcza Worker.
+        """
+        self._call_recorder = recorder
+
+    @contextmanager
+    def job_context(self, job_id: str = None, phase: str = None, process_wide: bool = False):
+        """
+        Przypisuje zapytania do zadania (job_id, faza). Domyślnie dla bieżącego wątku;
+        process_wide=True - dla wszystkich wątków bez własnego kontekstu (pule wątków operacji).
+        """
+        ctx = {'job_id': job_id, 'phase': phase}
+        if process_wide:
+            previous = self._process_job
+            self._process_job = ctx
+            try:
+                yield self
+            finally:
+                self._process_job = previous
+        else:
+            previous = getattr(self._job_ctx, 'job', None)
+            self._job_ctx.job = ctx
+            try:
+                yield self
+            finally:
+                self._job_ctx.job = previous
+
+    def current_job(self) -> dict:
+        return getattr(self._job_ctx, 'job', None) or self._process_job or {'job_id': None, 'phase': None}
+
+    def _record_call(self, function: str, symbol: str = None, status: str = 'OK', cached: bool = False, latency_ms: int = None):
+        if not self._call_recorder:
+            return
+        job = self.current_job()
+        try:
+            self._call_recorder({
+                'called_at': datetime.now(timezone.utc),
+                'job_id': job['job_id'],
+                'phase': job['phase'],
+                'function': function,
+                'symbol': (symbol or None) and str(symbol)[:50],
+                'lane': self.current_lane(),
+                'cached': cached,
+                'status': status,
+                'latency_ms': latency_ms
+            })
+        except Exception as e:
+            logger.error(f"AV Ledger: Błąd zapisu zapytania: {e}")
+
+    def record_cache_hit(self, data_type: str, symbol: str = None):
+        """Dane podane z cache (bez zapytania AV) - ta sama księga z cached=True."""
+        self._record_call(data_type, symbol, status='CACHE', cached=True)
+
+    # === PRIORYTETY ===
+
+    @contextmanager
+    def priority(self, lane: int):
+        """Ustawia pas priorytetu dla zapytań z bieżącego wątku (zagnieżdżalne)."""
+        previous = getattr(self._lane_ctx, 'lane', LANE_BULK)
+        self._lane_ctx.lane = lane
+        try:
+            yield self
+        finally:
+            self._lane_ctx.lane = previous
+
+    def current_lane(self) -> int:
+        return getattr(self._lane_ctx, 'lane', LANE_BULK)
 
     def _rate_limiter(self):
-        """Zaawansowany Rate Limiter typu 'Rolling Window'."""
+        """Rate Limiter typu 'Rolling Window' z pasami priorytetu (bezpieczny wątkowo)."""
         if not self.api_key: return
-             
-        now = time.monotonic()
-        # Usuwamy stare znaczniki czasu (starsze niż 60s)
-        while self.request_timestamps and (now - self.request_timestamps[0] > 60):
-            self.request_timestamps.popleft()
-            
-        # Jeśli przekroczyliśmy limit w oknie 60s -> czekamy
-        if len(self.request_timestamps) >= self.requests_per_minute:
-            time_to_wait = 60 - (now - self.request_timestamps[0]) + 0.1
-            if time_to_wait > 0:
-                time.sleep(time_to_wait)
-                now = time.monotonic()
-
-        # Pacing (odstęp między zapytaniami)
-        if self.request_timestamps:
-            time_since_last = now - self.request_timestamps[-1]
-            if time_since_last < self.request_interval:
-                time.sleep(self.request_interval - time_since_last)
-        
-        self.request_timestamps.append(time.monotonic())
+
+        lane = self.current_lane()
+        with self._rate_cond:
+            self._lane_waiting[lane] += 1
+            try:
+                self._acquire_slot(lane)
+            finally:
+                self._lane_waiting[lane] -= 1
+                self._rate_cond.notify_all()
+
+    def _acquire_slot(self, lane: int):
+        # Wywoływane pod self._rate_cond. Czekamy przez cond.wait (zwalnia blokadę),
+        # więc wątek z wyższego pasa może wejść przed czekającym skanem.
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                # Klucz wstrzymany po throttle - czekają wszystkie pasy
+                self._rate_cond.wait(timeout=self._paused_until - now)
+                continue
+            # Usuwamy stare znaczniki czasu (starsze niż 60s)
+            while self.request_timestamps and (now - self.request_timestamps[0] > 60):
+                self.request_timestamps.popleft()
+
+            if any(self._lane_waiting[l] for l in range(lane)):
+                # Wyższy pas czeka na slot - ustępujemy
+                time_to_wait = self.request_interval
+            else:
+                limit = int(self.current_rpm)
+                if lane != LANE_LIVE:
+                    limit = max(1, int(limit * (1 - self.LIVE_RESERVED_FRACTION)))
+
+                time_to_wait = 0.0
+                # Jeśli przekroczyliśmy limit pasa w oknie 60s -> czekamy
+                if len(self.request_timestamps) >= limit:
+                    time_to_wait = 60 - (now - self.request_timestamps[-limit]) + 0.1
+
+                # Pacing (odstęp między zapytaniami)
+                if self.request_timestamps:
+                    time_to_wait = max(time_to_wait, self.request_interval - (now - self.request_timestamps[-1]))
+
+                if time_to_wait <= 0:
+                    self.request_timestamps.append(now)
+                    return
+
+            self._rate_cond.wait(timeout=max(time_to_wait, 0.01))
 
     def _make_request(self, params: dict):
         if not self.api_key:
@@ -71,39 +385,56 @@ class AlphaVantageClient:
         request_params['apikey'] = self.api_key
             
         request_identifier = params.get('symbol') or params.get('tickers') or params.get('function')
+        function = params.get('function')
+        symbol = params.get('symbol') or params.get('tickers')
         
         for attempt in range(self.retries):
             self._rate_limiter()
             
+            started = time.monotonic()
+            status, latency_ms = 'ERROR', None
             try:
                 response = self.session.get(self.BASE_URL, params=request_params, timeout=30)
+                latency_ms = int((time.monotonic() - started) * 1000)
                 
                 try:
                     data = response.json()
                 except json.JSONDecodeError:
                     if params.get('datatype') == 'csv':
                         response.raise_for_status() 
+                        self._on_success()
+                        status = 'OK'
                         return response.text
                     raise requests.exceptions.RequestException("Response was not valid JSON.")
 
                 is_rate_limit_json = False
-                if "Information" in data:
-                    info_text = data["Information"].lower()
+                if isinstance(data, dict):
+                    info_text = str(data.get("Information") or data.get("Note") or "").lower()
                     if "frequency" in info_text or "api call volume" in info_text or "please contact premium" in info_text:
                         is_rate_limit_json = True
                 
                 is_error_msg = isinstance(data, dict) and "Error Message" in data
 
                 if is_rate_limit_json:
-                    wait_time = 5 * (attempt + 1)
-                    logger.warning(f"Worker API Rate Limit Hit for {request_identifier}. Sleeping {wait_time}s...")
-                    time.sleep(wait_time)
+                    # AIMD: cięcie tempa + pauza klucza do końca cooldownu / odnowienia okna;
+                    # ponowienie czeka na slot limitera (pauza obowiązuje wszystkie wątki)
+                    status = 'THROTTLED'
+                    self._on_throttle()
+                    if attempt < self.retries - 1:
+                        pause = self._pause_after_throttle(attempt)
+                        logger.warning(f"Worker API Rate Limit Hit for {request_identifier}. Retrying in {pause:.1f}s at {self.current_rpm:.1f} req/min...")
+                    else:
+                        logger.error(f"Worker API Rate Limit Hit for {request_identifier}. Giving up after {self.retries} attempts.")
                     continue
 
+                self._on_success()
+
                 if not data or is_error_msg:
+                    status = 'EMPTY'
                     return None
                 
                 response.raise_for_status()
+                status = 'OK'
                 return data
 
             except (requests.exceptions.RequestException, json.JSONDecodeError) as e:
@@ -111,6 +442,9 @@ class AlphaVantageClient:
                     time.sleep(1)
                 else:
                     pass
+            finally:
+                # Każda próba (także throttle i błąd) zużywa limit klucza
+                self._record_call(function, symbol, status=status, latency_ms=latency_ms)
 
         return None
 
@@ -142,93 +476,51 @@ class AlphaVantageClient:
         params = {"function": "MARKET_STATUS"}
         return self._make_request(params)
 
-    def get_bulk_quotes(self, symbols: list[str]):
+    def _iter_bulk_chunks(self, symbols: list[str]):
         """
-        Pobiera surowy tekst CSV dla endpointu REALTIME_BULK_QUOTES.
-        OBSŁUGA BATCHINGU: Dzieli zapytanie na paczki po 100 symboli.
+        Generator surowych odpowiedzi CSV endpointu REALTIME_BULK_QUOTES.
+        OBSŁUGA BATCHINGU: Dzieli zapytanie na paczki po BULK_BATCH_SIZE symboli
+        (tempo pilnuje limiter - bez dodatkowych uśpień między paczkami).
         """
-        # 1. Oczyszczenie i deduplikacja symboli
-        clean_symbols = list(set([s.strip().upper() for s in symbols if s.strip()]))
-        if not clean_symbols:
-            return None
+        # 1. Oczyszczenie i deduplikacja symboli (kolejność zachowana)
+        clean_symbols = list(dict.fromkeys(s.strip().upper() for s in symbols if s and s.strip()))
 
         # 2. Podział na batche (Max 100 symboli na request wg dokumentacji AV)
-        batch_size = 100
-        batches = [clean_symbols[i:i + batch_size] for i in range(0, len(clean_symbols), batch_size)]
-        
-        combined_csv_output = ""
-        header_saved = False
-        
-        # 3. Wykonanie zapytań dla każdej paczki
-        for batch in batches:
+        for i in range(0, len(clean_symbols), self.BULK_BATCH_SIZE):
+            batch = clean_symbols[i:i + self.BULK_BATCH_SIZE]
             params = {
                 "function": "REALTIME_BULK_QUOTES",
                 "symbol": ",".join(batch),
                 "datatype": "csv",
             }
-            
             try:
                 # _make_request zarządza API Key i Rate Limitami (Worker ma własne limity 120/min)
                 text_response = self._make_request(params)
-                
                 if isinstance(text_response, str) and "symbol" in text_response:
-                    lines = text_response.strip().split('\n')
-                    if not lines: continue
-                    
-                    # Logika łączenia CSV
-                    if not header_saved:
-                        # Pierwsza paczka: bierzemy wszystko (nagłówek + dane)
-                        combined_csv_output += text_response.strip()
-                        header_saved = True
-                    else:
-                        # Kolejne paczki: pomijamy nagłówek (pierwszą linię), doklejamy tylko dane
-                        if len(lines) > 1:
-                            # Dodaj nową linię separatora, jeśli buffer nie jest pusty
-                            if combined_csv_output:
-                                combined_csv_output += "\n"
-                            combined_csv_output += "\n".join(lines[1:])
-                
-                # Krótki oddech, aby nie zalać API przy bardzo dużej liczbie batchy
-                if len(batches) > 1:
-                    time.sleep(0.1)
-                    
+                    yield text_response
             except Exception as e:
                 logger.error(f"Worker: Błąd podczas pobierania batcha Bulk Quotes: {e}")
-                continue
 
-        if not combined_csv_output or "symbol" not in combined_csv_output:
+    def get_bulk_quotes(self, symbols: list[str]):
+        """
+        Pobiera surowy tekst CSV dla endpointu REALTIME_BULK_QUOTES (jeden nagłówek, wszystkie paczki).
+        Ścieżka tekstowa dla pojedynczych notowań (get_global_quote, cache) - masowo: get_bulk_quote_table.
+        """
+        lines = []
+        for chunk in self._iter_bulk_chunks(symbols):
+            chunk_lines = chunk.strip().split('\n')
+            # Kolejne paczki: pomijamy nagłówek (pierwszą linię), doklejamy tylko dane
+            lines.extend(chunk_lines if not lines else chunk_lines[1:])
+        if not lines:
             return None
-            
-        return combined_csv_output
+        return "\n".join(lines)
 
-    def get_bulk_quotes_parsed(self, symbols: list[str]) -> list[dict]:
+    def get_bulk_quote_table(self, symbols: list[str]) -> BulkQuoteTable:
         """
-        Pobiera i parsuje dane Bulk do listy słowników (Dla Workera/Faza 5).
+        Ceny masowe jako tabela kolumnowa (symbol, price, high, low, volume, timestamp).
+        Dla Workera: monitor sygnałów, wirtualny portfel, bramka cenowa Fazy X.
         """
-        csv_text = self.get_bulk_quotes(symbols)
-        if not csv_text: 
-            return []
-            
-        results = []
-        try:
-            f = StringIO(csv_text)
-            reader = csv.DictReader(f)
-            for row in reader:
-                data = {
-                    'symbol': row.get('symbol'),
-                    'price': self._safe_float(row.get('close')),
-                    'volume': self._safe_float(row.get('volume')),
-                    'bid': self._safe_float(row.get('bid')),
-                    'ask': self._safe_float(row.get('ask')),
-                    'bid_size': self._safe_float(row.get('bid_size')),
-                    'ask_size': self._safe_float(row.get('ask_size'))
-                }
-                if data['symbol']:
-                    results.append(data)
-        except Exception as e:
-            logger.error(f"Błąd parsowania Bulk CSV w Workerze: {e}")
-            
-        return results
+        return bulk_quote_table(self._iter_bulk_chunks(symbols))
 
     def get_global_quote(self, symbol: str):
         # Używamy get_bulk_quotes z listą jednoelementową, aby skorzystać z tej samej logiki
@@ -338,6 +630,22 @@ class AlphaVantageClient:
         if time_from: params["time_from"] = time_from
         if time_to: params["time_to"] = time_to
         return self._make_request(params)
+
+    def get_news_feed(self, topics: str = None, time_from: str = None, time_to: str = None, limit: int = 1000, sort: str = "LATEST"):
+        """
+        Strumień NEWS_SENTIMENT całego rynku (bez filtra tickerów, opcjonalnie po tematach).
+        Artykuły niosą listę 'ticker_sentiment', więc jedno zapytanie pokrywa wiele spółek.
+        sort: LATEST (najnowsze najpierw) albo EARLIEST (stronicowanie w przód od time_from).
+        """
+        params = {
+            "function": "NEWS_SENTIMENT",
+            "limit": str(limit),
+            "sort": sort
+        }
+        if topics: params["topics"] = topics
+        if time_from: params["time_from"] = time_from
+        if time_to: params["time_to"] = time_to
+        return self._make_request(params)
     
     def search_symbol(self, keywords: str):
         """
@@ -358,6 +666,18 @@ class AlphaVantageClient:
         params = {"function": "EARNINGS", "symbol": symbol}
         return self._make_request(params)
 
+    def get_listing_status(self, state: str = 'active', date: str = None):
+        """Lista notowanych (lub wycofanych: state='delisted') spółek jako CSV - jedno zapytanie."""
+        params = {"function": "LISTING_STATUS", "state": state, "datatype": "csv"}
+        if date: params["date"] = date
+        return self._make_request(params)
+
+    def get_earnings_calendar(self, horizon: str = '3month', symbol: str = None):
+        """Cały kalendarz wyników (CSV) w jednym zapytaniu. horizon: 3month / 6month / 12month."""
+        params = {"function": "EARNINGS_CALENDAR", "horizon": horizon, "datatype": "csv"}
+        if symbol: params["symbol"] = symbol
+        return self._make_request(params)
+
     # === DANE MAKRO ===
     def get_inflation_rate(self, interval: str = 'monthly'):
         params = {"function": "INFLATION", "interval": interval, "datatype": "json"}
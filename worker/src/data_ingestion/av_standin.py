@@ -0,0 +1,747 @@
+"""
+Lokalny zastępca Alpha Vantage (record / replay / synthetic) do benchmarków offline.
+
+Transport podpinany do AlphaVantageClient (parametr `transport` albo zmienna
+środowiskowa APEX_AV_STANDIN) lub serwowany jako mały serwer HTTP:
+
+    python -m src.data_ingestion.av_standin serve --port 8765 --mode synthetic
+    python -m src.data_ingestion.av_standin probe --requests 500 --rpm-limit 150
+    python -m src.data_ingestion.av_standin bench --symbols 2000
+
+Tryby:
+  - synthetic: deterministyczne dane generowane z (seed, symbol, data kotwicy),
+  - replay:    odtwarzanie odpowiedzi zapisanych w katalogu fixtures,
+  - record:    przepuszczanie zapytań do prawdziwego API i zapis fixtures.
+Opóźnienie (latency/jitter) i komunikaty throttle (losowe lub limit okna 60s)
+są konfigurowalne - pozwala to mierzyć skanery, backtest i optymalizator
+powtarzalnie, bez zużywania limitu klucza.
+"""
+import os
+import io
+import csv
+import json
+import time
+import zlib
+import random
+import hashlib
+import logging
+import argparse
+import threading
+from collections import deque, Counter
+from datetime import datetime, date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qsl
+from typing import Dict, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+LIVE_BASE_URL = "https://www.alphavantage.co/query"
+THROTTLE_MESSAGE = (
+    "Thank you for using Alpha Vantage! Please contact premium@alphavantage.co "
+    "if you are targeting a higher API call volume."
+)
+
+FULL_DAILY_BARS = 2500       # ~10 lat sesji dla outputsize=full
+COMPACT_BARS = 100
+INTRADAY_FULL_DAYS = 30
+DEFAULT_UNIVERSE = [
+    'AAPL', 'MSFT', 'NVDA', 'AMZN', 'META', 'GOOGL', 'TSLA', 'AMD', 'NFLX', 'INTC',
+    'MRNA', 'BNTX', 'VRTX', 'REGN', 'GILD', 'BIIB', 'ILMN', 'SAVA', 'NVAX', 'CRSP'
+]
+SECTORS = [
+    ('TECHNOLOGY', 'SERVICES-PREPACKAGED SOFTWARE'),
+    ('LIFE SCIENCES', 'BIOLOGICAL PRODUCTS, (NO DIAGNOSTIC SUBSTANCES)'),
+    ('LIFE SCIENCES', 'PHARMACEUTICAL PREPARATIONS'),
+    ('MANUFACTURING', 'SEMICONDUCTORS & RELATED DEVICES'),
+    ('FINANCE', 'STATE COMMERCIAL BANKS'),
+    ('ENERGY & TRANSPORTATION', 'CRUDE PETROLEUM & NATURAL GAS'),
+]
+SENTIMENT_LABELS = [
+    (-0.35, 'Bearish'), (-0.15, 'Somewhat-Bearish'), (0.15, 'Neutral'), (0.35, 'Somewhat-Bullish'), (9.9, 'Bullish')
+]
+
+
+# ==================================================================
+# ODPOWIEDŹ (kompatybilna z requests.Response w zakresie używanym przez klienta)
+# ==================================================================
+
+class StandInResponse:
+    def __init__(self, body: str, status_code: int = 200, content_type: str = 'application/json'):
+        self.text = body
+        self.status_code = status_code
+        self.headers = {'Content-Type': content_type}
+
+    def json(self):
+        return json.loads(self.text)
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.exceptions.HTTPError(f"Stand-in HTTP {self.status_code}")
+
+
+# ==================================================================
+# GENERATOR DANYCH SYNTETYCZNYCH
+# ==================================================================
+
+def _rng(*parts) -> random.Random:
+    return random.Random(zlib.crc32("|".join(str(p) for p in parts).encode('utf-8')))
+
+def _business_days(end: date, count: int) -> List[date]:
+    days = []
+    cursor = end
+    while len(days) < count:
+        if cursor.weekday() < 5:
+            days.append(cursor)
+        cursor -= timedelta(days=1)
+    days.reverse()
+    return days
+
+def _fmt(x: float, digits: int = 4) -> str:
+    return f"{x:.{digits}f}"
+
+def _sentiment_label(score: float) -> str:
+    for bound, label in SENTIMENT_LABELS:
+        if score <= bound:
+            return label
+    return 'Bullish'
+
+class SyntheticMarket:
+    """Deterministyczny rynek: ten sam (seed, symbol, kotwica) daje zawsze te same serie."""
+
+    def __init__(self, seed: int = 42, anchor: Optional[date] = None, universe: Optional[List[str]] = None):
+        self.seed = seed
+        self.anchor = anchor
+        self.universe = universe or DEFAULT_UNIVERSE
+
+    def _anchor(self) -> date:
+        return self.anchor or datetime.now().date()
+
+    # --- Serie dzienne ---
+
+    def daily_bars(self, symbol: str) -> List[dict]:
+        rng = _rng(self.seed, symbol, 'daily')
+        price = rng.uniform(3, 250)
+        drift, vol = rng.uniform(-0.0002, 0.0008), rng.uniform(0.01, 0.05)
+        base_volume = rng.uniform(2e5, 2e7)
+        split_day = rng.randrange(FULL_DAILY_BARS) if rng.random() < 0.1 else None
+        bars = []
+        adj_factor = 1.0
+        for i, d in enumerate(_business_days(self._anchor(), FULL_DAILY_BARS)):
+            split = 2.0 if i == split_day else 1.0
+            # Jak w AV: w dniu splitu (i później) surowe ceny są już po podziale, wolumen w nowych akcjach
+            price /= split
+            base_volume *= split
+            open_ = price * (1 + rng.gauss(0, vol / 4))
+            close = max(0.5 / split, open_ * (1 + rng.gauss(drift, vol)))
+            high = max(open_, close) * (1 + abs(rng.gauss(0, vol / 3)))
+            low = min(open_, close) * (1 - abs(rng.gauss(0, vol / 3)))
+            volume = int(base_volume * rng.lognormvariate(0, 0.5))
+            bars.append({'date': d, 'open': open_, 'high': high, 'low': low, 'close': close,
+                         'volume': volume, 'split': split, 'dividend': 0.0})
+            price = close
+        # Skorygowane zamknięcie: splity działają wstecz
+        for bar in reversed(bars):
+            bar['adjusted_close'] = bar['close'] / adj_factor
+            adj_factor *= bar['split']
+        return bars
+
+    def time_series_daily(self, symbol: str, outputsize: str, adjusted: bool) -> dict:
+        bars = self.daily_bars(symbol)
+        if outputsize != 'full':
+            bars = bars[-COMPACT_BARS:]
+        series = {}
+        for b in reversed(bars):
+            row = {'1. open': _fmt(b['open']), '2. high': _fmt(b['high']),
+                   '3. low': _fmt(b['low']), '4. close': _fmt(b['close'])}
+            if adjusted:
+                row.update({'5. adjusted close': _fmt(b['adjusted_close']), '6. volume': str(b['volume']),
+                            '7. dividend amount': _fmt(b['dividend']), '8. split coefficient': _fmt(b['split'], 1)})
+            else:
+                row['5. volume'] = str(b['volume'])
+            series[b['date'].isoformat()] = row
+        fn = 'Daily Time Series with Splits and Dividend Events' if adjusted else 'Daily Prices (open, high, low, close) and Volumes'
+        return {
+            'Meta Data': {'1. Information': fn, '2. Symbol': symbol, '3. Last Refreshed': bars[-1]['date'].isoformat(),
+                          '4. Output Size': 'Full size' if outputsize == 'full' else 'Compact'},
+            'Time Series (Daily)': series
+        }
+
+    def weekly_adjusted(self, symbol: str) -> dict:
+        weeks: Dict[date, dict] = {}
+        for b in self.daily_bars(symbol):
+            friday = b['date'] + timedelta(days=4 - b['date'].weekday())
+            w = weeks.get(friday)
+            if w is None:
+                weeks[friday] = w = {'open': b['open'], 'high': b['high'], 'low': b['low'], 'volume': 0, 'dividend': 0.0}
+            w['high'] = max(w['high'], b['high'])
+            w['low'] = min(w['low'], b['low'])
+            w['close'], w['adjusted_close'] = b['close'], b['adjusted_close']
+            w['volume'] += b['volume']
+        series = {
+            d.isoformat(): {'1. open': _fmt(w['open']), '2. high': _fmt(w['high']), '3. low': _fmt(w['low']),
+                            '4. close': _fmt(w['close']), '5. adjusted close': _fmt(w['adjusted_close']),
+                            '6. volume': str(w['volume']), '7. dividend amount': '0.0000'}
+            for d, w in sorted(weeks.items(), reverse=True)
+        }
+        return {'Meta Data': {'2. Symbol': symbol}, 'Weekly Adjusted Time Series': series}
+
+    def obv(self, symbol: str) -> dict:
+        obv, prev, series = 0.0, None, {}
+        for b in self.daily_bars(symbol):
+            if prev is not None:
+                obv += b['volume'] if b['close'] > prev else (-b['volume'] if b['close'] < prev else 0)
+            prev = b['close']
+            series[b['date'].isoformat()] = {'OBV': _fmt(obv)}
+        return {'Meta Data': {'1: Symbol': symbol, '2: Indicator': 'On Balance Volume (OBV)'},
+                'Technical Analysis: OBV': dict(sorted(series.items(), reverse=True))}
+
+    def bbands(self, symbol: str, period: int = 20, nbdev: float = 2.0) -> dict:
+        closes = [(b['date'], b['close']) for b in self.daily_bars(symbol)]
+        series = {}
+        for i in range(period - 1, len(closes)):
+            window = [c for _, c in closes[i - period + 1:i + 1]]
+            mean = sum(window) / period
+            std = (sum((c - mean) ** 2 for c in window) / period) ** 0.5
+            series[closes[i][0].isoformat()] = {
+                'Real Upper Band': _fmt(mean + nbdev * std), 'Real Middle Band': _fmt(mean),
+                'Real Lower Band': _fmt(mean - nbdev * std)}
+        return {'Meta Data': {'1: Symbol': symbol, '2: Indicator': 'Bollinger Bands (BBANDS)'},
+                'Technical Analysis: BBANDS': dict(sorted(series.items(), reverse=True))}
+
+    # --- Intraday ---
+
+    def _intraday_day(self, symbol: str, day: date, minutes: int) -> List[tuple]:
+        rng = _rng(self.seed, symbol, 'intraday', day.isoformat(), minutes)
+        price = _rng(self.seed, symbol, 'daily').uniform(3, 250) * rng.uniform(0.8, 1.2)
+        vol = rng.uniform(0.001, 0.006) * (minutes / 5) ** 0.5
+        bars = []
+        t = datetime(day.year, day.month, day.day, 4, 0)
+        end = datetime(day.year, day.month, day.day, 20, 0)
+        while t < end:
+            open_ = price
+            close = max(0.5, open_ * (1 + rng.gauss(0, vol)))
+            high = max(open_, close) * (1 + abs(rng.gauss(0, vol / 2)))
+            low = min(open_, close) * (1 - abs(rng.gauss(0, vol / 2)))
+            regular = 9 * 60 + 30 <= t.hour * 60 + t.minute < 16 * 60
+            volume = int(rng.uniform(5e3, 8e4) * (4 if regular else 0.3))
+            t_close = t + timedelta(minutes=minutes)
+            bars.append((t_close, open_, high, low, close, volume))
+            price, t = close, t_close
+        return bars
+
+    def intraday(self, symbol: str, interval: str, outputsize: str, month: Optional[str]) -> dict:
+        minutes = int(interval.replace('min', ''))
+        if month:
+            first = datetime.strptime(month, '%Y-%m').date()
+            last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            days = [d for d in _business_days(min(last, self._anchor()), 31) if d >= first]
+        else:
+            days = _business_days(self._anchor(), INTRADAY_FULL_DAYS if outputsize == 'full' else 1)
+        bars = [b for d in days for b in self._intraday_day(symbol, d, minutes)]
+        if outputsize != 'full' and not month:
+            bars = bars[-COMPACT_BARS:]
+        key = f'Time Series ({interval})'
+        series = {
+            b[0].strftime('%Y-%m-%d %H:%M:%S'): {'1. open': _fmt(b[1]), '2. high': _fmt(b[2]), '3. low': _fmt(b[3]),
+                                                  '4. close': _fmt(b[4]), '5. volume': str(b[5])}
+            for b in reversed(bars)
+        }
+        return {'Meta Data': {'2. Symbol': symbol, '4. Interval': interval}, key: series}
+
+    # --- Bulk quotes (CSV) ---
+
+    BULK_COLUMNS = ['symbol', 'timestamp', 'open', 'high', 'low', 'close', 'volume', 'previous_close', 'change',
+                    'change_percent', 'extended_hours_quote', 'extended_hours_change', 'extended_hours_change_percent']
+
+    def bulk_quotes_csv(self, symbols: List[str]) -> str:
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(self.BULK_COLUMNS)
+        stamp = datetime.now().strftime('%Y-%m-%d %H:%M:%S.000')
+        minute_slot = int(time.time() // 60)
+        for s in symbols:
+            base = _rng(self.seed, s, 'daily').uniform(3, 250)
+            rng = _rng(self.seed, s, 'bulk', minute_slot)
+            prev_close = base
+            close = base * (1 + rng.gauss(0, 0.02))
+            change = close - prev_close
+            writer.writerow([s, stamp, _fmt(prev_close), _fmt(max(close, prev_close) * 1.005), _fmt(min(close, prev_close) * 0.995),
+                             _fmt(close), int(rng.uniform(1e5, 5e6)), _fmt(prev_close), _fmt(change),
+                             _fmt(change / prev_close * 100), '', '', ''])
+        return out.getvalue()
+
+    # --- Newsy ---
+
+    def _article(self, slot: datetime, idx: int, tickers: List[str], rng: random.Random) -> dict:
+        overall = rng.uniform(-0.6, 0.6)
+        topics = rng.sample(['Life Sciences', 'Technology', 'Earnings', 'Mergers & Acquisitions',
+                             'Financial Markets', 'Economy - Macro'], 2)
+        published = slot + timedelta(minutes=rng.randrange(60))
+        ticker_sentiment = []
+        for t in tickers:
+            score = max(-1.0, min(1.0, overall + rng.gauss(0, 0.2)))
+            ticker_sentiment.append({'ticker': t, 'relevance_score': _fmt(rng.uniform(0.1, 1.0), 6),
+                                     'ticker_sentiment_score': _fmt(score, 6),
+                                     'ticker_sentiment_label': _sentiment_label(score)})
+        return {
+            'title': f"{' / '.join(tickers)}: synthetic headline {slot:%Y%m%d%H}-{idx}",
+            'url': f"https://standin.local/news/{slot:%Y%m%d%H}/{'-'.join(tickers)}/{idx}",
+            'time_published': published.strftime('%Y%m%dT%H%M%S'),
+            'summary': 'Synthetic article generated by the Alpha Vantage stand-in.',
+            'source': rng.choice(['Benzinga', 'Reuters', 'Motley Fool', 'Zacks']),
+            'topics': [{'topic': t, 'relevance_score': '0.5'} for t in topics],
+            'overall_sentiment_score': _fmt(overall, 6),
+            'overall_sentiment_label': _sentiment_label(overall),
+            'ticker_sentiment': ticker_sentiment
+        }
+
+    def news(self, tickers: Optional[str], time_from: Optional[str], time_to: Optional[str], limit: int, sort: str = 'LATEST') -> dict:
+        end = datetime.strptime(time_to, '%Y%m%dT%H%M') if time_to else datetime.now()
+        start = datetime.strptime(time_from, '%Y%m%dT%H%M') if time_from else end - timedelta(days=3)
+        wanted = [t for t in (tickers or '').split(',') if t]
+        slot = start.replace(minute=0, second=0, microsecond=0)
+        feed = []
+        while slot <= end:
+            if wanted:
+                for t in wanted:
+                    rng = _rng(self.seed, 'news', t, slot.isoformat())
+                    for i in range(rng.choice([0, 0, 0, 1, 1, 2])):
+                        feed.append(self._article(slot, i, [t], rng))
+            else:
+                rng = _rng(self.seed, 'news', '*', slot.isoformat())
+                for i in range(rng.randrange(5, 25)):
+                    feed.append(self._article(slot, i, rng.sample(self.universe, rng.choice([1, 1, 2, 3])), rng))
+            slot += timedelta(hours=1)
+        feed = [a for a in feed if start.strftime('%Y%m%dT%H%M%S') <= a['time_published'] <= end.strftime('%Y%m%dT%H%M%S')]
+        feed.sort(key=lambda a: a['time_published'], reverse=(sort != 'EARLIEST'))
+        feed = feed[:limit]
+        return {'items': str(len(feed)), 'sentiment_score_definition': 'synthetic',
+                'relevance_score_definition': 'synthetic', 'feed': feed}
+
+    # --- Fundamenty / insiderzy / wyniki ---
+
+    def overview(self, symbol: str) -> dict:
+        rng = _rng(self.seed, symbol, 'overview')
+        sector, industry = rng.choice(SECTORS)
+        shares = int(rng.uniform(2e7, 5e9))
+        price = self.daily_bars(symbol)[-1]['close']
+        return {
+            'Symbol': symbol, 'AssetType': 'Common Stock', 'Name': f'{symbol} Synthetic Inc', 'Exchange': 'NASDAQ',
+            'Currency': 'USD', 'Country': 'USA', 'Sector': sector, 'Industry': industry,
+            'MarketCapitalization': str(int(shares * price)), 'SharesOutstanding': str(shares),
+            'SharesFloat': str(int(shares * rng.uniform(0.5, 0.98))), 'PERatio': _fmt(rng.uniform(5, 60), 2),
+            'Beta': _fmt(rng.uniform(0.5, 2.5), 3), '52WeekHigh': _fmt(price * 1.3, 2), '52WeekLow': _fmt(price * 0.7, 2)
+        }
+
+    def insider_transactions(self, symbol: str) -> dict:
+        rng = _rng(self.seed, symbol, 'insider')
+        days = _business_days(self._anchor(), 750)
+        data = []
+        for _ in range(rng.randrange(5, 60)):
+            d = rng.choice(days)
+            data.append({'transaction_date': d.isoformat(), 'ticker': symbol,
+                         'executive': f'Insider {rng.randrange(1, 9)}', 'executive_title': 'Director',
+                         'security_type': 'Common Stock', 'acquisition_or_disposal': rng.choice(['A', 'D']),
+                         'shares': _fmt(rng.uniform(100, 50000), 1), 'share_price': _fmt(rng.uniform(3, 250), 2)})
+        data.sort(key=lambda x: x['transaction_date'], reverse=True)
+        return {'data': data}
+
+    def earnings(self, symbol: str) -> dict:
+        rng = _rng(self.seed, symbol, 'earnings')
+        quarterly = []
+        d = self._anchor().replace(day=1)
+        for _ in range(20):
+            d = (d - timedelta(days=85)).replace(day=1)
+            est = rng.uniform(-0.5, 2.5)
+            rep = est + rng.gauss(0, 0.2)
+            quarterly.append({'fiscalDateEnding': d.isoformat(), 'reportedDate': (d + timedelta(days=30)).isoformat(),
+                              'reportedEPS': _fmt(rep, 2), 'estimatedEPS': _fmt(est, 2),
+                              'surprise': _fmt(rep - est, 2), 'surprisePercentage': _fmt((rep - est) / (abs(est) or 1) * 100, 2)})
+        return {'symbol': symbol, 'annualEarnings': [], 'quarterlyEarnings': quarterly}
+
+    def earnings_calendar_csv(self, horizon: str, symbol: Optional[str]) -> str:
+        months = {'3month': 3, '6month': 6, '12month': 12}.get(horizon, 3)
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(['symbol', 'name', 'reportDate', 'fiscalDateEnding', 'estimate', 'currency', 'timeOfTheDay'])
+        start = self._anchor()
+        for s in ([symbol] if symbol else self.universe):
+            rng = _rng(self.seed, s, 'earnings_calendar', start.isoformat())
+            report = start + timedelta(days=rng.randrange(1, 91))
+            while report <= start + timedelta(days=30 * months):
+                if report.weekday() < 5:
+                    fiscal = (report.replace(day=1) - timedelta(days=1))
+                    writer.writerow([s, f'{s} Synthetic Inc', report.isoformat(), fiscal.isoformat(),
+                                     _fmt(rng.uniform(-0.5, 2.5), 2), 'USD', rng.choice(['pre-market', 'post-market'])])
+                report += timedelta(days=91)
+        return out.getvalue()
+
+    def listing_status_csv(self, state: str) -> str:
+        out = io.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(['symbol', 'name', 'exchange', 'assetType', 'ipoDate', 'delistingDate', 'status'])
+        if state == 'active':
+            for s in self.universe:
+                writer.writerow([s, f'{s} Synthetic Inc', 'NASDAQ', 'Stock', '2010-01-04', 'null', 'Active'])
+        return out.getvalue()
+
+    # --- Makro ---
+
+    def macro(self, function: str, interval: Optional[str]) -> dict:
+        rng = _rng(self.seed, 'macro', function)
+        level = {'TREASURY_YIELD': 3.0, 'FEDERAL_FUNDS_RATE': 2.0, 'INFLATION': 2.5, 'UNEMPLOYMENT': 5.0}.get(function, 1.0)
+        annual = function == 'INFLATION' or interval == 'annual'
+        points = []
+        d = date(2000, 1, 1)
+        end = self._anchor()
+        while d <= end:
+            level = max(0.05, level + rng.gauss(0, 0.15 if annual else 0.05))
+            points.append({'date': d.isoformat(), 'value': _fmt(level, 2)})
+            d = date(d.year + 1, 1, 1) if annual else (d + timedelta(days=32)).replace(day=1)
+        return {'name': function.replace('_', ' ').title(), 'interval': 'annual' if annual else (interval or 'monthly'),
+                'unit': 'percent', 'data': list(reversed(points))}
+
+    # --- Dispatcher ---
+
+    def respond(self, params: Dict[str, str]):
+        """Zwraca obiekt JSON (dict) albo tekst CSV dla zapytania AV."""
+        fn = params.get('function', '')
+        symbol = params.get('symbol', '')
+        if fn == 'TIME_SERIES_DAILY_ADJUSTED':
+            return self.time_series_daily(symbol, params.get('outputsize', 'compact'), adjusted=True)
+        if fn == 'TIME_SERIES_DAILY':
+            return self.time_series_daily(symbol, params.get('outputsize', 'compact'), adjusted=False)
+        if fn == 'TIME_SERIES_WEEKLY_ADJUSTED':
+            return self.weekly_adjusted(symbol)
+        if fn == 'TIME_SERIES_INTRADAY':
+            return self.intraday(symbol, params.get('interval', '5min'), params.get('outputsize', 'compact'), params.get('month'))
+        if fn == 'REALTIME_BULK_QUOTES':
+            return self.bulk_quotes_csv([s for s in symbol.split(',') if s])
+        if fn == 'NEWS_SENTIMENT':
+            return self.news(params.get('tickers'), params.get('time_from'), params.get('time_to'), int(params.get('limit', 50)),
+                             params.get('sort', 'LATEST'))
+        if fn == 'INSIDER_TRANSACTIONS':
+            return self.insider_transactions(symbol)
+        if fn == 'OVERVIEW':
+            return self.overview(symbol)
+        if fn == 'EARNINGS':
+            return self.earnings(symbol)
+        if fn == 'LISTING_STATUS':
+            return self.listing_status_csv(params.get('state', 'active'))
+        if fn == 'EARNINGS_CALENDAR':
+            return self.earnings_calendar_csv(params.get('horizon', '3month'), params.get('symbol'))
+        if fn == 'OBV':
+            return self.obv(symbol)
+        if fn == 'BBANDS':
+            return self.bbands(symbol, int(params.get('time_period', 20)), float(params.get('nbdevup', 2)))
+        if fn in ('TREASURY_YIELD', 'FEDERAL_FUNDS_RATE', 'INFLATION', 'UNEMPLOYMENT'):
+            return self.macro(fn, params.get('interval'))
+        if fn == 'MARKET_STATUS':
+            return {'endpoint': 'Global Market Open & Close Status', 'markets': []}
+        if fn == 'SYMBOL_SEARCH':
+            kw = params.get('keywords', '').upper()
+            return {'bestMatches': [{'1. symbol': s, '2. name': f'{s} Synthetic Inc'} for s in self.universe if kw in s]}
+        return {'Error Message': f'Stand-in: function {fn} is not supported.'}
+
+
+# ==================================================================
+# TRANSPORT (podpinany do AlphaVantageClient zamiast requests.Session)
+# ==================================================================
+
+def fixture_name(params: Dict[str, str]) -> str:
+    """Klucz fixture: funkcja + symbol + hash pozostałych parametrów (bez apikey)."""
+    clean = {k: str(v) for k, v in params.items() if k != 'apikey' and v is not None}
+    digest = hashlib.sha1(json.dumps(clean, sort_keys=True).encode('utf-8')).hexdigest()[:12]
+    symbol = clean.get('symbol') or clean.get('tickers') or 'ALL'
+    if len(symbol) > 24 or not symbol.replace('.', '').replace('-', '').isalnum():
+        symbol = 'MULTI'
+    ext = 'csv' if clean.get('datatype') == 'csv' else 'json'
+    return f"{clean.get('function', 'UNKNOWN')}__{symbol}__{digest}.{ext}"
+
+class StandInTransport:
+    """
+    Zamiennik requests.Session dla AlphaVantageClient (metoda get(url, params, timeout)).
+    Symuluje opóźnienie sieci i throttle AV ("Information") - losowo lub jako limit okna 60s.
+    """
+
+    def __init__(
+        self,
+        mode: str = 'synthetic',
+        fixtures_dir: Optional[str] = None,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        throttle_rate: float = 0.0,
+        rpm_limit: Optional[int] = None,
+        seed: int = 42,
+        anchor: Optional[date] = None,
+        replay_fallback: str = 'synthetic',
+        upstream_url: str = LIVE_BASE_URL
+    ):
+        if mode not in ('synthetic', 'replay', 'record'):
+            raise ValueError(f"Nieznany tryb stand-in: {mode}")
+        if mode in ('replay', 'record') and not fixtures_dir:
+            raise ValueError("Tryb replay/record wymaga katalogu fixtures.")
+        self.mode = mode
+        self.fixtures_dir = fixtures_dir
+        self.latency_s = latency_ms / 1000.0
+        self.jitter_s = jitter_ms / 1000.0
+        self.throttle_rate = throttle_rate
+        self.rpm_limit = rpm_limit
+        self.replay_fallback = replay_fallback
+        self.upstream_url = upstream_url
+        self.market = SyntheticMarket(seed=seed, anchor=anchor)
+
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._window = deque()
+        self._upstream = requests.Session() if mode == 'record' else None
+        self.stats = Counter()
+
+        if fixtures_dir:
+            os.makedirs(fixtures_dir, exist_ok=True)
+
+    # --- Symulacja sieci / limitów ---
+
+    def _delay_and_throttle(self) -> bool:
+        with self._lock:
+            delay = self.latency_s + (self._rng.uniform(0, self.jitter_s) if self.jitter_s else 0.0)
+            throttled = bool(self.throttle_rate) and self._rng.random() < self.throttle_rate
+            if self.rpm_limit:
+                now = time.monotonic()
+                while self._window and now - self._window[0] > 60:
+                    self._window.popleft()
+                if len(self._window) >= self.rpm_limit:
+                    throttled = True
+                else:
+                    self._window.append(now)
+        if delay > 0:
+            time.sleep(delay)
+        return throttled
+
+    # --- Fixtures ---
+
+    def _fixture_path(self, params) -> str:
+        return os.path.join(self.fixtures_dir, fixture_name(params))
+
+    def _load_fixture(self, params) -> Optional[str]:
+        path = self._fixture_path(params)
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return f.read()
+
+    def _save_fixture(self, params, body: str):
+        with open(self._fixture_path(params), 'w', encoding='utf-8') as f:
+            f.write(body)
+
+    # --- Odpowiedź ---
+
+    def _synthetic_body(self, params) -> str:
+        payload = self.market.respond(params)
+        return payload if isinstance(payload, str) else json.dumps(payload)
+
+    def _body_for(self, params) -> str:
+        if self.mode == 'synthetic':
+            return self._synthetic_body(params)
+
+        if self.mode == 'record':
+            upstream = self._upstream.get(self.upstream_url, params=params, timeout=30)
+            body = upstream.text
+            # Nie nagrywamy throttle/błędów - fixture ma być "czystą" odpowiedzią
+            if '"Information"' not in body and '"Note"' not in body and '"Error Message"' not in body:
+                self._save_fixture(params, body)
+            return body
+
+        body = self._load_fixture(params)
+        if body is not None:
+            self.stats['replay_hit'] += 1
+            return body
+        self.stats['replay_miss'] += 1
+        if self.replay_fallback == 'synthetic':
+            return self._synthetic_body(params)
+        return json.dumps({'Error Message': f"Stand-in: no fixture {fixture_name(params)}"})
+
+    def get(self, url: str, params: Optional[dict] = None, timeout: Optional[float] = None, **kwargs) -> StandInResponse:
+        params = {k: str(v) for k, v in (params or {}).items()}
+        self.stats['requests'] += 1
+        self.stats[params.get('function', 'UNKNOWN')] += 1
+
+        if self._delay_and_throttle():
+            self.stats['throttled'] += 1
+            return StandInResponse(json.dumps({'Information': THROTTLE_MESSAGE}))
+
+        body = self._body_for(params)
+        is_csv = params.get('datatype') == 'csv' and not body.lstrip().startswith('{')
+        return StandInResponse(body, content_type='text/csv' if is_csv else 'application/json')
+
+    def close(self):
+        if self._upstream:
+            self._upstream.close()
+
+def transport_from_env() -> Optional[StandInTransport]:
+    """
+    APEX_AV_STANDIN = synthetic | replay:<katalog> | record:<katalog>
+    Opcjonalnie: APEX_AV_STANDIN_LATENCY_MS, _JITTER_MS, _THROTTLE_RATE, _RPM_LIMIT, _SEED, _ANCHOR (YYYY-MM-DD).
+    """
+    spec = os.getenv('APEX_AV_STANDIN')
+    if not spec:
+        return None
+    mode, _, fixtures_dir = spec.partition(':')
+    env = lambda name, default=None: os.getenv(f'APEX_AV_STANDIN_{name}', default)
+    anchor = env('ANCHOR')
+    transport = StandInTransport(
+        mode=mode,
+        fixtures_dir=fixtures_dir or None,
+        latency_ms=float(env('LATENCY_MS', 0)),
+        jitter_ms=float(env('JITTER_MS', 0)),
+        throttle_rate=float(env('THROTTLE_RATE', 0)),
+        rpm_limit=int(env('RPM_LIMIT')) if env('RPM_LIMIT') else None,
+        seed=int(env('SEED', 42)),
+        anchor=datetime.strptime(anchor, '%Y-%m-%d').date() if anchor else None
+    )
+    logger.warning(f"Alpha Vantage STAND-IN aktywny (tryb: {mode}). Zapytania nie trafiają do produkcyjnego API.")
+    return transport
+
+
+# ==================================================================
+# SERWER HTTP + CLI
+# ==================================================================
+
+def make_handler(transport: StandInTransport):
+    class StandInHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            parsed = urlparse(self.path)
+            if parsed.path.rstrip('/') != '/query':
+                self.send_error(404)
+                return
+            response = transport.get(parsed.path, params=dict(parse_qsl(parsed.query)))
+            body = response.text.encode('utf-8')
+            self.send_response(response.status_code)
+            self.send_header('Content-Type', response.headers['Content-Type'])
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, fmt, *args):
+            logger.debug(fmt % args)
+    return StandInHandler
+
+def serve(transport: StandInTransport, host: str = '127.0.0.1', port: int = 8765):
+    """Serwer HTTP zgodny z https://www.alphavantage.co/query (ALPHAVANTAGE_BASE_URL=http://host:port/query)."""
+    server = ThreadingHTTPServer((host, port), make_handler(transport))
+    logger.info(f"AV stand-in ({transport.mode}) nasłuchuje na http://{host}:{port}/query")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+def probe(transport: StandInTransport, n_requests: int, workers: int, rpm: int):
+    """Przepuszcza n zapytań przez prawdziwego klienta (AIMD + pasy) i raportuje przepustowość."""
+    from concurrent.futures import ThreadPoolExecutor
+    from .alpha_vantage_client import AlphaVantageClient
+
+    client = AlphaVantageClient(api_key='standin', requests_per_minute=rpm, transport=transport)
+    symbols = transport.market.universe
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda i: client.get_daily_adjusted(symbols[i % len(symbols)], outputsize='compact'), range(n_requests)))
+    elapsed = time.monotonic() - start
+    ok = sum(1 for r in results if r)
+    print(f"requests={n_requests} ok={ok} elapsed={elapsed:.1f}s throughput={n_requests / elapsed * 60:.1f}/min "
+          f"throttled={transport.stats['throttled']} final_rpm={client.current_rpm:.1f}")
+
+def bench_bulk_quotes(transport: StandInTransport, n_symbols: int, repeats: int):
+    """
+    Benchmark cen masowych: dotychczasowa ścieżka (sklejanie CSV jako tekst + csv.DictReader
+    i słownik per wiersz, jak get_bulk_quotes_parsed) vs tabela kolumnowa (bulk_quote_table).
+    Paczki pobierane raz, mierzony parsing do mapy symbol -> cena.
+    """
+    from .alpha_vantage_client import AlphaVantageClient, bulk_quote_table
+
+    client = AlphaVantageClient(api_key='standin', requests_per_minute=AlphaVantageClient.AIMD_MAX_RPM, transport=transport)
+    symbols = [f"S{i:05d}" for i in range(n_symbols)]
+
+    start = time.perf_counter()
+    chunks = list(client._iter_bulk_chunks(symbols))
+    fetch_s = time.perf_counter() - start
+
+    def dict_rows():
+        lines = []
+        for chunk in chunks:
+            chunk_lines = chunk.strip().split('\n')
+            lines.extend(chunk_lines if not lines else chunk_lines[1:])
+        prices = {}
+        for row in csv.DictReader(io.StringIO("\n".join(lines))):
+            data = {
+                'symbol': row.get('symbol'),
+                'price': client._safe_float(row.get('close')),
+                'volume': client._safe_float(row.get('volume')),
+                'bid': client._safe_float(row.get('bid')),
+                'ask': client._safe_float(row.get('ask')),
+                'bid_size': client._safe_float(row.get('bid_size')),
+                'ask_size': client._safe_float(row.get('ask_size'))
+            }
+            if data['symbol'] and data['price']:
+                prices[data['symbol']] = data['price']
+        return prices
+
+    def columnar():
+        return bulk_quote_table(chunks).price_map()
+
+    results = {}
+    for name, fn in (('dict_rows', dict_rows), ('columnar', columnar)):
+        best = float('inf')
+        for _ in range(repeats):
+            t0 = time.perf_counter()
+            prices = fn()
+            best = min(best, time.perf_counter() - t0)
+        results[name] = (best, prices)
+
+    if results['dict_rows'][1] != results['columnar'][1]:
+        print("UWAGA: ścieżki zwróciły różne ceny")
+    print(f"symbols={n_symbols} chunks={len(chunks)} fetch={fetch_s:.3f}s")
+    for name, (best, prices) in results.items():
+        print(f"{name:>10}: best={best * 1000:.2f} ms rows={len(prices)}")
+    print(f"speedup={results['dict_rows'][0] / results['columnar'][0]:.2f}x")
+
+def _build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Lokalny zastępca Alpha Vantage")
+    sub = parser.add_subparsers(dest='command', required=True)
+    for name in ('serve', 'probe', 'bench'):
+        p = sub.add_parser(name)
+        p.add_argument('--mode', default='synthetic', choices=['synthetic', 'replay', 'record'])
+        p.add_argument('--fixtures', default=None)
+        p.add_argument('--latency-ms', type=float, default=0.0)
+        p.add_argument('--jitter-ms', type=float, default=0.0)
+        p.add_argument('--throttle-rate', type=float, default=0.0)
+        p.add_argument('--rpm-limit', type=int, default=None)
+        p.add_argument('--seed', type=int, default=42)
+        p.add_argument('--anchor', default=None, help='Data kotwicy serii syntetycznych (YYYY-MM-DD)')
+    sub.choices['serve'].add_argument('--host', default='127.0.0.1')
+    sub.choices['serve'].add_argument('--port', type=int, default=8765)
+    sub.choices['probe'].add_argument('--requests', type=int, default=300)
+    sub.choices['probe'].add_argument('--workers', type=int, default=8)
+    sub.choices['probe'].add_argument('--rpm', type=int, default=120)
+    sub.choices['bench'].add_argument('--symbols', type=int, default=2000)
+    sub.choices['bench'].add_argument('--repeats', type=int, default=5)
+    return parser
+
+def main(argv=None):
+    args = _build_parser().parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    transport = StandInTransport(
+        mode=args.mode, fixtures_dir=args.fixtures, latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+        throttle_rate=args.throttle_rate, rpm_limit=args.rpm_limit, seed=args.seed,
+        anchor=datetime.strptime(args.anchor, '%Y-%m-%d').date() if args.anchor else None
+    )
+    if args.command == 'serve':
+        serve(transport, args.host, args.port)
+    elif args.command == 'probe':
+        probe(transport, args.requests, args.workers, args.rpm)
+    elif args.command == 'bench':
+        bench_bulk_quotes(transport, args.symbols, args.repeats)
+
+if __name__ == '__main__':
+    main()
@@ -6,10 +6,16 @@ import requests
 from sqlalchemy.orm import Session
 from sqlalchemy import text, inspect
 import os 
+from datetime import datetime, timezone
+
+from ..config import UNIVERSE_SOURCE, UNIVERSE_EXCHANGES
+from ..analysis.utils import get_system_control_value, update_system_control, append_scan_log
+from ..analysis.daily_sentiment import rebuild_daily_sentiment
 
 logger = logging.getLogger(__name__)
 
 NASDAQ_LISTED_URL = "https://www.nasdaqtrader.com/dynamic/SymDir/nasdaqlisted.txt"
+DAILY_SENTIMENT_BACKFILL_KEY = 'daily_sentiment_backfilled'
 
 def _run_schema_and_index_migration(session: Session):
     """
@@ -51,6 +57,9 @@ def _run_schema_and_index_migration(session: Session):
 
         # === 2. COMPANIES ===
         safe_add_column('companies', 'sector_etf', 'VARCHAR(10)')
+        safe_add_column('companies', 'is_active', 'BOOLEAN NOT NULL DEFAULT TRUE')
+        safe_add_column('companies', 'delisted_at', 'TIMESTAMP WITH TIME ZONE')
+        safe_add_column('companies', 'renamed_to', 'VARCHAR(50)')
 
         # === 3. PHASE 1 CANDIDATES ===
         safe_add_column('phase1_candidates', 'sector_ticker', 'VARCHAR(10)')
@@ -127,6 +136,16 @@ def _run_schema_and_index_migration(session: Session):
         safe_add_column('sdar_candidates', 'risk_reward_ratio', 'NUMERIC(5, 2)')
         safe_add_column('sdar_candidates', 'tactical_comment', 'TEXT')
         
+        # === 8. DZIENNE AGREGATY SENTYMENTU (jednorazowo z newsów zapisanych przed tabelą daily_sentiment) ===
+        if get_system_control_value(session, DAILY_SENTIMENT_BACKFILL_KEY) != 'DONE':
+            try:
+                refreshed = rebuild_daily_sentiment(session)
+                update_system_control(session, DAILY_SENTIMENT_BACKFILL_KEY, 'DONE')
+                logger.info(f"daily_sentiment: odtworzono {refreshed} agregatów (ticker, dzień).")
+            except Exception as e:
+                logger.warning(f"daily_sentiment backfill warning: {e}")
+                session.rollback()
+
         # === INDEKSY ===
         try:
             with engine.connect() as conn:
@@ -220,6 +239,165 @@ def force_reset_simulation_data(session: Session):
         logger.error(f"Błąd podczas resetu bazy: {e}", exc_info=True)
         session.rollback()
 
+def _is_common_stock(symbol: str, security_name: str, is_etf: bool = False, is_test: bool = False) -> bool:
+    """Te same reguły wykluczeń co pierwotny seed (ETF, test issue, warranty/prawa/jednostki, symbole z kropką)."""
+    excluded_keywords = ['warrant', 'right', 'unit', 'note', 'fund', 'etf']
+    if is_etf or is_test or not symbol:
+        return False
+    if '.' in symbol or '$' in symbol or len(symbol) > 5:
+        return False
+    name = (security_name or '').lower()
+    return not any(keyword in name for keyword in excluded_keywords)
+
+def _fetch_nasdaq_listing() -> list:
+    """nasdaqlisted.txt -> lista {'ticker', 'company_name', 'exchange'} (tylko akcje zwykłe)."""
+    response = requests.get(NASDAQ_LISTED_URL, timeout=60)
+    response.raise_for_status()
+    lines = response.text.strip().split('\n')
+    clean_lines = lines[:-1]  # Ostatnia linia to stopka "File Creation Time"
+    reader = csv.DictReader(StringIO('\n'.join(clean_lines)), delimiter='|')
+    listing = []
+    for row in reader:
+        symbol = (row.get('Symbol') or '').strip()
+        if _is_common_stock(symbol, row.get('Security Name'), row.get('ETF') == 'Y', row.get('Test Issue') == 'Y'):
+            listing.append({"ticker": symbol, "company_name": row.get('Security Name'), "exchange": "NASDAQ"})
+    return listing
+
+def _fetch_av_listing(api_client) -> list:
+    """AV LISTING_STATUS (active) -> ta sama struktura; zawężone do giełd z UNIVERSE_EXCHANGES."""
+    csv_text = api_client.get_listing_status(state='active')
+    if not csv_text or 'symbol' not in csv_text:
+        return []
+    listing = []
+    for row in csv.DictReader(StringIO(csv_text)):
+        symbol = (row.get('symbol') or '').strip()
+        if row.get('exchange') not in UNIVERSE_EXCHANGES or row.get('assetType') != 'Stock':
+            continue
+        if _is_common_stock(symbol, row.get('name')):
+            listing.append({"ticker": symbol, "company_name": row.get('name'), "exchange": row.get('exchange')})
+    return listing
+
+def fetch_universe_listing(api_client, source: str = None) -> list:
+    source = source or UNIVERSE_SOURCE
+    if source == 'AV':
+        return _fetch_av_listing(api_client)
+    return _fetch_nasdaq_listing()
+
+# === ODŚWIEŻANIE UNIWERSUM (COPY -> staging -> diff zbiorowy) ===
+# Listing trafia przez COPY do tymczasowej tabeli staging, a zmiany liczymy zbiorowo w SQL:
+#   nowe spółki -> INSERT, zmiana symbolu (ta sama nazwa) -> nowy wiersz + renamed_to na starym,
+#   zmiana nazwy -> UPDATE, brak w listingu -> is_active = FALSE (bez kasowania - historia/backtesty),
+#   powrót na listing -> reaktywacja. Całość w jednej transakcji.
+
+UNIVERSE_REFRESHED_KEY = 'universe_refreshed_on'
+UNIVERSE_MIN_LISTING_RATIO = 0.5   # Listing mniejszy niż 50% aktywnych = uszkodzone pobranie, nic nie zmieniamy
+
+_UNIVERSE_DIFF_SQL = {
+    # Zmiana symbolu: stary ticker zniknął, nowy się pojawił, nazwa spółki identyczna i jednoznaczna po obu stronach
+    'renamed': """
+        WITH gone AS (
+            SELECT c.ticker, c.company_name FROM companies c
+            WHERE c.is_active AND NOT EXISTS (SELECT 1 FROM companies_staging s WHERE s.ticker = c.ticker)
+        ), fresh AS (
+            SELECT s.ticker, s.company_name, s.exchange FROM companies_staging s
+            WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.ticker = s.ticker)
+        ), pairs AS (
+            SELECT g.ticker AS old_ticker, f.ticker AS new_ticker, f.company_name, f.exchange
+            FROM gone g JOIN fresh f ON f.company_name = g.company_name
+            WHERE (SELECT COUNT(*) FROM gone g2 WHERE g2.company_name = g.company_name) = 1
+              AND (SELECT COUNT(*) FROM fresh f2 WHERE f2.company_name = f.company_name) = 1
+        ), inserted AS (
+            INSERT INTO companies (ticker, company_name, exchange, sector, industry, sector_etf, is_active)
+            SELECT p.new_ticker, p.company_name, p.exchange, c.sector, c.industry, c.sector_etf, TRUE
+            FROM pairs p JOIN companies c ON c.ticker = p.old_ticker
+            RETURNING ticker
+        )
+        UPDATE companies c SET is_active = FALSE, delisted_at = NOW(), renamed_to = p.new_ticker
+        FROM pairs p WHERE c.ticker = p.old_ticker
+    """,
+    'inserted': """
+        INSERT INTO companies (ticker, company_name, exchange, industry, sector, is_active)
+        SELECT s.ticker, s.company_name, s.exchange, 'N/A', 'N/A', TRUE FROM companies_staging s
+        WHERE NOT EXISTS (SELECT 1 FROM companies c WHERE c.ticker = s.ticker)
+    """,
+    'reactivated': """
+        UPDATE companies c SET is_active = TRUE, delisted_at = NULL, renamed_to = NULL
+        FROM companies_staging s WHERE s.ticker = c.ticker AND NOT c.is_active
+    """,
+    'name_changed': """
+        UPDATE companies c SET company_name = s.company_name
+        FROM companies_staging s
+        WHERE s.ticker = c.ticker AND c.company_name IS DISTINCT FROM s.company_name
+    """,
+    'delisted': """
+        UPDATE companies c SET is_active = FALSE, delisted_at = NOW()
+        WHERE c.is_active AND NOT EXISTS (SELECT 1 FROM companies_staging s WHERE s.ticker = c.ticker)
+    """,
+}
+
+def _copy_rows(cursor, table: str, columns: list, rows: list):
+    """COPY FROM STDIN (CSV) - jeden strumień zamiast executemany."""
+    buf = StringIO()
+    writer = csv.writer(buf)
+    for row in rows:
+        writer.writerow([row[c] for c in columns])
+    buf.seek(0)
+    cursor.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buf)
+
+def refresh_universe(session: Session, api_client, listing: list = None) -> dict:
+    """
+    Synchronizuje tabelę companies z aktualnym listingiem (COPY + diff zbiorowy, jedna transakcja).
+    Zwraca liczniki zmian {'inserted', 'renamed', 'reactivated', 'name_changed', 'delisted'}.
+    """
+    if listing is None:
+        listing = fetch_universe_listing(api_client)
+    listing = list({r['ticker']: r for r in listing}.values())
+    if not listing:
+        logger.warning("Uniwersum: Pusty listing - pomijam odświeżenie.")
+        return {}
+
+    active_count = session.execute(text("SELECT COUNT(*) FROM companies WHERE is_active")).scalar_one()
+    if active_count and len(listing) < active_count * UNIVERSE_MIN_LISTING_RATIO:
+        logger.error(f"Uniwersum: Listing podejrzanie mały ({len(listing)} vs {active_count} aktywnych) - pomijam.")
+        return {}
+
+    stats = {}
+    raw_conn = session.get_bind().raw_connection()
+    try:
+        cursor = raw_conn.cursor()
+        cursor.execute("""
+            CREATE TEMP TABLE companies_staging (
+                ticker VARCHAR(50) PRIMARY KEY, company_name VARCHAR(255), exchange VARCHAR(50)
+            ) ON COMMIT DROP
+        """)
+        _copy_rows(cursor, 'companies_staging', ['ticker', 'company_name', 'exchange'], listing)
+        # Kolejność ma znaczenie: zmiany symboli przed wstawieniem "nowych" i wygaszeniem "zniknętych"
+        for name in ('renamed', 'inserted', 'reactivated', 'name_changed', 'delisted'):
+            cursor.execute(_UNIVERSE_DIFF_SQL[name])
+            stats[name] = cursor.rowcount
+        raw_conn.commit()
+    except Exception as e:
+        raw_conn.rollback()
+        logger.error(f"Uniwersum: Błąd odświeżania (wycofano transakcję): {e}", exc_info=True)
+        return {}
+    finally:
+        raw_conn.close()
+
+    logger.info(f"Uniwersum: listing {len(listing)}, zmiany: {stats}")
+    return stats
+
+def run_universe_refresh_job(session: Session, api_client, force: bool = False) -> dict:
+    """Dzienne odświeżenie uniwersum (blokada 'już dziś' w system_control)."""
+    today = datetime.now(timezone.utc).date().isoformat()
+    if not force and get_system_control_value(session, UNIVERSE_REFRESHED_KEY) == today:
+        return {}
+    stats = refresh_universe(session, api_client)
+    if stats:
+        update_system_control(session, UNIVERSE_REFRESHED_KEY, today)
+        append_scan_log(session, f"Uniwersum: nowe {stats['inserted']}, zmiany symbolu {stats['renamed']}, "
+                                 f"wycofane {stats['delisted']}, przywrócone {stats['reactivated']}.")
+    return stats
+
 def initialize_database_if_empty(session: Session, api_client):
     _run_schema_and_index_migration(session)
     
@@ -237,31 +415,11 @@ def initialize_database_if_empty(session: Session, api_client):
             logger.info(f"Database already seeded with {count_result} companies. No action needed.")
             return
         logger.info("Table 'companies' is empty. Initializing with official data from NASDAQ...")
-        response = requests.get(NASDAQ_LISTED_URL, timeout=60)
-        response.raise_for_status()
-        lines = response.text.strip().split('\n')
-        clean_lines = lines[:-1]
-        reader = csv.DictReader(StringIO('\n'.join(clean_lines)), delimiter='|')
-        companies_to_insert = []
-        excluded_count = 0
-        for row in reader:
-            try:
-                symbol = row.get('Symbol')
-                security_name = row.get('Security Name', '').lower()
-                excluded_keywords = ['warrant', 'right', 'unit', 'note', 'fund', 'etf']
-                if (row.get('ETF') == 'Y' or row.get('Test Issue') == 'Y' or not symbol):
-                    excluded_count += 1; continue
-                if '.' in symbol or '$' in symbol or len(symbol) > 5:
-                    excluded_count += 1; continue
-                if any(keyword in security_name for keyword in excluded_keywords):
-                    excluded_count += 1; continue
-                companies_to_insert.append({"ticker": symbol, "company_name": row.get('Security Name'), "exchange": "NASDAQ"})
-            except Exception: excluded_count += 1
-        if not companies_to_insert: return
-        insert_stmt = text("INSERT INTO companies (ticker, company_name, exchange, industry, sector) VALUES (:ticker, :company_name, :exchange, 'N/A', 'N/A') ON CONFLICT (ticker) DO NOTHING;")
-        session.execute(insert_stmt, companies_to_insert)
-        session.commit()
-        logger.info(f"Successfully inserted {len(companies_to_insert)} companies. Excluded: {excluded_count}.")
+        # Pusta tabela = szczególny przypadek odświeżenia (same INSERT-y przez COPY)
+        stats = refresh_universe(session, api_client, listing=_fetch_nasdaq_listing())
+        if stats:
+            update_system_control(session, UNIVERSE_REFRESHED_KEY, datetime.now(timezone.utc).date().isoformat())
+            logger.info(f"Successfully inserted {stats.get('inserted', 0)} companies.")
     except Exception as e:
         logger.error(f"An error occurred during data initialization: {e}", exc_info=True)
         session.rollback()
@@ -5,6 +5,7 @@ import schedule
 import logging
 import sys
 import json
+import threading
 from datetime import datetime, timezone, timedelta 
 from dotenv import load_dotenv
 from sqlalchemy import text
@@ -12,8 +13,8 @@ from sqlalchemy import text
 # === IMPORTY BAZODANOWE (Unified) ===
 from .models import Base, OptimizationJob 
 from .database import get_db_session, engine
-from .data_ingestion.data_initializer import initialize_database_if_empty
-from .data_ingestion.alpha_vantage_client import AlphaVantageClient
+from .data_ingestion.data_initializer import initialize_database_if_empty, run_universe_refresh_job
+from .data_ingestion.alpha_vantage_client import AlphaVantageClient, LANE_LIVE, LANE_USER, LANE_BULK
 from .config import COMMAND_CHECK_INTERVAL_SECONDS
 
 # === IMPORTY ANALITYCZNE (Moduły Strategii) ===
@@ -21,7 +22,8 @@ from .analysis import (
     phase1_scanner, phase3_sniper, utils, news_agent,
     phase0_macro_agent, virtual_agent, backtest_engine, ai_optimizer, 
     h3_deep_dive_agent, signal_monitor, apex_optimizer, phasex_scanner, 
-    biox_agent, recheck_agent, phase4_kinetic, phase_sdar
+    biox_agent, recheck_agent, phase4_kinetic, phase_sdar, fundamentals, earnings_calendar,
+    cache_gc, cache_writer, api_ledger, ticker_tiers
 )
 
 # Konfiguracja Loggera
@@ -42,10 +44,15 @@ current_state = "IDLE"
 # === ZARZĄDCA STANU (RESOURCE GOVERNOR) ===
 # Definiuje tryby pracy Workera w celu ochrony limitów API (Traffic Shaping)
 MODE_MONITORING = "MONITORING"   # Newsy + Tło (Niskie zużycie API - nasłuchiwanie)
-MODE_OPERATION = "OPERATION"     # Skanery (F1, F3, F4, FX) / Optymalizacja (Wysokie zużycie - Wyłączność)
+MODE_OPERATION = "OPERATION"     # Skanery (F1, F3, F4, FX) / Optymalizacja (Wysokie zużycie - pas BULK)
 
 active_mode = MODE_MONITORING 
 
+# Monitory LIVE (sygnały SL/TP, wirtualny portfel) mają własny harmonogram i wątek:
+# działają także w trybie OPERACJI, bo klient API rezerwuje dla nich część limitu (pas LIVE).
+live_schedule = schedule.Scheduler()
+LIVE_LOOP_INTERVAL_SECONDS = 1
+
 def run_monitoring_tasks(session):
     """
     Tryb Wartownika: Utrzymuje przy życiu lekkie procesy tła.
@@ -57,15 +64,27 @@ def run_monitoring_tasks(session):
     # 1. Zadania w tle (Schedule) - Newsy, Re-check, Wirtualny Portfel
     # Uruchamiamy je tylko w trybie monitoringu, aby nie zatykać kolejki API podczas skanowania
     try:
-        schedule.run_pending()
+        with api_client.job_context(phase=MODE_MONITORING):
+            schedule.run_pending()
     except Exception as e:
         logger.error(f"Schedule Error: {e}")
 
+# Faza w księdze zapytań AV (api_call_ledger) - te same nazwy co zadania planera prefetchu
+OPERATION_PHASES = {
+    'run_phase_1_task': 'PHASE1',
+    'run_phase_3_task': 'PHASE3',
+    'run_phase_x_task': 'PHASEX',
+    'run_phase_4_task': 'PHASE4',
+    'run_sdar_task': 'SDAR',
+    'run_backtest_task': 'BACKTEST',
+    'run_optimization_task': 'OPTIMIZER',
+}
+
 def execute_high_priority_operation(session, operation_func, *args, **kwargs):
     """
     Tryb Operacji: "Odcięcie Tlenu" dla tła.
-    Zawiesza monitoring, wykonuje ciężkie zadanie (Skaner), a potem przywraca system.
-    Zapewnia, że Skaner ma 100% dostępnych zasobów API.
+    Zawiesza lekki monitoring (newsy, BioX, re-check), wykonuje ciężkie zadanie (Skaner), a potem przywraca system.
+    Monitory LIVE działają dalej w osobnym wątku - mają zarezerwowany pas w limiterze klienta.
     """
     global active_mode, current_state
     
@@ -73,13 +92,19 @@ def execute_high_priority_operation(session, operation_func, *args, **kwargs):
     active_mode = MODE_OPERATION
     
     utils.update_system_control(session, 'worker_status', 'BUSY_OPERATION')
-    utils.append_scan_log(session, "SYSTEM: Wstrzymanie monitoringu. Start operacji priorytetowej...")
+    utils.append_scan_log(session, "SYSTEM: Wstrzymanie monitoringu tła (LIVE aktywny). Start operacji priorytetowej...")
     
     start_time = time.time()
     
+    # Księga zapytań AV: wszystkie zapytania operacji (także z pul wątków prefetchu) pod jednym job_id
+    phase = OPERATION_PHASES.get(operation_func.__name__, operation_func.__name__.upper())
+    job_id = api_ledger.new_job_id(phase)
+    utils.update_system_control(session, 'current_job_id', job_id)
+    
     try:
         # 2. Wykonaj Operację (Skan/Optymalizacja/SDAR)
-        operation_func(session, *args, **kwargs)
+        with api_client.job_context(job_id, phase, process_wide=True):
+            operation_func(session, *args, **kwargs)
         
     except Exception as e:
         logger.error(f"Critical Operation Error: {e}", exc_info=True)
@@ -87,6 +112,9 @@ def execute_high_priority_operation(session, operation_func, *args, **kwargs):
         
     finally:
         # 3. Przywróć system do życia (Resuscytacja)
+        # Zapisy cache odroczone w trakcie operacji trafiają do bazy przed powrotem do monitoringu
+        cache_writer.flush_cache_writes()
+        api_ledger.flush_ledger()
         duration = time.time() - start_time
         logger.info(f"<<< OPERACJA ZAKOŃCZONA ({duration:.1f}s). POWRÓT DO MONITORINGU.")
         utils.append_scan_log(session, f"SYSTEM: Operacja zakończona. Wznawianie monitoringu.")
@@ -95,13 +123,28 @@ def execute_high_priority_operation(session, operation_func, *args, **kwargs):
         current_state = "IDLE" # Reset stanu
         utils.update_system_control(session, 'worker_status', 'IDLE')
         utils.update_system_control(session, 'current_phase', 'NONE')
+        utils.update_system_control(session, 'current_job_id', 'NONE')
+
+# === TRWAŁOŚĆ WYUCZONEGO TEMPA API (AIMD) ===
+AV_LEARNED_RPM_KEY = 'av_learned_rpm'
+
+def _load_learned_rpm():
+    with get_db_session() as session:
+        value = utils.get_system_control_value(session, AV_LEARNED_RPM_KEY)
+    try: return float(value) if value else None
+    except (TypeError, ValueError): return None
+
+def _save_learned_rpm(rpm: float):
+    # Wywoływane z dowolnego wątku klienta - zawsze własna sesja
+    with get_db_session() as session:
+        utils.update_system_control(session, AV_LEARNED_RPM_KEY, f"{rpm:.1f}")
 
 # === WRAPPERY ZADAŃ TŁA (Dla Schedule - Bezpieczeństwo) ===
 
 def safe_run_news_agent():
     # Tylko w trybie monitoringu (żeby nie marnować API podczas skanu)
     if active_mode == MODE_MONITORING:
-        with get_db_session() as session:
+        with get_db_session() as session, api_client.priority(LANE_USER):
             try: 
                 news_agent.run_news_agent_cycle(session, api_client)
             except Exception as e:
@@ -109,23 +152,70 @@ def safe_run_news_agent():
                 logger.error(f"News Agent Error (Schedule): {e}", exc_info=True)
 
 def safe_run_signal_monitor():
-    if active_mode == MODE_MONITORING:
-        with get_db_session() as session:
-            try: signal_monitor.run_signal_monitor_cycle(session, api_client)
-            except: pass
+    # Pas LIVE: działa także podczas operacji (kontrola SL/TP nie może czekać na skan)
+    with get_db_session() as session, api_client.priority(LANE_LIVE):
+        try: signal_monitor.run_signal_monitor_cycle(session, api_client)
+        except Exception as e: logger.error(f"Signal Monitor Error (LIVE): {e}")
 
 def safe_run_virtual_agent():
     # Ten agent może działać zawsze, bo operuje głównie na bazie danych (Virtual Portfolio)
-    with get_db_session() as session:
+    with get_db_session() as session, api_client.priority(LANE_LIVE):
         try: virtual_agent.run_virtual_trade_monitor(session, api_client)
-        except: pass
+        except Exception as e: logger.error(f"Virtual Agent Error (LIVE): {e}")
+
+def _live_monitor_loop():
+    """Wątek monitorów LIVE - niezależny od pętli głównej i trybu OPERACJI."""
+    while True:
+        try:
+            with api_client.job_context(phase='LIVE_MONITOR'):
+                live_schedule.run_pending()
+        except Exception as e:
+            logger.error(f"Live Schedule Error: {e}")
+        time.sleep(LIVE_LOOP_INTERVAL_SECONDS)
 
 def safe_run_biox_monitor():
     if active_mode == MODE_MONITORING:
-        with get_db_session() as session:
+        with get_db_session() as session, api_client.priority(LANE_USER):
             try: biox_agent.run_biox_live_monitor(session, api_client)
             except: pass
 
+def safe_run_fundamentals_refresh():
+    # Długi TTL (tygodnie) - mała porcja co przebieg, pas BULK, tylko w trybie monitoringu
+    if active_mode == MODE_MONITORING:
+        with get_db_session() as session, api_client.priority(LANE_BULK):
+            try: fundamentals.run_fundamentals_refresh_job(session, api_client)
+            except Exception as e: logger.error(f"Fundamentals Refresh Error (Schedule): {e}")
+
+def safe_run_earnings_calendar():
+    # Jedno zapytanie dziennie (wewnętrzna blokada "już dziś załadowano")
+    if active_mode == MODE_MONITORING:
+        with get_db_session() as session, api_client.priority(LANE_BULK):
+            try: earnings_calendar.ingest_earnings_calendar(session, api_client)
+            except Exception as e: logger.error(f"Earnings Calendar Error (Schedule): {e}")
+
+def safe_run_universe_refresh():
+    # Raz dziennie (blokada w system_control): nowe spółki, zmiany symboli, wycofane z obrotu
+    if active_mode == MODE_MONITORING:
+        with get_db_session() as session:
+            try: run_universe_refresh_job(session, api_client)
+            except Exception as e: logger.error(f"Universe Refresh Error (Schedule): {e}")
+
+def safe_run_cache_gc():
+    # Raz dziennie poza sesją NYSE (blokada w system_control): retencja, sieroty, VACUUM cache
+    if active_mode == MODE_MONITORING:
+        with get_db_session() as session:
+            try:
+                if cache_gc.run_cache_gc_job(session):
+                    api_ledger.purge_ledger(session)
+            except Exception as e: logger.error(f"Cache GC Error (Schedule): {e}")
+
+def safe_run_tier_refresh():
+    # Warstwy HOT/WARM/COLD (same zapytania SQL) - nowe sygnały i transakcje szybko trafiają do HOT
+    if active_mode == MODE_MONITORING:
+        with get_db_session() as session:
+            try: ticker_tiers.refresh_tiers(session)
+            except Exception as e: logger.error(f"Tier Refresh Error (Schedule): {e}")
+
 def safe_run_recheck_audit():
     if active_mode == MODE_MONITORING:
         with get_db_session() as session:
@@ -153,6 +243,8 @@ def run_phase_1_task(session):
         return # STOP - Oszczędzamy API i kapitał
         
     # Jeśli RISK_ON -> kontynuujemy normalny skan
+    # Warstwy odświeżania liczone jeszcze z dotychczasowymi kandydatami (zaraz zostaną usunięci)
+    ticker_tiers.refresh_tiers(session)
     session.execute(text("DELETE FROM phase1_candidates"))
     session.commit()
     phase1_scanner.run_scan(session, lambda: "RUNNING", api_client)
@@ -167,7 +259,7 @@ def run_phase_3_task(session):
     
     # Fallback: Jeśli F1 pusta, weź próbkę z companies
     if not candidates: 
-        candidates = [r[0] for r in session.execute(text("SELECT ticker FROM companies LIMIT 50")).fetchall()]
+        candidates = [r[0] for r in session.execute(text("SELECT ticker FROM companies WHERE is_active LIMIT 50")).fetchall()]
         
     phase3_sniper.run_h3_live_scan(session, candidates, api_client, parameters=params)
 
@@ -258,6 +350,11 @@ def main_loop():
         logger.critical(f"Database Schema Creation Error: {e}", exc_info=True)
     # ====================================================
 
+    # Adaptacyjne tempo API: start od tempa wyuczonego w poprzednich uruchomieniach
+    api_client.set_rate_persistence(loader=_load_learned_rpm, saver=_save_learned_rpm)
+    # Księga zapytań AV (każde zapytanie i trafienie w cache, z zadaniem i fazą)
+    api_client.set_call_recorder(api_ledger.LEDGER.record)
+
     # Inicjalizacja bazy i systemu
     try:
         with get_db_session() as session:
@@ -268,6 +365,9 @@ def main_loop():
             
             # Startowy check makro (żeby system wiedział od razu, co się dzieje na Nasdaq)
             phase0_macro_agent.run_macro_analysis(session, api_client)
+
+            # Kalendarz wyników (jeśli dziś jeszcze nie ładowany)
+            earnings_calendar.ingest_earnings_calendar(session, api_client)
             
     except Exception as e:
         logger.error(f"Startup Error: {e}")
@@ -279,15 +379,26 @@ def main_loop():
     # Newsy co 5 minut (zgodnie z limitem zapytań)
     schedule.every(5).minutes.do(safe_run_news_agent)
     
-    # Monitor sygnałów (bardzo częsty, dla szybkiej reakcji)
-    schedule.every(10).seconds.do(safe_run_signal_monitor)
-    
     # Inne monitory
     schedule.every(5).minutes.do(safe_run_biox_monitor)
     schedule.every(15).minutes.do(safe_run_recheck_audit)
+    # Fundamenty spółek (OVERVIEW) - odświeżanie w tle, skanery czytają z bazy
+    schedule.every(30).minutes.do(safe_run_fundamentals_refresh)
+    # Kalendarz wyników - raz dziennie (sprawdzane co godzinę)
+    schedule.every(1).hours.do(safe_run_earnings_calendar)
+    # Uniwersum spółek (listing -> companies) - raz dziennie (sprawdzane co godzinę)
+    schedule.every(1).hours.do(safe_run_universe_refresh)
+    # Sprzątanie alpha_vantage_cache - raz dziennie poza sesją (sprawdzane co godzinę)
+    schedule.every(1).hours.do(safe_run_cache_gc)
+    # Warstwy odświeżania tickerów (HOT/WARM/COLD) - co godzinę
+    schedule.every(1).hours.do(safe_run_tier_refresh)
     
+    # === MONITORY LIVE (osobny wątek, działają także podczas operacji) ===
+    # Monitor sygnałów (bardzo częsty, dla szybkiej reakcji)
+    live_schedule.every(10).seconds.do(safe_run_signal_monitor)
     # Odświeżanie portfela co minutę
-    schedule.every(1).minutes.do(safe_run_virtual_agent) 
+    live_schedule.every(1).minutes.do(safe_run_virtual_agent) 
+    threading.Thread(target=_live_monitor_loop, name="live-monitor", daemon=True).start()
 
     while True:
         with get_db_session() as session:
@@ -352,6 +463,10 @@ def main_loop():
                     if current_status_val != 'PAUSED' and not str(current_status_val).startswith('BUSY'):
                         run_monitoring_tasks(session)
                     
+                # Estymacja kosztu zadania (szybka - tylko odczyt świeżości, bez zapytań AV)
+                if not operation_to_run:
+                    api_ledger.run_estimate_request(session)
+
                 # Raportowanie życia workera
                 utils.report_heartbeat(session)
 
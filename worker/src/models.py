@@ -14,8 +14,112 @@ class Company(Base):
     sector = Column(VARCHAR(100))
     industry = Column(VARCHAR(255))
     sector_etf = Column(VARCHAR(10), nullable=True)
+    # Cykl życia w uniwersum (refresh_universe): spółki spoza listingu nie są kasowane, tylko wygaszane
+    is_active = Column(Boolean, nullable=False, default=True, server_default='true')
+    delisted_at = Column(PG_TIMESTAMP(timezone=True), nullable=True)
+    renamed_to = Column(VARCHAR(50), nullable=True, comment="Nowy symbol po zmianie tickera")
     last_updated = Column(PG_TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
 
+# === FUNDAMENTY SPÓŁEK (OVERVIEW, długi TTL) ===
+# Wypełniane przez job tła (fundamentals.refresh_fundamentals); skanery czytają przez JOIN.
+class CompanyFundamentals(Base):
+    __tablename__ = 'company_fundamentals'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    name = Column(VARCHAR(255), nullable=True)
+    exchange = Column(VARCHAR(50), nullable=True)
+    asset_type = Column(VARCHAR(50), nullable=True)
+    sector = Column(VARCHAR(100), nullable=True)
+    industry = Column(VARCHAR(255), nullable=True)
+    market_cap = Column(BIGINT, nullable=True)
+    shares_outstanding = Column(BIGINT, nullable=True)
+    shares_float = Column(BIGINT, nullable=True)
+    pe_ratio = Column(NUMERIC(14, 4), nullable=True)
+    beta = Column(NUMERIC(10, 4), nullable=True)
+    dividend_yield = Column(NUMERIC(10, 6), nullable=True)
+    week52_high = Column(NUMERIC(14, 4), nullable=True)
+    week52_low = Column(NUMERIC(14, 4), nullable=True)
+    status = Column(VARCHAR(10), nullable=False, default='OK', comment="OK / EMPTY (AV nie zna spółki)")
+    fetched_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now(), index=True)
+
+# === WARSTWY ODŚWIEŻANIA TICKERÓW (HOT / WARM / COLD) ===
+# Płynność obserwowana przez Fazę 1 + historia kandydatów; rytm odświeżania dziennych wg warstwy.
+class TickerTier(Base):
+    __tablename__ = 'ticker_tiers'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    tier = Column(VARCHAR(10), nullable=False, default='WARM', index=True, comment="HOT / WARM / COLD")
+    avg_volume = Column(BIGINT, nullable=True, comment="Średni wolumen 20 sesji (ostatnia obserwacja skanera)")
+    volume_observed_at = Column(PG_TIMESTAMP(timezone=True), nullable=True)
+    last_candidate_at = Column(PG_TIMESTAMP(timezone=True), nullable=True, comment="Ostatnio kandydat / sygnał / portfel")
+    updated_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+# === STATYSTYKI SKANÓW (kolejność pracy skanerów wg prawdopodobieństwa trafienia) ===
+class ScanStat(Base):
+    __tablename__ = 'scan_stats'
+    scanner = Column(VARCHAR(20), primary_key=True, comment="PHASE1 / PHASEX / SDAR")
+    ticker = Column(VARCHAR(50), primary_key=True)
+    scans = Column(NUMERIC(12, 4), nullable=False, default=0, comment="Liczba skanów z wygaszaniem (nowsze ważą więcej)")
+    passes = Column(NUMERIC(12, 4), nullable=False, default=0, comment="Liczba trafień z wygaszaniem")
+    total_scans = Column(INTEGER, nullable=False, default=0)
+    total_passes = Column(INTEGER, nullable=False, default=0)
+    last_margin = Column(NUMERIC(10, 4), nullable=True, comment="Względna odległość od progu decydującego filtra (>0 = przeszedł)")
+    last_volume = Column(BIGINT, nullable=True)
+    prev_volume = Column(BIGINT, nullable=True)
+    last_passed = Column(Boolean, nullable=True)
+    last_scanned_at = Column(PG_TIMESTAMP(timezone=True), nullable=True)
+    last_passed_at = Column(PG_TIMESTAMP(timezone=True), nullable=True)
+
+# === KALENDARZ WYNIKÓW (EARNINGS_CALENDAR, ładowany raz dziennie) ===
+class EarningsCalendar(Base):
+    __tablename__ = 'earnings_calendar'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    report_date = Column(DATE, primary_key=True, index=True)
+    name = Column(VARCHAR(255), nullable=True)
+    fiscal_date_ending = Column(DATE, nullable=True)
+    estimate = Column(NUMERIC(12, 4), nullable=True)
+    currency = Column(VARCHAR(10), nullable=True)
+    time_of_the_day = Column(VARCHAR(20), nullable=True, comment="pre-market / post-market (jeśli AV podaje)")
+    loaded_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+# === TRANSAKCJE INSIDERÓW (INSIDER_TRANSACTIONS, ładowane przyrostowo) ===
+# Klucz naturalny = hash pól transakcji (+ numer powtórzenia identycznych wierszy w payloadzie).
+class InsiderTransaction(Base):
+    __tablename__ = 'insider_transactions'
+    tx_hash = Column(VARCHAR(32), primary_key=True, comment="md5 klucza naturalnego")
+    ticker = Column(VARCHAR(50), nullable=False)
+    transaction_date = Column(DATE, nullable=False)
+    executive = Column(VARCHAR(255), nullable=True)
+    executive_title = Column(VARCHAR(255), nullable=True)
+    security_type = Column(VARCHAR(100), nullable=True)
+    acquisition_or_disposal = Column(VARCHAR(1), nullable=True, comment="A / D")
+    shares = Column(NUMERIC(20, 4), nullable=True)
+    share_price = Column(NUMERIC(14, 4), nullable=True)
+    loaded_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+    __table_args__ = (Index('ix_insider_transactions_ticker_date', 'ticker', 'transaction_date'),)
+
+class InsiderSyncState(Base):
+    """Znak wodny synchronizacji insiderów per ticker (najnowsza data + czas ostatniego pobrania)."""
+    __tablename__ = 'insider_sync'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    watermark = Column(DATE, nullable=True, comment="Najnowsza transaction_date w tabeli")
+    row_count = Column(INTEGER, default=0)
+    last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+# === KONTEKST MAKRO ===
+class MacroSeries(Base):
+    """Obserwacje serii makro AV (inflacja, rentowność 10Y, stopy, bezrobocie)."""
+    __tablename__ = 'macro_series'
+    series_id = Column(VARCHAR(50), primary_key=True)
+    obs_date = Column(DATE, primary_key=True)
+    value = Column(NUMERIC(16, 6), nullable=True)
+    loaded_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+class MacroSyncState(Base):
+    """Najnowsza obserwacja i czas ostatniego pobrania serii makro."""
+    __tablename__ = 'macro_sync'
+    series_id = Column(VARCHAR(50), primary_key=True)
+    latest_date = Column(DATE, nullable=True)
+    last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
 # === FAZA 1: KANDYDACI EOD ===
 class Phase1Candidate(Base):
     __tablename__ = 'phase1_candidates'
@@ -165,6 +269,49 @@ class ProcessedNews(Base):
     source_url = Column(TEXT, nullable=True)
     __table_args__ = (UniqueConstraint('ticker', 'news_hash', name='uq_ticker_news_hash'),)
 
+# === FIREHOSE NEWSÓW (Cały rynek, znormalizowane) ===
+class NewsArticle(Base):
+    __tablename__ = 'news_articles'
+    article_hash = Column(VARCHAR(64), primary_key=True, comment="MD5(url|title|source)")
+    url = Column(TEXT, nullable=True)
+    title = Column(TEXT, nullable=True)
+    source = Column(VARCHAR(255), nullable=True)
+    summary = Column(TEXT, nullable=True)
+    time_published = Column(PG_TIMESTAMP(timezone=True), nullable=False, index=True)
+    overall_sentiment_score = Column(NUMERIC(8, 4), nullable=True)
+    overall_sentiment_label = Column(VARCHAR(50), nullable=True)
+    topics = Column(JSONB, nullable=True)
+    ingested_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+class NewsTickerSentiment(Base):
+    """Rozprowadzenie artykułu na tickery (lista 'ticker_sentiment' z AV)."""
+    __tablename__ = 'news_ticker_sentiment'
+    article_hash = Column(VARCHAR(64), ForeignKey('news_articles.article_hash', ondelete='CASCADE'), primary_key=True)
+    ticker = Column(VARCHAR(50), primary_key=True)
+    time_published = Column(PG_TIMESTAMP(timezone=True), nullable=False)
+    relevance_score = Column(NUMERIC(8, 4), nullable=True)
+    ticker_sentiment_score = Column(NUMERIC(8, 4), nullable=True)
+    ticker_sentiment_label = Column(VARCHAR(50), nullable=True)
+    __table_args__ = (Index('ix_news_ticker_time', 'ticker', 'time_published'),)
+
+class DailySentiment(Base):
+    """Dzienny agregat sentymentu per (ticker, dzień UTC) - odświeżany przy każdym zapisie newsów."""
+    __tablename__ = 'daily_sentiment'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    day = Column(DATE, primary_key=True)
+    article_count = Column(INTEGER, nullable=False, default=0)
+    mean_sentiment = Column(NUMERIC(8, 4), nullable=True, comment="Średni overall_sentiment_score artykułów")
+    weighted_sentiment = Column(NUMERIC(8, 4), nullable=True, comment="ticker_sentiment_score ważony relevance_score")
+    bullish_count = Column(INTEGER, nullable=False, default=0)
+    bearish_count = Column(INTEGER, nullable=False, default=0)
+    updated_at = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
+class NewsSyncState(Base):
+    """Czas ostatniego pobrania historii newsów tickera (NEWS_SENTIMENT z filtrem tickera)."""
+    __tablename__ = 'news_sync'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
 # === PORTFEL INWESTYCYJNY (LIVE) ===
 class PortfolioHolding(Base):
     __tablename__ = 'portfolio_holdings'
@@ -242,6 +389,49 @@ class AlphaVantageCache(Base):
     last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now(), onupdate=func.now())
     __table_args__ = (UniqueConstraint('ticker', 'data_type', name='uq_av_cache_entry'),)
 
+# === KSIĘGA ZAPYTAŃ ALPHA VANTAGE (Quota Ledger) ===
+class ApiCallLedger(Base):
+    """Każde zapytanie AV (także throttle/błąd) i każde trafienie w cache, z zadaniem i fazą."""
+    __tablename__ = 'api_call_ledger'
+    id = Column(BIGINT, primary_key=True, autoincrement=True)
+    called_at = Column(PG_TIMESTAMP(timezone=True), nullable=False, server_default=func.now())
+    job_id = Column(VARCHAR(64), nullable=True)
+    phase = Column(VARCHAR(50), nullable=True)
+    function = Column(VARCHAR(64), nullable=True, comment="Funkcja AV (zapytanie) lub data_type (cache)")
+    symbol = Column(VARCHAR(50), nullable=True)
+    lane = Column(INTEGER, nullable=True)
+    cached = Column(Boolean, nullable=False, default=False)
+    status = Column(VARCHAR(20), nullable=False, comment="OK / EMPTY / THROTTLED / ERROR / CACHE")
+    latency_ms = Column(INTEGER, nullable=True)
+    __table_args__ = (
+        Index('ix_api_call_ledger_job', 'job_id', 'called_at'),
+        Index('ix_api_call_ledger_called_at', 'called_at'),
+    )
+
+# === HURTOWNIA ŚWIEC INTRADAY 5MIN (Partycje miesięczne) ===
+# Tabela partycjonowana po bar_time (RANGE, jedna partycja na miesiąc - tworzona przy zapisie),
+# a w obrębie partycji indeksowana po (ticker, bar_time). Czas świecy jak w AV (US/Eastern, bez strefy).
+class IntradayBar5m(Base):
+    __tablename__ = 'intraday_bars_5m'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    bar_time = Column(TIMESTAMP, primary_key=True)
+    open = Column(NUMERIC(14, 4), nullable=False)
+    high = Column(NUMERIC(14, 4), nullable=False)
+    low = Column(NUMERIC(14, 4), nullable=False)
+    close = Column(NUMERIC(14, 4), nullable=False)
+    volume = Column(BIGINT, nullable=False, default=0)
+    __table_args__ = {'postgresql_partition_by': 'RANGE (bar_time)'}
+
+class IntradayMonth(Base):
+    """Księga pokrycia hurtowni: które miesiące (ticker, interwał) są pobrane i czy są zamknięte."""
+    __tablename__ = 'intraday_months'
+    ticker = Column(VARCHAR(50), primary_key=True)
+    interval = Column(VARCHAR(10), primary_key=True)
+    month = Column(VARCHAR(7), primary_key=True, comment="YYYY-MM")
+    is_final = Column(Boolean, default=False, comment="Miesiąc zamknięty - nigdy nie pobieramy ponownie")
+    bar_count = Column(INTEGER, default=0)
+    last_fetched = Column(PG_TIMESTAMP(timezone=True), server_default=func.now())
+
 # === OPTYMALIZATOR (QUANTUM JOB) ===
 class OptimizationJob(Base):
     __tablename__ = 'optimization_jobs'
@@ -0,0 +1,8 @@
+import os
+import tempfile
+
+# src.database łączy się z bazą już przy imporcie - testy jednostkowe dostają
+# pustą bazę SQLite (plik tymczasowy), chyba że środowisko CI poda własną.
+os.environ.setdefault(
+    "DATABASE_URL", "sqlite:///" + os.path.join(tempfile.gettempdir(), "apex_worker_tests.db")
+)
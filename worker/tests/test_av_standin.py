@@ -0,0 +1,59 @@
+from datetime import date
+
+import pytest
+
+from src.data_ingestion.alpha_vantage_client import AlphaVantageClient
+from src.data_ingestion.av_standin import COMPACT_BARS, StandInTransport, SyntheticMarket
+from src.analysis.daily_data import parse_daily_adjusted
+from src.analysis.utils import is_compact_payload
+
+ANCHOR = date(2024, 6, 28)
+
+def _split_symbols(market: SyntheticMarket, limit: int = 3):
+    """Symbole ze splitem w środku historii (nie na pierwszej świecy)."""
+    found = []
+    for i in range(500):
+        symbol = f"S{i:04d}"
+        bars = market.daily_bars(symbol)
+        days = [k for k, b in enumerate(bars) if b['split'] != 1.0 and k > 0]
+        if days:
+            found.append((symbol, bars, days[0]))
+        if len(found) >= limit:
+            break
+    assert found, "stand-in nie wygenerował żadnego splitu"
+    return found
+
+def test_synthetic_split_drops_raw_prices_and_keeps_adjusted_continuous():
+    market = SyntheticMarket(seed=42, anchor=ANCHOR)
+    for symbol, bars, k in _split_symbols(market):
+        ratio = bars[k]['split']
+        raw_move = bars[k]['close'] / bars[k - 1]['close']
+        adj_move = bars[k]['adjusted_close'] / bars[k - 1]['adjusted_close']
+        # Surowe ceny spadają o współczynnik, skorygowane zachowują ciągłość (zwykły ruch dzienny)
+        assert raw_move == pytest.approx(1 / ratio, rel=0.25), symbol
+        assert adj_move == pytest.approx(1.0, rel=0.25), symbol
+        # Po splicie (i w dniu splitu) surowe = skorygowane
+        assert bars[-1]['adjusted_close'] == pytest.approx(bars[-1]['close'])
+
+def test_daily_adjusted_through_client_and_parser():
+    transport = StandInTransport(mode='synthetic', seed=42, anchor=ANCHOR)
+    client = AlphaVantageClient(api_key='standin', transport=transport)
+    market = transport.market
+    symbol, _, k = _split_symbols(market, limit=1)[0]
+
+    payload = client.get_daily_adjusted(symbol, outputsize='full')
+    assert not is_compact_payload(payload)
+    frames = parse_daily_adjusted(payload)
+
+    closes = frames.adjusted['close']
+    moves = (closes / closes.shift(1)).dropna()
+    # Widok skorygowany (z 'split coefficient') nie ma skoku w dniu splitu
+    assert moves.iloc[k - 1] == pytest.approx(1.0, rel=0.25)
+    assert frames.raw['split coefficient'].iloc[k] == pytest.approx(2.0)
+
+def test_compact_payload_is_marked_compact():
+    transport = StandInTransport(mode='synthetic', seed=42, anchor=ANCHOR)
+    client = AlphaVantageClient(api_key='standin', transport=transport)
+    payload = client.get_daily_adjusted('AAPL', outputsize='compact')
+    assert is_compact_payload(payload)
+    assert len(payload['Time Series (Daily)']) == COMPACT_BARS
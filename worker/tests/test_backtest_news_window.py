@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+from src.analysis import backtest_engine as be
+
+def _store(monkeypatch, articles):
+    store = be.TimeTravelDataStore(session=None, api_client=None)
+    months = []
+
+    def month_news(ticker, month):
+        months.append(month)
+        return [a for a in articles if a['time_published'][:6] == month.replace('-', '')]
+    monkeypatch.setattr(store, '_month_news', month_news)
+    return store, months
+
+def test_news_window_compares_ny_cutoff_in_utc(monkeypatch):
+    # 23:59:59 EDT 31.07 = 03:59:59 UTC 01.08 - artykuł z wieczora NY ma datę UTC następnego dnia
+    articles = [
+        {'time_published': '20240801T020000'},
+        {'time_published': '20240801T050000'},
+    ]
+    store, months = _store(monkeypatch, articles)
+    window = store.news_window('AAPL', datetime(2024, 7, 31, 23, 59, 59))
+    assert [a['time_published'] for a in window] == ['20240801T020000']
+    assert months == ['2024-07', '2024-08']
+
+def test_reference_time_is_cutoff_in_utc():
+    analyzer = be.TimeTravelSDARAnalyzer.__new__(be.TimeTravelSDARAnalyzer)
+    analyzer.cutoff_time = datetime(2024, 1, 15, 23, 59, 59)
+    assert analyzer._reference_time() == datetime(2024, 1, 16, 4, 59, 59, tzinfo=timezone.utc)
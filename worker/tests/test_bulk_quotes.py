@@ -0,0 +1,39 @@
+import csv
+import io
+
+import numpy as np
+import pytest
+
+from src.data_ingestion.alpha_vantage_client import AlphaVantageClient, bulk_chunk_to_table, bulk_quote_table
+from src.data_ingestion.av_standin import StandInTransport
+
+HEADER = "symbol,timestamp,open,high,low,close,volume,previous_close\n"
+
+def test_chunk_with_missing_fields_parses_to_nan():
+    chunk = HEADER + "AAA,2024-06-28 15:59:00.000,1,2,0.5,1.5,1000,1.4\nBBB,,1,2,0.5,,,1.4\n"
+    table = bulk_chunk_to_table(chunk)
+    assert table.symbol.tolist() == ['AAA', 'BBB']
+    assert table.price[0] == 1.5 and np.isnan(table.price[1])
+    assert np.isnan(table.volume[1])
+    assert table.timestamp[0] == np.datetime64('2024-06-28T15:59:00')
+    assert np.isnat(table.timestamp[1])
+    assert table.price_map() == {'AAA': 1.5}
+
+def test_chunks_are_concatenated_in_order():
+    first = HEADER + "AAA,2024-06-28 15:59:00.000,1,2,0.5,1.5,1000,1.4\n"
+    second = HEADER + "BBB,2024-06-28 15:59:00.000,1,2,0.5,2.5,2000,2.4\n"
+    table = bulk_quote_table([first, "Information: throttled", second])
+    assert table.symbol.tolist() == ['AAA', 'BBB']
+    assert table.volume.tolist() == [1000.0, 2000.0]
+    assert len(bulk_quote_table([])) == 0
+
+def test_table_matches_stand_in_csv():
+    transport = StandInTransport(mode='synthetic', seed=42)
+    client = AlphaVantageClient(api_key='standin', requests_per_minute=AlphaVantageClient.AIMD_MAX_RPM, transport=transport)
+    symbols = [f"S{i:03d}" for i in range(150)]
+    chunks = list(client._iter_bulk_chunks(symbols + ['S000']))   # duplikat - jedno notowanie
+    table = bulk_quote_table(chunks)
+    assert table.symbol.tolist() == symbols
+    assert (table.price > 0).all() and (table.high >= table.low).all()
+    expected = {row['symbol']: float(row['close']) for chunk in chunks for row in csv.DictReader(io.StringIO(chunk))}
+    assert table.price_map() == pytest.approx(expected)
@@ -0,0 +1,69 @@
+from src.analysis import cache_writer as cw
+
+class _Cursor:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def execute(self, sql):
+        self.conn.statements.append(sql)
+
+class _Conn:
+    """Połączenie, na którym wiersz z tickerem 'BAD' psuje całą instrukcję INSERT."""
+
+    def __init__(self):
+        self.statements = []
+        self.rows = []
+        self.committed = []
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def commit(self):
+        self.committed.extend(self.rows)
+        self.rows = []
+
+    def rollback(self):
+        self.rows = []
+
+    def close(self):
+        pass
+
+def _patch(monkeypatch):
+    conn = _Conn()
+
+    def execute_values(cursor, sql, rows, **kwargs):
+        if any(row[0] == 'BAD' for row in rows):
+            raise ValueError("invalid json")
+        cursor.conn.rows.extend(rows)
+
+    monkeypatch.setattr(cw, 'execute_values', execute_values)
+    monkeypatch.setattr(cw.engine, 'raw_connection', lambda: conn)
+    return conn
+
+def _writer(*tickers):
+    writer = cw.CacheWriteBehind(flush_size=100, flush_seconds=60, max_bytes=10**9)
+    writer._ensure_thread = lambda: None
+    for ticker in tickers:
+        writer.put(ticker, 'OVERVIEW', {}, '{}')
+    return writer
+
+def test_bad_row_does_not_drop_batch_on_last_retry(monkeypatch):
+    conn = _patch(monkeypatch)
+    writer = _writer('AAPL', 'BAD', 'MSFT')
+
+    for _ in range(cw.MAX_RETRIES - 1):
+        assert writer.flush() == 0
+        assert writer.pending_count() == 3
+
+    assert writer.flush() == 2
+    assert sorted(row[0] for row in conn.committed) == ['AAPL', 'MSFT']
+    assert writer.pending_count() == 0
+    assert writer.stats['dropped'] == 1
+    assert 'ROLLBACK TO SAVEPOINT cache_row' in conn.statements
+
+def test_clean_batch_is_written_at_once(monkeypatch):
+    conn = _patch(monkeypatch)
+    writer = _writer('AAPL', 'MSFT')
+    assert writer.flush() == 2
+    assert not conn.statements
+    assert writer.stats['flushes'] == 1
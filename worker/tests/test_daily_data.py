@@ -0,0 +1,44 @@
+import pandas as pd
+import pytest
+
+from src.analysis.daily_data import parse_daily_adjusted, split_factors
+
+def _payload(rows):
+    """JSON TIME_SERIES_DAILY_ADJUSTED z krotek (dzień, zamknięcie, wolumen, split)."""
+    series = {}
+    for day, close, volume, split in rows:
+        series[day] = {
+            '1. open': str(close), '2. high': str(close + 1), '3. low': str(close - 1), '4. close': str(close),
+            '5. adjusted close': str(close), '6. volume': str(volume),
+            '7. dividend amount': '0.0000', '8. split coefficient': str(split),
+        }
+    return {'Meta Data': {'2. Symbol': 'TEST'}, 'Time Series (Daily)': series}
+
+def test_split_factors_apply_to_bars_before_split_day():
+    index = pd.bdate_range('2024-01-01', periods=6)
+    raw = pd.DataFrame({'split coefficient': [1.0, 1.0, 2.0, 1.0, 3.0, 1.0]}, index=index)
+    # Dzień splitu ma już ceny po splicie - czynnik obejmuje tylko świece wcześniejsze
+    assert split_factors(raw).tolist() == [6.0, 6.0, 3.0, 3.0, 1.0, 1.0]
+
+def test_split_factors_ignore_missing_and_invalid_coefficients():
+    index = pd.bdate_range('2024-01-01', periods=4)
+    raw = pd.DataFrame({'split coefficient': [1.0, None, 0.0, 4.0]}, index=index)
+    assert split_factors(raw).tolist() == [4.0, 4.0, 4.0, 1.0]
+    assert split_factors(pd.DataFrame(index=index)).tolist() == [1.0] * 4
+
+def test_parse_daily_adjusted_keeps_raw_and_builds_continuous_view():
+    frames = parse_daily_adjusted(_payload([
+        ('2024-01-04', 51.0, 200, 1.0),    # kolejność jak w AV: od najnowszej
+        ('2024-01-03', 50.0, 200, 2.0),
+        ('2024-01-02', 101.0, 100, 1.0),
+        ('2024-01-01', 100.0, 100, 1.0),
+    ]))
+    assert list(frames.raw.index) == list(pd.to_datetime(['2024-01-01', '2024-01-02', '2024-01-03', '2024-01-04']))
+    assert frames.raw['close'].tolist() == [100.0, 101.0, 50.0, 51.0]
+    assert frames.adjusted['close'].tolist() == pytest.approx([50.0, 50.5, 50.0, 51.0])
+    assert frames.adjusted['high'].iloc[0] == pytest.approx(50.5)
+    assert frames.adjusted['volume'].tolist() == pytest.approx([200.0, 200.0, 200.0, 200.0])
+
+def test_parse_daily_adjusted_empty_payload():
+    assert parse_daily_adjusted(None).empty
+    assert parse_daily_adjusted({'Note': 'throttled'}).empty
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis import aqm_v3_metrics
+from src.analysis.daily_sentiment import FRAME_COLUMNS, retail_herding_series
+
+def _articles(seed: int = 7, count: int = 120):
+    """Artykuły z sentymentem (indeks: czas publikacji UTC bez strefy)."""
+    rng = np.random.default_rng(seed)
+    start = pd.Timestamp('2024-01-01')
+    published = start + pd.to_timedelta(np.sort(rng.integers(0, 90 * 24 * 60, size=count)), unit='min')
+    return pd.DataFrame({'overall_sentiment_score': rng.uniform(-0.6, 0.6, size=count)}, index=published)
+
+def _daily(articles: pd.DataFrame) -> pd.DataFrame:
+    """Agregat dzienny jak _REFRESH_SQL (dzień UTC publikacji)."""
+    grouped = articles.groupby(articles.index.normalize())['overall_sentiment_score']
+    df = pd.DataFrame(index=grouped.size().index, columns=FRAME_COLUMNS, dtype=float)
+    df['article_count'] = grouped.size().astype(float)
+    df['mean_sentiment'] = grouped.mean()
+    return df
+
+def test_retail_herding_series_matches_per_row_metric():
+    articles = _articles()
+    index = pd.bdate_range('2023-12-15', '2024-04-30')
+    series = retail_herding_series(_daily(articles), index)
+    expected = [aqm_v3_metrics.calculate_retail_herding_from_data(articles, day) for day in index]
+    assert series.tolist() == pytest.approx(expected)
+
+def test_retail_herding_series_without_news_is_neutral():
+    index = pd.bdate_range('2024-01-01', '2024-01-31')
+    empty = pd.DataFrame(columns=FRAME_COLUMNS).set_index(pd.to_datetime([]))
+    assert (retail_herding_series(empty, index) == 0.0).all()
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.analysis import indicators
+
+def _bars(closes, volumes=None, start='2024-01-02'):
+    """Świece dzienne (dni robocze) z zamknięć; high/low = close +/- 1."""
+    closes = np.asarray(closes, dtype=float)
+    index = pd.bdate_range(start, periods=len(closes))
+    volumes = np.full(len(closes), 1000.0) if volumes is None else np.asarray(volumes, dtype=float)
+    return pd.DataFrame({
+        'open': closes, 'high': closes + 1.0, 'low': closes - 1.0, 'close': closes, 'volume': volumes
+    }, index=index)
+
+def test_sma_warmup_is_nan():
+    result = indicators.sma(pd.Series([1.0, 2.0, 3.0, 4.0]), 3)
+    assert result.iloc[:2].isna().all()
+    assert result.iloc[2:].tolist() == [2.0, 3.0]
+
+def test_obv_starts_from_first_volume_and_ignores_flat_closes():
+    df = _bars([10, 11, 11, 9, 12], volumes=[100, 200, 300, 400, 500])
+    assert indicators.obv(df)['OBV'].tolist() == [100, 300, 300, -100, 400]
+
+def test_obv_sorts_descending_input():
+    df = _bars([10, 11, 9], volumes=[100, 200, 300])
+    assert indicators.obv(df.iloc[::-1])['OBV'].tolist() == [100, 300, 0]
+
+def test_bbands_population_std_and_full_windows_only():
+    df = _bars([1, 2, 3, 4, 5])
+    bands = indicators.bbands(df, time_period=5)
+    assert len(bands) == 1
+    std = np.std([1, 2, 3, 4, 5])                    # ddof=0 jak TA-Lib
+    row = bands.iloc[0]
+    assert row['Real Middle Band'] == pytest.approx(3.0)
+    assert row['Real Upper Band'] == pytest.approx(3.0 + 2 * std)
+    assert row['Real Lower Band'] == pytest.approx(3.0 - 2 * std)
+
+def test_weekly_resample_labels_last_trading_day():
+    # Tydzień z Wielkim Piątkiem (2024-03-29, sesja zamknięta): etykieta = czwartek 2024-03-28
+    index = pd.DatetimeIndex(['2024-03-25', '2024-03-26', '2024-03-27', '2024-03-28', '2024-04-01'])
+    df = pd.DataFrame({
+        'open': [1.0, 2.0, 3.0, 4.0, 5.0], 'high': [2.0, 5.0, 4.0, 6.0, 7.0],
+        'low': [0.5, 1.5, 0.2, 3.5, 4.5], 'close': [1.5, 2.5, 3.5, 4.5, 5.5],
+        'volume': [10.0, 20.0, 30.0, 40.0, 50.0]
+    }, index=index)
+    weekly = indicators.weekly_resample(df)
+    assert list(weekly.index) == [pd.Timestamp('2024-03-28'), pd.Timestamp('2024-04-01')]
+    week = weekly.iloc[0]
+    assert (week['open'], week['high'], week['low'], week['close'], week['volume']) == (1.0, 6.0, 0.2, 4.5, 100.0)
+
+def test_atr_wilder_seed_and_smoothing():
+    closes = [10, 12, 11, 15, 14, 13]
+    df = _bars(closes)
+    period = 3
+    atr = indicators.atr_wilder(df, time_period=period)
+    tr = indicators.true_range(df)
+    assert atr.iloc[:period].isna().all()
+    # Pierwsza wartość = średnia TR ze świec 1..period, potem wygładzanie Wildera
+    expected = tr.iloc[1:period + 1].mean()
+    assert atr.iloc[period] == pytest.approx(expected)
+    for t in range(period + 1, len(closes)):
+        expected = (expected * (period - 1) + tr.iloc[t]) / period
+        assert atr.iloc[t] == pytest.approx(expected)
+
+def test_atr_wilder_too_short_history():
+    assert indicators.atr_wilder(_bars([1, 2, 3]), time_period=3).isna().all()
@@ -0,0 +1,27 @@
+import pandas as pd
+import pytest
+
+from src.analysis import aqm_v3_metrics
+from src.analysis.insider_transactions import institutional_sync_series
+
+def _insider_frame():
+    return pd.DataFrame(
+        {
+            'transaction_type': ['A', 'D', 'A', 'D', 'A'],
+            'transaction_shares': [1000.0, 400.0, 250.0, 5000.0, 800.0],
+        },
+        index=pd.to_datetime(['2024-01-05', '2024-02-10', '2024-03-01', '2024-05-20', '2024-08-15']),
+    )
+
+def test_institutional_sync_series_matches_per_row_metric():
+    insider_df = _insider_frame()
+    index = pd.bdate_range('2023-12-01', '2024-10-31')
+    series = institutional_sync_series(insider_df, index)
+    expected = [aqm_v3_metrics.calculate_institutional_sync_from_data(insider_df, day) for day in index]
+    assert series.tolist() == pytest.approx(expected)
+
+def test_institutional_sync_series_without_transactions_is_neutral():
+    index = pd.bdate_range('2024-01-01', '2024-01-31')
+    empty = pd.DataFrame(columns=['transaction_type', 'transaction_shares']).set_index(pd.to_datetime([]))
+    assert (institutional_sync_series(empty, index) == 0.0).all()
+    assert (institutional_sync_series(None, index) == 0.0).all()
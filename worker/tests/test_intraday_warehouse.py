@@ -0,0 +1,58 @@
+import pandas as pd
+
+from src.analysis import intraday_warehouse as iw
+
+class _Client:
+    """Klient AV zwracający kolejne odpowiedzi get_intraday (None = throttle / błąd)."""
+
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.calls = []
+
+    def get_intraday(self, ticker, **kwargs):
+        self.calls.append(kwargs)
+        return self.responses.pop(0) if self.responses else None
+
+class _Session:
+    def execute(self, *args, **kwargs):
+        raise AssertionError("nieoczekiwane zapytanie SQL")
+
+def _payload(start: str, bars: int) -> dict:
+    index = pd.date_range(start, periods=bars, freq='5min')
+    return {iw.SERIES_KEY_5MIN: {
+        ts.strftime('%Y-%m-%d %H:%M:%S'): {
+            '1. open': '1.0', '2. high': '1.1', '3. low': '0.9', '4. close': '1.0', '5. volume': '100'
+        } for ts in index
+    }}
+
+def _patch_storage(monkeypatch, last_bar=None):
+    recorded = []
+    monkeypatch.setattr(iw, 'get_last_bar_time', lambda session, ticker: last_bar)
+    monkeypatch.setattr(iw, 'store_bars', lambda session, ticker, df: 0 if df is None else len(df))
+    monkeypatch.setattr(iw, '_record_months', lambda session, ticker, months, final_months=frozenset(): recorded.append((months, set(final_months))))
+    return recorded
+
+def test_failed_sync_is_not_recorded(monkeypatch):
+    recorded = _patch_storage(monkeypatch, last_bar=pd.Timestamp('2024-06-27 15:55'))
+    client = _Client(None, None)
+    assert iw.sync_ticker(_Session(), client, 'AAA') == 0
+    assert [c['outputsize'] for c in client.calls] == ['compact', 'full']
+    assert recorded == []
+
+def test_successful_sync_records_months(monkeypatch):
+    recorded = _patch_storage(monkeypatch)
+    client = _Client(_payload('2024-06-28 09:30', 12))
+    assert iw.sync_ticker(_Session(), client, 'AAA') == 12
+    assert len(recorded) == 1 and '2024-06' in recorded[0][0]
+
+def test_failed_backfill_month_is_not_recorded(monkeypatch):
+    recorded = _patch_storage(monkeypatch)
+
+    class _LedgerSession(_Session):
+        def execute(self, *args, **kwargs):
+            return type('R', (), {'fetchone': lambda self: None})()
+
+    assert iw.backfill_month(_LedgerSession(), _Client(None), 'AAA', '2024-03') == 0
+    assert recorded == []
+    assert iw.backfill_month(_LedgerSession(), _Client(_payload('2024-03-28 09:30', 6)), 'AAA', '2024-03') == 6
+    assert recorded == [(['2024-03'], {'2024-03'})]
@@ -0,0 +1,51 @@
+from datetime import date, datetime, timezone
+
+from src.analysis import market_calendar as mc
+
+def _utc(*args) -> datetime:
+    return datetime(*args, tzinfo=timezone.utc)
+
+def test_nyse_holidays_2024():
+    assert set(mc.nyse_holidays(2024)) == {
+        date(2024, 1, 1), date(2024, 1, 15), date(2024, 2, 19), date(2024, 3, 29), date(2024, 5, 27),
+        date(2024, 6, 19), date(2024, 7, 4), date(2024, 9, 2), date(2024, 11, 28), date(2024, 12, 25),
+    }
+
+def test_weekend_holidays_are_observed_by_nyse_rules():
+    assert date(2022, 6, 20) in mc.nyse_holidays(2022)        # Juneteenth w niedzielę -> poniedziałek
+    assert date(2027, 12, 24) in mc.nyse_holidays(2027)       # Boże Narodzenie w sobotę -> piątek
+    assert date(2021, 12, 31) not in mc.nyse_holidays(2021)   # Nowy Rok 2022 w sobotę - bez zamiany
+    assert date(2022, 1, 1) not in mc.nyse_holidays(2022)
+    assert date(2021, 6, 18) not in mc.nyse_holidays(2021)    # Juneteenth dopiero od 2022
+
+def test_early_closes_and_trading_days():
+    assert mc.early_closes(2024) == {date(2024, 7, 3), date(2024, 11, 29), date(2024, 12, 24)}
+    assert mc.next_trading_day(date(2024, 3, 28)) == date(2024, 4, 1)       # Wielki Piątek + weekend
+    assert mc.previous_trading_day(date(2024, 7, 5)) == date(2024, 7, 3)
+    assert not mc.is_trading_day(date(2024, 7, 6))
+
+def test_daily_data_fetched_friday_evening_stays_fresh_until_monday_publication():
+    fetched = _utc(2024, 6, 28, 21, 0)                      # piątek 17:00 NY, po publikacji
+    assert mc.next_daily_publication(fetched) == _utc(2024, 7, 1, 20, 30)
+    assert mc.unchanged_since('DAILY_ADJUSTED', fetched, _utc(2024, 7, 1, 20, 0))
+    assert not mc.unchanged_since('DAILY_ADJUSTED', fetched, _utc(2024, 7, 1, 20, 31))
+
+def test_daily_publication_after_early_close_skips_holiday():
+    # 3 lipca: zamknięcie 13:00 NY, publikacja 13:30 NY; 4 lipca bez sesji
+    assert mc.next_daily_publication(_utc(2024, 7, 3, 12, 0)) == _utc(2024, 7, 3, 17, 30)
+    fetched = _utc(2024, 7, 3, 18, 0)
+    assert mc.next_daily_publication(fetched) == _utc(2024, 7, 5, 20, 30)
+    assert mc.unchanged_since('OBV', fetched, _utc(2024, 7, 4, 16, 0))
+
+def test_intraday_freshness_follows_extended_session():
+    saturday = _utc(2024, 6, 29, 15, 0)
+    assert mc.next_intraday_activity(saturday) == _utc(2024, 7, 1, 8, 0)    # poniedziałek 04:00 NY
+    assert mc.unchanged_since('INTRADAY_5MIN', saturday, _utc(2024, 7, 1, 7, 59))
+    during = _utc(2024, 7, 1, 14, 0)
+    assert not mc.unchanged_since('INTRADAY_5MIN', during, _utc(2024, 7, 1, 14, 5))
+
+def test_types_without_calendar_rule_are_never_unchanged():
+    fetched = _utc(2024, 6, 29, 15, 0)
+    assert mc.freshness_policy('NEWS_SENTIMENT') is None
+    assert not mc.unchanged_since('NEWS_SENTIMENT', fetched, _utc(2024, 6, 29, 15, 1))
+    assert not mc.unchanged_since(None, fetched, _utc(2024, 6, 29, 15, 1))
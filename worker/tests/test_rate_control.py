@@ -0,0 +1,59 @@
+import json
+import time
+
+from src.data_ingestion.alpha_vantage_client import AlphaVantageClient
+
+THROTTLE = {"Information": "Thank you for using Alpha Vantage! Please contact premium@alphavantage.co ... API call volume ..."}
+
+class _Response:
+    def __init__(self, payload):
+        self.text = json.dumps(payload)
+        self._payload = payload
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        pass
+
+class _Transport:
+    """Kolejne odpowiedzi AV (ostatnia powtarzana), z czasem każdego zapytania."""
+
+    def __init__(self, *payloads):
+        self.payloads = list(payloads)
+        self.times = []
+
+    def get(self, url, params=None, timeout=None, **kwargs):
+        self.times.append(time.monotonic())
+        payload = self.payloads.pop(0) if len(self.payloads) > 1 else self.payloads[0]
+        return _Response(payload)
+
+def _client(transport, cooldown=0.2, window=0.5):
+    client = AlphaVantageClient(api_key='test', requests_per_minute=AlphaVantageClient.AIMD_MAX_RPM, transport=transport)
+    client.AIMD_DECREASE_COOLDOWN_S = cooldown
+    client.THROTTLE_WINDOW_S = window
+    return client
+
+def test_throttled_request_waits_for_cooldown_then_returns_data():
+    transport = _Transport(THROTTLE, {"ok": 1})
+    client = _client(transport)
+    rpm = client.current_rpm
+    assert client._make_request({'function': 'OVERVIEW', 'symbol': 'AAA'}) == {"ok": 1}
+    assert transport.times[1] - transport.times[0] >= 0.2
+    assert client.current_rpm < rpm
+
+def test_repeated_throttle_waits_for_window_reset():
+    transport = _Transport(THROTTLE, THROTTLE, {"ok": 1})
+    client = _client(transport)
+    assert client._make_request({'function': 'OVERVIEW', 'symbol': 'AAA'}) == {"ok": 1}
+    # Druga pauza trwa do odnowienia okna liczonego od najstarszego zapytania
+    assert transport.times[2] - transport.times[0] >= 0.5
+
+def test_throttle_pause_applies_to_other_requests():
+    transport = _Transport(THROTTLE, {"ok": 1})
+    client = _client(transport, cooldown=0.3)
+    client._make_request({'function': 'OVERVIEW', 'symbol': 'AAA'})
+    client._pause_after_throttle(0)
+    started = time.monotonic()
+    client._make_request({'function': 'OVERVIEW', 'symbol': 'BBB'})
+    assert time.monotonic() - started >= 0.25
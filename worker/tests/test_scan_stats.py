@@ -0,0 +1,68 @@
+import pytest
+
+from src.analysis import scan_stats
+
+class _Result:
+    def __init__(self, rows):
+        self._rows = rows
+
+    def fetchall(self):
+        return self._rows
+
+class _Session:
+    """Sesja z gotowymi wierszami scan_stats (albo błędem odczytu)."""
+
+    def __init__(self, rows=None, error=None):
+        self.rows = rows or []
+        self.error = error
+        self.params = None
+        self.rolled_back = False
+
+    def execute(self, statement, params=None):
+        if self.error:
+            raise self.error
+        self.params = params
+        return _Result(self.rows)
+
+    def rollback(self):
+        self.rolled_back = True
+
+def test_margins_are_clipped_relative_distances():
+    assert scan_stats.threshold_margin(150.0, 100.0) == pytest.approx(0.5)
+    assert scan_stats.threshold_margin(50.0, 100.0) == pytest.approx(-0.5)
+    assert scan_stats.threshold_margin(500.0, 100.0) == 1.0
+    assert scan_stats.threshold_margin(float('nan'), 100.0) is None
+    assert scan_stats.range_margin(20.0, 10.0, 40.0) == pytest.approx(1.0)
+    assert scan_stats.range_margin(35.0, 10.0, 40.0) == pytest.approx(40.0 / 35.0 - 1.0)
+    assert scan_stats.range_margin(8.0, 10.0, 40.0) == pytest.approx(-0.2)
+    assert scan_stats.range_margin(0.0, 10.0, 40.0) is None
+
+def test_ticker_score_prior_sits_between_regular_hits_and_rejects():
+    prior = scan_stats.ticker_score((0, 0, None, None, None))
+    assert prior == pytest.approx(scan_stats.PRIOR_PASS_RATE)
+    hits = scan_stats.ticker_score((10, 8, 0.2, None, None))
+    rejects = scan_stats.ticker_score((10, 0, -0.5, None, None))
+    assert rejects < prior < hits
+
+def test_ticker_score_rewards_rising_volume():
+    flat = scan_stats.ticker_score((5, 1, 0.0, 1000, 1000))
+    rising = scan_stats.ticker_score((5, 1, 0.0, 2000, 1000))
+    falling = scan_stats.ticker_score((5, 1, 0.0, 500, 1000))
+    assert falling < flat < rising
+    assert scan_stats.ticker_score((5, 1, 0.0, 2000, 0)) == pytest.approx(flat)
+
+def test_order_tickers_sorts_by_score_and_keeps_input_order_for_ties():
+    session = _Session(rows=[
+        ('AAA', 10, 0, -0.5, None, None),      # stały odrzut
+        ('CCC', 10, 9, 0.3, None, None),       # regularne trafienie
+    ])
+    ordered = scan_stats.order_tickers(session, scan_stats.SCANNER_PHASE1, ['AAA', 'BBB', 'CCC', 'DDD'])
+    assert ordered == ['CCC', 'BBB', 'DDD', 'AAA']
+    assert session.params == {'scanner': scan_stats.SCANNER_PHASE1, 'tickers': ['AAA', 'BBB', 'CCC', 'DDD']}
+
+def test_order_tickers_falls_back_to_input_order_on_read_error():
+    session = _Session(error=RuntimeError('no table'))
+    tickers = ['ZZZ', 'AAA', 'MMM']
+    assert scan_stats.order_tickers(session, scan_stats.SCANNER_SDAR, tickers) == tickers
+    assert session.rolled_back
+    assert scan_stats.order_tickers(session, scan_stats.SCANNER_SDAR, []) == []